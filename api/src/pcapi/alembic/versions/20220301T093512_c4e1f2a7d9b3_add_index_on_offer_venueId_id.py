@@ -0,0 +1,40 @@
+"""add_index_on_offer_venueId_id
+"""
+from alembic import op
+
+from pcapi import settings
+
+
+# revision identifiers, used by Alembic.
+revision = "c4e1f2a7d9b3"
+down_revision = "ab181e95a4c6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("COMMIT")
+    op.execute(
+        """
+        SET SESSION statement_timeout = '300s'
+        """
+    )
+    op.execute(
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS "ix_offer_venueId_id" ON offer ("venueId", id)
+        """
+    )
+    op.execute(
+        f"""
+        SET SESSION statement_timeout={settings.DATABASE_STATEMENT_TIMEOUT}
+        """
+    )
+
+
+def downgrade():
+    op.execute("COMMIT")
+    op.execute(
+        """
+        DROP INDEX CONCURRENTLY IF EXISTS "ix_offer_venueId_id"
+        """
+    )
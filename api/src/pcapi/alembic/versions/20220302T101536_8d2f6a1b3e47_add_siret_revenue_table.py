@@ -0,0 +1,26 @@
+"""Add siret_revenue table"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8d2f6a1b3e47"
+down_revision = "c4e1f2a7d9b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "siret_revenue",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("siret", sa.String(length=14), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("siret", "year", name="unique_siret_year"),
+    )
+
+
+def downgrade():
+    op.drop_table("siret_revenue")
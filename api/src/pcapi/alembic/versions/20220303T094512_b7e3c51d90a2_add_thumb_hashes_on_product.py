@@ -0,0 +1,19 @@
+"""Add product.thumbHashes column"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "b7e3c51d90a2"
+down_revision = "8d2f6a1b3e47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("product", sa.Column("thumbHashes", postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    op.drop_column("product", "thumbHashes")
@@ -0,0 +1,25 @@
+"""Add hasThumbVariants column on models with thumbs"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e41d9c07a8b3"
+down_revision = "b7e3c51d90a2"
+branch_labels = None
+depends_on = None
+
+
+TABLES = ("mediation", "offerer", "product", "venue")
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(
+            table, sa.Column("hasThumbVariants", sa.Boolean(), server_default=sa.text("false"), nullable=False)
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, "hasThumbVariants")
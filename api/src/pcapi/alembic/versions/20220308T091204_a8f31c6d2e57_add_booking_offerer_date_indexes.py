@@ -0,0 +1,49 @@
+"""add_booking_offerer_date_indexes
+"""
+from alembic import op
+
+from pcapi import settings
+
+
+# revision identifiers, used by Alembic.
+revision = "a8f31c6d2e57"
+down_revision = "e41d9c07a8b3"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = {
+    "ix_booking_offererId_dateCreated": '"offererId", "dateCreated"',
+    "ix_booking_offererId_dateUsed": '"offererId", "dateUsed"',
+    "ix_booking_offererId_reimbursementDate": '"offererId", "reimbursementDate"',
+}
+
+
+def upgrade():
+    op.execute("COMMIT")
+    op.execute(
+        """
+        SET SESSION statement_timeout = '300s'
+        """
+    )
+    for name, columns in INDEXES.items():
+        op.execute(
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON booking ({columns})
+            """
+        )
+    op.execute(
+        f"""
+        SET SESSION statement_timeout={settings.DATABASE_STATEMENT_TIMEOUT}
+        """
+    )
+
+
+def downgrade():
+    op.execute("COMMIT")
+    for name in INDEXES:
+        op.execute(
+            f"""
+            DROP INDEX CONCURRENTLY IF EXISTS "{name}"
+            """
+        )
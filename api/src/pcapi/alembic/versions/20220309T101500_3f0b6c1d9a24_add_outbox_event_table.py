@@ -0,0 +1,31 @@
+"""add_outbox_event_table
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "3f0b6c1d9a24"
+down_revision = "a8f31c6d2e57"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox_event",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("type", sa.String(length=100), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("dateCreated", sa.DateTime(), nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("nextAttemptDate", sa.DateTime(), nullable=False),
+        sa.Column("lastError", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_outbox_event_nextAttemptDate"), "outbox_event", ["nextAttemptDate"], unique=False)
+
+
+def downgrade():
+    op.drop_table("outbox_event")
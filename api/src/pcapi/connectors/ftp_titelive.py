@@ -1,6 +1,9 @@
+from collections.abc import Iterator
 import ftplib
-from io import BytesIO
 import logging
+import pathlib
+import tempfile
+from typing import IO
 from typing import Pattern
 from zipfile import ZipFile
 
@@ -25,16 +28,93 @@ def connect_to_titelive_ftp():
     return ftp_titelive
 
 
+def _get_download_dir() -> pathlib.Path:
+    if settings.TITELIVE_FTP_CACHE_DIR:
+        return pathlib.Path(settings.TITELIVE_FTP_CACHE_DIR)
+    return pathlib.Path(tempfile.gettempdir()) / "titelive"
+
+
+def download_file_from_ftp(file_name: str, folder_name: str) -> pathlib.Path:
+    """Download a file to the local download directory (unless it is
+    already there) and return its path.
+
+    The file is written to disk as it is received, instead of being
+    held in memory. Downloaded files are keyed by the name and the
+    modification date of the remote file, and interrupted downloads
+    are resumed where they stopped.
+    """
+    remote_path = folder_name + "/" + file_name
+    with connect_to_titelive_ftp() as ftp:
+        ftp.voidcmd("TYPE I")
+        size = ftp.size(remote_path)
+        modified_at = ftp.voidcmd("MDTM " + remote_path).split()[-1]
+
+    directory = _get_download_dir() / folder_name / modified_at
+    path = directory / file_name
+    if path.exists() and path.stat().st_size == size:
+        logger.info("Using already downloaded file %s", path)
+        return path
+
+    directory.mkdir(parents=True, exist_ok=True)
+    partial_path = directory / (file_name + ".part")
+    for attempt in range(1, settings.TITELIVE_FTP_DOWNLOAD_ATTEMPTS + 1):
+        offset = partial_path.stat().st_size if partial_path.exists() else 0
+        if offset >= size:
+            break
+        logger.info("Downloading file %s", remote_path, extra={"offset": offset, "size": size, "attempt": attempt})
+        try:
+            with connect_to_titelive_ftp() as ftp, open(partial_path, "ab") as partial_file:
+                ftp.retrbinary("RETR " + remote_path, partial_file.write, rest=offset or None)
+            break
+        except ftplib.all_errors as exc:
+            if attempt == settings.TITELIVE_FTP_DOWNLOAD_ATTEMPTS:
+                raise
+            logger.warning("Could not download file %s, will resume", remote_path, extra={"exc": str(exc)})
+    partial_path.rename(path)
+
+    _remove_other_versions(directory.parent, file_name, keep=modified_at)
+    return path
+
+
+def _remove_other_versions(folder: pathlib.Path, file_name: str, keep: str) -> None:
+    for directory in folder.iterdir():
+        if directory.name == keep:
+            continue
+        for path in (directory / file_name, directory / (file_name + ".part")):
+            path.unlink(missing_ok=True)
+        try:
+            directory.rmdir()
+        except OSError:  # not empty
+            pass
+
+
+def _open_downloaded_file(path: pathlib.Path, mode: str, **kwargs) -> IO:
+    data_file = open(path, mode, **kwargs)  # pylint: disable=consider-using-with,unspecified-encoding
+    if not settings.TITELIVE_FTP_CACHE_DIR:
+        # The disk space is freed as soon as the file is closed.
+        path.unlink()
+    return data_file
+
+
 def get_zip_file_from_ftp(zip_file_name: str, folder_name: str) -> ZipFile:
-    data_file = BytesIO()
-    data_file.name = zip_file_name
-    file_path = "RETR " + folder_name + "/" + zip_file_name
-    logger.info("Downloading file %s", file_path)
-    connect_to_titelive_ftp().retrbinary(file_path, data_file.write)
+    path = download_file_from_ftp(zip_file_name, folder_name)
+    data_file = _open_downloaded_file(path, "rb")
     # FIXME: this should be a with statement. Requires titelive sync to be rewritten
     return ZipFile(data_file, "r")  # pylint: disable=consider-using-with
 
 
+def get_lines_from_ftp_file(file_name: str, folder_name: str, encoding: str) -> Iterator[str]:
+    """Download a text file and lazily return its lines."""
+    path = download_file_from_ftp(file_name, folder_name)
+    data_file = _open_downloaded_file(path, "r", encoding=encoding)
+    return _iter_lines(data_file)
+
+
+def _iter_lines(data_file: IO) -> Iterator[str]:
+    with data_file:
+        yield from data_file
+
+
 def get_files_to_process_from_titelive_ftp(titelive_folder_name: str, date_regexp: Pattern[str]) -> list[str]:
     ftp_titelive = connect_to_titelive_ftp()
     files_list = ftp_titelive.nlst(titelive_folder_name)
@@ -1,8 +1,14 @@
+from concurrent.futures import Future
+from typing import Iterable
+
 from pcapi import settings
 from pcapi.core import object_storage
 from pcapi.models import Model
 from pcapi.utils.image_conversion import IMAGE_RATIO_PORTRAIT_DEFAULT
+from pcapi.utils.image_conversion import STANDARD_VARIANT
+from pcapi.utils.image_conversion import THUMB_VARIANTS
 from pcapi.utils.image_conversion import standardize_image
+from pcapi.utils.image_conversion import standardize_image_variants
 
 
 def create_thumb(
@@ -12,13 +18,47 @@ def create_thumb(
     crop_params: tuple = None,
     ratio: float = IMAGE_RATIO_PORTRAIT_DEFAULT,
 ) -> None:
-    image_as_bytes = standardize_image(image_as_bytes, ratio=ratio, crop_params=crop_params)
+    """Standardize and store a thumb. All variants of the first thumb
+    are stored (see `HasThumbMixin.thumbVariantUrls`), only the
+    standard one for the others.
+    """
+    if image_index > 0:
+        image_as_bytes = standardize_image(image_as_bytes, ratio=ratio, crop_params=crop_params)
+        store_thumb(model_with_thumb.get_thumb_storage_id(image_index), image_as_bytes)
+        return
+
+    variants = standardize_image_variants(image_as_bytes, ratio=ratio, crop_params=crop_params)
+    futures = store_thumbs_async(
+        (model_with_thumb.get_thumb_storage_id(0, variant), image, variant.content_type)
+        for variant, image in variants.items()
+    )
+    for future in futures:
+        future.result()
+    model_with_thumb.hasThumbVariants = True
+
 
+def store_thumb(storage_id: str, image_as_bytes: bytes, content_type: str = "image/jpeg") -> None:
+    """Upload an already standardized thumb."""
     object_storage.store_public_object(
         folder=settings.THUMBS_FOLDER_NAME,
-        object_id=model_with_thumb.get_thumb_storage_id(image_index),
+        object_id=storage_id,
         blob=image_as_bytes,
-        content_type="image/jpeg",
+        content_type=content_type,
+    )
+
+
+def store_thumbs_async(thumbs: Iterable[tuple[str, bytes, str]]) -> list[Future]:
+    """Upload already standardized thumbs, given as (storage id,
+    image, content type) tuples, in the background.
+    """
+    return object_storage.store_public_objects_async(
+        object_storage.PublicObject(
+            folder=settings.THUMBS_FOLDER_NAME,
+            object_id=storage_id,
+            blob=image_as_bytes,
+            content_type=content_type,
+        )
+        for storage_id, image_as_bytes, content_type in thumbs
     )
 
 
@@ -26,7 +66,11 @@ def remove_thumb(
     model_with_thumb: Model,
     image_index: int,
 ) -> None:
-    object_storage.delete_public_object(
-        folder="thumbs",
-        object_id=model_with_thumb.get_thumb_storage_id(image_index),
-    )
+    variants = THUMB_VARIANTS if image_index == 0 and model_with_thumb.hasThumbVariants else (STANDARD_VARIANT,)
+    for variant in variants:
+        object_storage.delete_public_object(
+            folder="thumbs",
+            object_id=model_with_thumb.get_thumb_storage_id(image_index, variant),
+        )
+    if image_index == 0:
+        model_with_thumb.hasThumbVariants = False
@@ -24,13 +24,11 @@ from pcapi.core.mails.transactional.bookings.booking_cancellation import (
 from pcapi.core.mails.transactional.bookings.booking_cancellation_by_beneficiary_to_pro import (
     send_booking_cancellation_by_beneficiary_to_pro_email,
 )
-from pcapi.core.mails.transactional.bookings.booking_confirmation_to_beneficiary import (
-    send_individual_booking_confirmation_email_to_beneficiary,
-)
-from pcapi.core.mails.transactional.bookings.new_booking_to_pro import send_user_new_booking_to_pro_email
 from pcapi.core.offers import repository as offers_repository
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
+from pcapi.core.outbox import api as outbox_api
+from pcapi.core.outbox.models import OutboxEventType
 from pcapi.core.users.external import update_external_pro
 from pcapi.core.users.external import update_external_user
 from pcapi.core.users.models import User
@@ -118,6 +116,20 @@ def book_offer(
         )
         stock.dnBookedQuantity += booking.quantity
 
+        # Side effects are executed by a worker, so that they do not
+        # slow down the booking.
+        side_effects = [
+            outbox_api.record(OutboxEventType.SEND_BOOKING_CONFIRMATION_EMAIL_TO_PRO, booking_token=booking.token),
+            outbox_api.record(
+                OutboxEventType.SEND_BOOKING_CONFIRMATION_EMAIL_TO_BENEFICIARY, booking_token=booking.token
+            ),
+            outbox_api.record(OutboxEventType.UPDATE_EXTERNAL_USER, user_id=beneficiary.id),
+        ]
+        if stock.offer.venue.bookingEmail:
+            side_effects.append(
+                outbox_api.record(OutboxEventType.UPDATE_EXTERNAL_PRO, email=stock.offer.venue.bookingEmail)
+            )
+
         repository.save(individual_booking, stock)
 
     logger.info(
@@ -131,18 +143,8 @@ def book_offer(
         },
     )
 
-    if not send_user_new_booking_to_pro_email(individual_booking):
-        logger.warning(
-            "Could not send booking confirmation email to offerer",
-            extra={"booking": booking.id},
-        )
-    if not send_individual_booking_confirmation_email_to_beneficiary(individual_booking):
-        logger.warning("Could not send booking=%s confirmation email to beneficiary", booking.id)
-
     search.async_index_offer_ids([stock.offerId])
-
-    update_external_user(individual_booking.user)
-    update_external_pro(stock.offer.venue.bookingEmail)
+    outbox_api.dispatch(side_effects)
 
     return individual_booking.booking
 
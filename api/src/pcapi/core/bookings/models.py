@@ -136,6 +136,12 @@ class Booking(PcObject, Model):
 
     reimbursementDate = Column(DateTime, nullable=True)
 
+    # Used to list the bookings of an offerer over a period, see
+    # `bookings.repository._get_filtered_bookings_query()`.
+    Index("ix_booking_offererId_dateCreated", offererId, dateCreated)
+    Index("ix_booking_offererId_dateUsed", offererId, dateUsed)
+    Index("ix_booking_offererId_reimbursementDate", offererId, reimbursementDate)
+
     educationalBookingId = Column(
         BigInteger,
         ForeignKey("educational_booking.id"),
@@ -4,20 +4,28 @@ from datetime import datetime
 from datetime import time
 from datetime import timedelta
 from io import StringIO
+import itertools
+import logging
 import math
 import typing
 from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 
 from dateutil import tz
+from flask import current_app
+import redis
 from sqlalchemy import Column
 from sqlalchemy import Date
+from sqlalchemy import and_
 from sqlalchemy import case
 from sqlalchemy import cast
 from sqlalchemy import func
+from sqlalchemy import literal
 from sqlalchemy import or_
 from sqlalchemy import text
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Query
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
@@ -26,6 +34,7 @@ from sqlalchemy.sql.elements import not_
 from sqlalchemy.sql.functions import coalesce
 from sqlalchemy.util._collections import AbstractKeyedTuple
 
+from pcapi import settings
 from pcapi.core.bookings import constants
 from pcapi.core.bookings.models import Booking
 from pcapi.core.bookings.models import BookingCancellationReasons
@@ -47,14 +56,18 @@ from pcapi.domain.booking_recap.booking_recap import BookingRecap
 from pcapi.domain.booking_recap.bookings_recap_paginated import BookingsRecapPaginated
 from pcapi.domain.postal_code.postal_code import PostalCode
 from pcapi.models import db
+from pcapi.models.api_errors import ApiErrors
 from pcapi.models.api_errors import ResourceNotFoundError
 from pcapi.models.payment import Payment
 from pcapi.models.user_offerer import UserOfferer
 from pcapi.routes.serialization.bookings_recap_serialize import OfferType
+from pcapi.utils import xlsx
 from pcapi.utils.date import get_department_timezone
 from pcapi.utils.token import random_token
 
 
+logger = logging.getLogger(__name__)
+
 DUO_QUANTITY = 2
 
 
@@ -67,6 +80,33 @@ BOOKING_STATUS_LABELS = {
     "confirmed": "confirmé",
 }
 
+REPORT_HEADER = (
+    "Lieu",
+    "Nom de l’offre",
+    "Date de l'évènement",
+    "ISBN",
+    "Nom et prénom du bénéficiaire",
+    "Email du bénéficiaire",
+    "Téléphone du bénéficiaire",
+    "Date et heure de réservation",
+    "Date et heure de validation",
+    "Contremarque",
+    "Prix de la réservation",
+    "Statut de la contremarque",
+    "Date et heure de remboursement",
+    "Type d'offre",
+)
+# Number of bookings fetched from the database, and sent to the
+# client, at a time when exporting a report.
+REPORT_BATCH_SIZE = 1000
+
+# Largest offsets between UTC and the local time of a venue
+# (UTC-12:00 and UTC+14:00).
+MAX_UTC_OFFSET_BEHIND = timedelta(hours=12)
+MAX_UTC_OFFSET_AHEAD = timedelta(hours=14)
+
+PRO_BOOKINGS_TOTAL_CACHE_KEY_TEMPLATE = "cache:bookings:pro:total:{user_id}:{filters}"
+
 BOOKING_DATE_STATUS_MAPPING = {
     BookingStatusFilter.BOOKED: Booking.dateCreated,
     BookingStatusFilter.VALIDATED: Booking.dateUsed,
@@ -116,8 +156,16 @@ def find_by_pro_user(
     offer_type: Optional[OfferType] = None,
     page: int = 1,
     per_page_limit: int = 1000,
+    cursor: Optional[str] = None,
 ) -> BookingsRecapPaginated:
-    total_bookings_recap = _get_filtered_bookings_count(
+    """Return a page of bookings.
+
+    If `cursor` (the `next_page_cursor` of the previous page) is given,
+    the page starts right after the last booking of the previous page,
+    and `page` is only returned as is. Otherwise, pages are counted
+    from the most recent booking, which is slower for deep pages.
+    """
+    total_bookings_recap = _get_filtered_bookings_count_from_cache(
         user,
         booking_period,
         status_filter=status_filter,
@@ -134,16 +182,22 @@ def find_by_pro_user(
         venue_id=venue_id,
         offer_type=offer_type,
     )
-    bookings_query = _duplicate_booking_when_quantity_is_two(bookings_query)
-    bookings_page = (
-        bookings_query.order_by(text('"bookedAt" DESC')).offset((page - 1) * per_page_limit).limit(per_page_limit).all()
-    )
+    bookings_page_query = _get_bookings_page_query(bookings_query, cursor)
+    if not cursor:
+        bookings_page_query = bookings_page_query.offset((page - 1) * per_page_limit)
+    # Fetch one more booking to know whether there is a next page.
+    bookings_page = bookings_page_query.limit(per_page_limit + 1).all()
+    next_page_cursor = None
+    if len(bookings_page) > per_page_limit:
+        bookings_page = bookings_page[:per_page_limit]
+        next_page_cursor = _encode_cursor(bookings_page[-1])
 
     return _paginated_bookings_sql_entities_to_bookings_recap(
         paginated_bookings=bookings_page,
         page=page,
         per_page_limit=per_page_limit,
         total_bookings_recap=total_bookings_recap,
+        next_page_cursor=next_page_cursor,
     )
 
 
@@ -427,6 +481,55 @@ def get_csv_report(
     venue_id: Optional[int] = None,
     offer_type: Optional[OfferType] = None,
 ) -> str:
+    return "".join(
+        stream_csv_report(
+            user=user,
+            booking_period=booking_period,
+            status_filter=status_filter,
+            event_date=event_date,
+            venue_id=venue_id,
+            offer_type=offer_type,
+        )
+    )
+
+
+def stream_csv_report(
+    user: User,
+    booking_period: tuple[date, date],
+    status_filter: BookingStatusFilter = BookingStatusFilter.BOOKED,
+    event_date: Optional[datetime] = None,
+    venue_id: Optional[int] = None,
+    offer_type: Optional[OfferType] = None,
+) -> Iterator[str]:
+    """Yield the CSV report in chunks of `REPORT_BATCH_SIZE` bookings,
+    as they are fetched from the database.
+    """
+    bookings_query = _get_booking_report_query(user, booking_period, status_filter, event_date, venue_id, offer_type)
+    return _serialize_csv_report(bookings_query)
+
+
+def stream_excel_report(
+    user: User,
+    booking_period: tuple[date, date],
+    status_filter: BookingStatusFilter = BookingStatusFilter.BOOKED,
+    event_date: Optional[datetime] = None,
+    venue_id: Optional[int] = None,
+    offer_type: Optional[OfferType] = None,
+) -> Iterator[bytes]:
+    """Yield the same report as `stream_csv_report()`, as an XLSX file."""
+    bookings_query = _get_booking_report_query(user, booking_period, status_filter, event_date, venue_id, offer_type)
+    rows = itertools.chain([REPORT_HEADER], _serialize_booking_report_rows(bookings_query))
+    return xlsx.stream_xlsx(rows, sheet_name="Réservations", chunk_size=REPORT_BATCH_SIZE)
+
+
+def _get_booking_report_query(
+    user: User,
+    booking_period: tuple[date, date],
+    status_filter: BookingStatusFilter,
+    event_date: Optional[datetime],
+    venue_id: Optional[int],
+    offer_type: Optional[OfferType],
+) -> Query:
     bookings_query = _get_filtered_booking_report(
         pro_user=user,
         period=booking_period,
@@ -435,14 +538,36 @@ def get_csv_report(
         venue_id=venue_id,
         offer_type=offer_type,
     )
-    bookings_query = _duplicate_booking_when_quantity_is_two(bookings_query)
-    return _serialize_csv_report(bookings_query)
+    return _duplicate_booking_when_quantity_is_two(bookings_query)
 
 
 def _field_to_venue_timezone(field: InstrumentedAttribute) -> cast:
     return cast(func.timezone(Venue.timezone, func.timezone("UTC", field)), Date)
 
 
+def _get_utc_range_of_local_dates(period: tuple[date, date]) -> tuple[datetime, datetime]:
+    """Return a range of UTC datetimes that contains all instants of the
+    given local dates, whatever the timezone of the venue.
+    """
+    first_date, last_date = sorted(day.date() if isinstance(day, datetime) else day for day in period)
+    return (
+        datetime.combine(first_date, time.min) - MAX_UTC_OFFSET_AHEAD,
+        datetime.combine(last_date + timedelta(days=1), time.min) + MAX_UTC_OFFSET_BEHIND,
+    )
+
+
+def _filter_by_local_dates(query: Query, field: InstrumentedAttribute, period: tuple[date, date]) -> Query:
+    # Filtering on the local date of the venue applies a function to
+    # the field, which prevents the use of an index. Filter on a range
+    # of UTC datetimes first, then refine on the local date.
+    range_start, range_end = _get_utc_range_of_local_dates(period)
+    return query.filter(
+        field >= range_start,
+        field < range_end,
+        _field_to_venue_timezone(field).between(*period, symmetric=True),
+    )
+
+
 def _get_filtered_bookings_query(
     pro_user: User,
     period: tuple[date, date],
@@ -454,17 +579,16 @@ def _get_filtered_bookings_query(
 ) -> Query:
     extra_joins = extra_joins or tuple()
 
-    bookings_query = (
-        Booking.query.join(Booking.offerer)
-        .join(Offerer.UserOfferers)
-        .join(Booking.stock)
-        .join(Booking.venue, isouter=True)
-    )
+    bookings_query = Booking.query.join(Booking.offerer).join(Booking.stock).join(Booking.venue, isouter=True)
     for join_key in extra_joins:
         bookings_query = bookings_query.join(join_key, isouter=True)
 
+    # Use a subquery rather than a join, so that bookings are not
+    # duplicated when the offerer has several users.
+    offerer_ids = db.session.query(UserOfferer.offererId).filter(UserOfferer.validationToken.is_(None))
     if not pro_user.has_admin_role:
-        bookings_query = bookings_query.filter(UserOfferer.user == pro_user)
+        offerer_ids = offerer_ids.filter(UserOfferer.userId == pro_user.id)
+    bookings_query = bookings_query.filter(Booking.offererId.in_(offerer_ids.subquery()))
 
     period_attribut_filter = (
         BOOKING_DATE_STATUS_MAPPING[status_filter]
@@ -472,15 +596,13 @@ def _get_filtered_bookings_query(
         else BOOKING_DATE_STATUS_MAPPING[BookingStatusFilter.BOOKED]
     )
 
-    bookings_query = bookings_query.filter(UserOfferer.validationToken.is_(None)).filter(
-        _field_to_venue_timezone(period_attribut_filter).between(*period, symmetric=True)
-    )
+    bookings_query = _filter_by_local_dates(bookings_query, period_attribut_filter, period)
 
     if venue_id is not None:
         bookings_query = bookings_query.filter(Booking.venueId == venue_id)
 
     if event_date:
-        bookings_query = bookings_query.filter(_field_to_venue_timezone(Stock.beginningDatetime) == event_date)
+        bookings_query = _filter_by_local_dates(bookings_query, Stock.beginningDatetime, (event_date, event_date))
 
     if offer_type is not None:
         if offer_type == OfferType.INDIVIDUAL_OR_DUO:
@@ -510,6 +632,43 @@ def _get_filtered_bookings_count(
     return bookings_count.scalar()
 
 
+def _get_filtered_bookings_count_from_cache(
+    pro_user: User,
+    period: tuple[date, date],
+    status_filter: BookingStatusFilter,
+    event_date: Optional[date] = None,
+    venue_id: Optional[int] = None,
+    offer_type: Optional[OfferType] = None,
+) -> int:
+    # The total is computed over all filtered bookings: cache it while
+    # the user browses through pages.
+    key = PRO_BOOKINGS_TOTAL_CACHE_KEY_TEMPLATE.format(
+        user_id=pro_user.id,
+        filters=":".join(map(str, (*sorted(map(str, period)), status_filter, event_date, venue_id, offer_type))),
+    )
+    if settings.PRO_BOOKINGS_TOTAL_CACHE_TTL:
+        try:
+            cached_total = current_app.redis_client.get(key)
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not get cached total of bookings of user %s", pro_user.id)
+            cached_total = None
+        if cached_total is not None:
+            return int(cached_total)
+
+    total = _get_filtered_bookings_count(pro_user, period, status_filter, event_date, venue_id, offer_type)
+
+    if settings.PRO_BOOKINGS_TOTAL_CACHE_TTL:
+        try:
+            current_app.redis_client.set(key, total, ex=settings.PRO_BOOKINGS_TOTAL_CACHE_TTL)
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not cache total of bookings of user %s", pro_user.id)
+    return total
+
+
 def _get_filtered_booking_report(
     pro_user: User,
     period: tuple[date, date],
@@ -570,50 +729,47 @@ def _get_filtered_booking_pro(
     venue_id: Optional[int] = None,
     offer_type: Optional[OfferType] = None,
 ) -> Query:
-    bookings_query = (
-        _get_filtered_bookings_query(
-            pro_user,
-            period,
-            status_filter,
-            event_date,
-            venue_id,
-            offer_type,
-            extra_joins=(
-                Stock.offer,
-                Booking.individualBooking,
-                IndividualBooking.user,
-                Booking.educationalBooking,
-                EducationalBooking.educationalRedactor,
-            ),
-        )
-        .with_entities(
-            Booking.token.label("bookingToken"),
-            Booking.dateCreated.label("bookedAt"),
-            Booking.quantity,
-            Booking.amount.label("bookingAmount"),
-            Booking.dateUsed.label("usedAt"),
-            Booking.cancellationDate.label("cancelledAt"),
-            Booking.cancellationLimitDate,
-            Booking.status,
-            Booking.reimbursementDate.label("reimbursedAt"),
-            Booking.educationalBookingId,
-            Booking.isConfirmed,
-            EducationalBooking.confirmationDate,
-            EducationalRedactor.firstName.label("redactorFirstname"),
-            EducationalRedactor.lastName.label("redactorLastname"),
-            EducationalRedactor.email.label("redactorEmail"),
-            Offer.name.label("offerName"),
-            Offer.id.label("offerId"),
-            Offer.extraData["isbn"].label("offerIsbn"),
-            User.firstName.label("beneficiaryFirstname"),
-            User.lastName.label("beneficiaryLastname"),
-            User.email.label("beneficiaryEmail"),
-            User.phoneNumber.label("beneficiaryPhoneNumber"),
-            Stock.beginningDatetime.label("stockBeginningDatetime"),
-            Venue.departementCode.label("venueDepartmentCode"),
-            Offerer.postalCode.label("offererPostalCode"),
-        )
-        .distinct(Booking.id)
+    bookings_query = _get_filtered_bookings_query(
+        pro_user,
+        period,
+        status_filter,
+        event_date,
+        venue_id,
+        offer_type,
+        extra_joins=(
+            Stock.offer,
+            Booking.individualBooking,
+            IndividualBooking.user,
+            Booking.educationalBooking,
+            EducationalBooking.educationalRedactor,
+        ),
+    ).with_entities(
+        Booking.token.label("bookingToken"),
+        Booking.dateCreated.label("bookedAt"),
+        Booking.quantity,
+        Booking.amount.label("bookingAmount"),
+        Booking.dateUsed.label("usedAt"),
+        Booking.cancellationDate.label("cancelledAt"),
+        Booking.cancellationLimitDate,
+        Booking.status,
+        Booking.reimbursementDate.label("reimbursedAt"),
+        Booking.educationalBookingId,
+        Booking.isConfirmed,
+        EducationalBooking.confirmationDate,
+        EducationalRedactor.firstName.label("redactorFirstname"),
+        EducationalRedactor.lastName.label("redactorLastname"),
+        EducationalRedactor.email.label("redactorEmail"),
+        Offer.name.label("offerName"),
+        Offer.id.label("offerId"),
+        Offer.extraData["isbn"].label("offerIsbn"),
+        User.firstName.label("beneficiaryFirstname"),
+        User.lastName.label("beneficiaryLastname"),
+        User.email.label("beneficiaryEmail"),
+        User.phoneNumber.label("beneficiaryPhoneNumber"),
+        Stock.beginningDatetime.label("stockBeginningDatetime"),
+        Venue.departementCode.label("venueDepartmentCode"),
+        Offerer.postalCode.label("offererPostalCode"),
+        Booking.id.label("bookingId"),
     )
 
     return bookings_query
@@ -623,6 +779,41 @@ def _duplicate_booking_when_quantity_is_two(bookings_recap_query: Query) -> Quer
     return bookings_recap_query.union_all(bookings_recap_query.filter(Booking.quantity == 2))
 
 
+def _get_bookings_page_query(bookings_query: Query, cursor: Optional[str]) -> Query:
+    """Like `_duplicate_booking_when_quantity_is_two()`, but rows are
+    sorted by a unique key, so that a page can start right after the
+    row of the cursor (and use an index) instead of skipping all
+    previous rows.
+    """
+    originals = bookings_query.add_columns(literal(0).label("duplicateIndex"))
+    duplicates = bookings_query.filter(Booking.quantity == DUO_QUANTITY).add_columns(literal(1).label("duplicateIndex"))
+    if cursor:
+        booked_at, booking_id, duplicate_index = _decode_cursor(cursor)
+        before_cursor = tuple_(Booking.dateCreated, Booking.id) < tuple_(booked_at, booking_id)
+        # The duplicate of a duo booking comes before the original.
+        if duplicate_index > 0:
+            at_cursor = and_(Booking.dateCreated == booked_at, Booking.id == booking_id)
+            originals = originals.filter(or_(before_cursor, at_cursor))
+        else:
+            originals = originals.filter(before_cursor)
+        duplicates = duplicates.filter(before_cursor)
+    return originals.union_all(duplicates).order_by(
+        text('"bookedAt" DESC'), text('"bookingId" DESC'), text('"duplicateIndex" DESC')
+    )
+
+
+def _encode_cursor(booking: AbstractKeyedTuple) -> str:
+    return f"{booking.bookedAt.isoformat()}_{booking.bookingId}_{booking.duplicateIndex}"
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int, int]:
+    try:
+        booked_at, booking_id, duplicate_index = cursor.split("_")
+        return datetime.fromisoformat(booked_at), int(booking_id), int(duplicate_index)
+    except ValueError:
+        raise ApiErrors({"cursor": ["Le curseur de pagination est invalide"]})
+
+
 def _serialize_booking_recap(booking: AbstractKeyedTuple) -> BookingRecap:
     return BookingRecap(
         offer_identifier=booking.offerId,
@@ -663,12 +854,14 @@ def _paginated_bookings_sql_entities_to_bookings_recap(
     page: int,
     per_page_limit: int,
     total_bookings_recap: int,
+    next_page_cursor: Optional[str] = None,
 ) -> BookingsRecapPaginated:
     return BookingsRecapPaginated(
         bookings_recap=[_serialize_booking_recap(booking) for booking in paginated_bookings],
         page=page,
         pages=int(math.ceil(total_bookings_recap / per_page_limit)),
         total=total_bookings_recap,
+        next_page_cursor=next_page_cursor,
     )
 
 
@@ -696,51 +889,39 @@ def _get_booking_status(status: BookingStatus, is_confirmed: bool) -> str:
     return BOOKING_STATUS_LABELS[status]
 
 
-def _serialize_csv_report(query: Query) -> str:
-    output = StringIO()
-    writer = csv.writer(output, dialect=csv.excel, delimiter=";", quoting=csv.QUOTE_NONNUMERIC)
-    writer.writerow(
-        (
-            "Lieu",
-            "Nom de l’offre",
-            "Date de l'évènement",
-            "ISBN",
-            "Nom et prénom du bénéficiaire",
-            "Email du bénéficiaire",
-            "Téléphone du bénéficiaire",
-            "Date et heure de réservation",
-            "Date et heure de validation",
-            "Contremarque",
-            "Prix de la réservation",
-            "Statut de la contremarque",
-            "Date et heure de remboursement",
-            "Type d'offre",
-        )
-    )
-    for booking in query.yield_per(1000):
-        print(booking)
-        writer.writerow(
-            (
-                booking.venueName,
-                booking.offerName,
-                _serialize_date_with_timezone(booking.stockBeginningDatetime, booking),
-                booking.isbn,
-                f"{booking.beneficiaryLastName} {booking.beneficiaryFirstName}",
-                booking.beneficiaryEmail,
-                booking.beneficiaryPhoneNumber,
-                _serialize_date_with_timezone(booking.bookedAt, booking),
-                _serialize_date_with_timezone(booking.usedAt, booking),
-                booking_recap_utils.get_booking_token(
-                    booking.token, booking.status, booking.offerIsEducational, booking.stockBeginningDatetime
-                ),
-                booking.amount,
-                _get_booking_status(booking.status, booking.isConfirmed),
-                _serialize_date_with_timezone(booking.reimbursedAt, booking),
-                serialize_offer_type_educational_or_individual(booking.offerIsEducational),
-            )
+def _serialize_booking_report_rows(query: Query) -> Iterator[tuple]:
+    for booking in query.yield_per(REPORT_BATCH_SIZE):
+        yield (
+            booking.venueName,
+            booking.offerName,
+            _serialize_date_with_timezone(booking.stockBeginningDatetime, booking),
+            booking.isbn,
+            f"{booking.beneficiaryLastName} {booking.beneficiaryFirstName}",
+            booking.beneficiaryEmail,
+            booking.beneficiaryPhoneNumber,
+            _serialize_date_with_timezone(booking.bookedAt, booking),
+            _serialize_date_with_timezone(booking.usedAt, booking),
+            booking_recap_utils.get_booking_token(
+                booking.token, booking.status, booking.offerIsEducational, booking.stockBeginningDatetime
+            ),
+            booking.amount,
+            _get_booking_status(booking.status, booking.isConfirmed),
+            _serialize_date_with_timezone(booking.reimbursedAt, booking),
+            serialize_offer_type_educational_or_individual(booking.offerIsEducational),
         )
 
-    return output.getvalue()
+
+def _serialize_csv_report(query: Query) -> Iterator[str]:
+    output = StringIO()
+    writer = csv.writer(output, dialect=csv.excel, delimiter=";", quoting=csv.QUOTE_NONNUMERIC)
+    writer.writerow(REPORT_HEADER)
+    for index, row in enumerate(_serialize_booking_report_rows(query), 1):
+        writer.writerow(row)
+        if index % REPORT_BATCH_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
 
 
 def get_soon_expiring_bookings(expiration_days_delta: int) -> typing.Generator[Booking, None, None]:
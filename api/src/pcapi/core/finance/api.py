@@ -40,6 +40,7 @@ import pytz
 import sqlalchemy as sqla
 from sqlalchemy import Date
 from sqlalchemy import cast
+from sqlalchemy.dialects import postgresql as sqla_postgresql
 import sqlalchemy.orm as sqla_orm
 import sqlalchemy.sql.functions as sqla_func
 
@@ -76,11 +77,20 @@ logger = logging.getLogger(__name__)
 # Prior bookings will be priced manually.
 # FIXME (dbaty, 2021-12-23): remove once prior bookings have been priced.
 MIN_DATE_TO_PRICE = datetime.datetime(2021, 12, 31, 23, 0)  # UTC
+# Maximum number of bookings of the same business unit that are priced
+# within a single transaction by `price_bookings()`.
+PRICE_BOOKINGS_BATCH_SIZE = 1000
 
 
-def price_bookings(min_date: datetime.datetime = MIN_DATE_TO_PRICE):
+def price_bookings(
+    min_date: datetime.datetime = MIN_DATE_TO_PRICE,
+    batch_size: int = PRICE_BOOKINGS_BATCH_SIZE,
+):
     """Price bookings that have been recently marked as used.
 
+    Bookings are grouped by business unit and priced in batches (see
+    `price_bookings_of_business_unit()`).
+
     This function is normally called by a cron job.
     """
     # The upper bound on `dateUsed` avoids selecting a very recent
@@ -114,32 +124,43 @@ def price_bookings(min_date: datetime.datetime = MIN_DATE_TO_PRICE):
             ),
         )
     )
-    errorred_business_unit_ids = set()
+    # Bookings of each business unit are kept in the order in which
+    # they have been used, which is the order in which they must be
+    # priced.
+    booking_ids_by_business_unit = defaultdict(list)
     for booking in bookings:
-        try:
-            if booking.venue.businessUnitId in errorred_business_unit_ids:
-                continue
-            start = time.perf_counter()
-            price_booking(booking)
-            elapsed = time.perf_counter() - start
-            logger.info(
-                "Priced booking",
-                extra={
-                    "booking": booking.id,
-                    "business_unit_id": booking.venue.businessUnitId,
-                    "elapsed": elapsed,
-                },
-            )
-        except Exception as exc:  # pylint: disable=broad-except
-            errorred_business_unit_ids.add(booking.venue.businessUnitId)
-            logger.exception(
-                "Could not price booking",
-                extra={
-                    "booking": booking.id,
-                    "business_unit": booking.venue.businessUnitId,
-                    "exc": str(exc),
-                },
-            )
+        booking_ids_by_business_unit[booking.venue.businessUnitId].append(booking.id)
+    if not booking_ids_by_business_unit:
+        return
+
+    rule_finder = reimbursement.get_custom_rule_finder()
+    for business_unit_id, booking_ids in booking_ids_by_business_unit.items():
+        for start_index in range(0, len(booking_ids), batch_size):
+            batch = booking_ids[start_index : start_index + batch_size]
+            try:
+                start = time.perf_counter()
+                priced = price_bookings_of_business_unit(business_unit_id, batch, rule_finder)
+                elapsed = time.perf_counter() - start
+                logger.info(
+                    "Priced bookings",
+                    extra={
+                        "business_unit_id": business_unit_id,
+                        "count": priced,
+                        "elapsed": elapsed,
+                    },
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                # Following bookings of the business unit cannot be
+                # priced before these ones: skip them.
+                logger.exception(
+                    "Could not price bookings",
+                    extra={
+                        "bookings": batch,
+                        "business_unit": business_unit_id,
+                        "exc": str(exc),
+                    },
+                )
+                break
 
 
 def lock_business_unit(business_unit_id: int):
@@ -214,11 +235,146 @@ def price_booking(booking: bookings_models.Booking) -> models.Pricing:
     return pricing
 
 
+def price_bookings_of_business_unit(
+    business_unit_id: int,
+    booking_ids: list[int],
+    rule_finder: reimbursement.CustomRuleFinder = None,
+) -> int:
+    """Price the requested bookings of a business unit within a single
+    transaction, and return the number of created pricings.
+
+    Unlike `price_booking()`, the lock on the business unit is
+    acquired once, the revenue of each SIRET is computed once and then
+    accrued in memory, and pricings are inserted in bulk.
+    """
+    rule_finder = rule_finder or reimbursement.get_custom_rule_finder()
+
+    with transaction():
+        lock_business_unit(business_unit_id)
+
+        # Now that we have acquired a lock, fetch bookings from the
+        # database again so that we can make some final checks before
+        # actually pricing them.
+        bookings = (
+            bookings_models.Booking.query.filter(bookings_models.Booking.id.in_(booking_ids))
+            .options(
+                sqla_orm.joinedload(bookings_models.Booking.venue, innerjoin=True).joinedload(
+                    offerers_models.Venue.businessUnit, innerjoin=True
+                ),
+                sqla_orm.joinedload(bookings_models.Booking.stock, innerjoin=True).joinedload(
+                    offers_models.Stock.offer, innerjoin=True
+                ),
+            )
+            .order_by(bookings_models.Booking.dateUsed, bookings_models.Booking.id)
+            .all()
+        )
+        # Perhaps a booking has been marked as unused (or its venue
+        # has been moved to another business unit) since we fetched it
+        # before we acquired the lock.
+        bookings = [
+            booking
+            for booking in bookings
+            if booking.status is bookings_models.BookingStatus.USED and booking.venue.businessUnitId == business_unit_id
+        ]
+        if not bookings:
+            return 0
+
+        business_unit = bookings[0].venue.businessUnit
+        # FIXME (dbaty, 2021-12-08): we can get rid of this condition
+        # once BusinessUnit.siret is set as NOT NULLable.
+        if not business_unit.siret:
+            return 0
+        if business_unit.status != models.BusinessUnitStatus.ACTIVE:
+            return 0
+
+        # Deleting pricings that depend on the oldest booking of each
+        # SIRET and year also deletes those that depend on the
+        # following bookings.
+        oldest_bookings = {}
+        for booking in bookings:
+            key = (_get_pricing_siret(booking), _get_revenue_period(booking.dateUsed))
+            oldest_bookings.setdefault(key, booking)
+        for booking in oldest_bookings.values():
+            _delete_dependent_pricings(booking, "Deleted pricings priced too early")
+
+        # Pricing the same booking twice is not allowed (and would be
+        # rejected by a database constraint, anyway).
+        already_priced = {
+            booking_id
+            for booking_id, in models.Pricing.query.filter(
+                models.Pricing.bookingId.in_([booking.id for booking in bookings]),
+                models.Pricing.status != models.PricingStatus.CANCELLED,
+            ).with_entities(models.Pricing.bookingId)
+        }
+
+        revenues = {}
+        pricings = []
+        for booking in bookings:
+            if booking.id in already_priced:
+                continue
+            siret = _get_pricing_siret(booking)
+            key = (siret, _get_revenue_year(booking.dateUsed))
+            if key not in revenues:
+                revenues[key] = _get_current_revenue(*key)
+            revenues[key] += utils.to_eurocents(booking.total_amount)
+            pricings.append(_make_pricing(booking, siret, revenues[key], rule_finder))
+
+        _insert_pricings(pricings)
+        for (siret, year), revenue in revenues.items():
+            _set_revenue(siret, year, revenue)
+    return len(pricings)
+
+
+def _insert_pricings(pricings: list[models.Pricing]) -> None:
+    """Insert pricings and their lines with a single query per table.
+
+    Given objects are not added to the session.
+    """
+    if not pricings:
+        return
+    pricing_columns = (
+        "status",
+        "bookingId",
+        "businessUnitId",
+        "siret",
+        "valueDate",
+        "amount",
+        "standardRule",
+        "customRuleId",
+        "revenue",
+    )
+    rows = db.session.execute(
+        sqla.insert(models.Pricing.__table__)
+        .values([{column: getattr(pricing, column) for column in pricing_columns} for pricing in pricings])
+        .returning(models.Pricing.id, models.Pricing.bookingId)
+    )
+    # A booking has at most one pricing that is not cancelled.
+    pricing_ids = {booking_id: pricing_id for pricing_id, booking_id in rows}
+    lines = [
+        {
+            "pricingId": pricing_ids[pricing.bookingId],
+            "amount": line.amount,
+            "category": line.category,
+        }
+        for pricing in pricings
+        for line in pricing.lines
+    ]
+    db.session.execute(sqla.insert(models.PricingLine.__table__).values(lines))
+
+
+def _get_revenue_year(value_date: datetime.datetime) -> int:
+    """Return the accounting year of the given value date."""
+    return value_date.replace(tzinfo=pytz.utc).astimezone(payments_utils.ACCOUNTING_TIMEZONE).year
+
+
 def _get_revenue_period(value_date: datetime.datetime) -> [datetime.datetime, datetime.datetime]:
     """Return a datetime (year) period for the given value date, i.e. the
     first and last seconds of the year of the ``value_date``.
     """
-    year = value_date.replace(tzinfo=pytz.utc).astimezone(payments_utils.ACCOUNTING_TIMEZONE).year
+    return _get_year_period(_get_revenue_year(value_date))
+
+
+def _get_year_period(year: int) -> [datetime.datetime, datetime.datetime]:
     first_second = payments_utils.ACCOUNTING_TIMEZONE.localize(
         datetime.datetime.combine(
             datetime.date(year, 1, 1),
@@ -234,49 +390,176 @@ def _get_revenue_period(value_date: datetime.datetime) -> [datetime.datetime, da
     return first_second, last_second
 
 
+def _get_pricing_siret(booking: bookings_models.Booking) -> str:
+    return booking.venue.siret or booking.venue.businessUnit.siret
+
+
 def _get_siret_and_current_revenue(booking: bookings_models.Booking) -> typing.Union[str, int]:
     """Return the SIRET to use for the requested booking, and the current
-    year revenue for this SIRET, NOT including the requested booking.
+    year revenue for this SIRET, NOT including the requested booking
+    (which must not have been priced yet).
+    """
+    siret = _get_pricing_siret(booking)
+    return siret, _get_current_revenue(siret, _get_revenue_year(booking.dateUsed))
+
+
+# Pricings with these statuses are not taken into account in revenues.
+REVENUE_EXCLUDED_PRICING_STATUSES = (
+    models.PricingStatus.CANCELLED,
+    models.PricingStatus.REJECTED,
+)
+
+
+def _get_current_revenue(siret: str, year: int) -> int:
+    """Return the revenue (in eurocents) of the SIRET during the given
+    accounting year.
+
+    The revenue is read from `SiretRevenue`. If there is no such row
+    yet, the revenue is computed from pricings. In both cases, the
+    caller must then store the new revenue with `_set_revenue()`.
+
+    IMPORTANT: the business unit of the SIRET must be locked.
+    """
+    revenue = (
+        db.session.query(models.SiretRevenue.revenue)
+        .filter(models.SiretRevenue.siret == siret, models.SiretRevenue.year == year)
+        .scalar()
+    )
+    if revenue is None:
+        revenue = _compute_revenue(siret, year)
+    return revenue
+
+
+def _compute_revenue(siret: str, year: int) -> int:
+    """Return the revenue (in eurocents) of the SIRET during the given
+    accounting year, computed from all pricings of the year.
     """
-    siret = booking.venue.siret or booking.venue.businessUnit.siret
-    revenue_period = _get_revenue_period(booking.dateUsed)
-    # I tried to be clever and store the accruing revenue on `Pricing`
-    # for quick access. But my first attempt had a bug. I *think* that
-    # the right way is to do this (but it has NOT been field-tested):
-    #
-    #     latest_pricing = (
-    #         models.Pricing.query.filter_by(siret=siret)
-    #         .filter(models.Pricing.valueDate.between(*revenue_period))
-    #         # See `order_by` used in `price_bookings()`
-    #         .order_by(models.Pricing.valueDate.desc(), models.Pricing.bookingId.desc())
-    #         .first()
-    #     )
-    #
-    # ... but a less error-prone and actually fast enough way is to
-    # just calculate the sum on-the-fly.
     current_revenue = (
         bookings_models.Booking.query.join(models.Pricing)
         .filter(
             models.Pricing.siret == siret,
-            models.Pricing.bookingId != booking.id,
-            models.Pricing.valueDate.between(*revenue_period),
-            models.Pricing.status.notin_(
-                (
-                    models.PricingStatus.CANCELLED,
-                    models.PricingStatus.REJECTED,
-                )
-            ),
+            models.Pricing.valueDate.between(*_get_year_period(year)),
+            models.Pricing.status.notin_(REVENUE_EXCLUDED_PRICING_STATUSES),
         )
         .with_entities(sqla.func.sum(bookings_models.Booking.amount * bookings_models.Booking.quantity))
         .scalar()
     )
-    return siret, utils.to_eurocents(current_revenue or 0)
+    return utils.to_eurocents(current_revenue or 0)
+
+
+def _set_revenue(siret: str, year: int, revenue: int) -> None:
+    table = models.SiretRevenue.__table__
+    statement = sqla_postgresql.insert(table).values(siret=siret, year=year, revenue=revenue)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.siret, table.c.year],
+        set_={"revenue": statement.excluded.revenue},
+    )
+    db.session.execute(statement)
+
+
+def _remove_pricings_from_revenues(pricing_ids: typing.Iterable[int]) -> None:
+    """Update revenues before the given pricings are cancelled or
+    deleted.
+    """
+    amounts = defaultdict(int)
+    rows = (
+        db.session.query(
+            models.Pricing.siret,
+            models.Pricing.valueDate,
+            bookings_models.Booking.amount * bookings_models.Booking.quantity,
+        )
+        .join(models.Pricing.booking)
+        .filter(
+            models.Pricing.id.in_(pricing_ids),
+            models.Pricing.status.notin_(REVENUE_EXCLUDED_PRICING_STATUSES),
+        )
+    )
+    for siret, value_date, total_amount in rows:
+        amounts[(siret, _get_revenue_year(value_date))] += utils.to_eurocents(total_amount)
+    for (siret, year), amount in amounts.items():
+        # If there is no row, there is nothing to update: the revenue
+        # will be computed from (remaining) pricings when needed.
+        db.session.execute(
+            sqla.update(models.SiretRevenue.__table__)
+            .where(models.SiretRevenue.siret == siret)
+            .where(models.SiretRevenue.year == year)
+            .values(revenue=models.SiretRevenue.revenue - amount)
+        )
+
+
+def check_siret_revenues(year: int = None, fix: bool = False) -> list[dict]:
+    """Compute revenues from pricings and compare them with those that
+    are stored in `SiretRevenue`. Return (and log) the list of
+    differences. If ``fix`` is True, stored revenues are updated.
+
+    Only existing rows are checked: missing rows are computed when
+    needed.
+    """
+    year_expression = sqla.cast(
+        sqla.extract(
+            "year",
+            sqla.func.timezone(
+                payments_utils.ACCOUNTING_TIMEZONE.zone,
+                sqla.func.timezone("UTC", models.Pricing.valueDate),
+            ),
+        ),
+        sqla.Integer,
+    )
+    query = (
+        db.session.query(
+            models.Pricing.siret,
+            year_expression.label("year"),
+            sqla.func.sum(bookings_models.Booking.amount * bookings_models.Booking.quantity),
+        )
+        .join(models.Pricing.booking)
+        .filter(models.Pricing.status.notin_(REVENUE_EXCLUDED_PRICING_STATUSES))
+        .group_by(models.Pricing.siret, "year")
+    )
+    siret_revenues = models.SiretRevenue.query.order_by(models.SiretRevenue.id)
+    if year:
+        query = query.filter(models.Pricing.valueDate.between(*_get_year_period(year)))
+        siret_revenues = siret_revenues.filter(models.SiretRevenue.year == year)
+    expected_revenues = {
+        (siret, pricing_year): utils.to_eurocents(total_amount) for siret, pricing_year, total_amount in query
+    }
+
+    differences = []
+    for siret_revenue in siret_revenues:
+        expected = expected_revenues.get((siret_revenue.siret, siret_revenue.year), 0)
+        if siret_revenue.revenue == expected:
+            continue
+        difference = {
+            "siret": siret_revenue.siret,
+            "year": siret_revenue.year,
+            "stored_revenue": siret_revenue.revenue,
+            "expected_revenue": expected,
+        }
+        logger.error("Found inconsistent SIRET revenue", extra=difference)
+        differences.append(difference)
+        if fix:
+            siret_revenue.revenue = expected
+    if fix:
+        db.session.commit()
+    return differences
 
 
 def _price_booking(booking: bookings_models.Booking) -> models.Pricing:
     siret, current_revenue = _get_siret_and_current_revenue(booking)
     new_revenue = current_revenue + utils.to_eurocents(booking.total_amount)
-    rule_finder = reimbursement.CustomRuleFinder()
+    _set_revenue(siret, _get_revenue_year(booking.dateUsed), new_revenue)
+    rule_finder = reimbursement.get_custom_rule_finder()
+    return _make_pricing(booking, siret, new_revenue, rule_finder)
+
+
+def _make_pricing(
+    booking: bookings_models.Booking,
+    siret: str,
+    new_revenue: int,
+    rule_finder: reimbursement.CustomRuleFinder,
+) -> models.Pricing:
+    """Return a new pricing, given the revenue of the SIRET including
+    the booking.
+    """
     # FIXME (dbaty, 2021-11-10): `revenue` here is in eurocents but
     # `get_reimbursement_rule` expects euros. Clean that once the
     # old payment code has been removed and the function accepts
@@ -325,7 +608,7 @@ def _delete_dependent_pricings(booking: bookings_models.Booking, log_message: st
 
     See note in the module docstring for further details.
     """
-    siret = booking.venue.siret or booking.venue.businessUnit.siret
+    siret = _get_pricing_siret(booking)
     _period_start, period_end = _get_revenue_period(booking.dateUsed)
     query = models.Pricing.query.filter(
         models.Pricing.siret == siret,
@@ -361,6 +644,7 @@ def _delete_dependent_pricings(booking: bookings_models.Booking, log_message: st
     # exclusive lock on the business unit to avoid that)... but I'd
     # rather be safe than sorry.
     pricing_ids = [p.id for p in pricings]
+    _remove_pricings_from_revenues(pricing_ids)
     lines = models.PricingLine.query.filter(models.PricingLine.pricingId.in_(pricing_ids))
     lines.delete(synchronize_session=False)
     logs = models.PricingLog.query.filter(models.PricingLog.pricingId.in_(pricing_ids))
@@ -402,6 +686,7 @@ def cancel_pricing(booking: bookings_models.Booking, reason: models.PricingLogRe
         # for bookings used after that booking), so that we can price
         # them again.
         _delete_dependent_pricings(booking, "Deleted pricings that depended on cancelled pricing")
+        _remove_pricings_from_revenues([pricing.id])
 
         db.session.add(
             models.PricingLog(
@@ -35,6 +35,15 @@ class PricingFactory(BaseFactory):
     revenue = LazyAttribute(lambda pricing: int(100 * pricing.booking.total_amount))
 
 
+class SiretRevenueFactory(BaseFactory):
+    class Meta:
+        model = models.SiretRevenue
+
+    siret = factory.Sequence("{:014}".format)
+    year = factory.LazyFunction(lambda: datetime.date.today().year)
+    revenue = 0
+
+
 class PricingLineFactory(BaseFactory):
     class Meta:
         model = models.PricingLine
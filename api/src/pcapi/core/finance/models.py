@@ -143,6 +143,27 @@ class Pricing(Model):
     )
 
 
+class SiretRevenue(Model):
+    """The revenue of a SIRET during an accounting year, i.e. the sum
+    of the total amount of bookings that have a pricing (that is
+    neither cancelled nor rejected) for this SIRET and year.
+
+    It is updated when pricings are created, cancelled or deleted, so
+    that we do not have to sum all pricings of the year to price a
+    booking. Rows are created on demand (see
+    `api._get_current_revenue()`).
+    """
+
+    id = sqla.Column(sqla.BigInteger, primary_key=True, autoincrement=True)
+    siret = sqla.Column(sqla.String(14), nullable=False)
+    # Accounting year, see `api._get_revenue_year()`.
+    year = sqla.Column(sqla.Integer, nullable=False)
+    # Revenue is in euro cents.
+    revenue = sqla.Column(sqla.Integer, nullable=False)
+
+    __table_args__ = (sqla.UniqueConstraint("siret", "year", name="unique_siret_year"),)
+
+
 class PricingLine(Model):
     id = sqla.Column(sqla.BigInteger, primary_key=True, autoincrement=True)
 
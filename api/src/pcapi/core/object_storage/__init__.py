@@ -1,9 +1,22 @@
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import functools
+import logging
+import threading
+import time
+from typing import Iterable
+
 from pcapi import settings
+from pcapi.core.object_storage.backends.base import BaseBackend
 from pcapi.models import Model
 from pcapi.utils.human_ids import humanize
 from pcapi.utils.module_loading import import_string
 
 
+logger = logging.getLogger(__name__)
+
+
 OVH = "OVH"
 GCP = "GCP"
 LOCAL_FILE_STORAGE = "local"
@@ -51,13 +64,101 @@ def _get_backends() -> set:
     return backends_set
 
 
+@dataclass
+class PublicObject:
+    folder: str
+    object_id: str
+    blob: bytes
+    content_type: str
+
+
+@functools.lru_cache(maxsize=None)
+def _get_backend(backend_path: str) -> BaseBackend:
+    """Return a backend instance that is shared by all callers, so
+    that its clients (and their HTTP connections) are reused.
+    """
+    return import_string(backend_path)()
+
+
+_executors: dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(name: str) -> ThreadPoolExecutor:
+    # Executors are created lazily, so that they are not created
+    # before the web server forks its workers.
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                settings.OBJECT_STORAGE_WORKERS, thread_name_prefix=f"object-storage-{name}"
+            )
+        return _executors[name]
+
+
+def _call_with_retry(backend: BaseBackend, method_name: str, *args) -> None:
+    attempt = 1
+    while True:
+        try:
+            getattr(backend, method_name)(*args)
+            return
+        except Exception as exc:  # pylint: disable=broad-except
+            if attempt >= settings.OBJECT_STORAGE_ATTEMPTS or not backend.is_transient_error(exc):
+                raise
+            delay = settings.OBJECT_STORAGE_RETRY_DELAY * 2 ** (attempt - 1)
+            logger.warning(
+                "Object storage call failed, retrying",
+                extra={"backend": type(backend).__name__, "method": method_name, "attempt": attempt, "delay": delay},
+            )
+            time.sleep(delay)
+            attempt += 1
+
+
+def _call_backends(method_name: str, *args) -> None:
+    """Call the method on all configured backends, concurrently if
+    there are several of them, and raise the first error (if any)
+    once all calls are finished.
+    """
+    backends = [_get_backend(path) for path in _get_backends()]
+    if len(backends) == 1:
+        _call_with_retry(backends[0], method_name, *args)
+        return
+    executor = _get_executor("backends")
+    futures = [executor.submit(_call_with_retry, backend, method_name, *args) for backend in backends]
+    errors = [future.exception() for future in futures]
+    for error in errors:
+        if error:
+            raise error
+
+
 def store_public_object(folder: str, object_id: str, blob: bytes, content_type: str) -> None:
-    for backend_path in _get_backends():
-        backend = import_string(backend_path)
-        backend().store_public_object(folder, object_id, blob, content_type)
+    _call_backends("store_public_object", folder, object_id, blob, content_type)
 
 
 def delete_public_object(folder: str, object_id: str) -> None:
-    for backend_path in _get_backends():
-        backend = import_string(backend_path)
-        backend().delete_public_object(folder, object_id)
+    _call_backends("delete_public_object", folder, object_id)
+
+
+def store_public_objects_async(objects: Iterable[PublicObject]) -> list[Future]:
+    """Store objects in the background and return immediately.
+
+    Errors are logged. Callers that need to know when (and whether)
+    objects are stored can wait for the returned futures.
+    """
+    executor = _get_executor("batch")
+    return [executor.submit(_store_public_object_in_background, obj) for obj in objects]
+
+
+def _store_public_object_in_background(obj: PublicObject) -> None:
+    try:
+        store_public_object(
+            folder=obj.folder,
+            object_id=obj.object_id,
+            blob=obj.blob,
+            content_type=obj.content_type,
+        )
+    except Exception as exc:
+        logger.error(
+            "Could not store object in the background",
+            extra={"folder": obj.folder, "object_id": obj.object_id, "exc": str(exc)},
+        )
+        raise
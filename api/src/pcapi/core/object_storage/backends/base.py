@@ -4,3 +4,7 @@ class BaseBackend:
 
     def delete_public_object(self, folder: str, object_id: str) -> None:
         raise NotImplementedError()
+
+    def is_transient_error(self, exc: Exception) -> bool:
+        """Return whether a failed call may succeed if retried."""
+        return True
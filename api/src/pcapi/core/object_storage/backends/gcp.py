@@ -1,5 +1,8 @@
 import logging
+import threading
 
+from google.api_core.exceptions import ClientError
+from google.api_core.exceptions import TooManyRequests
 from google.cloud.exceptions import NotFound
 from google.cloud.storage import Client
 from google.cloud.storage.bucket import Bucket
@@ -14,12 +17,20 @@ from .base import BaseBackend
 
 
 class GCPBackend(BaseBackend):
-    def get_gcp_storage_client_bucket(self) -> Bucket:
-        credentials = Credentials.from_service_account_info(settings.GCP_BUCKET_CREDENTIALS)
-        project_id = settings.GCP_BUCKET_CREDENTIALS.get("project_id")
-        storage_client = Client(credentials=credentials, project=project_id)
+    def __init__(self) -> None:
+        # Keep one client per thread, so that the credentials and the
+        # HTTP session are reused between calls.
+        self._local = threading.local()
 
-        return storage_client.bucket(settings.GCP_BUCKET_NAME)
+    def get_gcp_storage_client_bucket(self) -> Bucket:
+        bucket = getattr(self._local, "bucket", None)
+        if bucket is None:
+            credentials = Credentials.from_service_account_info(settings.GCP_BUCKET_CREDENTIALS)
+            project_id = settings.GCP_BUCKET_CREDENTIALS.get("project_id")
+            storage_client = Client(credentials=credentials, project=project_id)
+            bucket = storage_client.bucket(settings.GCP_BUCKET_NAME)
+            self._local.bucket = bucket
+        return bucket
 
     def store_public_object(self, folder: str, object_id: str, blob: bytes, content_type: str) -> None:
         storage_path = folder + "/" + object_id
@@ -42,3 +53,6 @@ class GCPBackend(BaseBackend):
         except Exception as exc:
             logger.exception("An error has occured while trying to delete file on GCP bucket: %s", exc)
             raise exc
+
+    def is_transient_error(self, exc: Exception) -> bool:
+        return not isinstance(exc, ClientError) or isinstance(exc, TooManyRequests)
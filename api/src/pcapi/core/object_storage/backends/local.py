@@ -44,6 +44,9 @@ class LocalBackend(BaseBackend):
             logger.exception("An error has occured while trying to delete file on local file storage: %s", exc)
             raise exc
 
+    def is_transient_error(self, exc: Exception) -> bool:
+        return False
+
     def get_container(
         self,
         container_name: Optional[str] = None,
@@ -1,4 +1,5 @@
 import logging
+import threading
 from typing import Optional
 
 import swiftclient
@@ -13,15 +14,25 @@ from .base import BaseBackend
 
 
 class OVHBackend(BaseBackend):
+    def __init__(self) -> None:
+        # Connections are not thread-safe: keep one per thread, so
+        # that the authentication token and the HTTP session are
+        # reused between calls.
+        self._local = threading.local()
+
     def swift_con(self) -> Connection:
-        return swiftclient.Connection(
-            user=settings.SWIFT_USER,
-            key=settings.SWIFT_KEY,
-            authurl=settings.SWIFT_AUTH_URL,
-            os_options={"region_name": settings.SWIFT_REGION_NAME},
-            tenant_name=settings.SWIFT_TENANT_NAME,
-            auth_version="3",
-        )
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = swiftclient.Connection(
+                user=settings.SWIFT_USER,
+                key=settings.SWIFT_KEY,
+                authurl=settings.SWIFT_AUTH_URL,
+                os_options={"region_name": settings.SWIFT_REGION_NAME},
+                tenant_name=settings.SWIFT_TENANT_NAME,
+                auth_version="3",
+            )
+            self._local.connection = connection
+        return connection
 
     def store_public_object(self, folder: str, object_id: str, blob: bytes, content_type: str) -> None:
         container_name = settings.SWIFT_BUCKET_NAME
@@ -41,6 +52,11 @@ class OVHBackend(BaseBackend):
             logger.exception("An error has occured while trying to delete file on OVH bucket: %s", exc)
             raise exc
 
+    def is_transient_error(self, exc: Exception) -> bool:
+        if isinstance(exc, swiftclient.ClientException) and exc.http_status:
+            return exc.http_status >= 500 or exc.http_status == 429
+        return True
+
     def get_container(
         self,
         container_name: Optional[str] = settings.SWIFT_BUCKET_NAME,
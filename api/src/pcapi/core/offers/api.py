@@ -65,6 +65,7 @@ from pcapi.core.offers.validation import check_offer_subcategory_is_valid
 from pcapi.core.offers.validation import check_shadow_stock_is_editable
 from pcapi.core.offers.validation import check_validation_config_parameters
 from pcapi.core.payments import conf as deposit_conf
+from pcapi.core.providers import product_lookup
 from pcapi.core.users.external import update_external_pro
 from pcapi.core.users.models import ExpenseDomain
 from pcapi.core.users.models import User
@@ -852,6 +853,7 @@ def deactivate_inappropriate_products(isbn: str) -> bool:
             extra={"isbn": isbn, "products": [p.id for p in products], "exc": str(exception)},
         )
         return False
+    product_lookup.invalidate()
     logger.info(
         "Deactivated inappropriate products",
         extra={"isbn": isbn, "products": [p.id for p in products], "offers": offer_ids},
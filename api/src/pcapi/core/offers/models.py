@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from dataclasses import field
 from datetime import datetime
 from datetime import timedelta
 import enum
@@ -231,6 +232,9 @@ sa.event.listen(Stock.__table__, "after_create", sa.DDL(Stock.trig_update_date_d
 class OfferImage:
     url: str
     credit: Optional[str] = None
+    # URLs of the variants of the image, by variant name (see
+    # `HasThumbMixin.thumbVariantUrls`).
+    variantUrls: dict[str, str] = field(default_factory=dict)
 
 
 class Offer(PcObject, Model, ExtraDataMixin, DeactivableMixin, ValidationMixin, AccessibilityMixin, StatusMixin):
@@ -308,6 +312,8 @@ class Offer(PcObject, Model, ExtraDataMixin, DeactivableMixin, ValidationMixin,
     #  can be used by PostgreSQL when filtering on the `venueId` column only.
     sa.Index("venueId_idAtProvider_index", venueId, idAtProvider, unique=True)
 
+    sa.Index("ix_offer_venueId_id", venueId, id)
+
     sa.Index("offer_isbn_idx", ExtraDataMixin.extraData["isbn"].astext)
 
     @sa.ext.declarative.declared_attr
@@ -456,11 +462,11 @@ class Offer(PcObject, Model, ExtraDataMixin, DeactivableMixin, ValidationMixin,
         if activeMediation:
             url = activeMediation.thumbUrl
             if url:
-                return OfferImage(url, activeMediation.credit)
+                return OfferImage(url, activeMediation.credit, activeMediation.thumbVariantUrls)
 
         productUrl = self.product.thumbUrl if self.product else None
         if productUrl:
-            return OfferImage(productUrl, credit=None)
+            return OfferImage(productUrl, credit=None, variantUrls=self.product.thumbVariantUrls)
 
         return None
 
@@ -33,9 +33,7 @@ from pcapi.infrastructure.repository.pro_offers.offers_recap_domain_converter im
 from pcapi.models import db
 from pcapi.models.offer_criterion import OfferCriterion
 from pcapi.models.offer_mixin import OfferStatus
-from pcapi.models.product import Product
 from pcapi.models.user_offerer import UserOfferer
-from pcapi.utils.custom_keys import compute_venue_reference
 
 
 IMPORTED_CREATION_MODE = "imported"
@@ -211,16 +209,6 @@ def get_stocks_for_offer(offer_id: int) -> list[Stock]:
     )
 
 
-def get_products_map_by_provider_reference(id_at_providers: list[str]) -> dict[str, Product]:
-    products = (
-        Product.query.filter(Product.can_be_synchronized)
-        .filter(Product.subcategoryId == subcategories.LIVRE_PAPIER.id)
-        .filter(Product.idAtProviders.in_(id_at_providers))
-        .all()
-    )
-    return {product.idAtProviders: product for product in products}
-
-
 def get_offers_map_by_id_at_provider(id_at_provider_list: list[str], venue: Venue) -> dict[str, int]:
     offers_map = {}
     for offer_id, offer_id_at_provider in (
@@ -233,42 +221,41 @@ def get_offers_map_by_id_at_provider(id_at_provider_list: list[str], venue: Venu
     return offers_map
 
 
-def get_offers_map_by_venue_reference(id_at_provider_list: list[str], venue_id: int) -> dict[str, int]:
-
-    offers_map = {}
-    for offer_id, offer_id_at_provider in (
-        db.session.query(Offer.id, Offer.idAtProvider)
-        .filter(Offer.venueId == venue_id, Offer.idAtProvider.in_(id_at_provider_list))
-        .all()
-    ):
-        offers_map[compute_venue_reference(offer_id_at_provider, venue_id)] = offer_id
-
-    return offers_map
-
-
-def get_stocks_by_id_at_providers(id_at_providers: list[str]) -> dict:
-    stocks = (
-        Stock.query.filter(Stock.idAtProviders.in_(id_at_providers))
-        .outerjoin(Booking, and_(Stock.id == Booking.stockId, Booking.status != BookingStatus.CANCELLED))
-        .group_by(Stock.id)
-        .with_entities(
+def get_offers_and_stocks_map_by_id_at_provider(
+    id_at_provider_list: list[str], venue_id: int, stock_id_at_providers: list[str]
+) -> tuple[dict[str, int], dict[str, dict]]:
+    """Return, with a single query, the ids of the offers of the venue
+    by `idAtProvider` and their stocks (among `stock_id_at_providers`)
+    by `idAtProviders`, along with their booked quantity.
+    """
+    rows = (
+        db.session.query(
+            Offer.id,
+            Offer.idAtProvider,
             Stock.id,
             Stock.idAtProviders,
             coalesce(func.sum(Booking.quantity), 0),
             Stock.quantity,
             Stock.price,
         )
+        .outerjoin(Stock, and_(Stock.offerId == Offer.id, Stock.idAtProviders.in_(stock_id_at_providers)))
+        .outerjoin(Booking, and_(Stock.id == Booking.stockId, Booking.status != BookingStatus.CANCELLED))
+        .filter(Offer.venueId == venue_id, Offer.idAtProvider.in_(id_at_provider_list))
+        .group_by(Offer.id, Stock.id)
         .all()
     )
-    return {
-        id_at_providers: {
-            "id": id,
-            "booking_quantity": booking_quantity,
-            "quantity": quantity,
-            "price": price,
-        }
-        for (id, id_at_providers, booking_quantity, quantity, price) in stocks
-    }
+    offers_map = {}
+    stocks_map = {}
+    for offer_id, offer_id_at_provider, stock_id, stock_id_at_providers, booking_quantity, quantity, price in rows:
+        offers_map[offer_id_at_provider] = offer_id
+        if stock_id is not None:
+            stocks_map[stock_id_at_providers] = {
+                "id": stock_id,
+                "booking_quantity": booking_quantity,
+                "quantity": quantity,
+                "price": price,
+            }
+    return offers_map, stocks_map
 
 
 def get_active_offers_count_for_venue(venue_id) -> int:
@@ -0,0 +1,194 @@
+"""Execute side effects (emails, updates of external services, etc.)
+outside of the request that causes them.
+
+Usage:
+
+    with transaction():
+        ...
+        events = [outbox_api.record(OutboxEventType.UPDATE_EXTERNAL_USER, user_id=user.id)]
+    outbox_api.dispatch(events)
+
+Events are recorded in the same transaction as the change, and
+executed by a worker once committed. Events that have not been
+dispatched (or whose worker stopped) are executed by
+`process_pending_events()`.
+
+Before executing an event, a worker claims it for `LEASE_DURATION`,
+so that no other worker executes it at the same time. An event may
+still be executed more than once (e.g. if a worker stops right after
+executing it, or takes longer than the lease), so handlers must
+tolerate that.
+"""
+import datetime
+import logging
+import typing
+
+import redis
+import sqlalchemy as sqla
+
+from pcapi import settings
+from pcapi.models import db
+
+from . import models
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+# Delay before the second attempt, doubled after each failure.
+RETRY_BASE_DELAY = datetime.timedelta(minutes=1)
+# Delay after which a recorded event that has not been executed (e.g.
+# because it has not been dispatched) is executed by
+# `process_pending_events()`.
+DISPATCH_GRACE_DELAY = datetime.timedelta(minutes=2)
+# Maximum expected duration of a handler. An event that has been
+# claimed by a worker is executed again after this delay if the
+# worker has neither deleted nor rescheduled it.
+LEASE_DURATION = datetime.timedelta(minutes=5)
+PENDING_EVENTS_BATCH_SIZE = 1000
+
+
+def record(event_type: models.OutboxEventType, **payload: typing.Any) -> models.OutboxEvent:
+    """Record a side effect in the current transaction.
+
+    It is only executed once the transaction has been committed and the
+    event dispatched with `dispatch()`, or by
+    `process_pending_events()`.
+    """
+    event = models.OutboxEvent(
+        type=event_type,
+        payload=payload,
+        nextAttemptDate=datetime.datetime.utcnow() + DISPATCH_GRACE_DELAY,
+    )
+    db.session.add(event)
+    return event
+
+
+def dispatch(events: typing.Iterable[models.OutboxEvent]) -> None:
+    """Ask a worker to execute the given committed events.
+
+    This only costs a Redis call. Events that cannot be enqueued are
+    executed later by `process_pending_events()`.
+    """
+    from pcapi.workers.outbox_job import process_outbox_events_job  # avoid import loop
+
+    # Read primary keys from the identity of (expired) events, to
+    # avoid reloading them from the database.
+    event_ids = [sqla.inspect(event).identity[0] for event in events]
+    if not event_ids:
+        return
+    try:
+        process_outbox_events_job.delay(event_ids)
+    except redis.exceptions.RedisError:
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not enqueue outbox events", extra={"events": event_ids})
+
+
+def process_event(event_id: int) -> None:
+    """Execute an event, unless it has already been executed, is being
+    executed by another worker or must be retried later.
+    """
+    claimed = _claim_event(event_id)
+    if not claimed:
+        return
+
+    event_type, payload, attempts = claimed
+    try:
+        _get_handler(event_type)(payload)
+    except Exception as exc:  # pylint: disable=broad-except
+        db.session.rollback()
+        error = f"{type(exc).__name__}: {exc}"
+        extra = {"event": event_id, "type": event_type.value, "attempts": attempts}
+        if attempts >= MAX_ATTEMPTS:
+            models.OutboxEvent.query.filter_by(id=event_id).delete(synchronize_session=False)
+            db.session.commit()
+            logger.error("Gave up outbox event", extra=dict(extra, payload=payload, error=error), exc_info=True)
+            return
+        models.OutboxEvent.query.filter_by(id=event_id).update(
+            {
+                "nextAttemptDate": datetime.datetime.utcnow() + RETRY_BASE_DELAY * 2 ** (attempts - 1),
+                "lastError": error,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        logger.warning("Could not execute outbox event", extra=extra, exc_info=True)
+        return
+
+    models.OutboxEvent.query.filter_by(id=event_id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _claim_event(event_id: int) -> typing.Optional[tuple[models.OutboxEventType, dict, int]]:
+    """Claim an event for `LEASE_DURATION` and return its type, payload
+    and number of attempts (including this one).
+
+    The claim is committed before the event is executed, so that it
+    still holds if the handler commits.
+    """
+    table = models.OutboxEvent.__table__
+    now = datetime.datetime.utcnow()
+    statement = (
+        table.update()
+        .where(table.c.id == event_id)
+        .where(table.c.attempts < MAX_ATTEMPTS)
+        # Never attempted (and thus not claimed), or due.
+        .where(sqla.or_(table.c.attempts == 0, table.c.nextAttemptDate <= now))
+        .values(attempts=table.c.attempts + 1, nextAttemptDate=now + LEASE_DURATION)
+        .returning(table.c.type, table.c.payload, table.c.attempts)
+    )
+    claimed = db.session.execute(statement).first()
+    db.session.commit()
+    return tuple(claimed) if claimed else None
+
+
+def process_pending_events() -> None:
+    """Execute events that have not been dispatched, or that failed and
+    must be retried.
+    """
+    now = datetime.datetime.utcnow()
+    _purge_abandoned_events(now)
+    event_ids = [
+        event_id
+        for event_id, in models.OutboxEvent.query.filter(
+            models.OutboxEvent.nextAttemptDate <= now,
+            models.OutboxEvent.attempts < MAX_ATTEMPTS,
+        )
+        .order_by(models.OutboxEvent.nextAttemptDate)
+        .limit(PENDING_EVENTS_BATCH_SIZE)
+        .with_entities(models.OutboxEvent.id)
+    ]
+    for event_id in event_ids:
+        process_event(event_id)
+
+
+def _purge_abandoned_events(now: datetime.datetime) -> None:
+    """Delete events whose last attempt has been claimed by a worker
+    that stopped before deleting or rescheduling them.
+    """
+    events = models.OutboxEvent.query.filter(
+        models.OutboxEvent.attempts >= MAX_ATTEMPTS,
+        models.OutboxEvent.nextAttemptDate <= now,
+    )
+    abandoned = events.with_entities(models.OutboxEvent.id, models.OutboxEvent.type, models.OutboxEvent.payload).all()
+    if not abandoned:
+        return
+    events.delete(synchronize_session=False)
+    db.session.commit()
+    for event_id, event_type, payload in abandoned:
+        logger.error(
+            "Gave up outbox event",
+            extra={"event": event_id, "type": event_type.value, "attempts": MAX_ATTEMPTS, "payload": payload},
+        )
+
+
+def _get_handler(event_type: models.OutboxEventType) -> typing.Callable[[dict], None]:
+    from . import handlers  # avoid import loop, handlers use modules that record events
+
+    return {
+        models.OutboxEventType.SEND_BOOKING_CONFIRMATION_EMAIL_TO_BENEFICIARY: handlers.send_booking_confirmation_email_to_beneficiary,
+        models.OutboxEventType.SEND_BOOKING_CONFIRMATION_EMAIL_TO_PRO: handlers.send_booking_confirmation_email_to_pro,
+        models.OutboxEventType.UPDATE_EXTERNAL_PRO: handlers.update_external_pro,
+        models.OutboxEventType.UPDATE_EXTERNAL_USER: handlers.update_external_user,
+    }[event_type]
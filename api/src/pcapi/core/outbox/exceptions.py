@@ -0,0 +1,2 @@
+class SideEffectFailed(Exception):
+    pass
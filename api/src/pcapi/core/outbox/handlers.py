@@ -0,0 +1,38 @@
+import logging
+
+from pcapi.core.bookings.models import Booking
+from pcapi.core.mails.transactional.bookings.booking_confirmation_to_beneficiary import (
+    send_individual_booking_confirmation_email_to_beneficiary,
+)
+from pcapi.core.mails.transactional.bookings.new_booking_to_pro import send_user_new_booking_to_pro_email
+from pcapi.core.users import external as users_external
+from pcapi.core.users.models import User
+
+from .exceptions import SideEffectFailed
+
+
+logger = logging.getLogger(__name__)
+
+
+def send_booking_confirmation_email_to_beneficiary(payload: dict) -> None:
+    booking = Booking.query.filter_by(token=payload["booking_token"]).one()
+    if not send_individual_booking_confirmation_email_to_beneficiary(booking.individualBooking):
+        raise SideEffectFailed(f"Could not send booking={booking.id} confirmation email to beneficiary")
+
+
+def send_booking_confirmation_email_to_pro(payload: dict) -> None:
+    booking = Booking.query.filter_by(token=payload["booking_token"]).one()
+    if not send_user_new_booking_to_pro_email(booking.individualBooking):
+        raise SideEffectFailed(f"Could not send booking={booking.id} confirmation email to offerer")
+
+
+def update_external_pro(payload: dict) -> None:
+    users_external.update_external_pro(payload["email"])
+
+
+def update_external_user(payload: dict) -> None:
+    user = User.query.get(payload["user_id"])
+    if not user:
+        logger.error("User with id:%s not found", payload["user_id"])
+        return
+    users_external.update_external_user(user)
@@ -0,0 +1,45 @@
+import datetime
+import enum
+
+import sqlalchemy as sqla
+from sqlalchemy.dialects import postgresql
+
+from pcapi.models import Model
+
+
+class OutboxEventType(enum.Enum):
+    SEND_BOOKING_CONFIRMATION_EMAIL_TO_BENEFICIARY = "SEND_BOOKING_CONFIRMATION_EMAIL_TO_BENEFICIARY"
+    SEND_BOOKING_CONFIRMATION_EMAIL_TO_PRO = "SEND_BOOKING_CONFIRMATION_EMAIL_TO_PRO"
+    UPDATE_EXTERNAL_PRO = "UPDATE_EXTERNAL_PRO"
+    UPDATE_EXTERNAL_USER = "UPDATE_EXTERNAL_USER"
+
+
+class OutboxEvent(Model):
+    """A side effect (sending an email, updating an external service,
+    etc.) that must be executed once the transaction that recorded it
+    has been committed.
+
+    Events are recorded in the same transaction as the change that
+    causes them, so that they are neither lost if the process stops
+    right after the commit, nor executed if the transaction is rolled
+    back. They are then executed (and deleted) by a worker, see
+    `pcapi.core.outbox.api`. Events that still fail after
+    `api.MAX_ATTEMPTS` attempts are logged and deleted.
+    """
+
+    id = sqla.Column(sqla.BigInteger, primary_key=True, autoincrement=True)
+    type = sqla.Column(
+        sqla.Enum(OutboxEventType, native_enum=False, create_constraint=False, length=100),
+        nullable=False,
+    )
+    payload = sqla.Column(postgresql.JSONB, nullable=False)
+    dateCreated = sqla.Column(sqla.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    # Failed events are executed again after an increasing delay, up
+    # to `api.MAX_ATTEMPTS` times.
+    attempts = sqla.Column(sqla.Integer, nullable=False, default=0, server_default="0")
+    # Date after which `api.process_pending_events()` executes the
+    # event: a grace delay after it has been recorded, the end of the
+    # lease of the worker that executes it, or the date of the next
+    # attempt after a failure.
+    nextAttemptDate = sqla.Column(sqla.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+    lastError = sqla.Column(sqla.Text, nullable=True)
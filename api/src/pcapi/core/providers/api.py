@@ -2,6 +2,7 @@ from dataclasses import asdict
 from datetime import datetime
 import logging
 from typing import Iterable
+from typing import MutableMapping
 from typing import Optional
 from typing import Union
 
@@ -10,10 +11,8 @@ from pcapi.core.offerers.models import Venue
 from pcapi.core.offerers.repository import find_venue_by_id
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
+from pcapi.core.offers.repository import get_offers_and_stocks_map_by_id_at_provider
 from pcapi.core.offers.repository import get_offers_map_by_id_at_provider
-from pcapi.core.offers.repository import get_offers_map_by_venue_reference
-from pcapi.core.offers.repository import get_products_map_by_provider_reference
-from pcapi.core.offers.repository import get_stocks_by_id_at_providers
 from pcapi.core.providers.exceptions import NoSiretSpecified
 from pcapi.core.providers.exceptions import ProviderNotFound
 from pcapi.core.providers.exceptions import ProviderWithoutApiImplementation
@@ -24,6 +23,8 @@ from pcapi.core.providers.models import Provider
 from pcapi.core.providers.models import StockDetail
 from pcapi.core.providers.models import VenueProvider
 from pcapi.core.providers.models import VenueProviderCreationPayload
+from pcapi.core.providers.product_lookup import ProductInfo
+from pcapi.core.providers.product_lookup import get_products_by_ean
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.core.providers.repository import get_provider_enabled_for_pro_by_id
 from pcapi.domain.price_rule import PriceRule
@@ -32,6 +33,8 @@ from pcapi.models.product import Product
 from pcapi.repository import repository
 from pcapi.routes.serialization.venue_provider_serialize import PostVenueProviderBody
 from pcapi.use_cases.connect_venue_to_allocine import connect_venue_to_allocine
+from pcapi.utils.custom_keys import compute_venue_reference
+from pcapi.utils.timing import timed
 from pcapi.validation.models.entity_validator import validate
 
 
@@ -160,61 +163,95 @@ def _siret_can_be_synchronized(
 
 
 def synchronize_stocks(
-    stock_details: Iterable[StockDetail], venue: Venue, provider_id: Optional[int] = None
+    stock_details: Iterable[StockDetail],
+    venue: Venue,
+    provider_id: Optional[int] = None,
+    timings: Optional[MutableMapping[str, float]] = None,
 ) -> dict[str, int]:
-    products_provider_references = [stock_detail.products_provider_reference for stock_detail in stock_details]
-    # here product.id_at_providers is the "ref" field that provider api gives use.
-    products_by_provider_reference = get_products_map_by_provider_reference(products_provider_references)
+    """Create or update offers and stocks of the venue.
+
+    If `timings` is given, the duration of each stage is added to it.
+    """
+    with timed(timings, "product_lookup"):
+        products_provider_references = [stock_detail.products_provider_reference for stock_detail in stock_details]
+        # here product.id_at_providers is the "ref" field that provider api gives use.
+        products_by_provider_reference = get_products_by_ean(products_provider_references)
 
     stock_details = [
         stock for stock in stock_details if stock.products_provider_reference in products_by_provider_reference
     ]
 
-    offers_provider_references = [stock_detail.offers_provider_reference for stock_detail in stock_details]
-    # here offers.id_at_providers is the "ref" field that provider api gives use.
-    offers_by_provider_reference = get_offers_map_by_id_at_provider(offers_provider_references, venue)
-
-    products_references = [stock_detail.products_provider_reference for stock_detail in stock_details]
-    offers_by_venue_reference = get_offers_map_by_venue_reference(products_references, venue.id)
-
-    offers_update_mapping = [
-        {"id": offer_id, "lastProviderId": provider_id} for offer_id in offers_by_provider_reference.values()
-    ]
-    db.session.bulk_update_mappings(Offer, offers_update_mapping)
-
-    new_offers = _build_new_offers_from_stock_details(
-        stock_details,
-        offers_by_provider_reference,
-        products_by_provider_reference,
-        offers_by_venue_reference,
-        venue,
-        provider_id,
-    )
-    new_offers_references = [new_offer.idAtProvider for new_offer in new_offers]
-
-    db.session.bulk_save_objects(new_offers)
+    with timed(timings, "offer_insert"):
+        offers_provider_references = [stock_detail.offers_provider_reference for stock_detail in stock_details]
+        stocks_provider_references = [stock.stocks_provider_reference for stock in stock_details]
+        # here offers.id_at_providers is the "ref" field that provider api gives use.
+        offers_by_provider_reference, stocks_by_provider_reference = get_offers_and_stocks_map_by_id_at_provider(
+            offers_provider_references, venue.id, stocks_provider_references
+        )
+        offers_by_venue_reference = {
+            compute_venue_reference(reference, venue.id): offer_id
+            for reference, offer_id in offers_by_provider_reference.items()
+        }
+
+        offers_update_mapping = [
+            {"id": offer_id, "lastProviderId": provider_id} for offer_id in offers_by_provider_reference.values()
+        ]
+        db.session.bulk_update_mappings(Offer, offers_update_mapping)
+
+        new_offers = _build_new_offers_from_stock_details(
+            stock_details,
+            offers_by_provider_reference,
+            _get_products_for_new_offers(stock_details, offers_by_provider_reference, products_by_provider_reference),
+            offers_by_venue_reference,
+            venue,
+            provider_id,
+        )
+        if new_offers:
+            db.session.bulk_save_objects(new_offers)
+            new_offers_references = [new_offer.idAtProvider for new_offer in new_offers]
+            new_offers_by_provider_reference = get_offers_map_by_id_at_provider(new_offers_references, venue)
+            offers_by_provider_reference = {**offers_by_provider_reference, **new_offers_by_provider_reference}
+
+    with timed(timings, "stock_upsert"):
+        update_stock_mapping, new_stocks, offer_ids = _get_stocks_to_upsert(
+            stock_details,
+            stocks_by_provider_reference,
+            offers_by_provider_reference,
+            products_by_provider_reference,
+            provider_id,
+        )
 
-    new_offers_by_provider_reference = get_offers_map_by_id_at_provider(new_offers_references, venue)
-    offers_by_provider_reference = {**offers_by_provider_reference, **new_offers_by_provider_reference}
+        db.session.bulk_save_objects(new_stocks)
+        db.session.bulk_update_mappings(Stock, update_stock_mapping)
 
-    stocks_provider_references = [stock.stocks_provider_reference for stock in stock_details]
-    stocks_by_provider_reference = get_stocks_by_id_at_providers(stocks_provider_references)
-    update_stock_mapping, new_stocks, offer_ids = _get_stocks_to_upsert(
-        stock_details,
-        stocks_by_provider_reference,
-        offers_by_provider_reference,
-        products_by_provider_reference,
-        provider_id,
-    )
+        db.session.commit()
 
-    db.session.bulk_save_objects(new_stocks)
-    db.session.bulk_update_mappings(Stock, update_stock_mapping)
+    with timed(timings, "reindex_enqueue"):
+        search.async_index_offer_ids(offer_ids, low_priority=True)
 
-    db.session.commit()
+    return {"new_offers": len(new_offers), "new_stocks": len(new_stocks), "updated_stocks": len(update_stock_mapping)}
 
-    search.async_index_offer_ids(offer_ids)
 
-    return {"new_offers": len(new_offers), "new_stocks": len(new_stocks), "updated_stocks": len(update_stock_mapping)}
+def _get_products_for_new_offers(
+    stock_details: list[StockDetail],
+    existing_offers_by_provider_reference: dict[str, int],
+    products_by_provider_reference: dict[str, ProductInfo],
+) -> dict[str, Product]:
+    """Load the products that new offers will be copied from.
+
+    Products come from a cache (see `product_lookup`): those that have
+    been deleted or are not compatible anymore are left out.
+    """
+    product_ids = {
+        products_by_provider_reference[stock_detail.products_provider_reference].id
+        for stock_detail in stock_details
+        if stock_detail.offers_provider_reference not in existing_offers_by_provider_reference
+        and stock_detail.available_quantity
+    }
+    if not product_ids:
+        return {}
+    products = Product.query.filter(Product.id.in_(product_ids), Product.can_be_synchronized)
+    return {product.idAtProviders: product for product in products}
 
 
 def _build_new_offers_from_stock_details(
@@ -239,7 +276,9 @@ def _build_new_offers_from_stock_details(
         if not stock_detail.available_quantity:
             continue
 
-        product = products_by_provider_reference[stock_detail.products_provider_reference]
+        product = products_by_provider_reference.get(stock_detail.products_provider_reference)
+        if not product:
+            continue
         offer = _build_new_offer(
             venue,
             product,
@@ -260,7 +299,7 @@ def _get_stocks_to_upsert(
     stock_details: list[StockDetail],
     stocks_by_provider_reference: dict[str, dict],
     offers_by_provider_reference: dict[str, int],
-    products_by_provider_reference: dict[str, Product],
+    products_by_provider_reference: dict[str, ProductInfo],
     provider_id: Optional[int],
 ) -> tuple[list[dict], list[Stock], set[int]]:
     update_stock_mapping = []
@@ -270,7 +309,7 @@ def _get_stocks_to_upsert(
     for stock_detail in stock_details:
         stock_provider_reference = stock_detail.stocks_provider_reference
         product = products_by_provider_reference[stock_detail.products_provider_reference]
-        book_price = stock_detail.price or float(product.extraData["prix_livre"])
+        book_price = stock_detail.price or product.price
         if stock_provider_reference in stocks_by_provider_reference:
             stock = stocks_by_provider_reference[stock_provider_reference]
 
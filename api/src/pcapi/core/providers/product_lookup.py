@@ -0,0 +1,152 @@
+"""An in-process cache of the products that can be synchronized by
+API providers, by EAN (`Product.idAtProviders`).
+
+Provider synchronizations look up the same books over and over, for
+each venue and each page of stocks: the cache saves a query on the
+product table for each page. Unknown EANs are not cached, so that new
+products are found right away.
+
+Products are deleted or become incompatible (see
+`Product.can_be_synchronized`) in other processes: `invalidate()` must
+then be called, so that all processes clear their cache.
+"""
+from dataclasses import dataclass
+import logging
+import time
+from typing import Optional
+
+from flask import current_app
+import redis
+from sqlalchemy import func
+from sqlalchemy.orm import Query
+
+from pcapi import settings
+from pcapi.core.categories import subcategories
+from pcapi.core.offers.models import Offer
+from pcapi.models import db
+from pcapi.models.product import Product
+from pcapi.utils.cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProductInfo:
+    id: int
+    price: Optional[float]  # `extraData["prix_livre"]`
+    subcategoryId: str
+
+
+# Incremented by `invalidate()`. Each process clears its cache when
+# it sees a new value.
+REDIS_GENERATION_KEY = "product_lookup:generation"
+
+_cache = LRUCache(settings.PRODUCT_LOOKUP_CACHE_SIZE, settings.PRODUCT_LOOKUP_CACHE_TTL)
+_warmed_up_at: Optional[float] = None
+_generation: Optional[str] = None
+
+
+def _get_products_query() -> Query:
+    return db.session.query(
+        Product.id,
+        Product.idAtProviders,
+        Product.extraData["prix_livre"].astext,
+        Product.subcategoryId,
+    ).filter(
+        Product.can_be_synchronized,
+        Product.subcategoryId == subcategories.LIVRE_PAPIER.id,
+    )
+
+
+def _to_product_info(product_id: int, price: Optional[str], subcategory_id: str) -> ProductInfo:
+    return ProductInfo(id=product_id, price=float(price) if price is not None else None, subcategoryId=subcategory_id)
+
+
+def get_products_by_ean(eans: list[str]) -> dict[str, ProductInfo]:
+    """Return products that can be synchronized, by EAN.
+
+    Only EANs that are not cached are looked up in the database, with
+    a single query.
+    """
+    _clear_cache_if_invalidated()
+    products, missing = _cache.get_many(eans)
+    if missing:
+        fetched = {
+            ean: _to_product_info(product_id, price, subcategory_id)
+            for product_id, ean, price, subcategory_id in _get_products_query().filter(
+                Product.idAtProviders.in_(missing)
+            )
+        }
+        _cache.set_many(fetched)
+        products.update(fetched)
+    return products
+
+
+def warm_up(limit: Optional[int] = None) -> int:
+    """Fill the cache with the products that have the most offers
+    synchronized by providers, unless it has already been done less
+    than `PRODUCT_LOOKUP_CACHE_TTL` seconds ago. Return the number of
+    cached products.
+    """
+    global _warmed_up_at  # pylint: disable=global-statement
+    _clear_cache_if_invalidated()
+    limit = settings.PRODUCT_LOOKUP_CACHE_WARMUP if limit is None else limit
+    now = time.monotonic()
+    if limit <= 0 or (_warmed_up_at is not None and now - _warmed_up_at < settings.PRODUCT_LOOKUP_CACHE_TTL):
+        return 0
+    _warmed_up_at = now
+
+    start = time.perf_counter()
+    rows = (
+        _get_products_query()
+        .join(Offer, Offer.productId == Product.id)
+        .filter(Offer.lastProviderId.isnot(None))
+        .group_by(Product.id)
+        .order_by(func.count(Offer.id).desc())
+        .limit(min(limit, settings.PRODUCT_LOOKUP_CACHE_SIZE))
+        .all()
+    )
+    _cache.set_many(
+        {ean: _to_product_info(product_id, price, subcategory_id) for product_id, ean, price, subcategory_id in rows}
+    )
+    logger.info(
+        "Warmed up product lookup cache",
+        extra={"products": len(rows), "duration": time.perf_counter() - start},
+    )
+    return len(rows)
+
+
+def invalidate() -> None:
+    """Clear the cache of all processes. Call it when products are
+    deleted or their compatibility changes.
+    """
+    _cache.clear()
+    try:
+        current_app.redis_client.incr(REDIS_GENERATION_KEY)
+    except redis.exceptions.RedisError:
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not invalidate product lookup cache")
+
+
+def _clear_cache_if_invalidated() -> None:
+    global _generation, _warmed_up_at  # pylint: disable=global-statement
+    try:
+        generation = current_app.redis_client.get(REDIS_GENERATION_KEY)
+    except redis.exceptions.RedisError:
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not get generation of product lookup cache")
+        return
+    if generation != _generation:
+        _cache.clear()
+        _warmed_up_at = None
+        _generation = generation
+
+
+def clear_cache() -> None:
+    global _generation, _warmed_up_at  # pylint: disable=global-statement
+    _cache.clear()
+    _warmed_up_at = None
+    _generation = None
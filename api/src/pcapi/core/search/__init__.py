@@ -1,11 +1,15 @@
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 import logging
+from typing import Any
 from typing import Iterable
+from typing import Optional
 
+import flask
 from sqlalchemy.orm import joinedload
 
 from pcapi import settings
 from pcapi.core.offerers.models import Venue
-from pcapi.core.offers.models import Offer
 from pcapi.core.search.backends import base
 from pcapi.repository import offer_queries
 from pcapi.utils.module_loading import import_string
@@ -19,16 +23,20 @@ def _get_backend() -> base.SearchBackend:
     return backend_class()
 
 
-def async_index_offer_ids(offer_ids: Iterable[int]) -> None:
+def async_index_offer_ids(offer_ids: Iterable[int], low_priority: bool = False) -> None:
     """Ask for an asynchronous reindexation of the given list of
     ``Offer.id``.
 
     This function returns quickly. The "real" reindexation will be
     done later through a cron job.
+
+    ``low_priority`` should be set by bulk updates (e.g. provider
+    synchronizations), so that they do not delay the reindexation
+    of offers that have been modified by users.
     """
     backend = _get_backend()
     try:
-        backend.enqueue_offer_ids(offer_ids)
+        backend.enqueue_offer_ids(offer_ids, low_priority=low_priority)
     except Exception:  # pylint: disable=broad-except
         if settings.IS_RUNNING_TESTS:
             raise
@@ -70,7 +78,7 @@ def async_index_offers_of_venue_ids(venue_ids: Iterable[int]) -> None:
         )
 
 
-def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue: bool = False) -> None:
+def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue: bool = False, workers: int = 1) -> None:
     """Pop offers from indexation queue and reindex them.
 
     If ``from_error_queue`` is True, pop offers from the error queue
@@ -87,43 +95,127 @@ def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue:
     If ``stop_only_when_empty`` is True (i.e. if called from the
     ``process_offers`` Flask command), we pop from the queue and stop
     only when the queue is empty.
+
+    If ``workers`` is greater than 1, as many threads pop and process
+    chunks concurrently. Most of the time is spent waiting for the
+    database and the indexation service, so that a worker loads its
+    offers while another one sends its chunk to the indexation
+    service.
     """
     backend = _get_backend()
-    while True:
-        # We must pop and not get-and-delete. Otherwise two concurrent
-        # cron jobs could delete the wrong offers from the queue:
-        # 1. Cron job 1 gets the first 1.000 offers from the queue.
-        # 2. Cron job 2 gets the same 1.000 offers from the queue.
-        # 3. Cron job 1 finishes processing the batch and deletes the
-        #    first 1.000 offers from the queue. OK.
-        # 4. Cron job 2 finishes processing the batch and also deletes
-        #    the first 1.000 offers from the queue. Not OK, these are
-        #    not the same offers it just processed!
-        offer_ids = backend.pop_offer_ids_from_queue(
-            count=settings.REDIS_OFFER_IDS_CHUNK_SIZE, from_error_queue=from_error_queue
-        )
-        if not offer_ids:
-            break
+    backend.requeue_expired_offer_ids_leases()
 
-        logger.info("Fetched offers from indexation queue", extra={"count": len(offer_ids)})
-        try:
-            reindex_offer_ids(offer_ids)
-        except Exception as exc:  # pylint: disable=broad-except
-            if settings.IS_RUNNING_TESTS:
-                raise
-            logger.exception(
-                "Exception while reindexing offers, must fix manually",
-                extra={"exc": str(exc), "offers": offer_ids},
+    if workers <= 1:
+        _index_offers_in_queue(backend, stop_only_when_empty, from_error_queue)
+        return
+
+    app = flask.current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_index_offers_in_queue_in_thread, app, stop_only_when_empty, from_error_queue)
+            for _ in range(workers)
+        ]
+        for future in futures:
+            future.result()
+
+
+def _index_offers_in_queue_in_thread(app: flask.Flask, stop_only_when_empty: bool, from_error_queue: bool) -> None:
+    # Each thread has its own application context and thus its own
+    # database session.
+    with app.app_context():
+        _index_offers_in_queue(_get_backend(), stop_only_when_empty, from_error_queue)
+
+
+def _index_offers_in_queue(backend: base.SearchBackend, stop_only_when_empty: bool, from_error_queue: bool) -> None:
+    app = flask.current_app._get_current_object()
+    # When offers are serialized from SQL rows, which are not bound to
+    # the database session, a chunk is sent to the indexation service
+    # by another thread while the next chunk is loaded from the
+    # database. Offers loaded as ORM objects may lazy-load relations
+    # during serialization, so they are sent by the current thread.
+    with ThreadPoolExecutor(max_workers=1) as sender:
+        sending = None
+        while True:
+            # We must pop and not get-and-delete. Otherwise two concurrent
+            # cron jobs could delete the wrong offers from the queue:
+            # 1. Cron job 1 gets the first 1.000 offers from the queue.
+            # 2. Cron job 2 gets the same 1.000 offers from the queue.
+            # 3. Cron job 1 finishes processing the batch and deletes the
+            #    first 1.000 offers from the queue. OK.
+            # 4. Cron job 2 finishes processing the batch and also deletes
+            #    the first 1.000 offers from the queue. Not OK, these are
+            #    not the same offers it just processed!
+            # Popped offers are leased: if we crash before releasing the
+            # lease, they will be queued again.
+            lease_id, offer_ids = backend.lease_offer_ids_from_queue(
+                count=settings.REDIS_OFFER_IDS_CHUNK_SIZE, from_error_queue=from_error_queue
             )
+            if not offer_ids:
+                break
+
+            logger.info("Fetched offers from indexation queue", extra={"count": len(offer_ids)})
+            if settings.SEARCH_SERIALIZE_OFFERS_FROM_SQL:
+                try:
+                    offers = _get_offers_to_reindex(backend, offer_ids)
+                except Exception as exc:  # pylint: disable=broad-except
+                    if settings.IS_RUNNING_TESTS:
+                        raise
+                    logger.exception(
+                        "Exception while reindexing offers, must fix manually",
+                        extra={"exc": str(exc), "offers": offer_ids},
+                    )
+                    backend.release_offer_ids_lease(lease_id)
+                else:
+                    if sending:
+                        sending.result()
+                    sending = sender.submit(
+                        _reindex_leased_offer_ids_in_thread, app, backend, lease_id, offer_ids, from_error_queue, offers
+                    )
+            else:
+                _reindex_leased_offer_ids(backend, lease_id, offer_ids, from_error_queue)
+
+            left_to_process = backend.count_offers_to_index_from_queue(from_error_queue=from_error_queue)
+            if not stop_only_when_empty and left_to_process < settings.REDIS_OFFER_IDS_CHUNK_SIZE:
+                break
+        if sending:
+            sending.result()
+
+
+def _reindex_leased_offer_ids_in_thread(app: flask.Flask, *args: Any) -> None:
+    with app.app_context():
+        _reindex_leased_offer_ids(*args)
+
+
+def _reindex_leased_offer_ids(
+    backend: base.SearchBackend,
+    lease_id: str,
+    offer_ids: set[int],
+    from_error_queue: bool,
+    offers: Optional[tuple[list, list[int]]] = None,
+) -> None:
+    """Reindex leased offers and release the lease.
+
+    If ``offers`` is given (as returned by `_get_offers_to_reindex()`),
+    they are sent to the indexation service without being loaded again.
+    """
+    try:
+        if offers is None:
+            reindex_offer_ids(offer_ids)
         else:
-            logger.info(
-                "Reindexed offers from queue",
-                extra={"count": len(offer_ids), "from_error_queue": from_error_queue},
-            )
-
-        left_to_process = backend.count_offers_to_index_from_queue(from_error_queue=from_error_queue)
-        if not stop_only_when_empty and left_to_process < settings.REDIS_OFFER_IDS_CHUNK_SIZE:
-            break
+            _send_offers_to_reindex(backend, *offers)
+    except Exception as exc:  # pylint: disable=broad-except
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception(
+            "Exception while reindexing offers, must fix manually",
+            extra={"exc": str(exc), "offers": offer_ids},
+        )
+    else:
+        logger.info(
+            "Reindexed offers from queue",
+            extra={"count": len(offer_ids), "from_error_queue": from_error_queue},
+        )
+    backend.release_offer_ids_lease(lease_id)
 
 
 def index_venues_in_queue(from_error_queue: bool = False) -> None:
@@ -169,22 +261,21 @@ def _reindex_venue_ids(backend: base.SearchBackend, venue_ids: Iterable[int]) ->
         logger.info("Finished unindexing venues", extra={"count": len(to_delete_ids)})
 
 
-def index_offers_of_venues_in_queue() -> None:
-    """Pop venues from indexation queue and reindex their offers."""
+def index_offers_of_venues_in_queue(workers: int = 1) -> None:
+    """Pop venues from indexation queue and reindex their offers.
+
+    If ``workers`` is greater than 1, chunks of offers of each venue
+    are reindexed concurrently by as many threads.
+    """
     backend = _get_backend()
     try:
         venue_ids = backend.pop_venue_ids_for_offers_from_queue(count=settings.REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE)
         for venue_id in venue_ids:
-            page = 0
             logger.info("Starting to index offers of venue", extra={"venue": venue_id})
-            while True:
-                offer_ids = offer_queries.get_paginated_offer_ids_by_venue_id(
-                    limit=settings.ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE, page=page, venue_id=venue_id
-                )
-                if not offer_ids:
-                    break
-                reindex_offer_ids(offer_ids)
-                page += 1
+            chunks = offer_queries.get_offer_ids_by_venue_id_in_chunks(
+                venue_id, chunk_size=settings.ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE
+            )
+            _reindex_offer_ids_chunks(chunks, workers)
             logger.info("Finished indexing offers of venue", extra={"venue": venue_id})
     except Exception:  # pylint: disable=broad-except
         if settings.IS_RUNNING_TESTS:
@@ -192,6 +283,35 @@ def index_offers_of_venues_in_queue() -> None:
         logger.exception("Could not index offers of venues from queue")
 
 
+def _reindex_offer_ids_chunks(chunks: Iterable[list[int]], workers: int) -> None:
+    if workers <= 1:
+        for offer_ids in chunks:
+            reindex_offer_ids(offer_ids)
+        return
+
+    app = flask.current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Chunks are fetched by the current thread (only ids are
+        # loaded) while the workers load and index offers. We do not
+        # fetch more than one chunk ahead of each worker, so that a
+        # venue with many offers does not fill the memory with
+        # pending chunks.
+        pending = set()
+        for offer_ids in chunks:
+            if len(pending) >= 2 * workers:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(_reindex_offer_ids_in_thread, app, offer_ids))
+        for future in pending:
+            future.result()
+
+
+def _reindex_offer_ids_in_thread(app: flask.Flask, offer_ids: list[int]) -> None:
+    with app.app_context():
+        reindex_offer_ids(offer_ids)
+
+
 def reindex_offer_ids(offer_ids: Iterable[int]) -> None:
     """Given a list of `Offer.id`, reindex or unindex each offer
     (i.e. request the external indexation service an update or a
@@ -202,29 +322,52 @@ def reindex_offer_ids(offer_ids: Iterable[int]) -> None:
     call `async_index_offer_ids()` instead to return quickly.
     """
     backend = _get_backend()
+    to_add, to_delete_ids = _get_offers_to_reindex(backend, offer_ids)
+    _send_offers_to_reindex(backend, to_add, to_delete_ids)
 
+
+def _get_offers_to_reindex(backend: base.SearchBackend, offer_ids: Iterable[int]) -> tuple[list, list[int]]:
+    """Return offers (or rows) to index and ids of offers to unindex."""
+    # `to_add` holds either `Offer` objects or rows returned by
+    # `offer_queries.get_offer_rows_for_search_indexation()`. Both
+    # have an `id` attribute.
     to_add = []
-    to_delete = []
-    # FIXME (dbaty, 2021-07-05): join-load Stock, Venue, Offerer,
-    # etc. to avoid N+1 queries on each offer.
-    offers = Offer.query.filter(Offer.id.in_(offer_ids))
-    for offer in offers:
-        if offer and offer.is_eligible_for_search:
-            to_add.append(offer)
-        elif backend.check_offer_is_indexed(offer):
-            to_delete.append(offer)
+    ineligible_offer_ids = []
+    if settings.SEARCH_SERIALIZE_OFFERS_FROM_SQL:
+        to_add = offer_queries.get_offer_rows_for_search_indexation(offer_ids)
+        eligible_offer_ids = {row.id for row in to_add}
+        ineligible_offer_ids = [offer_id for offer_id in offer_ids if offer_id not in eligible_offer_ids]
+    else:
+        offers = offer_queries.get_offers_for_search_indexation(offer_ids)
+        for offer in offers:
+            if offer.is_eligible_for_search:
+                to_add.append(offer)
+            else:
+                ineligible_offer_ids.append(offer.id)
+
+    to_delete_ids = []
+    for offer_id in ineligible_offer_ids:
+        if backend.check_offer_id_is_indexed(offer_id):
+            to_delete_ids.append(offer_id)
         else:
             # FIXME (dbaty, 2021-06-24). I think we could safely do
             # without the hashmap in Redis. Check the logs and see if
             # I am right!
             logger.info(
                 "Redis 'indexed_offers' set avoided unnecessary request to indexation service",
-                extra={"source": "reindex_offer_ids", "offer": offer.id},
+                extra={"source": "reindex_offer_ids", "offer": offer_id},
             )
 
+    return to_add, to_delete_ids
+
+
+def _send_offers_to_reindex(backend: base.SearchBackend, to_add: list, to_delete_ids: list[int]) -> None:
     # Handle new or updated available offers
     try:
-        backend.index_offers(to_add)
+        if settings.SEARCH_SERIALIZE_OFFERS_FROM_SQL:
+            backend.index_offer_rows(to_add)
+        else:
+            backend.index_offers(to_add)
     except Exception as exc:  # pylint: disable=broad-except
         if settings.IS_RUNNING_TESTS:
             raise
@@ -237,16 +380,16 @@ def reindex_offer_ids(offer_ids: Iterable[int]) -> None:
 
     # Handle unavailable offers (deleted, expired, sold out, etc.)
     try:
-        backend.unindex_offer_ids([offer.id for offer in to_delete])
+        backend.unindex_offer_ids(to_delete_ids)
     except Exception as exc:  # pylint: disable=broad-except
         if settings.IS_RUNNING_TESTS:
             raise
         logger.warning(
             "Could not unindex offers, will automatically retry",
-            extra={"exc": str(exc), "offers": [offer.id for offer in to_delete]},
+            extra={"exc": str(exc), "offers": to_delete_ids},
             exc_info=True,
         )
-        backend.enqueue_offer_ids_in_error([offer.id for offer in to_delete])
+        backend.enqueue_offer_ids_in_error(to_delete_ids)
 
 
 def unindex_offer_ids(offer_ids: Iterable[int]) -> None:
@@ -311,3 +454,18 @@ def unindex_all_venues() -> None:
         if settings.IS_RUNNING_TESTS:
             raise
         logger.exception("Could not unindex all venues")
+
+
+def search_offers(query: str = "", **kwargs: Any) -> dict:
+    """Search offers and return an Algolia-like response.
+
+    Clients query Algolia directly, so this is only implemented by
+    the local backend (see `backends.local.LocalIndex.search()` for
+    arguments), e.g. to check what has been indexed.
+    """
+    return _get_backend().search_offers(query, **kwargs)
+
+
+def search_venues(query: str = "", **kwargs: Any) -> dict:
+    """Search venues, see `search_offers()`."""
+    return _get_backend().search_venues(query, **kwargs)
@@ -1,28 +1,83 @@
+import hashlib
+import json
 import logging
 import re
+import time
 from typing import Iterable
 import urllib.parse
+import uuid
 
 import algoliasearch.search_client
 from flask import current_app
 import redis
 
 from pcapi import settings
+from pcapi.core.categories import subcategories
 import pcapi.core.offerers.models as offerers_models
 import pcapi.core.offers.models as offers_models
 from pcapi.core.search.backends import base
 import pcapi.utils.date as date_utils
+from pcapi.utils.human_ids import humanize
 from pcapi.utils.stopwords import STOPWORDS
 
 
 logger = logging.getLogger(__name__)
 
-# FIXME (dbaty, 2021-10-15): these are all lists, which are less
-# usable for us than sets. See also `redis_lpop()` below, which we
-# would not have to implement if we were using sets (because `SPOP`
-# does allow to pop multiple items at once with our Redis version).
+# Offer ids are queued in sets: an offer that is modified many times
+# before the queue is processed is indexed only once. Offers queued
+# by bulk synchronizations (e.g. providers) go in a distinct set that
+# is processed only when the main set is empty.
+REDIS_OFFER_IDS_TO_INDEX = "search:algolia:offer-ids-to-index"
+REDIS_LOW_PRIORITY_OFFER_IDS_TO_INDEX = "search:algolia:low-priority-offer-ids-to-index"
+REDIS_OFFER_IDS_IN_ERROR_TO_INDEX = "search:algolia:offer-ids-in-error-to-index"
+# Chunks of offer ids that are being processed. Each lease is a member
+# of a sorted set (scored by its expiration timestamp) and the offer
+# ids are stored in a set named after the lease.
+REDIS_OFFER_IDS_LEASES = "search:algolia:offer-ids-leases"
+REDIS_OFFER_IDS_LEASE_PREFIX = "search:algolia:offer-ids-lease:"
+# Pop up to ARGV[1] offer ids from the sets KEYS[4:] (in this order),
+# then from the legacy list KEYS[3], and store them in the lease set
+# KEYS[1]. The lease ARGV[2] is added to KEYS[2] with the expiration
+# ARGV[3]. Since Redis 5, scripts are replicated by effects, so
+# that `SPOP` may be followed by writes.
+LEASE_OFFER_IDS_SCRIPT = """
+local count = tonumber(ARGV[1])
+local offer_ids = {}
+for i = 4, #KEYS do
+    if #offer_ids >= count then
+        break
+    end
+    for _, offer_id in ipairs(redis.call("SPOP", KEYS[i], count - #offer_ids)) do
+        table.insert(offer_ids, offer_id)
+    end
+end
+if #offer_ids < count then
+    local popped = redis.call("LRANGE", KEYS[3], 0, count - #offer_ids - 1)
+    redis.call("LTRIM", KEYS[3], #popped, -1)
+    for _, offer_id in ipairs(popped) do
+        table.insert(offer_ids, offer_id)
+    end
+end
+if #offer_ids > 0 then
+    for i = 1, #offer_ids, 1000 do
+        redis.call("SADD", KEYS[1], unpack(offer_ids, i, math.min(i + 999, #offer_ids)))
+    end
+    redis.call("ZADD", KEYS[2], ARGV[3], ARGV[2])
+end
+return offer_ids
+"""
+# These offer lists are not filled anymore. They are still drained so
+# that offers that were queued before the sets were introduced are
+# indexed. They can be removed, along with the legacy branches of
+# `pop_offer_ids_from_queue()` and `count_offers_to_index_from_queue()`,
+# once `LLEN` returns 0 for both lists in all environments (i.e. after
+# the first run of the indexing cron that follows the deployment).
 REDIS_LIST_OFFER_IDS_NAME = "offer_ids"
 REDIS_LIST_OFFER_IDS_IN_ERROR_NAME = "offer_ids_in_error"
+# FIXME (dbaty, 2021-10-15): this is a list, which is less usable for
+# us than a set. See also `redis_lpop()` below, which we would not
+# have to implement if we were using sets (because `SPOP` does allow
+# to pop multiple items at once with our Redis version).
 REDIS_LIST_VENUE_IDS_FOR_OFFERS_NAME = "venue_ids_for_offers"
 REDIS_VENUE_IDS_TO_INDEX = "search:algolia:venue-ids-to-index"
 REDIS_VENUE_IDS_IN_ERROR_TO_INDEX = "search:algolia:venue-ids-in-error-to-index"
@@ -34,6 +89,15 @@ DEFAULT_LATITUDE = 47.158459
 WORD_SPLITTER = re.compile(r"\W+")
 
 
+def get_offer_digest(obj: dict) -> str:
+    """Return a compact digest of a serialized offer, to detect whether
+    it has changed since it was last indexed.
+    """
+    # `default=str` handles `Decimal` prices.
+    serialized = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.blake2b(serialized.encode(), digest_size=8).hexdigest()
+
+
 def url_path(url):
     """Return the path component of a URL.
 
@@ -77,11 +141,18 @@ class AlgoliaBackend(base.SearchBackend):
         self.algolia_venues_client = client.init_index(settings.ALGOLIA_VENUES_INDEX_NAME)
         self.redis_client = current_app.redis_client
 
-    def enqueue_offer_ids(self, offer_ids: Iterable[int]) -> None:
+    def enqueue_offer_ids(self, offer_ids: Iterable[int], low_priority: bool = False) -> None:
         if not offer_ids:
             return
         try:
-            self.redis_client.rpush(REDIS_LIST_OFFER_IDS_NAME, *offer_ids)
+            if low_priority:
+                self.redis_client.sadd(REDIS_LOW_PRIORITY_OFFER_IDS_TO_INDEX, *offer_ids)
+            else:
+                pipeline = self.redis_client.pipeline(transaction=True)
+                pipeline.sadd(REDIS_OFFER_IDS_TO_INDEX, *offer_ids)
+                # No need to index them twice.
+                pipeline.srem(REDIS_LOW_PRIORITY_OFFER_IDS_TO_INDEX, *offer_ids)
+                pipeline.execute()
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
@@ -91,7 +162,7 @@ class AlgoliaBackend(base.SearchBackend):
         if not offer_ids:
             return
         try:
-            self.redis_client.rpush(REDIS_LIST_OFFER_IDS_IN_ERROR_NAME, *offer_ids)
+            self.redis_client.sadd(REDIS_OFFER_IDS_IN_ERROR_TO_INDEX, *offer_ids)
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
@@ -128,13 +199,102 @@ class AlgoliaBackend(base.SearchBackend):
                 "Could not add venues to indexation queue", extra={"venues": venue_ids, "queue": queue_name}
             )
 
-    def pop_offer_ids_from_queue(self, count: int, from_error_queue: bool = False) -> set[int]:
+    def _get_offer_queues(self, from_error_queue: bool) -> tuple[tuple[str, ...], str]:
+        """Return the sets to pop offer ids from (in this order) and the
+        legacy list.
+        """
         if from_error_queue:
-            redis_list_name = REDIS_LIST_OFFER_IDS_IN_ERROR_NAME
-        else:
-            redis_list_name = REDIS_LIST_OFFER_IDS_NAME
+            return (REDIS_OFFER_IDS_IN_ERROR_TO_INDEX,), REDIS_LIST_OFFER_IDS_IN_ERROR_NAME
+        return (REDIS_OFFER_IDS_TO_INDEX, REDIS_LOW_PRIORITY_OFFER_IDS_TO_INDEX), REDIS_LIST_OFFER_IDS_NAME
+
+    def pop_offer_ids_from_queue(self, count: int, from_error_queue: bool = False) -> set[int]:
+        queues, legacy_list_name = self._get_offer_queues(from_error_queue)
+
+        offer_ids = set()
+        for queue in queues:
+            offer_ids |= self._spop(queue, count - len(offer_ids))
+            if len(offer_ids) >= count:
+                return offer_ids
+        return offer_ids | self.redis_lpop(legacy_list_name, count - len(offer_ids))
+
+    def _spop(self, queue: str, count: int) -> set[int]:
+        # `SPOP` is atomic: concurrent cron jobs never get the same ids.
+        try:
+            offer_ids = self.redis_client.spop(queue, count)
+            return {int(offer_id) for offer_id in offer_ids}  # str -> int
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not pop offer ids to index from queue", extra={"queue": queue})
+            return set()
+
+    def lease_offer_ids_from_queue(self, count: int, from_error_queue: bool = False) -> tuple[str, set[int]]:
+        """Pop offer ids from the queue and keep a copy of them until
+        the lease is released. If the lease has not been released
+        before REDIS_OFFER_IDS_LEASE_TIMEOUT (e.g. because the worker
+        has crashed), offer ids are queued again by
+        `requeue_expired_offer_ids_leases()`.
+        """
+        queues, legacy_list_name = self._get_offer_queues(from_error_queue)
+        lease_id = uuid.uuid4().hex
+        expiration = time.time() + settings.REDIS_OFFER_IDS_LEASE_TIMEOUT
+        try:
+            # Offer ids are popped and leased by a single script, which
+            # Redis runs atomically: they cannot be lost in-between.
+            lease_offer_ids = self.redis_client.register_script(LEASE_OFFER_IDS_SCRIPT)
+            offer_ids = lease_offer_ids(
+                keys=[REDIS_OFFER_IDS_LEASE_PREFIX + lease_id, REDIS_OFFER_IDS_LEASES, legacy_list_name, *queues],
+                args=[count, lease_id, expiration],
+            )
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not lease offer ids to index from queue", extra={"queues": queues})
+            return "", set()
+        offer_ids = {int(offer_id) for offer_id in offer_ids}  # str -> int
+        if not offer_ids:
+            return "", offer_ids
+        return lease_id, offer_ids
 
-        return self.redis_lpop(redis_list_name, count)
+    def release_offer_ids_lease(self, lease_id: str) -> None:
+        if not lease_id:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=True)
+            pipeline.delete(REDIS_OFFER_IDS_LEASE_PREFIX + lease_id)
+            pipeline.zrem(REDIS_OFFER_IDS_LEASES, lease_id)
+            pipeline.execute()
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            # The offers will be indexed again, which is harmless.
+            logger.exception("Could not release lease of offer ids", extra={"lease": lease_id})
+        finally:
+            pipeline.reset()
+
+    def requeue_expired_offer_ids_leases(self) -> int:
+        """Queue again offer ids of expired leases, in the error queue.
+        Return the number of expired leases.
+
+        If two workers requeue the same lease at the same time, offer
+        ids are added twice to the queue, which is a set, so it's fine.
+        """
+        try:
+            lease_ids = self.redis_client.zrangebyscore(REDIS_OFFER_IDS_LEASES, "-inf", time.time())
+            for lease_id in lease_ids:
+                offer_ids = self.redis_client.smembers(REDIS_OFFER_IDS_LEASE_PREFIX + lease_id)
+                logger.warning(
+                    "Lease of offer ids has expired, offers will be indexed again",
+                    extra={"lease": lease_id, "offers": offer_ids},
+                )
+                self.enqueue_offer_ids_in_error([int(offer_id) for offer_id in offer_ids])
+                self.release_offer_ids_lease(lease_id)
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not requeue expired leases of offer ids")
+            return 0
+        return len(lease_ids)
 
     def pop_venue_ids_from_queue(self, count: int, from_error_queue: bool = False) -> set[int]:
         if from_error_queue:
@@ -152,53 +312,93 @@ class AlgoliaBackend(base.SearchBackend):
         return self.redis_lpop(REDIS_LIST_VENUE_IDS_FOR_OFFERS_NAME, count)
 
     def count_offers_to_index_from_queue(self, from_error_queue: bool = False) -> int:
-        if from_error_queue:
-            redis_list_name = REDIS_LIST_OFFER_IDS_IN_ERROR_NAME
-        else:
-            redis_list_name = REDIS_LIST_OFFER_IDS_NAME
+        queues, legacy_list_name = self._get_offer_queues(from_error_queue)
         try:
-            return self.redis_client.llen(redis_list_name)
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for queue in queues:
+                pipeline.scard(queue)
+            pipeline.llen(legacy_list_name)
+            return sum(pipeline.execute())
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
             logger.exception("Could not count offers left to index from queue")
             return 0
+        finally:
+            pipeline.reset()
 
     def check_offer_is_indexed(self, offer: offers_models.Offer) -> bool:
+        return self.check_offer_id_is_indexed(offer.id)
+
+    def check_offer_id_is_indexed(self, offer_id: int) -> bool:
         try:
-            return self.redis_client.hexists(REDIS_HASHMAP_INDEXED_OFFERS_NAME, offer.id)
+            return self.redis_client.hexists(REDIS_HASHMAP_INDEXED_OFFERS_NAME, offer_id)
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
-            logger.exception("Could not check whether offer exists in cache", extra={"offer": offer.id})
+            logger.exception("Could not check whether offer exists in cache", extra={"offer": offer_id})
             # This function is only used to avoid an unnecessary
             # deletion request to Algolia if the offer is not in the
             # cache. Here we don't know, so we'll say it's in the
             # cache so that we do perform a request to Algolia.
             return True
 
-    def index_offers(self, offers: Iterable[offers_models.Offer]) -> None:
+    def index_offers(self, offers: Iterable[offers_models.Offer], force: bool = False) -> None:
         if not offers:
             return
-        objects = [self.serialize_offer(offer) for offer in offers]
+        self._index_offer_objects([self.serialize_offer(offer) for offer in offers], force=force)
+
+    def index_offer_rows(self, rows: Iterable, force: bool = False) -> None:
+        if not rows:
+            return
+        self._index_offer_objects([self.serialize_offer_row(row) for row in rows], force=force)
+
+    def _index_offer_objects(self, objects: list[dict], force: bool = False) -> None:
+        """Index the given serialized offers.
+
+        Offers whose document has not changed since they were last
+        indexed are skipped, unless ``force`` is True (e.g. when the
+        index has been lost and must be rebuilt).
+        """
+        digests = {obj["objectID"]: get_offer_digest(obj) for obj in objects}
+        if not force:
+            objects = self._exclude_unchanged_offer_objects(objects, digests)
+        if not objects:
+            return
         self.algolia_offers_client.save_objects(objects)
         try:
-            # We used to store a summary of each offer, which is why
-            # we used hashmap and not a set. But since we don't need
-            # the value anymore, we can store the lightest object
-            # possible to make Redis use less memory. In the future,
-            # we may even remove the hashmap if it's not proven useful
-            # (see log in reindex_offer_ids)
-            offer_ids = [offer.id for offer in offers]
+            # We store a digest of the indexed document, so that we
+            # can skip offers that have not changed the next time
+            # they are reindexed.
+            offer_ids = [obj["objectID"] for obj in objects]
             pipeline = self.redis_client.pipeline(transaction=True)
             for offer_id in offer_ids:
-                pipeline.hset(REDIS_HASHMAP_INDEXED_OFFERS_NAME, offer_id, "")
+                pipeline.hset(REDIS_HASHMAP_INDEXED_OFFERS_NAME, offer_id, digests[offer_id])
             pipeline.execute()
         except Exception:  # pylint: disable=broad-except
             logger.exception("Could not add to list of indexed offers", extra={"offers": offer_ids})
         finally:
             pipeline.reset()
 
+    def _exclude_unchanged_offer_objects(self, objects: list[dict], digests: dict[int, str]) -> list[dict]:
+        offer_ids = [obj["objectID"] for obj in objects]
+        try:
+            indexed_digests = self.redis_client.hmget(REDIS_HASHMAP_INDEXED_OFFERS_NAME, offer_ids)
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not get digests of indexed offers", extra={"offers": offer_ids})
+            return objects
+        changed = [
+            obj for obj, indexed_digest in zip(objects, indexed_digests) if indexed_digest != digests[obj["objectID"]]
+        ]
+        if len(changed) < len(objects):
+            logger.info(
+                "Skipped reindexation of unchanged offers",
+                extra={"count": len(objects) - len(changed)},
+            )
+        return changed
+
     def index_venues(self, venues: Iterable[offerers_models.Venue]) -> None:
         if not venues:
             return
@@ -250,7 +450,9 @@ class AlgoliaBackend(base.SearchBackend):
             ]
         date_created = offer.dateCreated.timestamp()
         stocks_date_created = [stock.dateCreated.timestamp() for stock in offer.bookableStocks]
-        tags = [criterion.name for criterion in offer.criteria]
+        # Sort tags and times, so that the digest of the document does
+        # not depend on the order in which they have been loaded.
+        tags = sorted(criterion.name for criterion in offer.criteria)
         extra_data = offer.extraData or {}
         artist = " ".join(extra_data.get(key, "") for key in ("author", "performer", "speaker", "stageDirector"))
 
@@ -281,7 +483,7 @@ class AlgoliaBackend(base.SearchBackend):
                 "subcategoryId": offer.subcategory.id,
                 "thumbUrl": url_path(offer.thumbUrl),
                 "tags": tags,
-                "times": list(set(times)),
+                "times": sorted(set(times)),
             },
             "offerer": {
                 "name": offerer.name,
@@ -297,6 +499,74 @@ class AlgoliaBackend(base.SearchBackend):
 
         return object_to_index
 
+    @classmethod
+    def serialize_offer_row(cls, row) -> dict:
+        """Serialize a row returned by
+        `offer_queries.get_offer_rows_for_search_indexation()`.
+
+        The result must be identical to what `serialize_offer()`
+        returns for the same offer.
+        """
+        subcategory = subcategories.ALL_SUBCATEGORIES_DICT[row.subcategoryId]
+        prices_sorted = sorted(row.prices, key=float)
+        dates = []
+        times = []
+        if subcategory.is_event:
+            dates = [beginning.timestamp() for beginning in row.beginning_datetimes]
+            times = [date_utils.get_time_in_seconds_from_datetime(beginning) for beginning in row.beginning_datetimes]
+        is_forbidden_to_underage = all(
+            (price > 0 and not subcategory.is_bookable_by_underage_when_not_free)
+            or (price == 0 and not subcategory.is_bookable_by_underage_when_free)
+            for price in row.prices
+        )
+        # Same logic as `Offer.thumbUrl`: use the thumb of the latest
+        # active mediation, if any, and fallback on the product.
+        thumb_url = None
+        if row.mediation_id and row.mediation_thumb_count:
+            thumb_url = _thumb_url("mediations", row.mediation_id)
+        elif row.product_thumb_count:
+            thumb_url = _thumb_url("products", row.product_id)
+        extra_data = row.extra_data or {}
+        artist = " ".join(extra_data.get(key, "") for key in ("author", "performer", "speaker", "stageDirector"))
+        distinct = extra_data.get("isbn") or extra_data.get("visa") or str(row.id)
+
+        return {
+            "distinct": distinct,
+            "objectID": row.id,
+            "offer": {
+                "artist": artist.strip() or None,
+                "rankingWeight": row.rankingWeight,
+                "dateCreated": row.dateCreated.timestamp(),
+                "dates": sorted(dates),
+                "description": remove_stopwords(row.description or ""),
+                "isDigital": bool(row.url),
+                "isDuo": row.isDuo,
+                "isEducational": row.isEducational,
+                "isEvent": subcategory.is_event,
+                "isForbiddenToUnderage": is_forbidden_to_underage,
+                "isThing": not subcategory.is_event,
+                "name": row.name,
+                "prices": prices_sorted,
+                "searchGroupName": subcategory.search_group_name,
+                "stocksDateCreated": sorted(date_created.timestamp() for date_created in row.stocks_date_created),
+                "students": extra_data.get("students") or [],
+                "subcategoryId": subcategory.id,
+                "thumbUrl": url_path(thumb_url),
+                "tags": sorted(row.tags or []),
+                "times": sorted(set(times)),
+            },
+            "offerer": {
+                "name": row.offerer_name,
+            },
+            "venue": {
+                "departmentCode": row.venue_department_code,
+                "id": row.venue_id,
+                "name": row.venue_name,
+                "publicName": row.venue_public_name,
+            },
+            "_geoloc": _geoloc(row.venue_latitude, row.venue_longitude),
+        }
+
     @classmethod
     def serialize_venue(cls, venue: offerers_models.Venue) -> dict:
         social_medias = getattr(venue.contact, "social_medias", {})
@@ -358,6 +628,15 @@ class AlgoliaBackend(base.SearchBackend):
 
 
 def position(venue):
-    latitude = venue.latitude or DEFAULT_LATITUDE
-    longitude = venue.longitude or DEFAULT_LONGITUDE
+    return _geoloc(venue.latitude, venue.longitude)
+
+
+def _geoloc(latitude, longitude):
+    latitude = latitude or DEFAULT_LATITUDE
+    longitude = longitude or DEFAULT_LONGITUDE
     return {"lat": float(latitude), "lng": float(longitude)}
+
+
+def _thumb_url(path_component: str, object_id: int) -> str:
+    # Same as `HasThumbMixin.thumbUrl`, without an ORM object.
+    return f"{settings.OBJECT_STORAGE_URL}/thumbs/{path_component}/{humanize(object_id)}"
@@ -11,7 +11,7 @@ class SearchBackend:
     def __str__(self) -> str:  # useful in logs
         return str(self.__class__.__name__)
 
-    def enqueue_offer_ids(self, offer_ids: Iterable[int]) -> None:
+    def enqueue_offer_ids(self, offer_ids: Iterable[int], low_priority: bool = False) -> None:
         raise NotImplementedError()
 
     def enqueue_offer_ids_in_error(self, offer_ids: Iterable[int]) -> None:
@@ -29,6 +29,15 @@ class SearchBackend:
     def pop_offer_ids_from_queue(self, count: int, from_error_queue: bool = False) -> set[int]:
         raise NotImplementedError()
 
+    def lease_offer_ids_from_queue(self, count: int, from_error_queue: bool = False) -> tuple[str, set[int]]:
+        raise NotImplementedError()
+
+    def release_offer_ids_lease(self, lease_id: str) -> None:
+        raise NotImplementedError()
+
+    def requeue_expired_offer_ids_leases(self) -> int:
+        raise NotImplementedError()
+
     def pop_venue_ids_for_offers_from_queue(self, count: int) -> set[int]:
         raise NotImplementedError()
 
@@ -38,7 +47,13 @@ class SearchBackend:
     def check_offer_is_indexed(self, offer: "offers_models.Offer") -> bool:
         raise NotImplementedError()
 
-    def index_offers(self, offers: "Iterable[offers_models.Offer]") -> None:
+    def check_offer_id_is_indexed(self, offer_id: int) -> bool:
+        raise NotImplementedError()
+
+    def index_offers(self, offers: "Iterable[offers_models.Offer]", force: bool = False) -> None:
+        raise NotImplementedError()
+
+    def index_offer_rows(self, rows: Iterable, force: bool = False) -> None:
         raise NotImplementedError()
 
     def index_venues(self, offers: "Iterable[offerers_models.Venue]") -> None:
@@ -59,10 +74,20 @@ class SearchBackend:
     def pop_venue_ids_from_queue(self, count: int, from_queue: bool = False) -> set[int]:
         raise NotImplementedError()
 
+    def search_offers(self, query: str = "", **kwargs: typing.Any) -> dict:
+        raise NotImplementedError()
+
+    def search_venues(self, query: str = "", **kwargs: typing.Any) -> dict:
+        raise NotImplementedError()
+
     @classmethod
     def serialize_offer(cls, offer: "offers_models.Offer") -> dict:
         raise NotImplementedError()
 
+    @classmethod
+    def serialize_offer_row(cls, row) -> dict:
+        raise NotImplementedError()
+
     @classmethod
     def serialize_venue(cls, venue: "offerers_models.Venue") -> dict:
         raise NotImplementedError()
@@ -0,0 +1,444 @@
+import decimal
+import json
+import math
+import os
+import sqlite3
+import threading
+from typing import Any
+from typing import Iterable
+from typing import Optional
+import unicodedata
+
+from flask import current_app
+
+from pcapi import settings
+
+from .algolia import AlgoliaBackend
+from .algolia import WORD_SPLITTER
+from .algolia import get_offer_digest
+
+
+EARTH_RADIUS_IN_METERS = 6_371_000
+METERS_PER_DEGREE_OF_LATITUDE = math.pi * EARTH_RADIUS_IN_METERS / 180
+
+# Attributes that are searched by full-text queries, like the
+# "searchableAttributes" setting of our Algolia indices.
+OFFER_SEARCHABLE_ATTRIBUTES = (
+    "offer.name",
+    "offer.artist",
+    "offer.description",
+    "offer.tags",
+    "venue.name",
+    "venue.publicName",
+    "offerer.name",
+)
+VENUE_SEARCHABLE_ATTRIBUTES = ("name", "offerer_name", "description", "city", "tags")
+# Attributes that can be used in filters and facets, like the
+# "attributesForFaceting" setting of our Algolia indices.
+OFFER_FACET_ATTRIBUTES = (
+    "offer.dates",
+    "offer.isDigital",
+    "offer.isDuo",
+    "offer.isEducational",
+    "offer.isEvent",
+    "offer.isForbiddenToUnderage",
+    "offer.isThing",
+    "offer.prices",
+    "offer.searchGroupName",
+    "offer.students",
+    "offer.subcategoryId",
+    "offer.tags",
+    "offer.times",
+    "venue.departmentCode",
+    "venue.id",
+)
+VENUE_FACET_ATTRIBUTES = (
+    "audio_disability",
+    "mental_disability",
+    "motor_disability",
+    "tags",
+    "venue_type",
+    "visual_disability",
+)
+
+# Documents are stored as JSON in `search_object`. Words of their
+# searchable attributes are indexed in the `search_text` full-text
+# index (with the same `rowid`), and values of their facet attributes
+# in `search_value`, so that the whole query runs in SQLite.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_object (
+    id INTEGER PRIMARY KEY,
+    indexName TEXT NOT NULL,
+    objectID INTEGER NOT NULL,
+    document TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    lat REAL,
+    lng REAL,
+    rankingWeight REAL NOT NULL DEFAULT 0,
+    UNIQUE (indexName, objectID)
+);
+CREATE INDEX IF NOT EXISTS search_object_lat ON search_object (indexName, lat);
+CREATE TABLE IF NOT EXISTS search_value (
+    objectId INTEGER NOT NULL,
+    attribute TEXT NOT NULL,
+    value TEXT NOT NULL,
+    number REAL
+);
+CREATE INDEX IF NOT EXISTS search_value_object ON search_value (objectId);
+CREATE INDEX IF NOT EXISTS search_value_value ON search_value (attribute, value, objectId);
+CREATE INDEX IF NOT EXISTS search_value_number ON search_value (attribute, number, objectId);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_text USING fts5(text, tokenize = 'unicode61 remove_diacritics 2');
+"""
+
+_connections: dict[tuple[int, str], sqlite3.Connection] = {}
+# A connection is shared by all threads of a process (e.g. the threads
+# that reindex offers concurrently), which must not use it at the same
+# time.
+_lock = threading.RLock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    # Connections are not inherited by forked processes (e.g. RQ
+    # workers), as SQLite does not support it.
+    key = (os.getpid(), settings.LOCAL_SEARCH_DATABASE)
+    with _lock:
+        if key not in _connections:
+            connection = sqlite3.connect(key[1], timeout=30, check_same_thread=False)
+            if key[1] != ":memory:":
+                # Let other processes read while we write.
+                connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(SCHEMA)
+            connection.create_function("distance", 4, get_distance, deterministic=True)
+            _connections[key] = connection
+        return _connections[key]
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> list[str]:
+    return [word for word in WORD_SPLITTER.split(_normalize(text)) if word]
+
+
+def get_attribute(obj: dict, path: str) -> Any:
+    """Return the value of a dotted attribute (e.g. ``offer.prices``)."""
+    value: Any = obj
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _as_list(value: Any) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def _json_default(value: Any) -> Any:
+    # Like the Algolia client, send `Decimal` prices as numbers.
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+def _facet_value(value: Any) -> str:
+    if isinstance(value, decimal.Decimal):
+        value = float(value)
+    return str(value)
+
+
+def _placeholders(values: list) -> str:
+    return ", ".join("?" * len(values))
+
+
+def get_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> Optional[float]:
+    """Return the distance in meters between two points (haversine
+    formula).
+    """
+    if lat1 is None or lng1 is None:
+        return None
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_IN_METERS * math.asin(math.sqrt(a))
+
+
+class LocalIndex:
+    """An index that stores documents as sent to Algolia in a SQLite
+    database (see `settings.LOCAL_SEARCH_DATABASE`) and answers a
+    subset of Algolia queries: full-text, facet filters, numeric
+    filters, facet counts and geo-radius.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        searchable_attributes: Iterable[str],
+        facet_attributes: Iterable[str] = (),
+        ranking_attribute: Optional[str] = None,
+    ):
+        self.name = name
+        self.searchable_attributes = tuple(searchable_attributes)
+        self.facet_attributes = tuple(facet_attributes)
+        self.ranking_attribute = ranking_attribute
+
+    def _get_searchable_text(self, obj: dict) -> str:
+        values = []
+        for path in self.searchable_attributes:
+            values.extend(str(value) for value in _as_list(get_attribute(obj, path)) if value)
+        return "\n".join(values)
+
+    def _get_facet_values(self, object_id: int, obj: dict) -> Iterable[tuple]:
+        for path in self.facet_attributes:
+            for value in _as_list(get_attribute(obj, path)):
+                if value is None:
+                    continue
+                is_number = isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool)
+                yield object_id, path, _facet_value(value), float(value) if is_number else None
+
+    def save_objects(self, objects: Iterable[dict]) -> None:
+        objects = list(objects)
+        if not objects:
+            return
+        with _lock, _get_connection() as connection:
+            self._delete_objects(connection, [obj["objectID"] for obj in objects])
+            for obj in objects:
+                geoloc = obj.get("_geoloc") or {}
+                ranking = get_attribute(obj, self.ranking_attribute) if self.ranking_attribute else None
+                cursor = connection.execute(
+                    "INSERT INTO search_object (indexName, objectID, document, digest, lat, lng, rankingWeight) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.name,
+                        obj["objectID"],
+                        json.dumps(obj, default=_json_default),
+                        get_offer_digest(obj),
+                        geoloc.get("lat"),
+                        geoloc.get("lng"),
+                        ranking or 0,
+                    ),
+                )
+                object_id = cursor.lastrowid
+                connection.execute(
+                    "INSERT INTO search_text (rowid, text) VALUES (?, ?)",
+                    (object_id, self._get_searchable_text(obj)),
+                )
+                connection.executemany(
+                    "INSERT INTO search_value (objectId, attribute, value, number) VALUES (?, ?, ?, ?)",
+                    self._get_facet_values(object_id, obj),
+                )
+
+    def delete_objects(self, object_ids: Iterable[int]) -> None:
+        object_ids = list(object_ids)
+        if not object_ids:
+            return
+        with _lock, _get_connection() as connection:
+            self._delete_objects(connection, object_ids)
+
+    def _delete_objects(self, connection: sqlite3.Connection, object_ids: list[int]) -> None:
+        ids = [
+            id_
+            for id_, in connection.execute(
+                f"SELECT id FROM search_object WHERE indexName = ? AND objectID IN ({_placeholders(object_ids)})",
+                [self.name, *object_ids],
+            )
+        ]
+        if not ids:
+            return
+        for statement in (
+            "DELETE FROM search_value WHERE objectId IN ({})",
+            "DELETE FROM search_text WHERE rowid IN ({})",
+            "DELETE FROM search_object WHERE id IN ({})",
+        ):
+            connection.execute(statement.format(_placeholders(ids)), ids)
+
+    def clear_objects(self) -> None:
+        ids = "SELECT id FROM search_object WHERE indexName = ?"
+        with _lock, _get_connection() as connection:
+            connection.execute(f"DELETE FROM search_value WHERE objectId IN ({ids})", [self.name])
+            connection.execute(f"DELETE FROM search_text WHERE rowid IN ({ids})", [self.name])
+            connection.execute("DELETE FROM search_object WHERE indexName = ?", [self.name])
+
+    def get_digests(self, object_ids: Iterable[int]) -> dict[int, str]:
+        """Return the digest (see `get_offer_digest()`) of the given
+        objects, as they were when they were saved.
+        """
+        object_ids = list(object_ids)
+        if not object_ids:
+            return {}
+        with _lock, _get_connection() as connection:
+            rows = connection.execute(
+                "SELECT objectID, digest FROM search_object "
+                f"WHERE indexName = ? AND objectID IN ({_placeholders(object_ids)})",
+                [self.name, *object_ids],
+            )
+            return dict(rows.fetchall())
+
+    def _get_filters(  # pylint: disable=too-many-arguments
+        self,
+        query: str,
+        facet_filters: dict[str, Any],
+        numeric_filters: dict[str, tuple[Optional[float], Optional[float]]],
+        around_lat_lng: Optional[tuple[float, float]],
+        around_radius: Optional[float],
+    ) -> tuple[str, list]:
+        """Return the WHERE clause (on ``search_object o``) and its
+        parameters.
+        """
+        clauses = ["o.indexName = ?"]
+        params: list = [self.name]
+        words = tokenize(query)
+        if words:
+            # As Algolia does by default, the last word is a prefix.
+            match = " ".join(f'"{word}"' for word in words) + "*"
+            clauses.append("o.id IN (SELECT rowid FROM search_text WHERE search_text MATCH ?)")
+            params.append(match)
+        for path, expected in facet_filters.items():
+            self._check_facet_attribute(path)
+            values = [_facet_value(value) for value in _as_list(expected)]
+            # Subqueries are not correlated, so that they are run once
+            # (using the indices on values) and not for each object.
+            clauses.append(
+                "o.id IN (SELECT objectId FROM search_value "
+                f"WHERE attribute = ? AND value IN ({_placeholders(values)}))"
+            )
+            params.extend([path, *values])
+        for path, (minimum, maximum) in numeric_filters.items():
+            self._check_facet_attribute(path)
+            clause = "o.id IN (SELECT objectId FROM search_value WHERE attribute = ? AND number IS NOT NULL"
+            params.append(path)
+            if minimum is not None:
+                clause += " AND number >= ?"
+                params.append(minimum)
+            if maximum is not None:
+                clause += " AND number <= ?"
+                params.append(maximum)
+            clauses.append(clause + ")")
+        if around_lat_lng:
+            lat, lng = around_lat_lng
+            if around_radius is None:
+                clauses.append("o.lat IS NOT NULL")
+            else:
+                # Use the index on latitude before computing distances.
+                delta = around_radius / METERS_PER_DEGREE_OF_LATITUDE
+                clauses.append("o.lat BETWEEN ? AND ? AND distance(o.lat, o.lng, ?, ?) <= ?")
+                params.extend([lat - delta, lat + delta, lat, lng, around_radius])
+        return " AND ".join(clauses), params
+
+    def _check_facet_attribute(self, path: str) -> None:
+        if path not in self.facet_attributes:
+            raise ValueError(f"Attribute {path} is not a facet of index {self.name}")
+
+    def search(  # pylint: disable=too-many-arguments
+        self,
+        query: str = "",
+        facet_filters: Optional[dict[str, Any]] = None,
+        numeric_filters: Optional[dict[str, tuple[Optional[float], Optional[float]]]] = None,
+        around_lat_lng: Optional[tuple[float, float]] = None,
+        around_radius: Optional[float] = None,
+        facets: Iterable[str] = (),
+        page: int = 0,
+        hits_per_page: int = 20,
+    ) -> dict:
+        """Search objects and return a response that looks like the
+        response of Algolia.
+
+        - ``facet_filters`` maps an attribute to a value or a list of
+          values (that are OR-ed), e.g.
+          ``{"offer.subcategoryId": ["LIVRE_PAPIER", "SEANCE_CINE"]}``;
+        - ``numeric_filters`` maps an attribute to a ``(min, max)``
+          tuple (inclusive, ``None`` means no bound), e.g.
+          ``{"offer.prices": (0, 20)}``;
+        - ``around_lat_lng`` and ``around_radius`` (in meters) restrict
+          results to objects whose ``_geoloc`` is within the radius.
+          Results are then sorted by distance.
+
+        Filtered attributes and ``facets`` must be facet attributes of
+        the index. For attributes whose value is a list (e.g. prices),
+        an object matches if any of its values match.
+        """
+        for facet in facets:
+            self._check_facet_attribute(facet)
+        where, params = self._get_filters(
+            query, facet_filters or {}, numeric_filters or {}, around_lat_lng, around_radius
+        )
+        distance, distance_params = (
+            ("distance(o.lat, o.lng, ?, ?)", list(around_lat_lng)) if around_lat_lng else ("0", [])
+        )
+
+        with _lock, _get_connection() as connection:
+            nb_hits = connection.execute(f"SELECT COUNT(*) FROM search_object o WHERE {where}", params).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT o.document, {distance} AS distance FROM search_object o WHERE {where} "
+                "ORDER BY distance, o.rankingWeight DESC, o.objectID LIMIT ? OFFSET ?",
+                [*distance_params, *params, hits_per_page, page * hits_per_page],
+            ).fetchall()
+            facet_counts = {
+                facet: dict(
+                    connection.execute(
+                        "SELECT v.value, COUNT(DISTINCT v.objectId) FROM search_value v WHERE v.attribute = ? "
+                        f"AND v.objectId IN (SELECT o.id FROM search_object o WHERE {where}) GROUP BY v.value",
+                        [facet, *params],
+                    ).fetchall()
+                )
+                for facet in facets
+            }
+
+        hits = []
+        for document, hit_distance in rows:
+            hit = json.loads(document)
+            if around_lat_lng:
+                hit["_rankingInfo"] = {"geoDistance": round(hit_distance)}
+            hits.append(hit)
+        return {
+            "hits": hits,
+            "nbHits": nb_hits,
+            "page": page,
+            "nbPages": math.ceil(nb_hits / hits_per_page) if hits_per_page else 0,
+            "hitsPerPage": hits_per_page,
+            "facets": facet_counts,
+            "query": query,
+        }
+
+
+offers_index = LocalIndex("offers", OFFER_SEARCHABLE_ATTRIBUTES, OFFER_FACET_ATTRIBUTES, "offer.rankingWeight")
+venues_index = LocalIndex("venues", VENUE_SEARCHABLE_ATTRIBUTES, VENUE_FACET_ATTRIBUTES)
+
+
+class LocalBackend(AlgoliaBackend):
+    """A backend that stores documents in a local SQLite database and
+    can be queried, to run the search locally (e.g. for development or
+    load tests) without an Algolia account.
+
+    We subclass a real-looking backend to be as close as possible to
+    what we have in production: documents are serialized the same
+    way and Redis is used for the queue. Only the external search
+    service is replaced by local indices.
+    """
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        self.algolia_offers_client = offers_index
+        self.algolia_venues_client = venues_index
+        self.redis_client = current_app.redis_client
+
+    def check_offer_id_is_indexed(self, offer_id: int) -> bool:
+        # The Redis cache may be out of sync with the index (e.g. if
+        # Redis has been flushed): look at the index itself.
+        return bool(offers_index.get_digests([offer_id]))
+
+    def _exclude_unchanged_offer_objects(self, objects: list[dict], digests: dict[int, str]) -> list[dict]:
+        indexed_digests = offers_index.get_digests(digests)
+        return [obj for obj in objects if indexed_digests.get(obj["objectID"]) != digests[obj["objectID"]]]
+
+    def search_offers(self, query: str = "", **kwargs: Any) -> dict:
+        """Search offers. See `LocalIndex.search()` for arguments."""
+        return offers_index.search(query, **kwargs)
+
+    def search_venues(self, query: str = "", **kwargs: Any) -> dict:
+        """Search venues. See `LocalIndex.search()` for arguments."""
+        return venues_index.search(query, **kwargs)
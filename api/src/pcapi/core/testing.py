@@ -14,6 +14,7 @@ import sqlalchemy.event
 import sqlalchemy.orm
 
 from pcapi import settings
+from pcapi.models import feature
 from pcapi.models.feature import Feature
 
 
@@ -264,6 +265,7 @@ class override_features(TestContextDecorator):
         if flask.has_request_context():
             if hasattr(flask.request, "_cached_features"):
                 flask.request._cached_features = {}  # pylint: disable=assigning-non-slot
+        feature.clear_cache()
 
     def disable(self):
         for name, status in self.apply_to_revert.items():
@@ -272,6 +274,7 @@ class override_features(TestContextDecorator):
         if flask.has_request_context():
             if hasattr(flask.request, "_cached_features"):
                 flask.request._cached_features = {}  # pylint: disable=assigning-non-slot
+        feature.clear_cache()
 
 
 def clean_temporary_files(test_function):
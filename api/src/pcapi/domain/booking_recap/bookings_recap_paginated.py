@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pcapi.domain.booking_recap.booking_recap import BookingRecap
 
 
@@ -8,8 +10,10 @@ class BookingsRecapPaginated:
         page: int,
         pages: int,
         total: int,
+        next_page_cursor: Optional[str] = None,
     ):
         self.bookings_recap = bookings_recap
         self.page = page
         self.pages = pages
         self.total = total
+        self.next_page_cursor = next_page_cursor
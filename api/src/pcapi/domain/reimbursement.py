@@ -1,15 +1,32 @@
+import bisect
 from collections import defaultdict
 from dataclasses import dataclass
 import datetime
 from decimal import Decimal
+import logging
+import time
 from typing import Optional
+import uuid
 
+from flask import current_app
+import redis
+import sqlalchemy as sa
+import sqlalchemy.orm as sa_orm
+
+from pcapi import settings
 from pcapi.core.bookings.models import Booking
 from pcapi.core.categories import subcategories
 from pcapi.core.finance import conf as finance_conf
 from pcapi.core.offers.models import Offer
 import pcapi.core.payments.models as payments_models
+from pcapi.models import db
+
+
+logger = logging.getLogger(__name__)
+
 
+REDIS_CUSTOM_RULE_FINDER_VERSION = "payments:custom-reimbursement-rules:version"
+CUSTOM_RULE_FINDER_TTL = 60 * 60  # seconds
 
 # A new set rules are in effect as of 1 September 2021 (i.e. 31 August 22:00 UTC)
 SEPTEMBER_2021 = datetime.datetime(2021, 9, 1) - datetime.timedelta(hours=2)
@@ -213,25 +230,146 @@ class BookingReimbursement:
 
 
 class CustomRuleFinder:
+    """Find the custom reimbursement rule (if any) that applies to a
+    booking.
+
+    Rules are indexed by offer and by (offerer, subcategory), and
+    sorted by the start of their timespan. Since rules of the same
+    offer (or offerer and subcategory) cannot overlap (see
+    `payments.validation._check_reimbursement_rule_conflicts()`),
+    finding the rule of a booking is a dict lookup followed by a
+    bisection and a single interval check.
+    """
+
     def __init__(self):
         self.rules = payments_models.CustomReimbursementRule.query.all()
-        self.rules_by_offer = self._partition_by_field("offerId")
-        self.rules_by_offerer = self._partition_by_field("offererId")
+        self.rules_by_offer = self._index(((rule.offerId,), rule) for rule in self.rules if rule.offerId)
+        self.rules_by_offerer = self._index(
+            ((rule.offererId, subcategory_id), rule)
+            for rule in self.rules
+            if rule.offererId
+            for subcategory_id in (rule.subcategories or [None])
+        )
 
-    def _partition_by_field(self, field: str):
-        cache = {}
-        for rule in self.rules:
-            cache.setdefault(getattr(rule, field), []).append(rule)
-        return cache
+    @staticmethod
+    def _index(items) -> dict[tuple, tuple[list[datetime.datetime], list[payments_models.CustomReimbursementRule]]]:
+        rules_by_key = defaultdict(list)
+        for key, rule in items:
+            rules_by_key[key].append(rule)
+        index = {}
+        for key, rules in rules_by_key.items():
+            rules.sort(key=lambda rule: rule.timespan.lower)
+            index[key] = ([rule.timespan.lower for rule in rules], rules)
+        return index
+
+    @staticmethod
+    def _find_active(index, key: tuple, date: datetime.datetime) -> Optional[payments_models.CustomReimbursementRule]:
+        if key not in index:
+            return None
+        starts, rules = index[key]
+        position = bisect.bisect_right(starts, date)
+        if not position:
+            return None
+        rule = rules[position - 1]
+        if rule.timespan.upper is not None and date >= rule.timespan.upper:
+            return None
+        return rule
 
     def get_rule(self, booking: Booking) -> Optional[payments_models.CustomReimbursementRule]:
-        for rule in self.rules_by_offer.get(booking.stock.offerId, ()):
-            if rule.matches(booking):
-                return rule
-        for rule in self.rules_by_offerer.get(booking.offererId, ()):
-            if rule.matches(booking):
-                return rule
-        return None
+        rule = self._find_active(self.rules_by_offer, (booking.stock.offerId,), booking.dateUsed)
+        if rule:
+            return rule
+        subcategory_id = booking.stock.offer.subcategoryId
+        return self._find_active(
+            self.rules_by_offerer, (booking.offererId, subcategory_id), booking.dateUsed
+        ) or self._find_active(self.rules_by_offerer, (booking.offererId, None), booking.dateUsed)
+
+
+_custom_rule_finder: Optional[CustomRuleFinder] = None
+_custom_rule_finder_version: Optional[str] = None
+_custom_rule_finder_built_at: float = 0
+
+
+def get_custom_rule_finder() -> CustomRuleFinder:
+    """Return a `CustomRuleFinder` that is shared by all callers of
+    the process.
+
+    The finder is rebuilt when rules have been modified (by this
+    process or another one, see `invalidate_custom_rule_finder()`), or
+    after `CUSTOM_RULE_FINDER_TTL` seconds, just in case.
+
+    Rules of a shared finder are detached from the database session:
+    use their columns (e.g. `rule.id`), not their relationships.
+    """
+    global _custom_rule_finder, _custom_rule_finder_version, _custom_rule_finder_built_at  # pylint: disable=global-statement
+
+    try:
+        version = current_app.redis_client.get(REDIS_CUSTOM_RULE_FINDER_VERSION)
+        if version is None:
+            version = _set_new_custom_rule_finder_version()
+    except redis.exceptions.RedisError:
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not get version of custom reimbursement rules")
+        version = None
+
+    is_expired = time.monotonic() - _custom_rule_finder_built_at > CUSTOM_RULE_FINDER_TTL
+    if _custom_rule_finder is None or version is None or version != _custom_rule_finder_version or is_expired:
+        finder = CustomRuleFinder()
+        for rule in finder.rules:
+            db.session.expunge(rule)
+        _custom_rule_finder = finder
+        _custom_rule_finder_version = version
+        _custom_rule_finder_built_at = time.monotonic()
+    return _custom_rule_finder
+
+
+def invalidate_custom_rule_finder() -> None:
+    """Make all processes rebuild their `CustomRuleFinder` the next
+    time they call `get_custom_rule_finder()`.
+    """
+    global _custom_rule_finder  # pylint: disable=global-statement
+
+    _custom_rule_finder = None
+    try:
+        _set_new_custom_rule_finder_version()
+    except redis.exceptions.RedisError:
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not invalidate custom reimbursement rules")
+
+
+def _set_new_custom_rule_finder_version() -> str:
+    version = uuid.uuid4().hex
+    current_app.redis_client.set(REDIS_CUSTOM_RULE_FINDER_VERSION, version)
+    return version
+
+
+# Rules are modified through `payments.api`, the admin and some
+# scripts. Instead of having each of them invalidate the shared
+# finder, we do it whenever a rule is flushed, and again when the
+# transaction is committed (so that another process that would have
+# rebuilt its finder in between does not miss the change).
+def _on_custom_rule_change(mapper, connection, target):  # pylint: disable=unused-argument
+    session = sa_orm.object_session(target)
+    if session is not None:
+        session.info["custom_reimbursement_rules_changed"] = True
+    invalidate_custom_rule_finder()
+
+
+def _on_commit(session):
+    if session.info.pop("custom_reimbursement_rules_changed", False):
+        invalidate_custom_rule_finder()
+
+
+def _on_rollback(session, previous_transaction):  # pylint: disable=unused-argument
+    session.info.pop("custom_reimbursement_rules_changed", None)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    sa.event.listen(payments_models.CustomReimbursementRule, _event, _on_custom_rule_change)
+sa.event.listen(sa_orm.Session, "after_commit", _on_commit)
+sa.event.listen(sa_orm.Session, "after_soft_rollback", _on_rollback)
 
 
 def find_all_booking_reimbursements(
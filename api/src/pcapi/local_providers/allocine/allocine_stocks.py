@@ -1,10 +1,15 @@
 from datetime import datetime
+import hashlib
+import json
+import logging
 import re
 from typing import Optional
 from typing import Union
 
 from dateutil import tz
 from dateutil.parser import parse
+from flask import current_app
+import redis
 from sqlalchemy import Sequence
 
 from pcapi import settings
@@ -26,6 +31,9 @@ from pcapi.utils.date import DEFAULT_STORED_TIMEZONE
 from pcapi.utils.date import get_department_timezone
 
 
+logger = logging.getLogger(__name__)
+
+
 DIGITAL_PROJECTION = "DIGITAL"
 DUBBED_VERSION = "DUBBED"
 LOCAL_VERSION = "LOCAL"
@@ -33,17 +41,36 @@ ORIGINAL_VERSION = "ORIGINAL"
 FRENCH_VERSION_SUFFIX = "VF"
 ORIGINAL_VERSION_SUFFIX = "VO"
 
+# Fingerprints of the movies of a theater (and of the whole response)
+# as of the last synchronization: unchanged movies are skipped. They
+# expire so that a full synchronization still happens regularly.
+REDIS_FINGERPRINTS_KEY_TEMPLATE = "allocine:venue-provider:{venue_provider_id}:fingerprints"
+REDIS_RESPONSE_FINGERPRINT_FIELD = "response"
+# URL of the poster that has been stored as the thumb of a movie.
+REDIS_POSTER_URL_KEY_TEMPLATE = "allocine:movie:{movie_id}:poster-url"
+FINGERPRINTS_TTL = 7 * 24 * 60 * 60  # 7 days
+
 
 class AllocineStocks(LocalProvider):
     name = "Allociné"
     can_create = True
 
-    def __init__(self, allocine_venue_provider: AllocineVenueProvider):
+    def __init__(
+        self,
+        allocine_venue_provider: AllocineVenueProvider,
+        theater_showtimes: Optional[list[tuple[dict, Optional[str]]]] = None,
+    ):
+        """`theater_showtimes` may be given if it has already been
+        fetched with `fetch_theater_showtimes()`.
+        """
         super().__init__(allocine_venue_provider)
         self.api_key = settings.ALLOCINE_API_KEY
         self.venue = allocine_venue_provider.venue
         self.theater_id = allocine_venue_provider.venueIdAtOfferProvider
-        self.movies_showtimes = get_movies_showtimes(self.api_key, self.theater_id)
+        if theater_showtimes is None:
+            theater_showtimes = fetch_theater_showtimes(
+                self.api_key, self.theater_id, get_settings_fingerprint(allocine_venue_provider)
+            )
         self.isDuo = allocine_venue_provider.isDuo
         self.quantity = allocine_venue_provider.quantity
         self.room_internal_id = allocine_venue_provider.internalId
@@ -53,9 +80,32 @@ class AllocineStocks(LocalProvider):
         self.last_product_id = None
         self.last_vf_offer_id = None
         self.last_vo_offer_id = None
+        self.download_poster = True
+
+        self.movies_count = len(theater_showtimes)
+        self.response_fingerprint = _get_fingerprint([fingerprint for _, fingerprint in theater_showtimes])
+        self.previous_fingerprints = self._get_previous_fingerprints()
+        # Fingerprints of the movies returned by `__next__`. They are
+        # only saved for movies whose objects have all been saved
+        # without errors.
+        self.fingerprints: dict[str, str] = {}
+        self.errored_movie_ids: set[str] = set()
+        self.movie_id: Optional[str] = None
+        self.poster_urls: dict[str, str] = {}
+        self.skippedMovies = 0
+        if self.previous_fingerprints.get(REDIS_RESPONSE_FINGERPRINT_FIELD) == self.response_fingerprint:
+            logger.info("Allociné showtimes of venue_provider=%s have not changed", allocine_venue_provider.id)
+            self.skippedMovies = self.movies_count
+            theater_showtimes = []
+        self.movies_showtimes = iter(theater_showtimes)
 
     def __next__(self) -> list[ProvidableInfo]:
-        raw_movie_information = next(self.movies_showtimes)
+        raw_movie_information, fingerprint = next(self.movies_showtimes)
+        self.download_poster = True
+        movie_id = self.movie_id = _get_movie_id(raw_movie_information)
+        if fingerprint and self.previous_fingerprints.get(movie_id) == fingerprint:
+            self.skippedMovies += 1
+            return []
         try:
             self.movie_information = retrieve_movie_information(raw_movie_information["node"]["movie"])
             self.filtered_movie_showtimes = _filter_only_digital_and_non_experience_showtimes(
@@ -66,6 +116,8 @@ class AllocineStocks(LocalProvider):
                 LocalProviderEventType.SyncError, f"Error parsing movie for theater {self.venue.siret}"
             )
             return []
+        if fingerprint:
+            self.fingerprints[movie_id] = fingerprint
 
         showtimes_number = len(self.filtered_movie_showtimes)
         providable_information_list = [
@@ -100,6 +152,67 @@ class AllocineStocks(LocalProvider):
 
         return providable_information_list
 
+    def _get_previous_fingerprints(self) -> dict[str, str]:
+        key = REDIS_FINGERPRINTS_KEY_TEMPLATE.format(venue_provider_id=self.venue_provider.id)
+        try:
+            return current_app.redis_client.hgetall(key)
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not get Allociné fingerprints of venue_provider=%s", self.venue_provider.id)
+            return {}
+
+    def handle_providable_error(self, providable_info: ProvidableInfo) -> None:
+        # The movie must be synchronized again next time.
+        self.errored_movie_ids.add(self.movie_id)
+        if self.movie_information and "id" in self.movie_information:
+            self.poster_urls.pop(self.movie_information["id"], None)
+
+    def _save_fingerprints(self) -> None:
+        fingerprints = {
+            movie_id: fingerprint
+            for movie_id, fingerprint in self.fingerprints.items()
+            if movie_id not in self.errored_movie_ids
+        }
+        if len(fingerprints) + self.skippedMovies == self.movies_count:
+            # All movies are up to date.
+            fingerprints[REDIS_RESPONSE_FINGERPRINT_FIELD] = self.response_fingerprint
+        key = REDIS_FINGERPRINTS_KEY_TEMPLATE.format(venue_provider_id=self.venue_provider.id)
+        try:
+            pipeline = current_app.redis_client.pipeline(transaction=False)
+            if fingerprints:
+                pipeline.hset(key, mapping=fingerprints)
+            if not self.previous_fingerprints:
+                # Do not postpone the expiration of existing fingerprints.
+                pipeline.expire(key, FINGERPRINTS_TTL)
+            for movie_id, poster_url in self.poster_urls.items():
+                pipeline.set(REDIS_POSTER_URL_KEY_TEMPLATE.format(movie_id=movie_id), poster_url, ex=FINGERPRINTS_TTL)
+            pipeline.execute()
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not save Allociné fingerprints of venue_provider=%s", self.venue_provider.id)
+
+    def _has_poster_changed(self) -> bool:
+        key = REDIS_POSTER_URL_KEY_TEMPLATE.format(movie_id=self.movie_information["id"])
+        try:
+            return current_app.redis_client.get(key) != self.movie_information.get("poster_url")
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not get poster URL of Allociné movie %s", self.movie_information["id"])
+            return True
+
+    def updateObjects(self, limit=None):
+        super().updateObjects(limit)
+        # Only reached if the synchronization did not fail.
+        self._save_fingerprints()
+        logger.info(
+            "Synchronized Allociné movies of venue_provider=%s",
+            self.venue_provider.id,
+            extra={"movies": self.movies_count, "skipped_movies": self.skippedMovies},
+        )
+
     def fill_object_attributes(self, pc_object: Model):
         if isinstance(pc_object, Product):
             self.fill_product_attributes(pc_object)
@@ -133,7 +246,10 @@ class AllocineStocks(LocalProvider):
     def fill_product_attributes(self, allocine_product: Product):
         allocine_product.name = self.movie_information["title"]
         allocine_product.subcategoryId = subcategories.SEANCE_CINE.id
-        allocine_product.thumbCount = 0
+        # Download the poster again only if it has changed.
+        self.download_poster = not allocine_product.thumbCount or self._has_poster_changed()
+        if self.download_poster:
+            allocine_product.thumbCount = 0
 
         self.update_from_movie_information(allocine_product, self.movie_information)
 
@@ -216,15 +332,72 @@ class AllocineStocks(LocalProvider):
         raise AllocineStocksPriceRule("Aucun prix par défaut n'a été trouvé")
 
     def get_object_thumb(self) -> bytes:
-        if "poster_url" in self.movie_information:
+        if "poster_url" in self.movie_information and self.download_poster:
             image_url = self.movie_information["poster_url"]
-            return get_movie_poster(image_url)
+            poster = get_movie_poster(image_url)
+            if "id" in self.movie_information:
+                self.poster_urls[self.movie_information["id"]] = image_url
+            return poster
         return bytes()
 
     def get_object_thumb_index(self) -> int:
         return 1
 
 
+def get_settings_fingerprint(allocine_venue_provider: AllocineVenueProvider) -> str:
+    """Return a fingerprint of the settings of the venue provider (and
+    of its venue) that are used to build offers and stocks: if they
+    change, all movies must be synchronized again.
+    """
+    venue = allocine_venue_provider.venue
+    return _get_fingerprint(
+        [
+            allocine_venue_provider.isDuo,
+            allocine_venue_provider.quantity,
+            allocine_venue_provider.internalId,
+            sorted((rule.priceRule.name, str(rule.price)) for rule in allocine_venue_provider.priceRules),
+            venue.id,
+            venue.siret,
+            venue.departementCode,
+            venue.bookingEmail,
+            venue.withdrawalDetails,
+        ]
+    )
+
+
+def fetch_theater_showtimes(
+    api_key: str, theater_id: str, settings_fingerprint: str
+) -> list[tuple[dict, Optional[str]]]:
+    """Return showtimes of each movie of the theater, with the
+    fingerprint of the movie (or None if the movie cannot be
+    identified).
+
+    This function does not use the database, so that it can be called
+    from another thread.
+    """
+    return [
+        (raw_movie_information, _get_movie_fingerprint(raw_movie_information, settings_fingerprint))
+        for raw_movie_information in get_movies_showtimes(api_key, theater_id)
+    ]
+
+
+def _get_fingerprint(data: object) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _get_movie_id(raw_movie_information: dict) -> Optional[str]:
+    try:
+        return raw_movie_information["node"]["movie"]["id"]
+    except (KeyError, TypeError):
+        return None
+
+
+def _get_movie_fingerprint(raw_movie_information: dict, settings_fingerprint: str) -> Optional[str]:
+    if _get_movie_id(raw_movie_information) is None:
+        return None
+    return _get_fingerprint([settings_fingerprint, raw_movie_information])
+
+
 def get_next_product_id_from_database():
     sequence = Sequence("product_id_seq")
     return db.session.execute(sequence)
@@ -1,22 +1,50 @@
+from collections import defaultdict
+from typing import Iterable
 from typing import Optional
 
 from pcapi.local_providers.providable_info import ProvidableInfo
 from pcapi.models import Model
 from pcapi.repository.providable_queries import get_existing_object
+from pcapi.repository.providable_queries import get_existing_objects
 from pcapi.repository.providable_queries import insert_chunk
 from pcapi.repository.providable_queries import update_chunk
 
 
 def get_existing_pc_obj(
-    providable_info: ProvidableInfo, chunk_to_insert: dict, chunk_to_update: dict
+    providable_info: ProvidableInfo,
+    chunk_to_insert: dict,
+    chunk_to_update: dict,
+    existing_objects: Optional[dict[str, Optional[Model]]] = None,
 ) -> Optional[Model]:
     object_in_current_chunk = get_object_from_current_chunks(providable_info, chunk_to_insert, chunk_to_update)
     if object_in_current_chunk is None:
+        chunk_key = f"{providable_info.id_at_providers}|{providable_info.type.__name__}"
+        if existing_objects is not None and chunk_key in existing_objects:
+            return existing_objects[chunk_key]
         return get_existing_object(providable_info.type, providable_info.id_at_providers)
 
     return object_in_current_chunk
 
 
+def get_existing_pc_objs(providable_infos: Iterable[ProvidableInfo]) -> dict[str, Optional[Model]]:
+    """Fetch existing objects of the given providable infos, with one
+    query per model type.
+
+    Return a dictionary indexed by chunk keys. The value is `None` if
+    the object does not exist in the database.
+    """
+    ids_by_type = defaultdict(set)
+    for providable_info in providable_infos:
+        ids_by_type[providable_info.type].add(providable_info.id_at_providers)
+
+    existing_objects = {}
+    for model_type, ids_at_providers in ids_by_type.items():
+        found = get_existing_objects(model_type, ids_at_providers)
+        for id_at_providers in ids_at_providers:
+            existing_objects[f"{id_at_providers}|{model_type.__name__}"] = found.get(id_at_providers)
+    return existing_objects
+
+
 def get_object_from_current_chunks(
     providable_info: ProvidableInfo, chunk_to_insert: dict, chunk_to_update: dict
 ) -> Optional[Model]:
@@ -30,9 +58,16 @@ def get_object_from_current_chunks(
     return None
 
 
-def save_chunks(chunk_to_insert: dict[str, Model], chunk_to_update: dict[str, Model]):
+def save_chunks(chunk_to_insert: dict[str, Model], chunk_to_update: dict[str, Model]) -> dict[str, list[int]]:
+    """Save chunks and return ids of inserted or updated objects,
+    indexed by model name.
+    """
+    ids = defaultdict(list)
     if len(chunk_to_insert) > 0:
-        insert_chunk(chunk_to_insert)
+        for model_name, inserted_ids in insert_chunk(chunk_to_insert).items():
+            ids[model_name].extend(inserted_ids)
 
     if len(chunk_to_update) > 0:
-        update_chunk(chunk_to_update)
+        for model_name, updated_ids in update_chunk(chunk_to_update).items():
+            ids[model_name].extend(updated_ids)
+    return dict(ids)
@@ -1,16 +1,21 @@
 from abc import abstractmethod
 from collections.abc import Iterator
 from datetime import datetime
+import itertools
 import logging
+from typing import Optional
 
+from pcapi import settings
 from pcapi.connectors.thumb_storage import create_thumb
 from pcapi.core import search
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.local_providers.chunk_manager import get_existing_pc_obj
+from pcapi.local_providers.chunk_manager import get_existing_pc_objs
 from pcapi.local_providers.chunk_manager import save_chunks
 from pcapi.local_providers.providable_info import ProvidableInfo
+from pcapi.local_providers.thumb_pipeline import ThumbPipeline
 from pcapi.models import Model
 from pcapi.models import db
 from pcapi.models.api_errors import ApiErrors
@@ -26,9 +31,26 @@ logger = logging.getLogger(__name__)
 
 
 CHUNK_MAX_SIZE = 1000
+# Maximum number of providable infos that are read ahead (for
+# providers that support it, see `LocalProvider.read_ahead_attributes`)
+# so that existing objects can be fetched in bulk.
+READ_AHEAD_MAX_SIZE = 1000
 
 
 class LocalProvider(Iterator):
+    # Names of the attributes that `__next__` sets and that are later
+    # used by `fill_object_attributes()` and the thumb-related methods.
+    # If set, `updateObjects()` reads ahead many providable infos and
+    # restores these attributes before processing each of them.
+    # `__next__` must assign new values to these attributes, not
+    # modify them in place. If empty, providable infos are processed
+    # as soon as `__next__` returns them.
+    read_ahead_attributes: tuple[str, ...] = ()
+    # If set, thumbs are standardized and uploaded in the background
+    # by a `ThumbPipeline` and unchanged images are skipped. Objects
+    # must have a `thumbHashes` attribute.
+    process_thumbs_in_background = False
+
     def __init__(self, venue_provider=None, **options):
         self.venue_provider = venue_provider
         self.updatedObjects = 0
@@ -39,6 +61,8 @@ class LocalProvider(Iterator):
         self.updatedThumbs = 0
         self.checkedThumbs = 0
         self.erroredThumbs = 0
+        self.skippedThumbs = 0
+        self.thumb_pipeline: Optional[ThumbPipeline] = None
         self.provider = get_provider_by_local_class(self.__class__.__name__)
 
     @property
@@ -73,18 +97,48 @@ class LocalProvider(Iterator):
     def name(self):
         pass
 
-    def _handle_thumb(self, pc_object: Model):
+    def handle_providable_error(self, providable_info: ProvidableInfo) -> None:
+        """Called when the object (or the thumb) of a providable info
+        could not be saved because of an error. The error has already
+        been logged.
+        """
+
+    def _handle_thumb(self, pc_object: Model) -> bool:
+        """Return True if the object has been modified by a thumb that is
+        processed in the background.
+        """
         new_thumb_index = self.get_object_thumb_index()
         if new_thumb_index == 0:
-            return
+            return False
         self.checkedThumbs += 1
 
         new_thumb = self.get_object_thumb()
         if not new_thumb:
-            return
+            return False
+
+        if self.thumb_pipeline:
+            if not self.thumb_pipeline.add(pc_object, new_thumb_index, new_thumb):
+                self.skippedThumbs += 1
+                return False
+            return True
 
         _save_same_thumb_from_thumb_count_to_index(pc_object, new_thumb_index, new_thumb)
         self.createdThumbs += new_thumb_index
+        return False
+
+    def _wait_for_thumbs(self) -> None:
+        """Wait for thumbs that are processed in the background, so that
+        the thumb count of objects that are about to be saved is right.
+        """
+        if not self.thumb_pipeline:
+            return
+        for pending in self.thumb_pipeline.wait():
+            if pending.error:
+                self.log_provider_event(LocalProviderEventType.SyncError, pending.error.__class__.__name__)
+                self.erroredThumbs += 1
+                logger.info("ERROR during handle thumb: %s", pending.error, exc_info=pending.error)
+            else:
+                self.createdThumbs += pending.thumb_index
 
     def _create_object(self, providable_info: ProvidableInfo) -> Model:
         pc_object = providable_info.type()
@@ -143,16 +197,44 @@ class LocalProvider(Iterator):
             self.erroredObjects,
         )
         logger.info(
-            "Synchronization of thumbs of venue=%s, checked=%d, created=%d, updated=%d, errors=%s",
+            "Synchronization of thumbs of venue=%s, checked=%d, created=%d, updated=%d, skipped=%d, errors=%s",
             venue_id,
             self.checkedThumbs,
             self.createdThumbs,
             self.updatedThumbs,
+            self.skippedThumbs,
             self.erroredThumbs,
         )
 
+    def _read_ahead(self, limit=None) -> Iterator[list[tuple[dict, list[ProvidableInfo]]]]:
+        """Yield windows of providable infos, along with the state of
+        the provider (see `read_ahead_attributes`) when each list of
+        providable infos was returned by `__next__`.
+        """
+        max_size = READ_AHEAD_MAX_SIZE if self.read_ahead_attributes else 1
+        exhausted = False
+        while not exhausted:
+            window = []
+            size = 0
+            while size < max_size:
+                # Do not read beyond the limit. If some objects end up
+                # being skipped, the next window reads more.
+                objects_limit_reached = limit and self.checkedObjects + size >= limit
+                if objects_limit_reached:
+                    break
+                try:
+                    providable_infos = next(self)
+                except StopIteration:
+                    exhausted = True
+                    break
+                state = {attribute: getattr(self, attribute, None) for attribute in self.read_ahead_attributes}
+                window.append((state, providable_infos))
+                size += len(providable_infos) or 1
+            if not window:
+                return
+            yield window
+
     def updateObjects(self, limit=None):
-        # pylint: disable=too-many-nested-blocks
         if self.venue_provider and not self.venue_provider.isActive:
             logger.info("Venue provider %s is inactive", self.venue_provider)
             return
@@ -165,77 +247,17 @@ class LocalProvider(Iterator):
         # TODO (asaunier,2021-03-18): We may replace this log in BDD with logs in the monitoring system
         self.log_provider_event(LocalProviderEventType.SyncStart)
 
-        chunk_to_insert = {}
-        chunk_to_update = {}
-
-        for providable_infos in self:
-            objects_limit_reached = limit and self.checkedObjects >= limit
-            if objects_limit_reached:
-                break
-
-            has_no_providables_info = len(providable_infos) == 0
-            if has_no_providables_info:
-                self.checkedObjects += 1
-                continue
-
-            for providable_info in providable_infos:
-                chunk_key = providable_info.id_at_providers + "|" + str(providable_info.type.__name__)
-                pc_object = get_existing_pc_obj(providable_info, chunk_to_insert, chunk_to_update)
-
-                if pc_object is None:
-                    if not self.can_create:
-                        continue
-
-                    try:
-                        pc_object = self._create_object(providable_info)
-                        chunk_to_insert[chunk_key] = pc_object
-                    except ApiErrors:
-                        continue
-                else:
-                    last_update_for_current_provider = get_last_update_for_provider(self.provider.id, pc_object)
-                    object_need_update = (
-                        last_update_for_current_provider is None
-                        or last_update_for_current_provider < providable_info.date_modified_at_provider
-                    )
-
-                    if object_need_update:
-                        try:
-                            self._handle_update(pc_object, providable_info)
-                            if chunk_key in chunk_to_insert:
-                                chunk_to_insert[chunk_key] = pc_object
-                            else:
-                                chunk_to_update[chunk_key] = pc_object
-                        except ApiErrors:
-                            continue
-
-                if isinstance(pc_object, HasThumbMixin):
-                    initial_thumb_count = pc_object.thumbCount
-                    try:
-                        self._handle_thumb(pc_object)
-                    except Exception as e:  # pylint: disable=broad-except
-                        self.log_provider_event(LocalProviderEventType.SyncError, e.__class__.__name__)
-                        self.erroredThumbs += 1
-                        logger.info("ERROR during handle thumb: %s", e, exc_info=True)
-                    pc_object_has_new_thumbs = pc_object.thumbCount != initial_thumb_count
-                    if pc_object_has_new_thumbs:
-                        errors = entity_validator.validate(pc_object)
-                        if errors and len(errors.errors) > 0:
-                            self.log_provider_event(LocalProviderEventType.SyncError, "ApiErrors")
-                            continue
-
-                        chunk_to_update[chunk_key] = pc_object
-
-                self.checkedObjects += 1
-
-                if len(chunk_to_insert) + len(chunk_to_update) >= CHUNK_MAX_SIZE:
-                    save_chunks(chunk_to_insert, chunk_to_update)
-                    _reindex_offers(list(chunk_to_insert.values()) + list(chunk_to_update.values()))
-                    chunk_to_insert = {}
-                    chunk_to_update = {}
-
-        if len(chunk_to_insert) + len(chunk_to_update) > 0:
-            save_chunks(chunk_to_insert, chunk_to_update)
-            _reindex_offers(list(chunk_to_insert.values()) + list(chunk_to_update.values()))
+        if self.process_thumbs_in_background:
+            self.thumb_pipeline = ThumbPipeline(
+                processes=settings.THUMBS_STANDARDIZATION_PROCESSES,
+                upload_workers=settings.THUMBS_UPLOAD_WORKERS,
+            )
+        try:
+            self._update_objects(limit)
+        finally:
+            if self.thumb_pipeline:
+                self.thumb_pipeline.shutdown()
+                self.thumb_pipeline = None
 
         self._print_objects_summary()
         self.log_provider_event(LocalProviderEventType.SyncEnd)
@@ -244,6 +266,93 @@ class LocalProvider(Iterator):
             self.venue_provider.lastSyncDate = datetime.utcnow()
             repository.save(self.venue_provider)
 
+    def _update_objects(self, limit):
+        # pylint: disable=too-many-nested-blocks
+        chunk_to_insert = {}
+        chunk_to_update = {}
+
+        for window in self._read_ahead(limit):
+            existing_objects = get_existing_pc_objs(
+                providable_info for _state, providable_infos in window for providable_info in providable_infos
+            )
+            for state, providable_infos in window:
+                for attribute, value in state.items():
+                    setattr(self, attribute, value)
+
+                has_no_providables_info = len(providable_infos) == 0
+                if has_no_providables_info:
+                    self.checkedObjects += 1
+                    continue
+
+                for providable_info in providable_infos:
+                    chunk_key = providable_info.id_at_providers + "|" + str(providable_info.type.__name__)
+                    pc_object = get_existing_pc_obj(providable_info, chunk_to_insert, chunk_to_update, existing_objects)
+
+                    if pc_object is None:
+                        if not self.can_create:
+                            continue
+
+                        try:
+                            pc_object = self._create_object(providable_info)
+                            chunk_to_insert[chunk_key] = pc_object
+                        except ApiErrors:
+                            self.handle_providable_error(providable_info)
+                            continue
+                    else:
+                        last_update_for_current_provider = get_last_update_for_provider(self.provider.id, pc_object)
+                        object_need_update = (
+                            last_update_for_current_provider is None
+                            or last_update_for_current_provider < providable_info.date_modified_at_provider
+                        )
+
+                        if object_need_update:
+                            try:
+                                self._handle_update(pc_object, providable_info)
+                                if chunk_key in chunk_to_insert:
+                                    chunk_to_insert[chunk_key] = pc_object
+                                else:
+                                    chunk_to_update[chunk_key] = pc_object
+                            except ApiErrors:
+                                self.handle_providable_error(providable_info)
+                                continue
+
+                    if isinstance(pc_object, HasThumbMixin):
+                        initial_thumb_count = pc_object.thumbCount
+                        pc_object_has_new_thumbs = False
+                        try:
+                            pc_object_has_new_thumbs = self._handle_thumb(pc_object)
+                        except Exception as e:  # pylint: disable=broad-except
+                            self.log_provider_event(LocalProviderEventType.SyncError, e.__class__.__name__)
+                            self.erroredThumbs += 1
+                            logger.info("ERROR during handle thumb: %s", e, exc_info=True)
+                            self.handle_providable_error(providable_info)
+                        pc_object_has_new_thumbs |= pc_object.thumbCount != initial_thumb_count
+                        if pc_object_has_new_thumbs:
+                            errors = entity_validator.validate(pc_object)
+                            if errors and len(errors.errors) > 0:
+                                self.log_provider_event(LocalProviderEventType.SyncError, "ApiErrors")
+                                self.handle_providable_error(providable_info)
+                                continue
+
+                            chunk_to_update[chunk_key] = pc_object
+
+                    self.checkedObjects += 1
+
+                    if len(chunk_to_insert) + len(chunk_to_update) >= CHUNK_MAX_SIZE:
+                        self._wait_for_thumbs()
+                        _reindex_offers(save_chunks(chunk_to_insert, chunk_to_update))
+                        # Saved objects cannot be found in the chunks
+                        # anymore: they must be looked up again in the
+                        # database if they appear later in the window.
+                        for saved_chunk_key in itertools.chain(chunk_to_insert, chunk_to_update):
+                            existing_objects.pop(saved_chunk_key, None)
+                        chunk_to_insert = {}
+                        chunk_to_update = {}
+
+        self._wait_for_thumbs()
+        if len(chunk_to_insert) + len(chunk_to_update) > 0:
+            _reindex_offers(save_chunks(chunk_to_insert, chunk_to_update))
+
 
 def _save_same_thumb_from_thumb_count_to_index(pc_object: Model, thumb_index: int, image_as_bytes: bytes):
     if pc_object.thumbCount is None:  # handle unsaved object
@@ -258,11 +367,16 @@ def _save_same_thumb_from_thumb_count_to_index(pc_object: Model, thumb_index: in
             pc_object.thumbCount += 1
 
 
-def _reindex_offers(created_or_updated_objects):
-    offer_ids = set()
-    for obj in created_or_updated_objects:
-        if isinstance(obj, Stock):
-            offer_ids.add(obj.offerId)
-        elif isinstance(obj, Offer):
-            offer_ids.add(obj.id)
-    search.async_index_offer_ids(offer_ids)
+def _reindex_offers(saved_ids: dict[str, list[int]]) -> None:
+    """Reindex offers that have been saved, or whose stocks have been
+    saved, given the ids returned by `save_chunks()`.
+
+    Saved objects are expired, so we use their ids instead of loading
+    them again one by one.
+    """
+    offer_ids = set(saved_ids.get(Offer.__name__, []))
+    stock_ids = saved_ids.get(Stock.__name__)
+    if stock_ids:
+        stocks = Stock.query.filter(Stock.id.in_(stock_ids)).with_entities(Stock.offerId).distinct()
+        offer_ids.update(offer_id for offer_id, in stocks)
+    search.async_index_offer_ids(offer_ids, low_priority=True)
@@ -1,8 +1,20 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 import logging
+import time
+from typing import Callable
+from typing import Iterable
+from typing import Optional
 
+import flask
 from sqlalchemy.orm.util import aliased
 
+from pcapi import settings
 import pcapi.connectors.notion as notion_connector
+from pcapi.core.providers import product_lookup
 from pcapi.core.providers.models import Provider
 from pcapi.core.providers.models import VenueProvider
 from pcapi.models import db
@@ -13,7 +25,17 @@ from . import synchronize_provider_api
 logger = logging.getLogger(__name__)
 
 
-def synchronize_stocks() -> None:
+def synchronize_stocks(workers: Optional[int] = None, workers_per_provider: Optional[int] = None) -> None:
+    """Synchronize stocks of all active venue providers of API
+    providers, least recently synchronized first.
+
+    If `workers` is greater than 1, venue providers are synchronized
+    concurrently, with at most `workers_per_provider` venue providers
+    of the same provider at a time.
+    """
+    workers = workers or settings.PROVIDER_API_SYNC_WORKERS
+    workers_per_provider = workers_per_provider or settings.PROVIDER_API_SYNC_WORKERS_PER_PROVIDER
+
     # Alias for provider table, and explicit "on" clause for the "join", are mandatory because
     # VenueProvider model already has a "select" on the provider table for its polymorphic query
     provider_alias = aliased(Provider)
@@ -27,22 +49,124 @@ def synchronize_stocks() -> None:
         .all()
     )
 
-    for venue_provider in venue_providers:
-        # We need to stock these values inside variables to prevent a crash
-        # if the session is broken and we need to log them
-        venue_id = venue_provider.venueId
-        venue_provider_id = venue_provider.id
-        venue_id_at_offer_provider = venue_provider.venueIdAtOfferProvider
-        provider_name = venue_provider.provider.name
-
-        try:
-            synchronize_provider_api.synchronize_venue_provider(venue_provider)
-        except Exception as exc:  # pylint: disable=broad-except
-            logger.exception("Could not synchronize venue_provider=%s: %s", venue_provider_id, exc)
-            notion_connector.add_to_synchronization_error_database(
-                exception=exc,
-                provider_name=provider_name,
-                venue_id=venue_id,
-                venue_id_at_offer_provider=venue_id_at_offer_provider,
-            )
-            db.session.rollback()
+    product_lookup.warm_up()
+
+    start = time.perf_counter()
+    if workers <= 1:
+        durations = {}
+        for venue_provider in venue_providers:
+            venue_provider_id = venue_provider.id
+            venue_provider_start = time.perf_counter()
+            _synchronize_venue_provider(venue_provider)
+            durations[venue_provider_id] = time.perf_counter() - venue_provider_start
+    else:
+        app = flask.current_app._get_current_object()
+        durations = run_by_provider(
+            [(venue_provider.providerId, venue_provider.id) for venue_provider in venue_providers],
+            lambda venue_provider_id: _synchronize_venue_provider_in_thread(app, venue_provider_id),
+            workers=workers,
+            workers_per_provider=workers_per_provider,
+        )
+
+    duration = time.perf_counter() - start
+    logger.info(
+        "Synchronized stocks of API venue providers",
+        extra={
+            "venue_providers": len(durations),
+            "workers": workers,
+            "duration": duration,
+            "venue_providers_per_second": len(durations) / duration if duration else None,
+            "slowest_venue_providers": sorted(durations, key=durations.get, reverse=True)[:10],
+        },
+    )
+
+
+def run_by_provider(
+    items: Iterable[tuple[int, int]],
+    task: Callable[[int], None],
+    workers: int,
+    workers_per_provider: int,
+) -> dict[int, float]:
+    """Run ``task(item_id)`` for each ``(provider_id, item_id)`` item in
+    a pool of `workers` threads, with at most `workers_per_provider`
+    tasks of the same provider at a time.
+
+    Items are started in the given order, except that items of a
+    provider that already runs `workers_per_provider` tasks wait
+    without holding a thread, so that a slow provider does not delay
+    the others.
+
+    Return the duration of each task, indexed by item id.
+    """
+    # Items are queued by provider, along with their position in the
+    # given order.
+    queues: dict[int, deque] = {}
+    for position, (provider_id, item_id) in enumerate(items):
+        queues.setdefault(provider_id, deque()).append((position, item_id))
+    running = {provider_id: 0 for provider_id in queues}
+    futures: dict[Future, tuple[int, int]] = {}
+    durations = {}
+
+    def timed_task(item_id: int) -> float:
+        start = time.perf_counter()
+        task(item_id)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(futures) < workers:
+                available = [
+                    provider_id
+                    for provider_id, queue in queues.items()
+                    if queue and running[provider_id] < workers_per_provider
+                ]
+                if not available:
+                    break
+                # Start the first pending item among providers that
+                # can run one more task.
+                provider_id = min(available, key=lambda provider_id: queues[provider_id][0][0])
+                _position, item_id = queues[provider_id].popleft()
+                futures[executor.submit(timed_task, item_id)] = (provider_id, item_id)
+                running[provider_id] += 1
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider_id, item_id = futures.pop(future)
+                running[provider_id] -= 1
+                try:
+                    durations[item_id] = future.result()
+                except Exception:  # pylint: disable=broad-except
+                    # Errors are handled by the task itself. This is a
+                    # safety net, so that the other tasks still run.
+                    logger.exception("Unexpected error in task of item=%s of provider=%s", item_id, provider_id)
+    return durations
+
+
+def _synchronize_venue_provider_in_thread(app: flask.Flask, venue_provider_id: int) -> None:
+    # Each thread has its own application context and thus its own
+    # database session.
+    with app.app_context():
+        venue_provider = VenueProvider.query.get(venue_provider_id)
+        _synchronize_venue_provider(venue_provider)
+
+
+def _synchronize_venue_provider(venue_provider: VenueProvider) -> None:
+    # We need to stock these values inside variables to prevent a crash
+    # if the session is broken and we need to log them
+    venue_id = venue_provider.venueId
+    venue_provider_id = venue_provider.id
+    venue_id_at_offer_provider = venue_provider.venueIdAtOfferProvider
+    provider_name = venue_provider.provider.name
+
+    try:
+        synchronize_provider_api.synchronize_venue_provider(venue_provider)
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("Could not synchronize venue_provider=%s: %s", venue_provider_id, exc)
+        notion_connector.add_to_synchronization_error_database(
+            exception=exc,
+            provider_name=provider_name,
+            venue_id=venue_id,
+            venue_id_at_offer_provider=venue_id_at_offer_provider,
+        )
+        db.session.rollback()
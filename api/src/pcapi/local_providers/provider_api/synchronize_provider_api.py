@@ -1,12 +1,19 @@
 from datetime import datetime
 from decimal import Decimal
 import logging
+import queue
+import threading
 import time
+from typing import Any
 from typing import Counter
 from typing import Generator
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
 
 from sqlalchemy.sql.sqltypes import DateTime
 
+from pcapi import settings
 from pcapi.core.providers.api import synchronize_stocks
 from pcapi.core.providers.models import Provider
 from pcapi.core.providers.models import StockDetail
@@ -14,12 +21,22 @@ from pcapi.core.providers.models import VenueProvider
 from pcapi.infrastructure.repository.stock_provider.provider_api import ProviderAPI
 from pcapi.repository import repository
 from pcapi.utils.custom_keys import compute_venue_reference
+from pcapi.utils.timing import timed
 
 
 logger = logging.getLogger(__name__)
 
 
-def synchronize_venue_provider(venue_provider: VenueProvider) -> None:
+def synchronize_venue_provider(venue_provider: VenueProvider, prefetch_pages: Optional[int] = None) -> None:
+    """Synchronize stocks of the venue with the provider API.
+
+    If `prefetch_pages` is greater than 0, pages of the provider API
+    are fetched in a separate thread, while the previous pages are
+    saved in the database (with at most `prefetch_pages` pages
+    waiting to be saved).
+    """
+    if prefetch_pages is None:
+        prefetch_pages = settings.PROVIDER_API_PREFETCH_PAGES
     venue = venue_provider.venue
     provider = venue_provider.provider
     start_sync_date = datetime.utcnow()
@@ -29,17 +46,28 @@ def synchronize_venue_provider(venue_provider: VenueProvider) -> None:
     provider_api = provider.getProviderAPI()
 
     stats = Counter()
-    for raw_stocks in _get_stocks_by_batch(
-        venue_provider.venueIdAtOfferProvider, provider_api, venue_provider.lastSyncDate
-    ):
+    timings: dict[str, float] = {}
+    n_stocks = 0
+    pages = _get_stocks_by_batch(venue_provider.venueIdAtOfferProvider, provider_api, venue_provider.lastSyncDate)
+    if prefetch_pages > 0:
+        pages = _prefetch(pages, prefetch_pages)
+    while True:
+        # With prefetch, this is the time spent waiting for a page
+        # that has not been downloaded yet.
+        with timed(timings, "http_wait"):
+            raw_stocks = next(pages, None)
+        if raw_stocks is None:
+            break
         stock_details = _build_stock_details_from_raw_stocks(
             raw_stocks, venue_provider.venueIdAtOfferProvider, provider, venue.id
         )
-        operations = synchronize_stocks(stock_details, venue, provider_id=provider.id)
+        operations = synchronize_stocks(stock_details, venue, provider_id=provider.id, timings=timings)
         stats += Counter(operations)
+        n_stocks += len(raw_stocks)
 
     venue_provider.lastSyncDate = start_sync_date
     repository.save(venue_provider)
+    duration = time.perf_counter() - start
     logger.info(
         "Ended synchronization of venue=%s provider=%s",
         venue.id,
@@ -47,12 +75,69 @@ def synchronize_venue_provider(venue_provider: VenueProvider) -> None:
         extra={
             "venue": venue.id,
             "provider": provider.name,
-            "duration": time.perf_counter() - start,
+            "duration": duration,
+            "stocks": n_stocks,
+            "stocks_per_second": n_stocks / duration if duration else None,
+            **{f"{stage}_duration": stage_duration for stage, stage_duration in timings.items()},
             **stats,
         },
     )
 
 
+class _PrefetchError:
+    def __init__(self, exception: Exception):
+        self.exception = exception
+
+
+_PREFETCH_END = object()
+
+
+def _prefetch(iterable: Iterable, size: int) -> Iterator:
+    """Iterate over `iterable` in a separate thread, keeping at most
+    `size` items ahead of the caller.
+
+    Exceptions raised by `iterable` are raised again in the caller.
+    The iterable must not use the database session, which is not
+    thread-safe.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as exc:  # pylint: disable=broad-except
+            put(_PrefetchError(exc))
+            return
+        put(_PREFETCH_END)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _PREFETCH_END:
+                return
+            if isinstance(item, _PrefetchError):
+                raise item.exception
+            yield item
+    finally:
+        # If the caller stops early (or fails), stop the producer.
+        stopped.set()
+        producer.join()
+
+
 def _get_stocks_by_batch(siret: str, provider_api: ProviderAPI, modified_since: DateTime) -> Generator:
     last_processed_provider_reference = ""
 
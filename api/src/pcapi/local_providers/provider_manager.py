@@ -1,9 +1,13 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from typing import Callable
 from typing import Optional
 
+from pcapi import settings
 from pcapi.core.providers.models import VenueProvider
 import pcapi.local_providers
+from pcapi.local_providers.allocine import allocine_stocks
 from pcapi.local_providers.local_provider import LocalProvider
 from pcapi.local_providers.provider_api import synchronize_provider_api
 from pcapi.repository.venue_provider_queries import get_active_venue_providers_for_specific_provider
@@ -29,6 +33,45 @@ def synchronize_venue_providers_for_provider(provider_id: int, limit: Optional[i
         synchronize_venue_provider(venue_provider, limit)
 
 
+def synchronize_allocine_venue_providers(provider_id: int, workers: Optional[int] = None) -> None:
+    """Synchronize Allociné venue providers one at a time, while the
+    showtimes of the next `workers` theaters are downloaded and
+    compared with the previous synchronization in a pool of threads.
+
+    Database writes are not concurrent, because products (movies) are
+    shared by all theaters.
+    """
+    workers = workers or settings.ALLOCINE_SYNC_WORKERS
+    venue_providers = iter(get_active_venue_providers_for_specific_provider(provider_id))
+    pending: deque = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def fetch_next() -> None:
+            venue_provider = next(venue_providers, None)
+            if venue_provider is None:
+                return
+            future = executor.submit(
+                allocine_stocks.fetch_theater_showtimes,
+                settings.ALLOCINE_API_KEY,
+                venue_provider.venueIdAtOfferProvider,
+                allocine_stocks.get_settings_fingerprint(venue_provider),
+            )
+            pending.append((venue_provider, future))
+
+        for _ in range(workers):
+            fetch_next()
+        while pending:
+            venue_provider, future = pending.popleft()
+            fetch_next()
+            try:
+                theater_showtimes = future.result()
+            except Exception:  # pylint: disable=broad-except
+                # Let the provider download them again and report the error.
+                theater_showtimes = None
+            synchronize_venue_provider(venue_provider, theater_showtimes=theater_showtimes)
+
+
 def do_update(provider: LocalProvider, limit: Optional[int]):
     try:
         provider.updateObjects(limit)
@@ -40,7 +83,7 @@ def get_local_provider_class_by_name(class_name: str) -> Callable:
     return getattr(pcapi.local_providers, class_name)
 
 
-def synchronize_venue_provider(venue_provider: VenueProvider, limit: Optional[int] = None):
+def synchronize_venue_provider(venue_provider: VenueProvider, limit: Optional[int] = None, **provider_options):
     if venue_provider.provider.implements_provider_api:
         synchronize_provider_api.synchronize_venue_provider(venue_provider)
 
@@ -54,7 +97,7 @@ def synchronize_venue_provider(venue_provider: VenueProvider, limit: Optional[in
             venue_provider.provider.localClass,
         )
         try:
-            provider = provider_class(venue_provider)
+            provider = provider_class(venue_provider, **provider_options)
             do_update(provider, limit)
         except Exception:  # pylint: disable=broad-except
             logger.exception(build_cron_log_message(name=provider_class.__name__, status=CronStatus.FAILED))
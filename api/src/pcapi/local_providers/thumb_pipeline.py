@@ -0,0 +1,155 @@
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import multiprocessing
+from typing import Optional
+
+from pcapi.connectors import thumb_storage
+from pcapi.models import Model
+from pcapi.utils import image_conversion
+
+
+def get_thumb_hash(image_as_bytes: bytes) -> str:
+    return hashlib.sha256(image_as_bytes).hexdigest()
+
+
+@dataclass
+class PendingThumb:
+    pc_object: Model
+    thumb_index: int
+    thumb_hash: str
+    previous_thumb_count: int
+    # None if the first thumb (and thus its variants) is not replaced
+    previous_has_thumb_variants: Optional[bool]
+    future: Future
+    error: Optional[Exception] = None
+
+
+class ThumbPipeline:
+    """Standardize thumbs in a pool of processes (that work is
+    CPU-bound) and upload them in a pool of threads, while the
+    provider keeps reading its data.
+
+    Objects must have a `thumbHashes` attribute: the hash of the
+    source image is stored there, so that an image that has already
+    been uploaded at the same index is skipped.
+
+    If `processes` is 0, images are standardized in the upload
+    threads.
+    """
+
+    def __init__(self, processes: int, upload_workers: int):
+        self.standardization_pool = None
+        if processes > 0:
+            # Do not fork: the parent process has database connections
+            # and threads that must not be shared with children.
+            self.standardization_pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        self.upload_pool = ThreadPoolExecutor(max(upload_workers, 1))
+        self.pending: list[PendingThumb] = []
+        self.skipped_thumbs = 0
+
+    def add(self, pc_object: Model, thumb_index: int, image_as_bytes: bytes) -> bool:
+        """Schedule the standardization and the upload of a thumb, like
+        `local_provider._save_same_thumb_from_thumb_count_to_index()`
+        does, and update `thumbCount` and `thumbHashes` of the object
+        as if it had succeeded (see `wait()`).
+
+        Return False if the same image has already been uploaded at
+        this index.
+        """
+        thumb_count = pc_object.thumbCount or 0
+        thumb_hashes = pc_object.thumbHashes or {}
+        thumb_hash = get_thumb_hash(image_as_bytes)
+        if thumb_index <= thumb_count:
+            if thumb_hashes.get(str(thumb_index)) == thumb_hash:
+                self.skipped_thumbs += 1
+                return False
+            # replace existing thumb
+            indexes = [thumb_index]
+        else:
+            # add new thumbs
+            indexes = list(range(thumb_count, thumb_index))
+        # Like `thumb_storage.create_thumb()`, store all variants of
+        # the first thumb.
+        variants = image_conversion.THUMB_VARIANTS if 0 in indexes else (image_conversion.STANDARD_VARIANT,)
+        storage_ids = [
+            (pc_object.get_thumb_storage_id(index, variant), variant)
+            for index in indexes
+            for variant in (variants if index == 0 else (image_conversion.STANDARD_VARIANT,))
+        ]
+
+        standardization = None
+        if self.standardization_pool:
+            standardization = self.standardization_pool.submit(
+                image_conversion.standardize_image_variants,
+                image_as_bytes,
+                ratio=image_conversion.IMAGE_RATIO_PORTRAIT_DEFAULT,
+                variants=variants,
+            )
+            image_as_bytes = None
+        future = self.upload_pool.submit(_standardize_and_store, image_as_bytes, standardization, variants, storage_ids)
+        previous_has_thumb_variants = bool(pc_object.hasThumbVariants) if 0 in indexes else None
+        self.pending.append(
+            PendingThumb(pc_object, thumb_index, thumb_hash, thumb_count, previous_has_thumb_variants, future)
+        )
+
+        if 0 in indexes:
+            pc_object.hasThumbVariants = True
+        pc_object.thumbCount = max(thumb_count, thumb_index)
+        # Assign a new dictionary so that the change is detected by SQLAlchemy.
+        pc_object.thumbHashes = {**thumb_hashes, str(thumb_index): thumb_hash}
+        return True
+
+    def wait(self) -> list[PendingThumb]:
+        """Wait for all scheduled thumbs and return them, with their
+        error if they could not be stored. In that case, the thumb
+        count of the object is restored and the hash is removed, so
+        that the image is processed again on the next synchronization.
+        """
+        done, self.pending = self.pending, []
+        for pending in done:
+            try:
+                pending.future.result()
+            except Exception as exc:  # pylint: disable=broad-except
+                pending.error = exc
+                pc_object = pending.pc_object
+                pc_object.thumbCount = min(pc_object.thumbCount, pending.previous_thumb_count)
+                if pending.previous_has_thumb_variants is not None:
+                    pc_object.hasThumbVariants = pending.previous_has_thumb_variants
+                thumb_hashes = dict(pc_object.thumbHashes or {})
+                if thumb_hashes.get(str(pending.thumb_index)) == pending.thumb_hash:
+                    del thumb_hashes[str(pending.thumb_index)]
+                pc_object.thumbHashes = thumb_hashes
+        return done
+
+    def shutdown(self) -> None:
+        self.upload_pool.shutdown(cancel_futures=True)
+        if self.standardization_pool:
+            self.standardization_pool.shutdown(cancel_futures=True)
+
+
+def _standardize_and_store(
+    image_as_bytes: Optional[bytes],
+    standardization: Optional[Future],
+    variants: tuple[image_conversion.ImageVariant, ...],
+    storage_ids: list[tuple[str, image_conversion.ImageVariant]],
+) -> None:
+    if standardization:
+        standardized = standardization.result()
+    else:
+        standardized = image_conversion.standardize_image_variants(
+            image_as_bytes, ratio=image_conversion.IMAGE_RATIO_PORTRAIT_DEFAULT, variants=variants
+        )
+    if len(storage_ids) == 1:
+        storage_id, variant = storage_ids[0]
+        thumb_storage.store_thumb(storage_id, standardized[variant], variant.content_type)
+        return
+    # Upload variants, and the same thumb stored under several ids,
+    # concurrently.
+    futures = thumb_storage.store_thumbs_async(
+        (storage_id, standardized[variant], variant.content_type) for storage_id, variant in storage_ids
+    )
+    for future in futures:
+        future.result()
@@ -20,6 +20,8 @@ SYNCHONISABLE_FILE_EXTENSION = "_75.jpg"
 class TiteLiveThingThumbs(LocalProvider):
     name = "TiteLive (Epagine / Place des libraires.com) Thumbs"
     can_create = False
+    read_ahead_attributes = ("zip", "thumb_zipinfo")
+    process_thumbs_in_background = True
 
     def __init__(self):
         super().__init__()
@@ -1,13 +1,19 @@
 import enum
 import logging
+import os
+import threading
+import time
+from typing import Optional
 
 from alembic import op
 import flask
+import redis
 from sqlalchemy import Column
 from sqlalchemy import String
 from sqlalchemy import Text
 from sqlalchemy.sql import text
 
+from pcapi import settings
 from pcapi.models import Model
 from pcapi.models import db
 from pcapi.models.deactivable_mixin import DeactivableMixin
@@ -16,6 +22,11 @@ from pcapi.models.pc_object import PcObject
 
 logger = logging.getLogger(__name__)
 
+FEATURES_INVALIDATION_CHANNEL = "feature_flags:invalidate"
+# Delay (in seconds) before listening again to invalidations after an
+# error.
+FEATURES_INVALIDATION_RETRY_DELAY = 5
+
 
 class FeatureToggle(enum.Enum):
     ALLOW_EMPTY_USER_PROFILING = "Autorise les inscriptions de bénéficiaires sans profile Threat Metrix"
@@ -92,6 +103,9 @@ class FeatureToggle(enum.Enum):
     ENABLE_IOS_OFFERS_LINK_WITH_REDIRECTION = "Active l'utilisation du lien avec redirection pour les offres (nécessaires pour contourner des restrictions d'iOS)"
 
     def is_active(self) -> bool:
+        if settings.FEATURE_FLAGS_CACHE_TTL:
+            return _features_cache.get_states()[self.name]
+
         if flask.has_request_context():
             if not hasattr(flask.request, "_cached_features"):
                 setattr(flask.request, "_cached_features", {})
@@ -117,6 +131,104 @@ class Feature(PcObject, Model, DeactivableMixin):
         return str(self.name).replace("FeatureToggle.", "")
 
 
+def _load_states() -> dict[str, bool]:
+    return dict(Feature.query.with_entities(Feature.name, Feature.isActive).all())
+
+
+class _FeaturesCache:
+    """A process-wide snapshot of feature flags, used both inside and
+    outside requests. It is loaded again after FEATURE_FLAGS_CACHE_TTL
+    seconds, or as soon as a flag is toggled: a thread of each process
+    listens to changes published by `notify_change()`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._states: Optional[dict[str, bool]] = None
+        self._expires_at = 0.0
+        # Incremented on each invalidation, so that states loaded
+        # before an invalidation are not stored after it.
+        self._generation = 0
+        self._listener_pid: Optional[int] = None
+
+    def get_states(self) -> dict[str, bool]:
+        self._start_listener()
+        with self._lock:
+            states, generation = self._states, self._generation
+            if states is not None and time.monotonic() < self._expires_at:
+                return states
+        states = _load_states()
+        with self._lock:
+            if generation == self._generation:
+                self._states = states
+                self._expires_at = time.monotonic() + settings.FEATURE_FLAGS_CACHE_TTL
+        return states
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states = None
+            self._generation += 1
+
+    def _start_listener(self) -> None:
+        # Threads are not inherited by forked processes (e.g. workers
+        # of gunicorn): start a listener in each process.
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+        thread = threading.Thread(target=self._listen, name="feature-flags-invalidation", daemon=True)
+        thread.start()
+
+    def _listen(self) -> None:
+        is_reconnection = False
+        while True:
+            try:
+                pubsub = redis.from_url(settings.REDIS_URL).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(FEATURES_INVALIDATION_CHANNEL)
+                if is_reconnection:
+                    # Changes may have been published while we were
+                    # not listening.
+                    self.clear()
+                for _message in pubsub.listen():
+                    self.clear()
+            except redis.exceptions.RedisError:
+                logger.exception("Could not listen to feature flags changes")
+            is_reconnection = True
+            time.sleep(FEATURES_INVALIDATION_RETRY_DELAY)
+
+
+_features_cache = _FeaturesCache()
+
+
+def get_states(*features: FeatureToggle) -> dict[FeatureToggle, bool]:
+    """Return whether the given features are active, with at most one
+    query.
+    """
+    states = _features_cache.get_states() if settings.FEATURE_FLAGS_CACHE_TTL else _load_states()
+    return {feature: states[feature.name] for feature in features}
+
+
+def clear_cache() -> None:
+    """Clear the cached feature flags of the current process."""
+    _features_cache.clear()
+
+
+def notify_change() -> None:
+    """Clear the cached feature flags of all processes. Must be called
+    once the change has been committed.
+    """
+    _features_cache.clear()
+    try:
+        flask.current_app.redis_client.publish(FEATURES_INVALIDATION_CHANNEL, "")
+    except redis.exceptions.RedisError:
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not notify feature flags change")
+
+
 FEATURES_DISABLED_BY_DEFAULT = (
     FeatureToggle.ALLOW_EMPTY_USER_PROFILING,
     FeatureToggle.ALLOW_IDCHECK_UNDERAGE_REGISTRATION,
@@ -1,13 +1,25 @@
+from typing import Optional
+
+from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import Integer
+from sqlalchemy.sql import expression
 
 from pcapi import settings
 from pcapi.utils.human_ids import humanize
+from pcapi.utils.image_conversion import ImageVariant
+from pcapi.utils.image_conversion import STANDARD_VARIANT
+from pcapi.utils.image_conversion import THUMB_VARIANTS
 
 
 class HasThumbMixin:
     thumbCount = Column(Integer(), nullable=False, default=0)
 
+    # Whether all `THUMB_VARIANTS` of the first thumb have been stored.
+    # Thumbs stored before variants were introduced only have the
+    # standard one.
+    hasThumbVariants = Column(Boolean, nullable=False, server_default=expression.false(), default=False)
+
     @property
     def thumb_path_component(self):
         """Return the part of the externally-stored file path that depends on
@@ -19,10 +31,12 @@ class HasThumbMixin:
         """
         raise NotImplementedError()
 
-    def get_thumb_storage_id(self, index: int) -> str:
+    def get_thumb_storage_id(self, index: int, variant: Optional[ImageVariant] = None) -> str:
         if self.id is None:
             raise ValueError("Trying to get thumb_storage_id for an unsaved object")
         suffix = f"_{index}" if index > 0 else ""
+        if variant and variant != STANDARD_VARIANT:
+            suffix += f".{variant.name}"
         return f"{self.thumb_path_component}/{humanize(self.id)}{suffix}"
 
     @property
@@ -34,3 +48,13 @@ class HasThumbMixin:
         if self.thumbCount == 0:
             return None
         return "{}/{}/{}".format(self.thumb_base_url, self.thumb_path_component, humanize(self.id))
+
+    @property
+    def thumbVariantUrls(self) -> dict[str, str]:
+        """Return the URLs of the variants of the first thumb, by
+        variant name (e.g. "375.webp").
+        """
+        if self.thumbCount == 0:
+            return {}
+        variants = THUMB_VARIANTS if self.hasThumbVariants else (STANDARD_VARIANT,)
+        return {variant.name: f"{self.thumb_base_url}/{self.get_thumb_storage_id(0, variant)}" for variant in variants}
@@ -9,6 +9,7 @@ from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Text
 from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import false
@@ -61,6 +62,11 @@ class Product(PcObject, Model, ExtraDataMixin, HasThumbMixin, ProvidableMixin):
 
     subcategoryId = Column(Text, nullable=False, index=True)
 
+    # Hashes of the source images of thumbs that were synchronized
+    # from a provider, by thumb index (e.g. `{"1": "9f86d0..."}`), so
+    # that unchanged images are not processed again.
+    thumbHashes = Column(JSONB, nullable=True)
+
     thumb_path_component = "products"
 
     Index("product_isbn_idx", ExtraDataMixin.extraData["isbn"].astext)
@@ -17,6 +17,7 @@ from pcapi.core.finance.models import InvoiceLine
 from pcapi.core.finance.models import Pricing
 from pcapi.core.finance.models import PricingLine
 from pcapi.core.finance.models import PricingLog
+from pcapi.core.finance.models import SiretRevenue
 from pcapi.core.fraud.models import BeneficiaryFraudCheck
 from pcapi.core.fraud.models import BeneficiaryFraudResult
 from pcapi.core.fraud.models import BeneficiaryFraudReview
@@ -82,6 +83,7 @@ def clean_all_database(*args, **kwargs):
     PricingLine.query.delete()
     PricingLog.query.delete()
     Pricing.query.delete()
+    SiretRevenue.query.delete()
     InvoiceLine.query.delete()
     Invoice.query.delete()
     CustomReimbursementRule.query.delete()
@@ -1,6 +1,23 @@
+from datetime import datetime
+from typing import Generator
+from typing import Iterable
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Query
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import selectinload
 
+from pcapi.core.offerers.models import Offerer
+from pcapi.core.offerers.models import Venue
+from pcapi.core.offers.models import Mediation
 from pcapi.core.offers.models import Offer
+from pcapi.core.offers.models import OfferValidationStatus
+from pcapi.core.offers.models import Stock
+from pcapi.models import db
+from pcapi.models.criterion import Criterion
+from pcapi.models.offer_criterion import OfferCriterion
+from pcapi.models.product import Product
 
 
 def get_offer_by_id(offer_id: int):
@@ -19,23 +36,126 @@ def get_offers_by_ids(offer_ids: list[int]) -> list[Offer]:
     return Offer.query.filter(Offer.id.in_(offer_ids)).options(joinedload("stocks")).all()
 
 
-def get_paginated_active_offer_ids(limit: int, page: int) -> list[int]:
+def get_offers_for_search_indexation(offer_ids: Iterable[int]) -> Query:
+    """Return offers with everything that is needed to check whether
+    they are eligible for search and to serialize them.
+
+    Many-to-one relationships are join-loaded and collections are
+    loaded with one additional query each, so that the number of
+    queries does not depend on the number of offers.
+    """
+    return Offer.query.filter(Offer.id.in_(offer_ids)).options(
+        joinedload(Offer.venue).joinedload(Venue.managingOfferer),
+        joinedload(Offer.product),
+        selectinload(Offer.stocks),
+        selectinload(Offer.criteria),
+        selectinload(Offer.mediations),
+    )
+
+
+def get_offer_rows_for_search_indexation(offer_ids: Iterable[int], now: Optional[datetime] = None) -> list:
+    """Return a row with the fields needed to index each offer that is
+    eligible for search. Offers that are not eligible are omitted.
+
+    Unlike `get_offers_for_search_indexation()`, no ORM object is
+    built: bookable stocks are aggregated in arrays with a single
+    query. Bookability rules mirror `Stock.isBookable` and
+    `Offer.isReleased`: keep them in sync.
+    """
+    now = now or datetime.utcnow()
+    is_bookable = sa.and_(
+        Stock.isSoftDeleted.is_(False),
+        sa.or_(Stock.beginningDatetime.is_(None), Stock.beginningDatetime > now),
+        sa.or_(Stock.bookingLimitDatetime.is_(None), Stock.bookingLimitDatetime > now),
+        sa.or_(Stock.quantity.is_(None), Stock.quantity - Stock.dnBookedQuantity > 0),
+    )
+    latest_active_mediation = (
+        Mediation.query.filter(Mediation.offerId == Offer.id, Mediation.isActive.is_(True))
+        .order_by(Mediation.dateCreated.desc())
+        .limit(1)
+    )
+    tags = (
+        db.session.query(sa.func.array_agg(Criterion.name))
+        .join(OfferCriterion, OfferCriterion.criterionId == Criterion.id)
+        .filter(OfferCriterion.offerId == Offer.id)
+    )
     query = (
-        Offer.query.with_entities(Offer.id)
-        .filter(Offer.isActive.is_(True))
+        db.session.query(
+            Offer.id,
+            Offer.name,
+            Offer.description,
+            Offer.url,
+            Offer.isDuo,
+            Offer.isEducational,
+            Offer.dateCreated,
+            Offer.rankingWeight,
+            Offer.extraData.label("extra_data"),
+            Offer.subcategoryId,
+            Venue.id.label("venue_id"),
+            Venue.name.label("venue_name"),
+            Venue.publicName.label("venue_public_name"),
+            Venue.departementCode.label("venue_department_code"),
+            Venue.latitude.label("venue_latitude"),
+            Venue.longitude.label("venue_longitude"),
+            Offerer.name.label("offerer_name"),
+            Product.id.label("product_id"),
+            Product.thumbCount.label("product_thumb_count"),
+            latest_active_mediation.with_entities(Mediation.id).correlate(Offer).label("mediation_id"),
+            latest_active_mediation.with_entities(Mediation.thumbCount).correlate(Offer).label("mediation_thumb_count"),
+            tags.correlate(Offer).label("tags"),
+            sa.func.array_agg(Stock.price).label("prices"),
+            sa.func.array_agg(Stock.beginningDatetime).label("beginning_datetimes"),
+            sa.func.array_agg(Stock.dateCreated).label("stocks_date_created"),
+        )
+        .join(Venue, Offer.venueId == Venue.id)
+        .join(Offerer, Venue.managingOffererId == Offerer.id)
+        .join(Product, Offer.productId == Product.id)
+        .join(Stock, sa.and_(Stock.offerId == Offer.id, is_bookable))
+        .filter(
+            Offer.id.in_(offer_ids),
+            Offer.isActive.is_(True),
+            Offer.validation == OfferValidationStatus.APPROVED,
+            Venue.validationToken.is_(None),
+            Offerer.isActive.is_(True),
+            Offerer.validationToken.is_(None),
+        )
+        .group_by(Offer.id, Venue.id, Offerer.id, Product.id)
         .order_by(Offer.id)
-        .offset(page * limit)
-        .limit(limit)
     )
-    return [offer_id for offer_id, in query]
+    return query.all()
 
 
-def get_paginated_offer_ids_by_venue_id(venue_id: int, limit: int, page: int) -> list[int]:
+def get_paginated_active_offer_ids(limit: int, page: int) -> list[int]:
     query = (
         Offer.query.with_entities(Offer.id)
-        .filter(Offer.venueId == venue_id)
+        .filter(Offer.isActive.is_(True))
         .order_by(Offer.id)
         .offset(page * limit)
         .limit(limit)
     )
     return [offer_id for offer_id, in query]
+
+
+def get_offer_ids_by_venue_id_in_chunks(venue_id: int, chunk_size: int) -> Generator[list[int], None, None]:
+    """Yield lists of (at most) ``chunk_size`` ids of the offers of the
+    given venue, in ascending order.
+
+    Chunks are fetched with keyset pagination (``id > last_id``), which
+    uses the ``(venueId, id)`` index, instead of ``OFFSET`` that has
+    to skip all the offers of previous chunks.
+    """
+    last_id = 0
+    while True:
+        query = (
+            Offer.query.with_entities(Offer.id)
+            .filter(Offer.venueId == venue_id, Offer.id > last_id)
+            .order_by(Offer.id)
+            .limit(chunk_size)
+        )
+        offer_ids = [offer_id for offer_id, in query]
+        if not offer_ids:
+            break
+        yield offer_ids
+        if len(offer_ids) < chunk_size:
+            break
+        last_id = offer_ids[-1]
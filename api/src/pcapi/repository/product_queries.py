@@ -5,6 +5,7 @@ from pcapi.core.categories import subcategories
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
 import pcapi.core.offers.repository as offers_repository
+from pcapi.core.providers import product_lookup
 from pcapi.core.users.repository import get_favorites_for_offers
 from pcapi.models import db
 from pcapi.models.product import Product
@@ -33,6 +34,7 @@ def delete_unwanted_existing_product(isbn: str):
         product.isGcuCompatible = False
         product.isSynchronizationCompatible = False
         repository.save(product)
+        product_lookup.invalidate()
         raise ProductWithBookingsException()
 
     objects_to_delete = []
@@ -47,6 +49,7 @@ def delete_unwanted_existing_product(isbn: str):
     favorites = get_favorites_for_offers(offer_ids)
     objects_to_delete = objects_to_delete + favorites
     repository.delete(*objects_to_delete)
+    product_lookup.invalidate()
 
 
 def find_active_book_product_by_isbn(isbn: str) -> Optional[Product]:
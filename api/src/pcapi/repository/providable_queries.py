@@ -1,43 +1,249 @@
 import datetime
+import io
+import json
+from typing import Any
+from typing import Iterable
 from typing import Optional
 
+import sqlalchemy as sa
+
 from pcapi.core.offers.models import Offer
+from pcapi.core.offers.models import Stock
 from pcapi.models import Model
 from pcapi.models import db
+from pcapi.models.product import Product
+
+
+# Models that are upserted with `COPY` (see `upsert_objects()`), and
+# the columns of the unique constraint that identifies them.
+UPSERT_CONFLICT_COLUMNS = {
+    Product: ("idAtProviders",),
+    Offer: ("venueId", "idAtProvider"),
+    Stock: ("idAtProviders",),
+}
+
+
+def insert_chunk(chunk_to_insert: dict) -> dict[str, list[int]]:
+    ids = {}
+    for model, objects in _group_by_model(chunk_to_insert.values()).items():
+        if model in UPSERT_CONFLICT_COLUMNS:
+            ids[model.__name__] = upsert_objects(model, objects)
+        else:
+            db.session.bulk_save_objects(objects, return_defaults=False)
+    db.session.commit()
+    return ids
 
 
-def insert_chunk(chunk_to_insert: dict):
-    db.session.bulk_save_objects(chunk_to_insert.values(), return_defaults=False)
+def update_chunk(chunk_to_update: dict) -> dict[str, list[int]]:
+    ids = {}
+    for model, objects in _group_by_model(chunk_to_update.values()).items():
+        if model in UPSERT_CONFLICT_COLUMNS:
+            ids[model.__name__] = update_objects(model, objects)
+        else:
+            values_to_update = [dictify_pc_object(obj) for obj in objects]
+            db.session.bulk_update_mappings(model, values_to_update)
     db.session.commit()
+    return ids
 
 
-def update_chunk(chunk_to_update: dict):
-    # Access `Model._decl_class_registry` here, not at module-scope,
-    # because it may not be populated yet if this module is imported
-    # too early.
-    # Use `getattr()` because the registry also contains things that
-    # are not models and don't have a `__name__` attribute.
-    MODELS = {getattr(klass, "__name__", None): klass for klass in Model._decl_class_registry.values()}
+def _group_by_model(objects: Iterable[Model]) -> dict[type, list[Model]]:
+    # Keep the order in which models first appear, so that objects
+    # are inserted before the objects that reference them (e.g.
+    # offers before their stocks).
+    groups: dict[type, list[Model]] = {}
+    for obj in objects:
+        groups.setdefault(type(obj), []).append(obj)
+    return groups
 
-    models_in_chunk = set(_extract_model_name_from_chunk_key(key) for key in chunk_to_update.keys())
 
-    for model_in_chunk in models_in_chunk:
-        matching_tuples_in_chunk = _filter_matching_pc_object_in_chunk(model_in_chunk, chunk_to_update)
-        values_to_update_in_chunk = _extract_dict_values_from_chunk(matching_tuples_in_chunk)
-        model_to_update = MODELS[model_in_chunk]
+def upsert_objects(model: type, objects: list[Model]) -> list[int]:
+    """Insert objects (or update them if they already exist, as
+    identified by `UPSERT_CONFLICT_COLUMNS`) and return their ids.
 
-        db.session.bulk_update_mappings(model_to_update, values_to_update_in_chunk)
-    db.session.commit()
+    Rows are staged with `COPY` in a temporary table and then inserted
+    with a single ``INSERT ... ON CONFLICT`` statement, which is much
+    faster than one ``INSERT`` per object. Ids of new objects are set
+    on the given objects.
+    """
+    conflict_columns = UPSERT_CONFLICT_COLUMNS[model]
+    columns_by_key = _get_table_columns(model)
+    objects_by_conflict_key = {}
+    ids = []
+    for keys, rows in _get_insert_rows(objects, columns_by_key).items():
+        columns = [columns_by_key[key] for key in keys]
+        staging_table = _stage_rows(model, columns, [row for _obj, row in rows])
+        quoted_columns = ", ".join(_quote(column.name) for column in columns)
+        updated_columns = [
+            column.name for column in columns if not column.primary_key and column.name not in conflict_columns
+        ]
+        on_conflict = (
+            "DO UPDATE SET " + ", ".join(f"{_quote(name)} = EXCLUDED.{_quote(name)}" for name in updated_columns)
+            if updated_columns
+            else "DO NOTHING"
+        )
+        returned = db.session.execute(
+            f"INSERT INTO {_quote(model.__tablename__)} ({quoted_columns}) "
+            f"SELECT {quoted_columns} FROM {staging_table} "
+            f"ON CONFLICT ({', '.join(_quote(name) for name in conflict_columns)}) {on_conflict} "
+            f"RETURNING id, {', '.join(_quote(name) for name in conflict_columns)}"
+        ).fetchall()
+        db.session.execute(f"DROP TABLE {staging_table}")
+
+        for obj, _row in rows:
+            objects_by_conflict_key[tuple(getattr(obj, name) for name in conflict_columns)] = obj
+        for object_id, *conflict_key in returned:
+            ids.append(object_id)
+            obj = objects_by_conflict_key.get(tuple(conflict_key))
+            if obj is not None and obj.id is None:
+                obj.id = object_id
+    return ids
+
+
+def update_objects(model: type, objects: list[Model]) -> list[int]:
+    """Update existing objects and return their ids.
+
+    As in `upsert_objects()`, rows are staged with `COPY` and applied
+    with a single ``UPDATE ... FROM`` statement. Updated objects that
+    are in the session are expired, so that their changes are not
+    flushed (again) when the session is committed.
+    """
+    columns_by_key = _get_table_columns(model)
+    primary_key = columns_by_key["id"]
+    ids = []
+    for keys, rows in _get_update_rows(objects, columns_by_key).items():
+        columns = [primary_key] + [columns_by_key[key] for key in keys]
+        staging_table = _stage_rows(model, columns, [row for _obj, row in rows])
+        table = _quote(model.__tablename__)
+        assignments = ", ".join(
+            f"{_quote(column.name)} = {staging_table}.{_quote(column.name)}" for column in columns[1:]
+        )
+        returned = db.session.execute(
+            f"UPDATE {table} SET {assignments} FROM {staging_table} "
+            f"WHERE {table}.id = {staging_table}.id RETURNING {table}.id"
+        ).fetchall()
+        db.session.execute(f"DROP TABLE {staging_table}")
+        ids.extend(object_id for object_id, in returned)
+
+    for obj in objects:
+        if obj in db.session:
+            db.session.expire(obj)
+    return ids
+
+
+def _get_table_columns(model: type) -> dict[str, sa.Column]:
+    """Return columns of the table of the model, indexed by the name of
+    the mapped attribute.
+    """
+    table = model.__table__
+    return {
+        prop.key: prop.columns[0]
+        for prop in sa.inspect(model).column_attrs
+        if isinstance(prop.columns[0], sa.Column) and prop.columns[0].table is table
+    }
+
+
+def _get_insert_rows(objects: list[Model], columns_by_key: dict[str, sa.Column]) -> dict[tuple, list]:
+    """Return rows to insert, grouped by the attributes that they set.
 
+    Attributes that are not set and have no Python-side default are
+    left out, so that the default of the database (if any) is used.
+    """
+    groups: dict[tuple, list] = {}
+    for obj in objects:
+        values = sa.inspect(obj).dict
+        row = {}
+        for key, column in columns_by_key.items():
+            if key in values:
+                row[key] = values[key]
+            elif column.default is not None and not column.default.is_sequence:
+                row[key] = _get_default_value(column.default)
+        keys = tuple(sorted(row))
+        groups.setdefault(keys, []).append((obj, [row[key] for key in keys]))
+    return groups
 
-def _filter_matching_pc_object_in_chunk(model_in_chunk: Model, chunk_to_update: dict) -> list[Model]:
-    return list(
-        filter(lambda item: _extract_model_name_from_chunk_key(item[0]) == model_in_chunk, chunk_to_update.items())
+
+def _get_update_rows(objects: list[Model], columns_by_key: dict[str, sa.Column]) -> dict[tuple, list]:
+    """Return rows to update (without their id), grouped by the
+    attributes that are loaded on objects.
+    """
+    groups: dict[tuple, list] = {}
+    for obj in objects:
+        state = sa.inspect(obj)
+        row = {}
+        for key, column in columns_by_key.items():
+            if column.primary_key:
+                continue
+            if key in state.dict:
+                row[key] = state.dict[key]
+            if column.onupdate is not None and not state.attrs[key].history.has_changes():
+                row[key] = _get_default_value(column.onupdate)
+        keys = tuple(sorted(row))
+        groups.setdefault(keys, []).append((obj, [obj.id] + [row[key] for key in keys]))
+    return groups
+
+
+def _get_default_value(default: sa.schema.ColumnDefault) -> Any:
+    if default.is_callable:
+        return default.arg(None)
+    if isinstance(default.arg, (list, dict)):
+        return default.arg.copy()
+    return default.arg
+
+
+def _stage_rows(model: type, columns: list[sa.Column], rows: list[list]) -> str:
+    """Create a temporary table for the given columns, fill it with
+    `COPY` and return its name.
+    """
+    staging_table = _quote(f"{model.__tablename__}_staging")
+    quoted_columns = ", ".join(_quote(column.name) for column in columns)
+    db.session.execute(
+        f"CREATE TEMPORARY TABLE {staging_table} ON COMMIT DROP AS "
+        f"SELECT {quoted_columns} FROM {_quote(model.__tablename__)} WITH NO DATA"
     )
 
+    dialect = db.engine.dialect
+    processors = [column.type.dialect_impl(dialect).bind_processor(dialect) for column in columns]
+    buffer = io.StringIO()
+    for row in rows:
+        values = (processor(value) if processor else value for processor, value in zip(processors, row))
+        buffer.write("\t".join(_to_copy_text(value) for value in values))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(f"COPY {staging_table} ({quoted_columns}) FROM STDIN", buffer)
+    return staging_table
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
 
-def _extract_dict_values_from_chunk(matching_tuples_in_chunk: list[Model]) -> list[dict]:
-    return list(dictify_pc_object(pc_object_item) for pc_object_key, pc_object_item in matching_tuples_in_chunk)
+
+def _to_copy_text(value: Any) -> str:
+    """Format a value for the text format of PostgreSQL `COPY`."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        text = "t" if value else "f"
+    elif isinstance(value, (list, tuple)):
+        text = _to_array_literal(value)
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        text = value.isoformat()
+    elif isinstance(value, dict):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _to_array_literal(values: Iterable) -> str:
+    items = []
+    for value in values:
+        if value is None:
+            items.append("NULL")
+        else:
+            items.append('"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
 
 
 def get_existing_object(model_type: Model, id_at_providers: str) -> Optional[dict]:
@@ -49,6 +255,18 @@ def get_existing_object(model_type: Model, id_at_providers: str) -> Optional[dic
     return model_type.query.filter_by(idAtProviders=id_at_providers).one_or_none()
 
 
+def get_existing_objects(model_type: Model, ids_at_providers: Iterable[str]) -> dict[str, Model]:
+    """Return existing objects as a dictionary indexed by their
+    identifier at providers.
+    """
+    # See `get_existing_object()` for the special case of Offer.
+    column = model_type.idAtProvider if model_type == Offer else model_type.idAtProviders
+    objects = model_type.query.filter(column.in_(ids_at_providers)).all()
+    if model_type == Offer:
+        return {obj.idAtProvider: obj for obj in objects}
+    return {obj.idAtProviders: obj for obj in objects}
+
+
 def get_last_update_for_provider(provider_id: int, pc_obj: Model) -> datetime:
     if pc_obj.lastProviderId == provider_id:
         return pc_obj.dateModifiedAtLastProvider if pc_obj.dateModifiedAtLastProvider else None
@@ -70,7 +288,3 @@ def dictify_pc_object(object_to_update: Model) -> dict:
     if "remainingQuantity" in dict_to_update:
         del dict_to_update["remainingQuantity"]
     return dict_to_update
-
-
-def _extract_model_name_from_chunk_key(chunk_key: str) -> str:
-    return chunk_key.split("|")[1]
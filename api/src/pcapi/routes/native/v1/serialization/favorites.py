@@ -20,6 +20,7 @@ class Coordinates(BaseModel):
 class FavoriteMediationResponse(BaseModel):
     credit: Optional[str]
     url: str
+    variantUrls: dict[str, str]
 
     class Config:
         orm_mode = True
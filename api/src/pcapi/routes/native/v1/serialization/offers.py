@@ -161,6 +161,7 @@ class OfferAccessibilityResponse(BaseModel):
 class OfferImageResponse(BaseModel):
     url: str
     credit: Optional[str]
+    variantUrls: dict[str, str]
 
     class Config:
         orm_mode = True
@@ -1,6 +1,6 @@
 from pcapi.core.users import constants
+from pcapi.models import feature
 from pcapi.models.feature import FeatureToggle
-from pcapi.repository import feature_queries
 from pcapi.serialization.decorator import spectree_serialize
 from pcapi.settings import OBJECT_STORAGE_URL
 
@@ -8,20 +8,11 @@ from . import blueprint
 from .serialization import settings as serializers
 
 
-def _get_features(*requested_features: FeatureToggle):
-    requested_features = {feature.name: feature for feature in requested_features}
-    return {
-        requested_features[db_feature.name]: db_feature.isActive
-        for db_feature in feature_queries.find_all()
-        if db_feature.name in requested_features
-    }
-
-
 @blueprint.native_v1.route("/settings", methods=["GET"])
 @spectree_serialize(api=blueprint.api, response_model=serializers.SettingsResponse)
 def get_settings() -> serializers.SettingsResponse:
 
-    features = _get_features(
+    features = feature.get_states(
         FeatureToggle.AUTO_ACTIVATE_DIGITAL_BOOKINGS,
         FeatureToggle.DISPLAY_DMS_REDIRECTION,
         FeatureToggle.ENABLE_ID_CHECK_RETENTION,
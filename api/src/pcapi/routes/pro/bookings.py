@@ -1,6 +1,9 @@
+import codecs
 from typing import Optional
 
+from flask import Response
 from flask import request
+from flask import stream_with_context
 from flask_login import current_user
 from flask_login import login_required
 
@@ -19,6 +22,7 @@ from pcapi.routes.serialization.bookings_serialize import UserHasBookingResponse
 from pcapi.routes.serialization.bookings_serialize import get_booking_response
 from pcapi.serialization.decorator import spectree_serialize
 from pcapi.serialization.spec_tree import ExtendResponse as SpectreeResponse
+from pcapi.utils import xlsx
 from pcapi.utils.human_ids import dehumanize
 from pcapi.utils.human_ids import humanize
 from pcapi.utils.rate_limiting import basic_auth_rate_limiter
@@ -105,6 +109,7 @@ def get_bookings_pro(query: ListBookingsQueryModel) -> ListBookingsResponseModel
         venue_id=venue_id,
         offer_type=offer_type,
         page=int(page),
+        cursor=query.cursor,
     )
 
     return ListBookingsResponseModel(
@@ -114,6 +119,7 @@ def get_bookings_pro(query: ListBookingsQueryModel) -> ListBookingsResponseModel
         page=bookings_recap_paginated.page,
         pages=bookings_recap_paginated.pages,
         total=bookings_recap_paginated.total,
+        next_page_cursor=bookings_recap_paginated.next_page_cursor,
     )
 
 
@@ -134,23 +140,36 @@ def get_user_has_bookings() -> UserHasBookingResponse:
         "Content-Disposition": "attachment; filename=reservations_pass_culture.csv",
     },
 )
-def get_bookings_csv(query: ListBookingsQueryModel) -> bytes:
-    venue_id = query.venue_id
-    event_date = query.event_date
-    booking_period = (query.booking_period_beginning_date, query.booking_period_ending_date)
-    booking_status = query.booking_status_filter
-    offer_type = query.offer_type
+def get_bookings_csv(query: ListBookingsQueryModel) -> Response:
+    chunks = booking_repository.stream_csv_report(**_get_report_filters(query))
+    # The report is sent while bookings are fetched, so that it is
+    # never held entirely in memory.
+    return Response(stream_with_context(codecs.iterencode(chunks, "utf-8-sig")))
 
-    bookings = booking_repository.get_csv_report(
-        user=current_user._get_current_object(),  # for tests to succeed, because current_user is actually a LocalProxy
-        booking_period=booking_period,
-        status_filter=booking_status,
-        event_date=event_date,
-        venue_id=venue_id,
-        offer_type=offer_type,
-    )
 
-    return bookings.encode("utf-8-sig")
+@blueprint.pro_private_api.route("/bookings/excel", methods=["GET"])
+@login_required
+@spectree_serialize(
+    json_format=False,
+    response_headers={
+        "Content-Type": xlsx.CONTENT_TYPE,
+        "Content-Disposition": "attachment; filename=reservations_pass_culture.xlsx",
+    },
+)
+def get_bookings_excel(query: ListBookingsQueryModel) -> Response:
+    chunks = booking_repository.stream_excel_report(**_get_report_filters(query))
+    return Response(stream_with_context(chunks))
+
+
+def _get_report_filters(query: ListBookingsQueryModel) -> dict:
+    return {
+        "user": current_user._get_current_object(),  # for tests to succeed, because current_user is actually a LocalProxy
+        "booking_period": (query.booking_period_beginning_date, query.booking_period_ending_date),
+        "status_filter": query.booking_status_filter,
+        "event_date": query.event_date,
+        "venue_id": query.venue_id,
+        "offer_type": query.offer_type,
+    }
 
 
 @blueprint.pro_public_api_v2.route("/bookings/token/<token>", methods=["GET"])
@@ -34,6 +34,7 @@ def serialize_bookings_recap_paginated(bookings_recap_paginated: BookingsRecapPa
         "page": bookings_recap_paginated.page,
         "pages": bookings_recap_paginated.pages,
         "total": bookings_recap_paginated.total,
+        "next_page_cursor": bookings_recap_paginated.next_page_cursor,
     }
 
 
@@ -121,6 +122,7 @@ class ListBookingsQueryModel(BaseModel):
     booking_period_beginning_date: date
     booking_period_ending_date: date
     offer_type: Optional[OfferType]
+    cursor: Optional[str]
 
     _dehumanize_venue_id = dehumanize_field("venue_id")
 
@@ -135,6 +137,7 @@ class ListBookingsResponseModel(BaseModel):
     page: int
     pages: int
     total: int
+    next_page_cursor: Optional[str]
 
 
 class PatchBookingByTokenQueryModel(BaseModel):
@@ -18,13 +18,13 @@ blueprint = Blueprint(__name__, __name__)
 @cron_context
 @log_cron_with_transaction
 def index_offers_in_algolia_by_offer():
-    search.index_offers_in_queue()
+    search.index_offers_in_queue(workers=settings.SEARCH_INDEXING_WORKERS)
 
 
 @cron_context
 @log_cron_with_transaction
 def index_offers_in_algolia_by_venue():
-    search.index_offers_of_venues_in_queue()
+    search.index_offers_of_venues_in_queue(workers=settings.SEARCH_INDEXING_WORKERS)
 
 
 @cron_context
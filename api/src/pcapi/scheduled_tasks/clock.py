@@ -16,6 +16,7 @@ from pcapi.core.offerers.repository import get_offerers_by_date_validated
 from pcapi.core.offers.repository import check_stock_consistency
 from pcapi.core.offers.repository import delete_past_draft_offers
 from pcapi.core.offers.repository import find_tomorrow_event_stock_ids
+from pcapi.core.outbox import api as outbox_api
 import pcapi.core.payments.utils as payments_utils
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.core.subscription.dms import api as dms_api
@@ -30,7 +31,7 @@ from pcapi.core.users.external.user_automations import users_turned_eighteen_aut
 from pcapi.core.users.repository import get_newly_eligible_age_18_users
 from pcapi.domain.user_emails import send_withdrawal_terms_to_newly_validated_offerer
 from pcapi.local_providers.provider_api import provider_api_stocks
-from pcapi.local_providers.provider_manager import synchronize_venue_providers_for_provider
+from pcapi.local_providers.provider_manager import synchronize_allocine_venue_providers
 from pcapi.models import db
 from pcapi.models.feature import FeatureToggle
 from pcapi.notifications.push.transactional_notifications import (
@@ -65,7 +66,7 @@ def update_booking_used() -> None:
 @cron_require_feature(FeatureToggle.SYNCHRONIZE_ALLOCINE)
 def synchronize_allocine_stocks() -> None:
     allocine_stocks_provider_id = get_provider_by_local_class("AllocineStocks").id
-    synchronize_venue_providers_for_provider(allocine_stocks_provider_id)
+    synchronize_allocine_venue_providers(allocine_stocks_provider_id)
 
 
 @cron_context
@@ -256,6 +257,12 @@ def pc_notify_users_bookings_not_retrieved() -> None:
             )
 
 
+@cron_context
+@log_cron_with_transaction
+def pc_process_outbox_events() -> None:
+    outbox_api.process_pending_events()
+
+
 @blueprint.cli.command("clock")
 def clock() -> None:
     set_tag("pcapi.app_type", "clock")
@@ -320,4 +327,6 @@ def clock() -> None:
 
     scheduler.add_job(pc_notify_users_bookings_not_retrieved, "cron", hour="12")
 
+    scheduler.add_job(pc_process_outbox_events, "cron", minute="*")
+
     scheduler.start()
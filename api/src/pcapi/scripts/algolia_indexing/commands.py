@@ -1,5 +1,8 @@
+import json
+
 import click
 
+from pcapi import settings
 from pcapi.core import search
 import pcapi.core.offers.api as offers_api
 from pcapi.scripts.algolia_indexing.indexing import batch_indexing_offers_in_algolia_from_database
@@ -10,13 +13,15 @@ blueprint = Blueprint(__name__, __name__)
 
 
 @blueprint.cli.command("process_offers")
-def process_offers():
-    search.index_offers_in_queue(stop_only_when_empty=True)
+@click.option("-w", "--workers", help="Number of concurrent workers", type=int, default=None)
+def process_offers(workers: int):
+    search.index_offers_in_queue(stop_only_when_empty=True, workers=workers or settings.SEARCH_INDEXING_WORKERS)
 
 
 @blueprint.cli.command("process_offers_by_venue")
-def process_offers_by_venue():
-    search.index_offers_of_venues_in_queue()
+@click.option("-w", "--workers", help="Number of concurrent workers", type=int, default=None)
+def process_offers_by_venue(workers: int):
+    search.index_offers_of_venues_in_queue(workers=workers or settings.SEARCH_INDEXING_WORKERS)
 
 
 @blueprint.cli.command("process_offers_from_database")
@@ -39,3 +44,37 @@ def process_offers_from_database(
 @click.option("-a", "--all", help="Bypass the two days limit to delete all expired offers", default=False)
 def process_expired_offers(all_offers: bool):
     offers_api.unindex_expired_offers(process_all_expired=all_offers)
+
+
+@blueprint.cli.command("search_offers")
+@click.argument("query", default="")
+@click.option("-s", "--subcategory", "subcategories", help="Subcategory id (may be repeated)", multiple=True)
+@click.option("--min-price", help="Minimum price", type=float, default=None)
+@click.option("--max-price", help="Maximum price", type=float, default=None)
+@click.option("--around", help="Latitude and longitude, e.g. 48.8566,2.3522", default=None)
+@click.option("--radius", help="Radius in meters around --around", type=float, default=None)
+@click.option("-p", "--page", help="Page of results", type=int, default=0)
+def search_offers(  # pylint: disable=too-many-arguments
+    query: str,
+    subcategories: tuple[str],
+    min_price: float,
+    max_price: float,
+    around: str,
+    radius: float,
+    page: int,
+):
+    """Search indexed offers (with the local search backend only)."""
+    kwargs = {"page": page, "facets": ["offer.subcategoryId"]}
+    if subcategories:
+        kwargs["facet_filters"] = {"offer.subcategoryId": list(subcategories)}
+    if min_price is not None or max_price is not None:
+        kwargs["numeric_filters"] = {"offer.prices": (min_price, max_price)}
+    if around:
+        lat, lng = around.split(",")
+        kwargs["around_lat_lng"] = (float(lat), float(lng))
+        kwargs["around_radius"] = radius
+    try:
+        response = search.search_offers(query, **kwargs)
+    except NotImplementedError as exc:
+        raise click.ClickException(f"Search backend {settings.SEARCH_BACKEND} cannot be queried from here") from exc
+    click.echo(json.dumps(response, indent=2))
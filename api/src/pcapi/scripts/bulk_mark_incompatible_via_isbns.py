@@ -3,6 +3,7 @@ from typing import Iterable
 
 from pcapi.core import search
 from pcapi.core.offers.models import Offer
+from pcapi.core.providers import product_lookup
 from pcapi.models import db
 from pcapi.models.product import Product
 
@@ -21,6 +22,7 @@ def process_batch(isbns: list[str], is_compatible: bool) -> None:
         offer_ids = [offer_id for offer_id, in offers.with_entities(Offer.id)]
         updated_offers_count = offers.update({"isActive": False}, synchronize_session=False)
     db.session.commit()
+    product_lookup.invalidate()
     if offer_ids:
         search.unindex_offer_ids(offer_ids)
     logger.info(
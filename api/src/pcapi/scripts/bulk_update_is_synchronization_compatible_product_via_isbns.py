@@ -1,6 +1,7 @@
 import logging
 from typing import Iterable
 
+from pcapi.core.providers import product_lookup
 from pcapi.models import db
 from pcapi.models.product import Product
 
@@ -17,6 +18,7 @@ def process_batch(isbns: list[str], is_synchronization_compatible: bool) -> None
         {"isSynchronizationCompatible": is_synchronization_compatible}, synchronize_session=False
     )
     db.session.commit()
+    product_lookup.invalidate()
     logger.info(
         "Finished bulk-update products isSynchronizationCompatible=%s",
         is_synchronization_compatible,
@@ -5,11 +5,9 @@ import time
 
 import click
 import pytz
-from sqlalchemy.orm import joinedload
 
-import pcapi.core.offerers.models as offerers_models
-import pcapi.core.offers.models as offers_models
 from pcapi.core.search.backends import algolia
+from pcapi.repository import offer_queries
 from pcapi.utils.blueprint import Blueprint
 
 
@@ -42,6 +40,9 @@ def full_index_offers(start, end):
     code. That way, this script skips a lot of unnecessary
     unindexation requests.
 
+    Offers are indexed even if their search document has not changed
+    since they were last indexed, so that a lost index can be rebuilt.
+
     This script processes batches of 1.000 offers and reports back
     every 10.000 offers.
 
@@ -65,12 +66,12 @@ def full_index_offers(start, end):
 
     queue = []
 
-    def enqueue_or_index(q, offer, force_index=False):
-        if offer:
-            q.append(offer)
+    def enqueue_or_index(q, row, force_index=False):
+        if row:
+            q.append(row)
         if force_index or len(q) > BATCH_SIZE:
             try:
-                backend.index_offers(q)
+                backend.index_offer_rows(q, force=True)
             except Exception as exc:  # pylint: disable=broad-except
                 logger.exception(
                     "Full offer reindexation: error while reindexing from %d to %d: %s", q[0].id, q[-1].id, exc
@@ -82,23 +83,9 @@ def full_index_offers(start, end):
 
     while start <= end:
         start_time = time.perf_counter()
-        offers = (
-            offers_models.Offer.query.options(
-                joinedload(offers_models.Offer.venue).joinedload(offerers_models.Venue.managingOfferer)
-            )
-            .options(joinedload(offers_models.Offer.criteria))
-            .options(joinedload(offers_models.Offer.mediations))
-            .options(joinedload(offers_models.Offer.product))
-            .options(joinedload(offers_models.Offer.stocks))
-            .filter(
-                offers_models.Offer.isActive.is_(True),
-                offers_models.Offer.id.between(start, min(start + BATCH_SIZE, end)),
-            )
-            .order_by(offers_models.Offer.id)
-        )
-        for offer in offers:
-            if offer.is_eligible_for_search:
-                enqueue_or_index(queue, offer)
+        offer_ids = list(range(start, min(start + BATCH_SIZE, end) + 1))
+        for row in offer_queries.get_offer_rows_for_search_indexation(offer_ids):
+            enqueue_or_index(queue, row)
         elapsed_per_batch.append(int(time.perf_counter() - start_time))
         start = start + BATCH_SIZE
         eta = _get_eta(end, start, elapsed_per_batch)
@@ -106,5 +93,5 @@ def full_index_offers(start, end):
         if to_report >= REPORT_EVERY:
             to_report = 0
             print(f"  => OK: {start} | eta = {eta}")
-    enqueue_or_index(queue, offer=None, force_index=True)
+    enqueue_or_index(queue, row=None, force_index=True)
     print("Done")
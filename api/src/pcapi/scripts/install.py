@@ -19,6 +19,7 @@ def install_commands(app: flask.Flask) -> None:
         "pcapi.scripts.offerer.commands",
         "pcapi.scripts.payment.add_custom_offer_reimbursement_rule",
         "pcapi.scripts.payment.banishment_command",
+        "pcapi.scripts.payment.check_siret_revenues",
         "pcapi.scripts.payment.generate_payments",
         "pcapi.scripts.provider.check_provider_api",
         "pcapi.scripts.sandbox",
@@ -26,8 +26,8 @@ from pcapi.domain.payments import generate_venues_csv
 from pcapi.domain.payments import generate_wallet_balances_csv
 from pcapi.domain.payments import make_transaction_label
 from pcapi.domain.payments import validate_message_file_structure
-from pcapi.domain.reimbursement import CustomRuleFinder
 from pcapi.domain.reimbursement import find_all_booking_reimbursements
+from pcapi.domain.reimbursement import get_custom_rule_finder
 from pcapi.models import db
 from pcapi.models.payment import Payment
 from pcapi.models.payment_message import PaymentMessage
@@ -74,7 +74,7 @@ def generate_new_payments(cutoff_date: datetime, batch_date: datetime) -> None:
     logger.info("Fetching venues to reimburse")
     venues_to_reimburse = get_venues_to_reimburse(cutoff_date)
     logger.info("Found %d venues to reimburse", len(venues_to_reimburse))
-    custom_rule_finder = CustomRuleFinder()
+    custom_rule_finder = get_custom_rule_finder()
     n_payments = 0
     for venue_id, venue_name in venues_to_reimburse:
         logger.info("[BATCH][PAYMENTS] Fetching bookings for venue: %s", venue_name, extra={"venue": venue_id})
@@ -0,0 +1,19 @@
+import click
+
+import pcapi.core.finance.api as finance_api
+from pcapi.utils.blueprint import Blueprint
+
+
+blueprint = Blueprint(__name__, __name__)
+
+
+@blueprint.cli.command("check_siret_revenues")
+@click.option("--year", help="Only check revenues of this year", type=int, default=None)
+@click.option("--fix", help="Update inconsistent revenues", is_flag=True, default=False)
+def check_siret_revenues(year: int, fix: bool):
+    """Compare revenues of each SIRET with the sum of their pricings.
+
+    Do not use ``--fix`` while bookings are being priced.
+    """
+    differences = finance_api.check_siret_revenues(year=year, fix=fix)
+    print(f"Found {len(differences)} inconsistent revenue(s)")
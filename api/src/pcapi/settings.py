@@ -109,6 +109,10 @@ REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
 REDIS_OFFER_IDS_CHUNK_SIZE = int(os.environ.get("REDIS_OFFER_IDS_CHUNK_SIZE", 1000))
 REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE = int(os.environ.get("REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE", 1000))
 REDIS_VENUE_IDS_CHUNK_SIZE = int(os.environ.get("REDIS_VENUE_IDS_CHUNK_SIZE", 1000))
+# Delay (in seconds) after which a chunk of offers that has been popped
+# from the indexation queue but not processed is queued again.
+REDIS_OFFER_IDS_LEASE_TIMEOUT = int(os.environ.get("REDIS_OFFER_IDS_LEASE_TIMEOUT", 10 * 60))
+SEARCH_INDEXING_WORKERS = int(os.environ.get("SEARCH_INDEXING_WORKERS", 1))
 
 
 # SENTRY
@@ -217,6 +221,11 @@ JWT_ACCESS_TOKEN_EXPIRES = int(os.environ.get("JWT_ACCESS_TOKEN_EXPIRES", 60 * 1
 TITELIVE_FTP_URI = os.environ.get("FTP_TITELIVE_URI")
 TITELIVE_FTP_USER = os.environ.get("FTP_TITELIVE_USER")
 TITELIVE_FTP_PWD = os.environ.get("FTP_TITELIVE_PWD")
+# Directory where files downloaded from the Titelive FTP are kept, so
+# that they are not downloaded again on the next run. If not set,
+# files are removed as soon as they have been processed.
+TITELIVE_FTP_CACHE_DIR = os.environ.get("TITELIVE_FTP_CACHE_DIR")
+TITELIVE_FTP_DOWNLOAD_ATTEMPTS = int(os.environ.get("TITELIVE_FTP_DOWNLOAD_ATTEMPTS", 3))
 
 # UBBLE
 UBBLE_API_URL = os.environ.get("UBBLE_API_URL", "https://api.ubble.ai")
@@ -231,6 +240,36 @@ STAGING_TEST_USER_PASSWORD = os.environ.get("STAGING_TEST_USER_PASSWORD", "")
 
 # PROVIDERS
 ALLOCINE_API_KEY = os.environ.get("ALLOCINE_API_KEY")
+# Number of Allociné theaters whose showtimes are downloaded (and
+# compared with the previous synchronization) concurrently.
+ALLOCINE_SYNC_WORKERS = int(os.environ.get("ALLOCINE_SYNC_WORKERS", 4))
+# Number of venue providers that are synchronized concurrently by
+# `provider_api_stocks.synchronize_stocks()`, overall and for a
+# single provider (so that we do not overload its API).
+PROVIDER_API_SYNC_WORKERS = int(os.environ.get("PROVIDER_API_SYNC_WORKERS", 1))
+PROVIDER_API_SYNC_WORKERS_PER_PROVIDER = int(os.environ.get("PROVIDER_API_SYNC_WORKERS_PER_PROVIDER", 2))
+# Number of pages of a provider API that may be downloaded in advance,
+# while previous pages are saved. 0 disables prefetching.
+PROVIDER_API_PREFETCH_PAGES = int(os.environ.get("PROVIDER_API_PREFETCH_PAGES", 2))
+# In-process cache of products looked up by provider synchronizations
+# (see `core.providers.product_lookup`): maximum number of products,
+# lifetime of entries (in seconds), and number of products that are
+# cached before synchronizations start. 0 disables the cache.
+PRODUCT_LOOKUP_CACHE_SIZE = int(os.environ.get("PRODUCT_LOOKUP_CACHE_SIZE", 200_000))
+PRODUCT_LOOKUP_CACHE_TTL = int(os.environ.get("PRODUCT_LOOKUP_CACHE_TTL", 60 * 60))
+PRODUCT_LOOKUP_CACHE_WARMUP = int(os.environ.get("PRODUCT_LOOKUP_CACHE_WARMUP", 50_000))
+
+# FEATURE FLAGS
+# Lifetime (in seconds) of the process-wide cache of feature flags.
+# The cache is also cleared when a flag is toggled from the admin. 0
+# disables the cache (flags are then only cached during a request).
+FEATURE_FLAGS_CACHE_TTL = int(os.environ.get("FEATURE_FLAGS_CACHE_TTL", 60))
+
+# BOOKINGS
+# Lifetime (in seconds) of the cached total of bookings listed to pro
+# users (see `bookings.repository.find_by_pro_user()`). 0 disables the
+# cache.
+PRO_BOOKINGS_TOTAL_CACHE_TTL = int(os.environ.get("PRO_BOOKINGS_TOTAL_CACHE_TTL", 60))
 
 
 # DEMARCHES SIMPLIFIEES
@@ -253,9 +292,20 @@ DMS_INSTRUCTOR_ID = os.environ.get("DEMARCHES_SIMPLIFIEES_INSTRUCTOR_ID")
 OBJECT_STORAGE_URL = os.environ.get("OBJECT_STORAGE_URL")
 OBJECT_STORAGE_PROVIDER = os.environ.get("OBJECT_STORAGE_PROVIDER", "")
 LOCAL_STORAGE_DIR = Path(os.path.dirname(os.path.realpath(__file__))) / "static" / "object_store_data"
+# Number of threads that call backends concurrently (and that store
+# objects in the background), and retry policy of these calls: the
+# delay (in seconds) doubles after each failed attempt.
+OBJECT_STORAGE_WORKERS = int(os.environ.get("OBJECT_STORAGE_WORKERS", 8))
+OBJECT_STORAGE_ATTEMPTS = int(os.environ.get("OBJECT_STORAGE_ATTEMPTS", 3))
+OBJECT_STORAGE_RETRY_DELAY = float(os.environ.get("OBJECT_STORAGE_RETRY_DELAY", 0.5))
 
 # THUMBS
 THUMBS_FOLDER_NAME = os.environ.get("THUMBS_FOLDER_NAME", "thumbs")
+# Number of processes that standardize thumbs synchronized from
+# providers (0 to standardize them in the upload threads), and number
+# of threads that upload them.
+THUMBS_STANDARDIZATION_PROCESSES = int(os.environ.get("THUMBS_STANDARDIZATION_PROCESSES", 2))
+THUMBS_UPLOAD_WORKERS = int(os.environ.get("THUMBS_UPLOAD_WORKERS", 8))
 
 # SWIFT
 SWIFT_AUTH_URL = os.environ.get("SWIFT_AUTH_URL", "https://auth.cloud.ovh.net/v3/")
@@ -327,6 +377,14 @@ APPS_FLYER_IOS_API_KEY = os.environ.get("APPS_FLYER_IOS_API_KEY", "")
 
 # SEARCH
 SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", _default_search_backend)
+# If set, offers are serialized from a single SQL projection query per
+# chunk instead of being loaded as ORM objects.
+SEARCH_SERIALIZE_OFFERS_FROM_SQL = bool(int(os.environ.get("SEARCH_SERIALIZE_OFFERS_FROM_SQL", "0")))
+# SQLite database of the local search backend (see
+# `pcapi.core.search.backends.local`). Use a file path to share the
+# indices between processes (API, workers, cron jobs) and keep them
+# across restarts.
+LOCAL_SEARCH_DATABASE = os.environ.get("LOCAL_SEARCH_DATABASE", ":memory:")
 
 # ADAGE
 ADAGE_API_KEY = os.environ.get("ADAGE_API_KEY", None)
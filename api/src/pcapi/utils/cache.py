@@ -0,0 +1,60 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any
+from typing import Hashable
+from typing import Iterable
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A thread-safe, in-process LRU cache whose entries expire after
+    `ttl` seconds.
+
+    `None` is a valid value: use it to remember that a key does not
+    exist.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, keys: Iterable[Hashable]) -> tuple[dict[Hashable, Any], list[Hashable]]:
+        """Return the cached values by key, and the keys that are not
+        cached (or have expired).
+        """
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                expires_at, value = self._entries.get(key, (0, _MISSING))
+                if value is _MISSING or expires_at <= now:
+                    self._entries.pop(key, None)
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found, missing
+
+    def set_many(self, values: dict[Hashable, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
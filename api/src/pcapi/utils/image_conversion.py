@@ -7,6 +7,7 @@ from the PIL library:
 """
 from dataclasses import dataclass
 import io
+import math
 from typing import Optional
 
 import PIL
@@ -17,7 +18,9 @@ from pydantic import confloat
 
 MAX_THUMB_WIDTH = 750
 CONVERSION_QUALITY = 90
+WEBP_CONVERSION_QUALITY = 80
 DO_NOT_CROP = (0, 0, 1)
+EXIF_ORIENTATION_TAG = 0x0112
 
 IMAGE_RATIO_PORTRAIT_DEFAULT = 6 / 9
 IMAGE_RATIO_LANDSCAPE_DEFAULT = 3 / 2
@@ -33,13 +36,57 @@ class Coordinates:
     y: float
 
 
+@dataclass(frozen=True)
+class ImageVariant:
+    width: int
+    format: str  # a PIL format: "JPEG" or "WEBP"
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}.{self.format.lower()}"
+
+    @property
+    def content_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+
+STANDARD_VARIANT = ImageVariant(MAX_THUMB_WIDTH, "JPEG")
+THUMB_VARIANTS = (
+    STANDARD_VARIANT,
+    ImageVariant(MAX_THUMB_WIDTH, "WEBP"),
+    ImageVariant(375, "JPEG"),
+    ImageVariant(375, "WEBP"),
+    ImageVariant(150, "JPEG"),
+    ImageVariant(150, "WEBP"),
+)
+
+
 def standardize_image(image: bytes, ratio: float, crop_params: Optional[CropParams] = None) -> bytes:
+    """Return the standard variant of the image, see
+    `standardize_image_variants()`.
     """
+    variants = standardize_image_variants(image, ratio, crop_params, variants=(STANDARD_VARIANT,))
+    return variants[STANDARD_VARIANT]
+
+
+def standardize_image_variants(
+    image: bytes,
+    ratio: float,
+    crop_params: Optional[CropParams] = None,
+    variants: tuple[ImageVariant, ...] = THUMB_VARIANTS,
+) -> dict[ImageVariant, bytes]:
+    """
+    Decode the image once and return each requested variant.
+
     Standardization steps are:
+        * let the JPEG decoder downscale the image if it is much larger
+          than the largest variant (see `_draft_image()`)
         * transpose image
         * convert to RGB mode
         * crop image (if specified), see below
-        * convert to jpeg using predefined values
+        * resize to the width of each variant (from the largest to the
+          smallest one)
+        * convert to the format of each variant using predefined values
 
     The cropping sets a new top left corner position, the crop_params
     are used to compute its new coordinates. The bottom right corner's
@@ -59,6 +106,7 @@ def standardize_image(image: bytes, ratio: float, crop_params: Optional[CropPara
     """
     crop_params = crop_params or DO_NOT_CROP
     raw_image = PIL.Image.open(io.BytesIO(image))
+    _draft_image(raw_image, crop_params, ratio, max(variant.width for variant in variants))
 
     # Remove exif orientation so that it doesnt rotate after upload
     transposed_image = _transpose_image(raw_image)
@@ -71,9 +119,35 @@ def standardize_image(image: bytes, ratio: float, crop_params: Optional[CropPara
 
     x_crop_percent, y_crop_percent, height_crop_percent = crop_params
     cropped_image = _crop_image(x_crop_percent, y_crop_percent, height_crop_percent, transposed_image, ratio)
-    resized_image = _resize_image(cropped_image, ratio)
-    standard_image = _convert_to_jpeg(resized_image)
-    return standard_image
+
+    converted = {}
+    resized_image = cropped_image
+    for variant in sorted(variants, key=lambda variant: variant.width, reverse=True):
+        resized_image = _resize_image(resized_image, ratio, variant.width)
+        converted[variant] = _convert(resized_image, variant.format)
+    return converted
+
+
+def _draft_image(image: Image, crop_params: CropParams, ratio: float, width: int) -> None:
+    """Configure the JPEG decoder to downscale the image (by a power
+    of 2) while decoding it, which is much cheaper than decoding the
+    full image and resizing it, as long as the cropped image stays at
+    least `width` pixels wide.
+    """
+    if image.format != "JPEG":
+        return
+    raw_width, raw_height = image.size
+    if image.getexif().get(EXIF_ORIENTATION_TAG) in (5, 6, 7, 8):
+        # The image will be rotated by `_transpose_image()`.
+        raw_width, raw_height = raw_height, raw_width
+    x_crop_percent, _y_crop_percent, height_crop_percent = crop_params
+    cropped_width = raw_width
+    if tuple(crop_params) != DO_NOT_CROP:
+        cropped_width = min(raw_height * height_crop_percent * ratio, raw_width * (1 - x_crop_percent))
+    scale = cropped_width / width
+    if scale < 2:
+        return
+    image.draft("RGB", (math.ceil(image.size[0] / scale), math.ceil(image.size[1] / scale)))
 
 
 def _transpose_image(raw_image):
@@ -110,20 +184,34 @@ def _crop_image(
     return cropped_img
 
 
-def _resize_image(image: Image, ratio: float) -> Image:
-    if image.size[0] <= MAX_THUMB_WIDTH:
+def _resize_image(image: Image, ratio: float, width: int = MAX_THUMB_WIDTH) -> Image:
+    if image.size[0] <= width:
         return image
 
     height_to_width_ratio = 1 / ratio
-    new_height = int(MAX_THUMB_WIDTH * height_to_width_ratio)
-    resized_image = image.resize([MAX_THUMB_WIDTH, new_height])
+    new_height = int(width * height_to_width_ratio)
+    resized_image = image.resize([width, new_height])
 
     return resized_image
 
 
+def _convert(image: Image, image_format: str) -> bytes:
+    if image_format == "WEBP":
+        return _convert_to_webp(image)
+    return _convert_to_jpeg(image)
+
+
 def _convert_to_jpeg(image: Image) -> bytes:
     new_bytes = io.BytesIO()
 
     image.save(new_bytes, format="JPEG", quality=CONVERSION_QUALITY, optimize=True, progressive=True)
 
     return new_bytes.getvalue()
+
+
+def _convert_to_webp(image: Image) -> bytes:
+    new_bytes = io.BytesIO()
+
+    image.save(new_bytes, format="WEBP", quality=WEBP_CONVERSION_QUALITY)
+
+    return new_bytes.getvalue()
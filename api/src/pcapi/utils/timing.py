@@ -0,0 +1,21 @@
+from contextlib import contextmanager
+import time
+from typing import Iterator
+from typing import MutableMapping
+from typing import Optional
+
+
+@contextmanager
+def timed(timings: Optional[MutableMapping[str, float]], stage: str) -> Iterator[None]:
+    """Add the duration (in seconds) of the block to ``timings[stage]``.
+
+    Do nothing if `timings` is None.
+    """
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0) + time.perf_counter() - start
@@ -0,0 +1,117 @@
+"""A minimal XLSX writer that streams the spreadsheet while rows are
+generated, instead of building the whole workbook in memory.
+
+Only what we need for exports is supported: a single sheet of strings
+and numbers, without any styling.
+"""
+import decimal
+import io
+import numbers
+import re
+import typing
+from typing import Iterable
+from typing import Iterator
+from typing import Sequence
+from xml.sax.saxutils import escape
+import zipfile
+
+
+CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Characters that are not allowed in XML 1.0 documents.
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+_SHEET_START = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>"""
+
+_SHEET_END = "</sheetData></worksheet>"
+
+
+class _StreamBuffer(io.RawIOBase):
+    """A non-seekable file object that keeps written data until it is
+    drained. `zipfile` then writes sizes and checksums after the data
+    of each member, so that nothing has to be rewritten afterwards.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _serialize_cell(value: typing.Any) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (numbers.Real, decimal.Decimal)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_INVALID_XML_CHARS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _serialize_row(row: Sequence[typing.Any]) -> str:
+    return "<row>" + "".join(_serialize_cell(value) for value in row) + "</row>"
+
+
+def stream_xlsx(
+    rows: Iterable[Sequence[typing.Any]],
+    sheet_name: str = "Feuille 1",
+    chunk_size: int = 1000,
+) -> Iterator[bytes]:
+    """Yield the content of an XLSX file, `chunk_size` rows at a time.
+
+    Numbers are written as numbers, `None` as an empty cell and
+    anything else as a string.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _WORKBOOK.format(sheet_name=escape(sheet_name, {'"': "&quot;"})))
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(_SHEET_START.encode("utf-8"))
+            yield buffer.drain()
+            lines = []
+            for row in rows:
+                lines.append(_serialize_row(row))
+                if len(lines) >= chunk_size:
+                    sheet.write("".join(lines).encode("utf-8"))
+                    lines = []
+                    yield buffer.drain()
+            sheet.write("".join(lines).encode("utf-8"))
+            sheet.write(_SHEET_END.encode("utf-8"))
+    yield buffer.drain()
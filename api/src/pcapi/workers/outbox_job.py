@@ -0,0 +1,9 @@
+from pcapi.core.outbox import api as outbox_api
+from pcapi.workers import worker
+from pcapi.workers.decorators import job
+
+
+@job(worker.default_queue)
+def process_outbox_events_job(event_ids: list[int]) -> None:
+    for event_id in event_ids:
+        outbox_api.process_event(event_id)
@@ -22,6 +22,7 @@ from pcapi import settings
 import pcapi.core.educational.testing as adage_api_testing
 import pcapi.core.mails.testing as mails_testing
 import pcapi.core.object_storage.testing as object_storage_testing
+from pcapi.core.providers import product_lookup
 import pcapi.core.search.testing as search_testing
 import pcapi.core.testing
 from pcapi.core.users import factories as users_factories
@@ -29,6 +30,7 @@ from pcapi.core.users import testing as users_testing
 from pcapi.install_database_extensions import install_database_extensions
 from pcapi.local_providers.install import install_local_providers
 from pcapi.models import db
+from pcapi.models import feature
 from pcapi.models.feature import install_feature_flags
 from pcapi.notifications.internal import testing as internal_notifications_testing
 from pcapi.notifications.push import testing as push_notifications_testing
@@ -91,6 +93,15 @@ def clear_outboxes():
         adage_api_testing.reset_requests()
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    try:
+        yield
+    finally:
+        product_lookup.clear_cache()
+        feature.clear_cache()
+
+
 @pytest.fixture(autouse=True)
 def clear_redis(app):
     try:
@@ -0,0 +1,114 @@
+import ftplib
+import io
+from unittest import mock
+import zipfile
+
+import pytest
+
+from pcapi.connectors import ftp_titelive
+from pcapi.core.testing import override_settings
+
+
+class FakeFtp:
+    def __init__(self, files, modified_at="20220301120000", fail_after=None):
+        self.files = files
+        self.modified_at = modified_at
+        self.fail_after = fail_after
+        self.downloads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def voidcmd(self, cmd):
+        if cmd.startswith("MDTM "):
+            return "213 " + self.modified_at
+        return "200 OK"
+
+    def size(self, path):
+        return len(self.files[path])
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        data = self.files[cmd.removeprefix("RETR ")][rest or 0 :]
+        self.downloads.append(rest)
+        if self.fail_after is not None:
+            callback(data[: self.fail_after])
+            self.fail_after = None
+            raise ftplib.error_temp("426 Connection closed; transfer aborted.")
+        callback(data)
+
+
+def make_zip(content):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as zip_file:
+        zip_file.writestr("9780847858903_1_75.jpg", content)
+    return data.getvalue()
+
+
+class DownloadFileFromFtpTest:
+    def test_download_and_reuse_cached_file(self, tmp_path):
+        ftp = FakeFtp({"Atoo/livres_tl20220301.zip": b"some data"})
+
+        with override_settings(TITELIVE_FTP_CACHE_DIR=str(tmp_path)):
+            with mock.patch("pcapi.connectors.ftp_titelive.connect_to_titelive_ftp", return_value=ftp):
+                path = ftp_titelive.download_file_from_ftp("livres_tl20220301.zip", "Atoo")
+                assert path == tmp_path / "Atoo" / "20220301120000" / "livres_tl20220301.zip"
+                assert path.read_bytes() == b"some data"
+
+                assert ftp_titelive.download_file_from_ftp("livres_tl20220301.zip", "Atoo") == path
+                assert ftp.downloads == [None]
+
+                # The file has been modified on the FTP: download it
+                # again and remove the previous version.
+                ftp.modified_at = "20220302120000"
+                new_path = ftp_titelive.download_file_from_ftp("livres_tl20220301.zip", "Atoo")
+                assert ftp.downloads == [None, None]
+                assert new_path.exists()
+                assert not path.exists()
+
+    def test_resume_interrupted_download(self, tmp_path):
+        ftp = FakeFtp({"livre3_11/Quotidien30.tit": b"0123456789"}, fail_after=4)
+
+        with override_settings(TITELIVE_FTP_CACHE_DIR=str(tmp_path)):
+            with mock.patch("pcapi.connectors.ftp_titelive.connect_to_titelive_ftp", return_value=ftp):
+                path = ftp_titelive.download_file_from_ftp("Quotidien30.tit", "livre3_11")
+
+        assert path.read_bytes() == b"0123456789"
+        assert ftp.downloads == [None, 4]
+
+    def test_give_up_after_too_many_attempts(self, tmp_path):
+        ftp = FakeFtp({"livre3_11/Quotidien30.tit": b"0123456789"}, fail_after=4)
+
+        with override_settings(TITELIVE_FTP_CACHE_DIR=str(tmp_path), TITELIVE_FTP_DOWNLOAD_ATTEMPTS=1):
+            with mock.patch("pcapi.connectors.ftp_titelive.connect_to_titelive_ftp", return_value=ftp):
+                with pytest.raises(ftplib.error_temp):
+                    ftp_titelive.download_file_from_ftp("Quotidien30.tit", "livre3_11")
+
+        assert (tmp_path / "livre3_11" / "20220301120000" / "Quotidien30.tit.part").read_bytes() == b"0123"
+
+
+class GetFilesFromFtpTest:
+    def test_get_zip_file_without_cache(self, tmp_path):
+        ftp = FakeFtp({"Atoo/livres_tl20220301.zip": make_zip(b"image")})
+
+        with override_settings(TITELIVE_FTP_CACHE_DIR=None):
+            with mock.patch("pcapi.connectors.ftp_titelive.tempfile.gettempdir", return_value=str(tmp_path)):
+                with mock.patch("pcapi.connectors.ftp_titelive.connect_to_titelive_ftp", return_value=ftp):
+                    zip_file = ftp_titelive.get_zip_file_from_ftp("livres_tl20220301.zip", "Atoo")
+
+        assert zip_file.read("9780847858903_1_75.jpg") == b"image"
+        assert zip_file.filename.endswith("livres_tl20220301.zip")
+        # The file is not kept on disk.
+        assert not list((tmp_path / "titelive" / "Atoo" / "20220301120000").iterdir())
+
+    def test_get_lines(self, tmp_path):
+        ftp = FakeFtp({"livre3_11/Quotidien30.tit": "première~ligne\nseconde~ligne\n".encode("iso-8859-1")})
+
+        with override_settings(TITELIVE_FTP_CACHE_DIR=str(tmp_path)):
+            with mock.patch("pcapi.connectors.ftp_titelive.connect_to_titelive_ftp", return_value=ftp):
+                lines = ftp_titelive.get_lines_from_ftp_file("Quotidien30.tit", "livre3_11", encoding="iso-8859-1")
+
+        assert next(lines) == "première~ligne\n"
+        assert list(lines) == ["seconde~ligne\n"]
@@ -25,6 +25,8 @@ import pcapi.core.mails.testing as mails_testing
 from pcapi.core.mails.transactional.sendinblue_template_ids import TransactionalEmail
 import pcapi.core.offers.factories as offers_factories
 import pcapi.core.offers.models as offers_models
+from pcapi.core.outbox import api as outbox_api
+from pcapi.core.outbox import models as outbox_models
 import pcapi.core.payments.factories as payments_factories
 from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_features
@@ -157,6 +159,33 @@ class BookOfferTest:
             TransactionalEmail.BOOKING_CONFIRMATION_BY_BENEFICIARY.value
         )  # to beneficiary
 
+    @mock.patch("pcapi.workers.outbox_job.process_outbox_events_job.delay")
+    def test_side_effects_are_executed_by_a_worker(self, mocked_delay):
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        stock = offers_factories.StockFactory(offer__venue__bookingEmail="venue@example.com")
+
+        booking = api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+        assert not mails_testing.outbox
+        events = outbox_models.OutboxEvent.query.order_by(outbox_models.OutboxEvent.id).all()
+        assert [(event.type, event.payload) for event in events] == [
+            (outbox_models.OutboxEventType.SEND_BOOKING_CONFIRMATION_EMAIL_TO_PRO, {"booking_token": booking.token}),
+            (
+                outbox_models.OutboxEventType.SEND_BOOKING_CONFIRMATION_EMAIL_TO_BENEFICIARY,
+                {"booking_token": booking.token},
+            ),
+            (outbox_models.OutboxEventType.UPDATE_EXTERNAL_USER, {"user_id": beneficiary.id}),
+            (outbox_models.OutboxEventType.UPDATE_EXTERNAL_PRO, {"email": "venue@example.com"}),
+        ]
+        event_ids = [event.id for event in events]
+        mocked_delay.assert_called_once_with(event_ids)
+
+        for event_id in event_ids:
+            outbox_api.process_event(event_id)
+
+        assert len(mails_testing.outbox) == 2
+        assert outbox_models.OutboxEvent.query.count() == 0
+
     def test_free_offer_booking_by_ex_beneficiary(self):
         with freeze_time(datetime.utcnow() - relativedelta(years=2, months=5)):
             ex_beneficiary = users_factories.BeneficiaryGrant18Factory()
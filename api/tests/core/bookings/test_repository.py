@@ -3,7 +3,10 @@ from datetime import date
 from datetime import datetime
 from datetime import time
 from datetime import timedelta
+import io
 from io import StringIO
+from unittest import mock
+import zipfile
 
 from dateutil import tz
 from dateutil.relativedelta import relativedelta
@@ -20,9 +23,11 @@ from pcapi.core.categories import subcategories
 import pcapi.core.offers.factories as offers_factories
 from pcapi.core.payments.api import create_deposit
 from pcapi.core.testing import assert_num_queries
+from pcapi.core.testing import override_settings
 import pcapi.core.users.factories as users_factories
 from pcapi.domain.booking_recap import booking_recap_history
 from pcapi.models import db
+from pcapi.models.api_errors import ApiErrors
 from pcapi.models.api_errors import ResourceNotFoundError
 from pcapi.routes.serialization.bookings_recap_serialize import OfferType
 from pcapi.utils.date import utc_datetime_to_department_timezone
@@ -743,6 +748,70 @@ class FindByProUserTest:
         assert bookings_recap_paginated.pages == 1
         assert bookings_recap_paginated.total == 2
 
+    def test_paginate_with_cursor(self, app: fixture):
+        user_offerer = offers_factories.UserOffererFactory()
+        stock = offers_factories.EventStockFactory(offer__venue__managingOfferer=user_offerer.offerer)
+        booking_date = datetime(2020, 4, 21, 12, 0)
+        bookings_factories.IndividualBookingFactory(stock=stock, dateCreated=booking_date, token="AAAAAA")
+        bookings_factories.IndividualBookingFactory(stock=stock, dateCreated=booking_date, token="BBBBBB", quantity=2)
+        bookings_factories.IndividualBookingFactory(
+            stock=stock, dateCreated=booking_date - timedelta(hours=1), token="CCCCCC"
+        )
+        period = (booking_date.date(), booking_date.date())
+
+        pages = []
+        cursor = None
+        for page in range(1, 4):
+            bookings_recap_paginated = booking_repository.find_by_pro_user(
+                user=user_offerer.user, booking_period=period, page=page, per_page_limit=2, cursor=cursor
+            )
+            pages.append([booking_recap.booking_token for booking_recap in bookings_recap_paginated.bookings_recap])
+            assert bookings_recap_paginated.total == 4
+            assert bookings_recap_paginated.pages == 2
+            cursor = bookings_recap_paginated.next_page_cursor
+            if not cursor:
+                break
+
+        # Most recent bookings first, then by descending id.
+        assert pages == [["BBBBBB", "BBBBBB"], ["AAAAAA", "CCCCCC"]]
+        offset_page = booking_repository.find_by_pro_user(
+            user=user_offerer.user, booking_period=period, page=2, per_page_limit=2
+        )
+        assert [booking_recap.booking_token for booking_recap in offset_page.bookings_recap] == pages[1]
+
+    def test_should_raise_on_invalid_cursor(self, app: fixture):
+        user_offerer = offers_factories.UserOffererFactory()
+
+        with pytest.raises(ApiErrors) as error:
+            booking_repository.find_by_pro_user(
+                user=user_offerer.user, booking_period=(date(2020, 4, 21), date(2020, 4, 22)), cursor="invalid"
+            )
+
+        assert error.value.errors == {"cursor": ["Le curseur de pagination est invalide"]}
+
+    def test_should_cache_total(self, app: fixture):
+        user_offerer = offers_factories.UserOffererFactory()
+        booking = bookings_factories.IndividualBookingFactory(
+            stock__offer__venue__managingOfferer=user_offerer.offerer, dateCreated=datetime(2020, 4, 21, 12, 0)
+        )
+        period = (date(2020, 4, 21), date(2020, 4, 21))
+        booking_repository.find_by_pro_user(user=user_offerer.user, booking_period=period)
+        bookings_factories.IndividualBookingFactory(stock=booking.stock, dateCreated=booking.dateCreated)
+
+        with assert_num_queries(1):
+            bookings_recap_paginated = booking_repository.find_by_pro_user(
+                user=user_offerer.user, booking_period=period
+            )
+
+        assert len(bookings_recap_paginated.bookings_recap) == 2
+        assert bookings_recap_paginated.total == 1  # cached
+        other_venue = booking_repository.find_by_pro_user(
+            user=user_offerer.user, booking_period=period, venue_id=booking.venueId
+        )
+        assert other_venue.total == 2
+        with override_settings(PRO_BOOKINGS_TOTAL_CACHE_TTL=0):
+            assert booking_repository.find_by_pro_user(user=user_offerer.user, booking_period=period).total == 2
+
     def test_should_return_booking_date_with_offerer_timezone_when_venue_is_digital(self, app: fixture):
         # Given
         beneficiary = users_factories.BeneficiaryGrant18Factory()
@@ -959,6 +1028,33 @@ class FindByProUserTest:
         assert cayenne_booking.token in bookings_tokens
         assert mayotte_booking.token in bookings_tokens
 
+    def test_should_consider_venues_far_from_utc_when_filtering_by_booking_period(self, app: fixture):
+        user_offerer = offers_factories.UserOffererFactory()
+        period = (date(2020, 4, 21), date(2020, 4, 21))
+        # 2020-04-21 23:30 in Tahiti (UTC-10)
+        tahiti_booking = bookings_factories.IndividualBookingFactory(
+            stock__offer__venue__postalCode="98714",
+            stock__offer__venue__managingOfferer=user_offerer.offerer,
+            dateCreated=datetime(2020, 4, 22, 9, 30),
+        )
+        # 2020-04-21 00:30 in Nouméa (UTC+11)
+        noumea_booking = bookings_factories.IndividualBookingFactory(
+            stock__offer__venue__postalCode="98800",
+            stock__offer__venue__managingOfferer=user_offerer.offerer,
+            dateCreated=datetime(2020, 4, 20, 13, 30),
+        )
+        # 2020-04-22 00:30 in Nouméa
+        bookings_factories.IndividualBookingFactory(
+            stock__offer__venue__postalCode="98800",
+            stock__offer__venue__managingOfferer=user_offerer.offerer,
+            dateCreated=datetime(2020, 4, 21, 13, 30),
+        )
+
+        bookings_recap_paginated = booking_repository.find_by_pro_user(user=user_offerer.user, booking_period=period)
+
+        bookings_tokens = {booking_recap.booking_token for booking_recap in bookings_recap_paginated.bookings_recap}
+        assert bookings_tokens == {tahiti_booking.token, noumea_booking.token}
+
     def test_should_set_educational_booking_confirmation_date_in_history(self, app: fixture) -> None:
         # Given
         pro = users_factories.ProFactory()
@@ -1147,6 +1243,45 @@ class GetCsvReportTest:
         assert data_dict["Date et heure de remboursement"] == ""
         assert data_dict["Type d'offre"] == "offre grand public"
 
+    @mock.patch("pcapi.core.bookings.repository.REPORT_BATCH_SIZE", 2)
+    def test_stream_csv_report_in_chunks(self, app: fixture):
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=offerer)
+        booking_date = datetime(2020, 1, 1, 10, 0, 0)
+        bookings_factories.BookingFactory.create_batch(5, stock=stock, dateCreated=booking_date)
+
+        chunks = list(
+            booking_repository.stream_csv_report(
+                user=pro, booking_period=(booking_date - timedelta(days=1), booking_date + timedelta(days=1))
+            )
+        )
+
+        # header and 2 bookings, 2 bookings, 1 booking
+        assert [len(list(csv.reader(StringIO(chunk)))) for chunk in chunks] == [3, 2, 1]
+
+    def test_stream_excel_report(self, app: fixture):
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=offerer, offer__name="Harry Potter")
+        booking_date = datetime(2020, 1, 1, 10, 0, 0)
+        bookings_factories.BookingFactory(stock=stock, dateCreated=booking_date, amount=12)
+
+        content = b"".join(
+            booking_repository.stream_excel_report(
+                user=pro, booking_period=(booking_date - timedelta(days=1), booking_date + timedelta(days=1))
+            )
+        )
+
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        assert sheet.count("<row>") == 2
+        assert "Nom de l’offre" in sheet
+        assert "Harry Potter" in sheet
+        assert "<v>12.00</v>" in sheet
+
     def test_should_not_return_token_for_non_used_goods(self, app: fixture):
         # Given
         beneficiary = users_factories.BeneficiaryGrant18Factory(
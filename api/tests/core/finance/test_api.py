@@ -26,6 +26,7 @@ from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import clean_temporary_files
 from pcapi.core.testing import override_settings
 import pcapi.core.users.factories as users_factories
+from pcapi.domain import reimbursement
 from pcapi.models.bank_information import BankInformationStatus
 from pcapi.utils import human_ids
 
@@ -178,14 +179,101 @@ class PriceBookingTest:
         queries += 1  # fetch booking again with multiple joinedload
         queries += 1  # select existing Pricing (if any)
         queries += 1  # select dependent pricings
-        queries += 1  # select latest pricing (to get revenue)
-        queries += 1  # select all CustomReimbursementRule
+        queries += 1  # select SiretRevenue
+        queries += 1  # compute revenue from pricings (no SiretRevenue yet)
+        queries += 1  # upsert SiretRevenue
+        queries += 1  # select all CustomReimbursementRule (then cached)
         queries += 3  # insert 1 Pricing + 2 PricingLine
         queries += 1  # commit
         with assert_num_queries(queries):
             api.price_booking(booking)
 
 
+class PriceBookingsOfBusinessUnitTest:
+    def test_basics(self):
+        booking1 = bookings_factories.UsedBookingFactory(amount=10, stock=offers_factories.ThingStockFactory())
+        before = booking1.dateUsed - datetime.timedelta(seconds=60)
+        booking2 = bookings_factories.UsedBookingFactory(amount=20, dateUsed=before, stock__offer__venue=booking1.venue)
+        business_unit = booking1.venue.businessUnit
+
+        priced = api.price_bookings_of_business_unit(business_unit.id, [booking1.id, booking2.id])
+
+        assert priced == 2
+        pricing2, pricing1 = models.Pricing.query.order_by(models.Pricing.valueDate).all()
+        # Bookings are priced in the order in which they have been used.
+        assert pricing2.booking == booking2
+        assert pricing2.revenue == 2000
+        assert pricing1.booking == booking1
+        assert pricing1.revenue == 3000
+        assert pricing1.businessUnit == business_unit
+        assert pricing1.siret == booking1.venue.siret
+        assert pricing1.valueDate == booking1.dateUsed
+        assert pricing1.amount == -1000
+        assert pricing1.standardRule == "Remboursement total pour les offres physiques"
+        assert [line.category for line in pricing1.lines] == [
+            models.PricingLineCategory.OFFERER_REVENUE,
+            models.PricingLineCategory.OFFERER_CONTRIBUTION,
+        ]
+        assert [line.amount for line in pricing1.lines] == [-1000, 0]
+
+    def test_accrue_revenue_from_existing_pricings(self):
+        existing = factories.PricingFactory(booking__amount=10)
+        existing_booking = existing.booking
+        booking = bookings_factories.UsedBookingFactory(
+            amount=20,
+            dateUsed=existing_booking.dateUsed + datetime.timedelta(seconds=1),
+            stock__offer__venue=existing_booking.venue,
+        )
+
+        api.price_bookings_of_business_unit(booking.venue.businessUnitId, [booking.id])
+
+        assert booking.pricings[0].revenue == 3000
+
+    def test_delete_dependent_pricings(self):
+        pricing = factories.PricingFactory()
+        booking1 = pricing.booking
+        before = booking1.dateUsed - datetime.timedelta(seconds=60)
+        booking2 = bookings_factories.UsedBookingFactory(dateUsed=before, stock__offer__venue=booking1.venue)
+
+        api.price_bookings_of_business_unit(booking2.venue.businessUnitId, [booking2.id])
+
+        # Pricing of `booking1` has been deleted.
+        single_pricing = models.Pricing.query.one()
+        assert single_pricing.booking == booking2
+
+    def test_skip_priced_and_unused_bookings(self):
+        existing = factories.PricingFactory()
+        priced_booking = existing.booking
+        unused_booking = bookings_factories.BookingFactory(stock__offer__venue=priced_booking.venue)
+
+        priced = api.price_bookings_of_business_unit(
+            priced_booking.venue.businessUnitId, [priced_booking.id, unused_booking.id]
+        )
+
+        assert priced == 0
+        assert models.Pricing.query.one() == existing
+
+    def test_num_queries_does_not_depend_on_number_of_bookings(self):
+        booking = bookings_factories.UsedBookingFactory()
+        bookings_factories.UsedBookingFactory.create_batch(4, stock__offer__venue=booking.venue)
+        booking_ids = [booking.id for booking in bookings_models.Booking.query.order_by("id")]
+        rule_finder = reimbursement.CustomRuleFinder()
+
+        queries = 0
+        queries += 1  # select for update on BusinessUnit (lock)
+        queries += 1  # fetch bookings again with multiple joinedload
+        queries += 1  # select dependent pricings
+        queries += 1  # select existing Pricing (if any)
+        queries += 1  # select SiretRevenue
+        queries += 1  # compute revenue from pricings (no SiretRevenue yet)
+        queries += 2  # insert Pricing + PricingLine
+        queries += 1  # upsert SiretRevenue
+        queries += 1  # commit
+        with assert_num_queries(queries):
+            api.price_bookings_of_business_unit(booking.venue.businessUnitId, booking_ids, rule_finder)
+        assert models.Pricing.query.count() == 5
+
+
 class GetRevenuePeriodTest:
     def test_after_midnight(self):
         # Year is 2021 in CET.
@@ -277,6 +365,103 @@ class GetSiretAndCurrentRevenueTest:
         assert current_revenue == 3000
 
 
+class SiretRevenueTest:
+    def get_revenue(self, booking):
+        year = api._get_revenue_year(booking.dateUsed)
+        return models.SiretRevenue.query.filter_by(siret=booking.venue.siret, year=year).one().revenue
+
+    def test_accrue_revenue_when_pricing(self):
+        booking1 = bookings_factories.UsedBookingFactory(amount=10)
+        booking2 = bookings_factories.UsedBookingFactory(amount=20, stock__offer__venue=booking1.venue)
+        api.price_booking(booking1)
+        assert self.get_revenue(booking1) == 1000
+        api.price_booking(booking2)
+        assert self.get_revenue(booking1) == 3000
+
+    def test_initialize_revenue_from_existing_pricings(self):
+        existing = factories.PricingFactory(booking__amount=10)
+        booking = bookings_factories.UsedBookingFactory(amount=20, stock__offer__venue=existing.booking.venue)
+        pricing = api.price_booking(booking)
+        assert pricing.revenue == 3000
+        assert self.get_revenue(booking) == 3000
+
+    def test_use_stored_revenue(self):
+        booking = bookings_factories.UsedBookingFactory(amount=20)
+        factories.SiretRevenueFactory(
+            siret=booking.venue.siret,
+            year=api._get_revenue_year(booking.dateUsed),
+            revenue=500,
+        )
+        pricing = api.price_booking(booking)
+        assert pricing.revenue == 2500
+        assert self.get_revenue(booking) == 2500
+
+    def test_remove_cancelled_pricing_from_revenue(self):
+        booking1 = bookings_factories.UsedBookingFactory(amount=10)
+        booking2 = bookings_factories.UsedBookingFactory(amount=20, stock__offer__venue=booking1.venue)
+        api.price_booking(booking1)
+        api.price_booking(booking2)
+
+        api.cancel_pricing(booking2, models.PricingLogReason.MARK_AS_UNUSED)
+
+        assert self.get_revenue(booking1) == 1000
+
+    def test_remove_deleted_dependent_pricings_from_revenue(self):
+        booking1 = bookings_factories.UsedBookingFactory(amount=10)
+        booking2 = bookings_factories.UsedBookingFactory(amount=20, stock__offer__venue=booking1.venue)
+        api.price_booking(booking1)
+        api.price_booking(booking2)
+
+        # Cancelling the pricing of `booking1` deletes the pricing of `booking2`.
+        api.cancel_pricing(booking1, models.PricingLogReason.MARK_AS_UNUSED)
+
+        assert self.get_revenue(booking1) == 0
+
+    def test_price_bookings_of_business_unit(self):
+        booking1 = bookings_factories.UsedBookingFactory(amount=10)
+        booking2 = bookings_factories.UsedBookingFactory(amount=20, stock__offer__venue=booking1.venue)
+        api.price_bookings_of_business_unit(booking1.venue.businessUnitId, [booking1.id, booking2.id])
+        assert self.get_revenue(booking1) == 3000
+
+
+class CheckSiretRevenuesTest:
+    def test_report_and_fix_inconsistent_revenues(self):
+        pricing = factories.PricingFactory(booking__amount=10)
+        year = api._get_revenue_year(pricing.valueDate)
+        consistent = factories.SiretRevenueFactory(siret=pricing.siret, year=year, revenue=1000)
+        inconsistent = factories.SiretRevenueFactory(year=year, revenue=500)
+
+        differences = api.check_siret_revenues()
+
+        assert differences == [
+            {
+                "siret": inconsistent.siret,
+                "year": year,
+                "stored_revenue": 500,
+                "expected_revenue": 0,
+            }
+        ]
+        assert inconsistent.revenue == 500  # unchanged
+
+        api.check_siret_revenues(year=year, fix=True)
+        assert inconsistent.revenue == 0
+        assert consistent.revenue == 1000
+        assert api.check_siret_revenues() == []
+
+    def test_ignore_cancelled_pricings_and_other_years(self):
+        pricing = factories.PricingFactory(booking__amount=10)
+        factories.PricingFactory(
+            siret=pricing.siret,
+            valueDate=pricing.valueDate,
+            status=models.PricingStatus.CANCELLED,
+        )
+        year = api._get_revenue_year(pricing.valueDate)
+        factories.SiretRevenueFactory(siret=pricing.siret, year=year, revenue=1000)
+        factories.SiretRevenueFactory(siret=pricing.siret, year=year - 1, revenue=0)
+
+        assert api.check_siret_revenues() == []
+
+
 class CancelPricingTest:
     def test_basics(self):
         pricing = factories.PricingFactory()
@@ -355,13 +540,37 @@ class PriceBookingsTest:
         api.price_bookings(min_date=self.few_minutes_ago)
         assert len(booking.pricings) == 1
 
-    @mock.patch("pcapi.core.finance.api.price_booking", lambda booking: None)
+    @mock.patch("pcapi.core.finance.api.price_bookings_of_business_unit", lambda *args: 0)
     def test_num_queries(self):
         bookings_factories.UsedBookingFactory(dateUsed=self.few_minutes_ago)
-        n_queries = 1
+        n_queries = 0
+        n_queries += 1  # select bookings to price
+        n_queries += 1  # select all CustomReimbursementRule
         with assert_num_queries(n_queries):
             api.price_bookings(self.few_minutes_ago)
 
+    def test_price_bookings_of_business_unit_in_batches(self):
+        booking1 = bookings_factories.UsedBookingFactory(amount=10, dateUsed=self.few_minutes_ago)
+        booking2 = bookings_factories.UsedBookingFactory(
+            amount=20,
+            dateUsed=self.few_minutes_ago + datetime.timedelta(seconds=1),
+            stock__offer__venue=booking1.venue,
+        )
+        booking3 = bookings_factories.UsedBookingFactory(
+            amount=30,
+            dateUsed=self.few_minutes_ago + datetime.timedelta(seconds=2),
+            stock__offer__venue=booking1.venue,
+        )
+
+        with mock.patch(
+            "pcapi.core.finance.api.price_bookings_of_business_unit",
+            side_effect=api.price_bookings_of_business_unit,
+        ) as mocked_price:
+            api.price_bookings(self.few_minutes_ago, batch_size=2)
+
+        assert [call.args[1] for call in mocked_price.mock_calls] == [[booking1.id, booking2.id], [booking3.id]]
+        assert [booking.pricings[0].revenue for booking in (booking1, booking2, booking3)] == [1000, 3000, 6000]
+
     def test_error_on_a_booking_does_not_block_other_bookings(self):
         booking1 = create_booking_with_undeletable_dependent(date_used=self.few_minutes_ago)
         booking2 = bookings_factories.UsedBookingFactory(dateUsed=self.few_minutes_ago)
@@ -1,17 +1,22 @@
+import threading
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 from google.cloud.exceptions import NotFound
 import pytest
 
+from pcapi.core import object_storage
 from pcapi.core.object_storage import BACKENDS_MAPPING
 from pcapi.core.object_storage import _check_backend_setting
 from pcapi.core.object_storage import _check_backends_module_paths
 from pcapi.core.object_storage import delete_public_object
 from pcapi.core.object_storage import store_public_object
+from pcapi.core.object_storage.backends.base import BaseBackend
 from pcapi.core.offers.models import Mediation
 from pcapi.core.testing import override_settings
 from pcapi.models.product import Product
+from pcapi.utils.image_conversion import ImageVariant
+from pcapi.utils.image_conversion import STANDARD_VARIANT
 
 
 class StorePublicObjectTest:
@@ -42,6 +47,112 @@ class StorePublicObjectTest:
         mock_gcp_store_public_object.assert_called_once_with("bucket", "object_id", b"mouette", "image/jpeg")
 
 
+class SlowBackend(BaseBackend):
+    """A backend that only returns once another backend has been
+    called (or after a timeout, in which case it fails), to check that
+    backends are called concurrently.
+    """
+
+    barrier = None
+    stored = []
+
+    def store_public_object(self, folder, object_id, blob, content_type):
+        self.barrier.wait(timeout=5)
+        self.stored.append(object_id)
+
+
+class FlakyBackend(BaseBackend):
+    failures = 0
+    calls = 0
+
+    def store_public_object(self, folder, object_id, blob, content_type):
+        FlakyBackend.calls += 1
+        if FlakyBackend.calls <= self.failures:
+            raise ConnectionError()
+
+
+@pytest.fixture(name="fake_backends")
+def fake_backends_fixture():
+    BACKENDS_MAPPING["slow1"] = f"{__name__}.SlowBackend"
+    BACKENDS_MAPPING["slow2"] = f"{__name__}.SlowBackend2"
+    BACKENDS_MAPPING["flaky"] = f"{__name__}.FlakyBackend"
+    SlowBackend.barrier = threading.Barrier(2)
+    SlowBackend.stored = []
+    FlakyBackend.calls = 0
+    yield
+    for name in ("slow1", "slow2", "flaky"):
+        BACKENDS_MAPPING.pop(name)
+
+
+class SlowBackend2(SlowBackend):
+    pass
+
+
+class BackendsTest:
+    def test_backend_instance_is_reused(self):
+        backend = object_storage._get_backend(BACKENDS_MAPPING["local"])
+        assert object_storage._get_backend(BACKENDS_MAPPING["local"]) is backend
+
+    @override_settings(OBJECT_STORAGE_PROVIDER="slow1,slow2")
+    def test_call_backends_concurrently(self, fake_backends):
+        store_public_object("bucket", "object_id", b"mouette", "image/jpeg")
+        assert SlowBackend.stored == ["object_id", "object_id"]
+
+    @override_settings(OBJECT_STORAGE_PROVIDER="flaky", OBJECT_STORAGE_RETRY_DELAY=0)
+    def test_retry_on_error(self, fake_backends):
+        FlakyBackend.failures = 2
+        store_public_object("bucket", "object_id", b"mouette", "image/jpeg")
+        assert FlakyBackend.calls == 3
+
+    @override_settings(OBJECT_STORAGE_PROVIDER="flaky", OBJECT_STORAGE_RETRY_DELAY=0, OBJECT_STORAGE_ATTEMPTS=2)
+    def test_give_up_after_too_many_attempts(self, fake_backends):
+        FlakyBackend.failures = 2
+        with pytest.raises(ConnectionError):
+            store_public_object("bucket", "object_id", b"mouette", "image/jpeg")
+        assert FlakyBackend.calls == 2
+
+    @override_settings(OBJECT_STORAGE_PROVIDER="local")
+    @patch("pcapi.core.object_storage.backends.local.LocalBackend.store_public_object", side_effect=OSError)
+    def test_do_not_retry_local_backend(self, mock_local_store_public_object):
+        with pytest.raises(OSError):
+            store_public_object("bucket", "object_id", b"mouette", "image/jpeg")
+        mock_local_store_public_object.assert_called_once()
+
+
+class StorePublicObjectsAsyncTest:
+    @override_settings(OBJECT_STORAGE_PROVIDER="local")
+    def test_store_objects_with_local_backend(self, tmp_path):
+        objects = [
+            object_storage.PublicObject("thumbs", f"products/{i}", f"image {i}".encode(), "image/jpeg")
+            for i in range(3)
+        ]
+        with override_settings(LOCAL_STORAGE_DIR=tmp_path):
+            futures = object_storage.store_public_objects_async(objects)
+            for future in futures:
+                future.result()
+
+        for i in range(3):
+            assert (tmp_path / "thumbs" / "products" / str(i)).read_bytes() == f"image {i}".encode()
+            assert (tmp_path / "thumbs" / "products" / f"{i}.type").read_text() == "image/jpeg"
+
+    @override_settings(OBJECT_STORAGE_PROVIDER="slow1,slow2")
+    def test_store_objects_with_slow_backends(self, fake_backends):
+        objects = [object_storage.PublicObject("bucket", "object_id", b"mouette", "image/jpeg")]
+        futures = object_storage.store_public_objects_async(objects)
+        futures[0].result()
+        assert SlowBackend.stored == ["object_id", "object_id"]
+
+    @override_settings(OBJECT_STORAGE_PROVIDER="flaky", OBJECT_STORAGE_ATTEMPTS=1)
+    def test_log_errors(self, fake_backends, caplog):
+        FlakyBackend.failures = 1
+        objects = [object_storage.PublicObject("bucket", "object_id", b"mouette", "image/jpeg")]
+        futures = object_storage.store_public_objects_async(objects)
+
+        assert isinstance(futures[0].exception(), ConnectionError)
+        assert caplog.messages == ["Could not store object in the background"]
+        assert caplog.records[0].extra["object_id"] == "object_id"
+
+
 class CheckBackendSettingTest:
     @override_settings(OBJECT_STORAGE_PROVIDER="")
     def test_empty_setting(self):
@@ -127,3 +238,8 @@ class GetThumbStorageIdTest:
     def test_with_index_above_0(self):
         obj = Product(id=123)
         assert obj.get_thumb_storage_id(3) == "products/PM_3"
+
+    def test_with_variant(self):
+        obj = Product(id=123)
+        assert obj.get_thumb_storage_id(0, STANDARD_VARIANT) == "products/PM"
+        assert obj.get_thumb_storage_id(0, ImageVariant(375, "WEBP")) == "products/PM.375.webp"
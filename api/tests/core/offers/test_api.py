@@ -34,6 +34,7 @@ from pcapi.notifications.push import testing as push_testing
 from pcapi.routes.serialization import offers_serialize
 from pcapi.routes.serialization import stock_serialize
 from pcapi.utils.human_ids import humanize
+from pcapi.utils.image_conversion import THUMB_VARIANTS
 
 import tests
 
@@ -1317,9 +1318,11 @@ class CreateMediationV2Test:
         assert not (self.THUMBS_DIR / thumb_2_id).exists()
         assert not (self.THUMBS_DIR / (thumb_2_id + ".type")).exists()
 
-        assert len(os.listdir(self.THUMBS_DIR)) == existing_number_of_files + 2
+        # Each variant is stored along with a ".type" file.
+        assert len(os.listdir(self.THUMBS_DIR)) == existing_number_of_files + 2 * len(THUMB_VARIANTS)
         assert (self.THUMBS_DIR / thumb_3_id).exists()
         assert (self.THUMBS_DIR / (thumb_3_id + ".type")).exists()
+        assert (self.THUMBS_DIR / (thumb_3_id + ".375.webp")).exists()
 
     @mock.patch("pcapi.core.object_storage.store_public_object", side_effect=Exception)
     @override_settings(LOCAL_STORAGE_DIR=BASE_THUMBS_DIR)
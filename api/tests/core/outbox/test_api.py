@@ -0,0 +1,138 @@
+import datetime
+from unittest import mock
+
+from freezegun import freeze_time
+import pytest
+
+from pcapi.core.outbox import api
+from pcapi.core.outbox import models
+import pcapi.core.users.factories as users_factories
+from pcapi.models import db
+import pcapi.notifications.push.testing as push_testing
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def record_and_commit(event_type=models.OutboxEventType.UPDATE_EXTERNAL_USER, **payload):
+    event = api.record(event_type, **payload)
+    db.session.commit()
+    return event
+
+
+class DispatchTest:
+    def test_execute_committed_events(self):
+        user = users_factories.BeneficiaryGrant18Factory()
+        event = record_and_commit(user_id=user.id)
+
+        api.dispatch([event])
+
+        assert models.OutboxEvent.query.count() == 0
+        assert push_testing.requests
+        assert {request["user_id"] for request in push_testing.requests} == {user.id}
+
+    def test_no_event(self):
+        with mock.patch("pcapi.workers.outbox_job.process_outbox_events_job.delay") as delay:
+            api.dispatch([])
+
+        delay.assert_not_called()
+
+
+class ProcessEventTest:
+    @mock.patch("pcapi.core.outbox.handlers.update_external_user", side_effect=ValueError("oops"))
+    def test_retry_failed_event(self, handler):
+        event = record_and_commit(user_id=1)
+
+        with freeze_time("2022-03-09 10:00:00"):
+            api.process_event(event.id)
+            api.process_event(event.id)  # not due yet
+        with freeze_time("2022-03-09 10:01:00"):
+            api.process_event(event.id)
+
+        assert handler.call_count == 2
+        event = models.OutboxEvent.query.one()
+        assert event.attempts == 2
+        assert event.nextAttemptDate == datetime.datetime(2022, 3, 9, 10, 3)
+        assert event.lastError == "ValueError: oops"
+
+    def test_claim_event_before_executing_it(self):
+        event = record_and_commit(user_id=1)
+        event_id = event.id
+
+        def handler(payload):
+            # Simulate another worker, after the handler has committed.
+            db.session.commit()
+            api.process_event(event_id)
+
+        with mock.patch("pcapi.core.outbox.handlers.update_external_user", side_effect=handler) as mocked:
+            with freeze_time("2022-03-09 10:00:00"):
+                api.process_event(event_id)
+
+        mocked.assert_called_once_with({"user_id": 1})
+        assert models.OutboxEvent.query.count() == 0
+
+    @mock.patch("pcapi.core.outbox.handlers.update_external_user", side_effect=ValueError("oops"))
+    def test_execute_event_again_after_lease(self, handler):
+        event = record_and_commit(user_id=1)
+        event.attempts = 1
+        event.nextAttemptDate = datetime.datetime(2022, 3, 9, 10, 0)
+        db.session.commit()
+
+        with freeze_time("2022-03-09 09:59:00"):
+            api.process_event(event.id)
+        handler.assert_not_called()
+
+        with freeze_time("2022-03-09 10:00:00"):
+            api.process_event(event.id)
+        handler.assert_called_once_with({"user_id": 1})
+        assert models.OutboxEvent.query.one().attempts == 2
+
+    @mock.patch("pcapi.core.outbox.handlers.update_external_user", side_effect=ValueError("oops"))
+    def test_give_up_after_max_attempts(self, handler):
+        event = record_and_commit(user_id=1)
+        event.attempts = api.MAX_ATTEMPTS - 1
+        event.nextAttemptDate = datetime.datetime.utcnow()
+        db.session.commit()
+
+        api.process_event(event.id)
+
+        handler.assert_called_once_with({"user_id": 1})
+        assert models.OutboxEvent.query.count() == 0
+
+
+class ProcessPendingEventsTest:
+    @mock.patch("pcapi.core.outbox.handlers.update_external_pro")
+    def test_process_due_events(self, handler):
+        due = record_and_commit(models.OutboxEventType.UPDATE_EXTERNAL_PRO, email="due@example.com")
+        due.nextAttemptDate = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+        later = record_and_commit(models.OutboxEventType.UPDATE_EXTERNAL_PRO, email="later@example.com")
+        later.attempts = 1
+        later.nextAttemptDate = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+        db.session.commit()
+
+        api.process_pending_events()
+
+        handler.assert_called_once_with({"email": "due@example.com"})
+        assert models.OutboxEvent.query.one().id == later.id
+        assert not models.OutboxEvent.query.filter_by(id=due.id).count()
+
+    @mock.patch("pcapi.core.outbox.handlers.update_external_pro")
+    def test_leave_recent_events_to_dispatch(self, handler):
+        record_and_commit(models.OutboxEventType.UPDATE_EXTERNAL_PRO, email="pro@example.com")
+
+        api.process_pending_events()
+
+        handler.assert_not_called()
+        assert models.OutboxEvent.query.count() == 1
+
+    @mock.patch("pcapi.core.outbox.handlers.update_external_pro")
+    def test_purge_abandoned_events(self, handler):
+        event = record_and_commit(models.OutboxEventType.UPDATE_EXTERNAL_PRO, email="pro@example.com")
+        event.attempts = api.MAX_ATTEMPTS
+        event.nextAttemptDate = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+        db.session.commit()
+
+        api.process_pending_events()
+
+        handler.assert_not_called()
+        assert models.OutboxEvent.query.count() == 0
@@ -14,11 +14,15 @@ from pcapi.core.offers.factories import StockFactory
 from pcapi.core.offers.factories import VenueFactory
 from pcapi.core.offers.models import Offer
 from pcapi.core.providers import api
+from pcapi.core.providers import product_lookup
 from pcapi.core.providers.exceptions import ProviderNotFound
 import pcapi.core.providers.factories as providers_factories
 from pcapi.core.providers.models import StockDetail
 from pcapi.core.providers.models import VenueProvider
+from pcapi.core.providers.product_lookup import ProductInfo
+from pcapi.core.testing import assert_num_queries
 from pcapi.local_providers.provider_api import synchronize_provider_api
+from pcapi.models import db
 from pcapi.models.product import Product
 
 
@@ -200,9 +204,54 @@ class SynchronizeStocksTest:
 
         # Test offer reindexation
         mock_async_index_offer_ids.assert_called_with(
-            {stock.offer.id, offer.id, stock_with_booking.offer.id, created_offer.id, second_created_offer.id}
+            {stock.offer.id, offer.id, stock_with_booking.offer.id, created_offer.id, second_created_offer.id},
+            low_priority=True,
         )
 
+    @pytest.mark.usefixtures("db_session")
+    @mock.patch("pcapi.core.search.async_index_offer_ids")
+    def test_number_of_queries_per_page(self, mock_async_index_offer_ids):
+        venue = VenueFactory()
+        provider = providers_factories.ProviderFactory()
+        spec = [{"ref": f"30100001{i:05}", "available": 5} for i in range(20)]
+        for item in spec:
+            create_product(item["ref"])
+        stock_details = synchronize_provider_api._build_stock_details_from_raw_stocks(
+            spec, venue.siret, provider, venue.id
+        )
+        # First page: products are cached, offers and stocks are created.
+        api.synchronize_stocks(stock_details, venue, provider_id=provider.id)
+        assert Offer.query.filter_by(venueId=venue.id).count() == 20
+        db.session.refresh(venue)  # expired by the commit
+
+        n_queries = 1  # select offers and stocks
+        n_queries += 1  # update offers
+        n_queries += 1  # update stocks
+        n_queries += 1  # commit
+        with assert_num_queries(n_queries):
+            operations = api.synchronize_stocks(stock_details, venue, provider_id=provider.id)
+
+        assert operations == {"new_offers": 0, "new_stocks": 0, "updated_stocks": 20}
+
+    @pytest.mark.usefixtures("db_session")
+    @mock.patch("pcapi.core.search.async_index_offer_ids")
+    def test_do_not_create_offers_of_cached_products_that_have_been_deleted(self, mock_async_index_offer_ids):
+        venue = VenueFactory()
+        provider = providers_factories.ProviderFactory()
+        spec = [{"ref": "3010000101789", "available": 6}, {"ref": "3010000101797", "available": 4}]
+        deleted_product = create_product(spec[0]["ref"])
+        create_product(spec[1]["ref"])
+        product_lookup.get_products_by_ean([item["ref"] for item in spec])
+        Product.query.filter_by(id=deleted_product.id).delete()
+        stock_details = synchronize_provider_api._build_stock_details_from_raw_stocks(
+            spec, venue.siret, provider, venue.id
+        )
+
+        operations = api.synchronize_stocks(stock_details, venue, provider_id=provider.id)
+
+        assert operations == {"new_offers": 1, "new_stocks": 1, "updated_stocks": 0}
+        assert Offer.query.one().idAtProvider == spec[1]["ref"]
+
     def test_build_new_offers_from_stock_details(self, db_session):
         # Given
         spec = [
@@ -313,10 +362,10 @@ class SynchronizeStocksTest:
         }
         offers_by_provider_reference = {"offer_ref1": 123, "offer_ref2": 134, "offer_ref4": 123}
         products_by_provider_reference = {
-            "product_ref1": Product(extraData={"prix_livre": 7.01}),
-            "product_ref2": Product(extraData={"prix_livre": 9.02}),
-            "product_ref3": Product(extraData={"prix_livre": 11.03}),
-            "product_ref4": Product(extraData={"prix_livre": 7.01}),
+            "product_ref1": ProductInfo(id=1, price=7.01, subcategoryId=subcategories.LIVRE_PAPIER.id),
+            "product_ref2": ProductInfo(id=2, price=9.02, subcategoryId=subcategories.LIVRE_PAPIER.id),
+            "product_ref3": ProductInfo(id=3, price=11.03, subcategoryId=subcategories.LIVRE_PAPIER.id),
+            "product_ref4": ProductInfo(id=4, price=7.01, subcategoryId=subcategories.LIVRE_PAPIER.id),
         }
         provider_id = 1
 
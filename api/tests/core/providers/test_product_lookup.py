@@ -0,0 +1,105 @@
+import pytest
+
+from pcapi.core.categories import subcategories
+from pcapi.core.offers import factories
+from pcapi.core.providers import product_lookup
+import pcapi.core.providers.factories as providers_factories
+from pcapi.core.testing import assert_num_queries
+from pcapi.repository import repository
+
+
+def create_product(isbn, **kwargs):
+    return factories.ProductFactory(
+        idAtProviders=isbn,
+        subcategoryId=subcategories.LIVRE_PAPIER.id,
+        extraData={"prix_livre": "12.5"},
+        **kwargs,
+    )
+
+
+@pytest.mark.usefixtures("db_session")
+class GetProductsByEanTest:
+    def test_cache_products(self):
+        product = create_product("9780000000001")
+        create_product("9780000000002", isGcuCompatible=False)
+
+        with assert_num_queries(1):
+            products = product_lookup.get_products_by_ean(["9780000000001", "9780000000002", "9780000000003"])
+        with assert_num_queries(0):
+            assert product_lookup.get_products_by_ean(["9780000000001"]) == products
+
+        assert products == {
+            "9780000000001": product_lookup.ProductInfo(
+                id=product.id, price=12.5, subcategoryId=subcategories.LIVRE_PAPIER.id
+            )
+        }
+
+    def test_do_not_cache_unknown_eans(self):
+        product_lookup.get_products_by_ean(["9780000000001"])
+        product = create_product("9780000000001")
+
+        with assert_num_queries(1):
+            products = product_lookup.get_products_by_ean(["9780000000001"])
+
+        assert products["9780000000001"].id == product.id
+
+    def test_look_up_missing_eans_only(self):
+        create_product("9780000000001")
+        product_lookup.get_products_by_ean(["9780000000001"])
+        product = create_product("9780000000002")
+
+        with assert_num_queries(1):
+            products = product_lookup.get_products_by_ean(["9780000000001", "9780000000002"])
+
+        assert set(products) == {"9780000000001", "9780000000002"}
+        assert products["9780000000002"].id == product.id
+
+
+@pytest.mark.usefixtures("db_session")
+class InvalidateTest:
+    def test_invalidate(self):
+        product = create_product("9780000000001")
+        product_lookup.get_products_by_ean(["9780000000001"])
+        product.isGcuCompatible = False
+        repository.save(product)
+
+        product_lookup.invalidate()
+
+        with assert_num_queries(1):
+            assert product_lookup.get_products_by_ean(["9780000000001"]) == {}
+
+    def test_clear_cache_when_invalidated_by_another_process(self, app):
+        create_product("9780000000001")
+        product_lookup.get_products_by_ean(["9780000000001"])
+
+        app.redis_client.incr(product_lookup.REDIS_GENERATION_KEY)
+
+        with assert_num_queries(1):
+            product_lookup.get_products_by_ean(["9780000000001"])
+        with assert_num_queries(0):
+            product_lookup.get_products_by_ean(["9780000000001"])
+
+
+@pytest.mark.usefixtures("db_session")
+class WarmUpTest:
+    def test_cache_most_synchronized_products(self):
+        provider = providers_factories.ProviderFactory()
+        popular = create_product("9780000000001")
+        other = create_product("9780000000002")
+        create_product("9780000000003")  # no synchronized offer
+        for _ in range(2):
+            factories.OfferFactory(product=popular, lastProvider=provider)
+        factories.OfferFactory(product=other, lastProvider=provider)
+
+        assert product_lookup.warm_up(limit=1) == 1
+
+        with assert_num_queries(0):
+            assert set(product_lookup.get_products_by_ean(["9780000000001"])) == {"9780000000001"}
+        with assert_num_queries(1):
+            product_lookup.get_products_by_ean(["9780000000002"])
+
+    def test_warm_up_once(self):
+        product_lookup.warm_up(limit=10)
+
+        with assert_num_queries(0):
+            assert product_lookup.warm_up(limit=10) == 0
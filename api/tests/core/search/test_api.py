@@ -1,3 +1,4 @@
+import threading
 from unittest import mock
 
 import pytest
@@ -6,6 +7,7 @@ from pcapi.core import search
 from pcapi.core.offerers import models as offerers_models
 import pcapi.core.offers.factories as offers_factories
 import pcapi.core.search.testing as search_testing
+from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_settings
 
 
@@ -26,7 +28,15 @@ def fail(*args, **kwargs):
 
 def test_async_index_offer_ids(app):
     search.async_index_offer_ids({1, 2})
-    assert app.redis_client.lrange("offer_ids", 0, 5) == ["1", "2"]
+    assert app.redis_client.smembers("search:algolia:offer-ids-to-index") == {"1", "2"}
+
+
+def test_async_index_offer_ids_deduplicates_offers(app):
+    for _ in range(50):
+        search.async_index_offer_ids([1], low_priority=True)
+        search.async_index_offer_ids([2])
+    backend = search._get_backend()
+    assert backend.count_offers_to_index_from_queue() == 2
 
 
 def test_async_index_offers_of_venue_ids(app):
@@ -70,6 +80,49 @@ def test_index_offers_of_venues_in_queue(app):
     assert unbookable_offer.id not in search_testing.search_store["offers"]
 
 
+@override_settings(ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE=2)
+@mock.patch("pcapi.core.search.reindex_offer_ids")
+def test_index_offers_of_venues_in_queue_with_workers(mocked_reindex_offer_ids, app):
+    venue = offers_factories.VenueFactory()
+    offers = offers_factories.OfferFactory.create_batch(5, venue=venue)
+    app.redis_client.lpush("venue_ids_for_offers", venue.id)
+
+    search.index_offers_of_venues_in_queue(workers=2)
+
+    chunks = sorted(call.args[0] for call in mocked_reindex_offer_ids.mock_calls)
+    offer_ids = [offer.id for offer in offers]
+    assert chunks == [offer_ids[0:2], offer_ids[2:4], offer_ids[4:]]
+
+
+def test_reindex_offer_ids_chunks_does_not_fetch_too_many_chunks_ahead(app):
+    workers = 2
+    lock = threading.Lock()
+    released = threading.Event()
+    completed = []
+    fetched_ahead = []
+
+    def reindex_offer_ids(offer_ids):
+        released.wait()
+        with lock:
+            completed.extend(offer_ids)
+
+    def chunks():
+        for i in range(20):
+            with lock:
+                fetched_ahead.append(i - len(completed))
+            if i == 2 * workers:
+                # Workers are blocked until then: all previous chunks
+                # are in flight.
+                released.set()
+            yield [i]
+
+    with mock.patch("pcapi.core.search.reindex_offer_ids", reindex_offer_ids):
+        search._reindex_offer_ids_chunks(chunks(), workers=workers)
+
+    assert sorted(completed) == list(range(20))
+    assert max(fetched_ahead) == 2 * workers
+
+
 @override_settings(REDIS_VENUE_IDS_CHUNK_SIZE=1)
 def test_index_venues_in_queue(app):
     venue1 = offers_factories.VenueFactory()
@@ -92,6 +145,25 @@ class ReindexOfferIdsTest:
         search.reindex_offer_ids([offer.id])
         assert offer.id in search_testing.search_store["offers"]
 
+    @pytest.mark.parametrize("n_offers", [1, 5])
+    def test_number_of_queries_does_not_depend_on_number_of_offers(self, n_offers):
+        offers = []
+        for _ in range(n_offers):
+            offer = make_bookable_offer()
+            offers_factories.MediationFactory(offer=offer)
+            offers_factories.StockFactory(offer=offer)
+            offers.append(offer)
+        offer_ids = [offer.id for offer in offers]
+
+        queries = 1  # select offers, venues, offerers and products
+        queries += 1  # select stocks
+        queries += 1  # select criteria
+        queries += 1  # select mediations
+        with assert_num_queries(queries):
+            search.reindex_offer_ids(offer_ids)
+
+        assert set(search_testing.search_store["offers"]) == set(offer_ids)
+
     def test_unindex_unbookable_offer(self, app):
         offer = make_unbookable_offer()
         search_testing.search_store["offers"][offer.id] = "dummy"
@@ -99,6 +171,18 @@ class ReindexOfferIdsTest:
         search.reindex_offer_ids([offer.id])
         assert search_testing.search_store["offers"] == {}
 
+    @override_settings(SEARCH_SERIALIZE_OFFERS_FROM_SQL=True)
+    def test_reindex_from_sql_projection(self, app):
+        offer = make_bookable_offer()
+        unbookable_offer = make_unbookable_offer()
+        search_testing.search_store["offers"][unbookable_offer.id] = "dummy"
+        app.redis_client.hset("indexed_offers", unbookable_offer.id, "")
+
+        search.reindex_offer_ids([offer.id, unbookable_offer.id])
+
+        assert search_testing.search_store["offers"].keys() == {offer.id}
+        assert search_testing.search_store["offers"][offer.id]["objectID"] == offer.id
+
     @mock.patch("pcapi.core.search.backends.testing.FakeClient.save_objects", fail)
     def test_handle_indexation_error(self, app):
         offer = make_bookable_offer()
@@ -106,7 +190,7 @@ class ReindexOfferIdsTest:
         with override_settings(IS_RUNNING_TESTS=False):  # as on prod: don't catch errors
             search.reindex_offer_ids([offer.id])
         assert offer.id not in search_testing.search_store["offers"]
-        assert app.redis_client.lrange("offer_ids_in_error", 0, 5) == [str(offer.id)]
+        assert app.redis_client.smembers("search:algolia:offer-ids-in-error-to-index") == {str(offer.id)}
 
     @mock.patch("pcapi.core.search.backends.testing.FakeClient.delete_objects", fail)
     def test_handle_unindexation_error(self, app):
@@ -116,7 +200,7 @@ class ReindexOfferIdsTest:
         with override_settings(IS_RUNNING_TESTS=False):  # as on prod: don't catch errors
             search.reindex_offer_ids([offer.id])
         assert offer.id in search_testing.search_store["offers"]
-        assert app.redis_client.lrange("offer_ids_in_error", 0, 5) == [str(offer.id)]
+        assert app.redis_client.smembers("search:algolia:offer-ids-in-error-to-index") == {str(offer.id)}
 
 
 class ReindexVenueIdsTest:
@@ -146,12 +230,26 @@ class ReindexVenueIdsTest:
         assert search_testing.search_store["venues"].keys() == {indexable_venue.id}
 
 
+@override_settings(REDIS_OFFER_IDS_CHUNK_SIZE=1, SEARCH_SERIALIZE_OFFERS_FROM_SQL=True)
+def test_index_offers_in_queue_sends_chunks_while_loading_next_ones(app):
+    offers = [make_bookable_offer() for _ in range(3)]
+    unbookable_offer = make_unbookable_offer()
+    search_testing.search_store["offers"][unbookable_offer.id] = "dummy"
+    app.redis_client.hset("indexed_offers", unbookable_offer.id, "")
+    search.async_index_offer_ids([offer.id for offer in offers] + [unbookable_offer.id])
+
+    search.index_offers_in_queue(stop_only_when_empty=True)
+
+    assert search_testing.search_store["offers"].keys() == {offer.id for offer in offers}
+    assert app.redis_client.zcard("search:algolia:offer-ids-leases") == 0
+
+
 @override_settings(REDIS_OFFER_IDS_CHUNK_SIZE=3)
 @mock.patch("pcapi.core.search.reindex_offer_ids")
 class IndexOffersInQueueTest:
     def test_cron_behaviour(self, mocked_reindex_offer_ids, app):
         items = range(1, 9)  # 8 items: 1..8
-        app.redis_client.lpush("offer_ids", *items)
+        app.redis_client.sadd("search:algolia:offer-ids-to-index", *items)
 
         search.index_offers_in_queue()
 
@@ -159,28 +257,71 @@ class IndexOffersInQueueTest:
         # indexes another set of 3 items. And stops because there are
         # less than REDIS_OFFER_IDS_CHUNK_SIZE items left in the
         # queue.
-        assert mocked_reindex_offer_ids.mock_calls == [
-            mock.call({8, 7, 6}),
-            mock.call({5, 4, 3}),
-        ]
-
-        assert app.redis_client.lrange("offer_ids", 0, 5) == ["2", "1"]
+        assert mocked_reindex_offer_ids.call_count == 2
+        popped = set()
+        for call in mocked_reindex_offer_ids.mock_calls:
+            offer_ids = call.args[0]
+            assert len(offer_ids) == 3
+            popped |= offer_ids
+        assert app.redis_client.scard("search:algolia:offer-ids-to-index") == 2
+        left = {int(offer_id) for offer_id in app.redis_client.smembers("search:algolia:offer-ids-to-index")}
+        assert popped | left == set(items)
 
     def test_command_behaviour(self, mocked_reindex_offer_ids, app):
         items = range(1, 9)  # 8 items: 1..8
-        app.redis_client.lpush("offer_ids", *items)
+        app.redis_client.sadd("search:algolia:offer-ids-to-index", *items)
+
+        search.index_offers_in_queue(stop_only_when_empty=True)
+
+        # First and second runs pop and index 3 items. Third run pops
+        # the last 2 items and stops because the queue is empty.
+        assert [len(call.args[0]) for call in mocked_reindex_offer_ids.mock_calls] == [3, 3, 2]
+        popped = set().union(*(call.args[0] for call in mocked_reindex_offer_ids.mock_calls))
+        assert popped == set(items)
+        assert app.redis_client.scard("search:algolia:offer-ids-to-index") == 0
+
+    def test_low_priority_offers_are_indexed_last(self, mocked_reindex_offer_ids, app):
+        search.async_index_offer_ids([1, 2, 3], low_priority=True)
+        search.async_index_offer_ids([4, 5])
 
         search.index_offers_in_queue(stop_only_when_empty=True)
 
-        # First run pops and indexes 8, 7, 6. Second run pops and
-        # indexes 5, 4, 3. Third run pops 2, 1 and stops because the
-        # queue is empty.
-        assert mocked_reindex_offer_ids.mock_calls == [
-            mock.call({8, 7, 6}),
-            mock.call({5, 4, 3}),
-            mock.call({2, 1}),
-        ]
+        first_chunk = mocked_reindex_offer_ids.mock_calls[0].args[0]
+        assert len(first_chunk) == 3
+        assert {4, 5} < first_chunk
+        popped = set().union(*(call.args[0] for call in mocked_reindex_offer_ids.mock_calls))
+        assert popped == {1, 2, 3, 4, 5}
+
+    def test_parallel_workers(self, mocked_reindex_offer_ids, app):
+        items = range(1, 21)
+        app.redis_client.sadd("search:algolia:offer-ids-to-index", *items)
+
+        search.index_offers_in_queue(stop_only_when_empty=True, workers=3)
+
+        popped = [offer_id for call in mocked_reindex_offer_ids.mock_calls for offer_id in call.args[0]]
+        assert sorted(popped) == list(items)
+        assert app.redis_client.scard("search:algolia:offer-ids-to-index") == 0
+        assert app.redis_client.zcard("search:algolia:offer-ids-leases") == 0
+
+    @override_settings(REDIS_OFFER_IDS_LEASE_TIMEOUT=0)
+    def test_requeue_offers_of_expired_leases(self, mocked_reindex_offer_ids, app):
+        backend = search._get_backend()
+        app.redis_client.sadd("search:algolia:offer-ids-to-index", 1, 2)
+        # Simulate a worker that has crashed after having popped offers.
+        backend.lease_offer_ids_from_queue(count=3)
+
+        search.index_offers_in_queue(from_error_queue=True)
+
+        assert mocked_reindex_offer_ids.mock_calls == [mock.call({1, 2})]
+        assert app.redis_client.zcard("search:algolia:offer-ids-leases") == 0
+
+    def test_legacy_list_is_processed(self, mocked_reindex_offer_ids, app):
+        app.redis_client.sadd("search:algolia:offer-ids-to-index", 1)
+        app.redis_client.lpush("offer_ids", 2, 3)
+
+        search.index_offers_in_queue(stop_only_when_empty=True)
 
+        assert mocked_reindex_offer_ids.mock_calls == [mock.call({1, 2, 3})]
         assert app.redis_client.llen("offer_ids") == 0
 
 
@@ -21,7 +21,16 @@ def test_enqueue_offer_ids(app):
     backend.enqueue_offer_ids([1])
     backend.enqueue_offer_ids({2, 3})
     backend.enqueue_offer_ids([])
-    assert set(app.redis_client.lrange("offer_ids", 0, 5)) == {"1", "2", "3"}
+    backend.enqueue_offer_ids([1])
+    assert app.redis_client.smembers("search:algolia:offer-ids-to-index") == {"1", "2", "3"}
+
+
+def test_enqueue_offer_ids_with_low_priority(app):
+    backend = get_backend()
+    backend.enqueue_offer_ids([1, 2], low_priority=True)
+    backend.enqueue_offer_ids([2, 3])
+    assert app.redis_client.smembers("search:algolia:low-priority-offer-ids-to-index") == {"1"}
+    assert app.redis_client.smembers("search:algolia:offer-ids-to-index") == {"2", "3"}
 
 
 def test_enqueue_offer_ids_in_error(app):
@@ -29,7 +38,7 @@ def test_enqueue_offer_ids_in_error(app):
     backend.enqueue_offer_ids_in_error([1])
     backend.enqueue_offer_ids_in_error({2, 3})
     backend.enqueue_offer_ids_in_error([])
-    assert set(app.redis_client.lrange("offer_ids_in_error", 0, 5)) == {"1", "2", "3"}
+    assert app.redis_client.smembers("search:algolia:offer-ids-in-error-to-index") == {"1", "2", "3"}
 
 
 def test_enqueue_venue_ids_for_offers(app):
@@ -42,7 +51,7 @@ def test_enqueue_venue_ids_for_offers(app):
 
 def test_pop_offer_ids_from_queue(app):
     backend = get_backend()
-    app.redis_client.lpush("offer_ids", 1, 2, 3)
+    app.redis_client.sadd("search:algolia:offer-ids-to-index", 1, 2, 3)
 
     popped = set()
     offer_ids = backend.pop_offer_ids_from_queue(count=2)
@@ -60,20 +69,65 @@ def test_pop_offer_ids_from_queue(app):
     assert offer_ids == set()
 
 
+def test_pop_offer_ids_from_queue_pops_low_priority_offers_last(app):
+    backend = get_backend()
+    app.redis_client.sadd("search:algolia:low-priority-offer-ids-to-index", 1, 2)
+    app.redis_client.sadd("search:algolia:offer-ids-to-index", 3)
+    app.redis_client.lpush("offer_ids", 4)
+
+    offer_ids = backend.pop_offer_ids_from_queue(count=2)
+    assert len(offer_ids) == 2
+    assert 3 in offer_ids
+
+    offer_ids = backend.pop_offer_ids_from_queue(count=2)
+    assert len(offer_ids) == 2
+    assert 4 in offer_ids
+
+    assert backend.pop_offer_ids_from_queue(count=2) == set()
+
+
 def test_pop_offer_ids_from_error_queue(app):
     backend = get_backend()
-    app.redis_client.lpush("offer_ids_in_error", 1, 2, 3)
+    app.redis_client.sadd("search:algolia:offer-ids-in-error-to-index", 1, 2, 3)
 
+    popped = set()
     offer_ids = backend.pop_offer_ids_from_queue(count=2, from_error_queue=True)
-    assert offer_ids == {3, 2}
+    popped |= offer_ids
+    assert len(offer_ids) == 2
 
     offer_ids = backend.pop_offer_ids_from_queue(count=2, from_error_queue=True)
-    assert offer_ids == {1}
+    popped |= offer_ids
+    assert len(offer_ids) == 1
+    assert popped == {1, 2, 3}
 
     offer_ids = backend.pop_offer_ids_from_queue(count=2, from_error_queue=True)
     assert offer_ids == set()
 
 
+def test_lease_offer_ids_from_queue(app):
+    app.redis_client.sadd("search:algolia:offer-ids-to-index", 1, 2)
+    app.redis_client.sadd("search:algolia:low-priority-offer-ids-to-index", 3)
+    app.redis_client.rpush("offer_ids", 4, 5)
+
+    backend = get_backend()
+    lease_id, offer_ids = backend.lease_offer_ids_from_queue(count=4)
+
+    assert offer_ids == {1, 2, 3, 4}
+    assert app.redis_client.smembers(f"search:algolia:offer-ids-lease:{lease_id}") == {"1", "2", "3", "4"}
+    assert app.redis_client.zscore("search:algolia:offer-ids-leases", lease_id)
+    assert app.redis_client.scard("search:algolia:offer-ids-to-index") == 0
+    assert app.redis_client.scard("search:algolia:low-priority-offer-ids-to-index") == 0
+    assert app.redis_client.lrange("offer_ids", 0, -1) == ["5"]
+
+
+def test_lease_offer_ids_from_empty_queue(app):
+    backend = get_backend()
+    lease_id, offer_ids = backend.lease_offer_ids_from_queue(count=4)
+
+    assert (lease_id, offer_ids) == ("", set())
+    assert app.redis_client.zcard("search:algolia:offer-ids-leases") == 0
+
+
 def test_get_venue_ids_for_offers_from_queue(app):
     backend = get_backend()
     # The following pushes 1 to head, then 2 to head, etc. In the end,
@@ -93,14 +147,16 @@ def test_get_venue_ids_for_offers_from_queue(app):
 def test_count_offers_to_index_from_queue(app):
     backend = get_backend()
     assert backend.count_offers_to_index_from_queue() == 0
-    app.redis_client.lpush("offer_ids", 1, 2, 3)
-    assert backend.count_offers_to_index_from_queue() == 3
+    app.redis_client.sadd("search:algolia:offer-ids-to-index", 1, 2, 3)
+    app.redis_client.sadd("search:algolia:low-priority-offer-ids-to-index", 4)
+    app.redis_client.lpush("offer_ids", 5)
+    assert backend.count_offers_to_index_from_queue() == 5
 
 
 def test_count_offers_to_index_from_error_queue(app):
     backend = get_backend()
     assert backend.count_offers_to_index_from_queue(from_error_queue=True) == 0
-    app.redis_client.lpush("offer_ids_in_error", 1, 2, 3)
+    app.redis_client.sadd("search:algolia:offer-ids-in-error-to-index", 1, 2, 3)
     assert backend.count_offers_to_index_from_queue(from_error_queue=True) == 3
 
 
@@ -182,6 +238,43 @@ def test_index_offers(app):
     assert backend.check_offer_is_indexed(offer)
 
 
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_skips_unchanged_offers(app):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    unchanged_offer = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post("https://dummy-app-id.algolia.net/1/indexes/offers/batch", json={})
+        backend.index_offers([offer, unchanged_offer])
+        assert posted.call_count == 1
+        assert app.redis_client.hget("indexed_offers", offer.id) == algolia.get_offer_digest(
+            backend.serialize_offer(offer)
+        )
+
+        backend.index_offers([unchanged_offer])
+        assert posted.call_count == 1
+
+        offer.name = "New name"
+        backend.index_offers([offer, unchanged_offer])
+        assert posted.call_count == 2
+        posted_json = posted.last_request.json()
+        assert [request["body"]["objectID"] for request in posted_json["requests"]] == [offer.id]
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_with_force_does_not_skip_unchanged_offers(app):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post("https://dummy-app-id.algolia.net/1/indexes/offers/batch", json={})
+        backend.index_offers([offer])
+        backend.index_offers([offer], force=True)
+
+        assert posted.call_count == 2
+        posted_json = posted.last_request.json()
+        assert [request["body"]["objectID"] for request in posted_json["requests"]] == [offer.id]
+
+
 def test_unindex_offer_ids(app):
     backend = get_backend()
     app.redis_client.hset("indexed_offers", "1", "")
@@ -0,0 +1,170 @@
+import json
+from unittest import mock
+
+import pytest
+
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.search.backends import local
+from pcapi.core.testing import override_settings
+
+
+@pytest.fixture(autouse=True)
+def clear_indices():
+    yield
+    for name in ("test", "other", "offers"):
+        local.LocalIndex(name, ()).clear_objects()
+
+
+@pytest.fixture(name="index")
+def index_fixture():
+    index = local.LocalIndex(
+        "test", local.OFFER_SEARCHABLE_ATTRIBUTES, local.OFFER_FACET_ATTRIBUTES, "offer.rankingWeight"
+    )
+    index.save_objects(
+        [
+            {
+                "objectID": 1,
+                "offer": {"name": "Le Seigneur des anneaux", "subcategoryId": "LIVRE_PAPIER", "prices": [12, 8]},
+                "venue": {"name": "Librairie de Paris"},
+                "_geoloc": {"lat": 48.8566, "lng": 2.3522},  # Paris
+            },
+            {
+                "objectID": 2,
+                "offer": {"name": "Séance de cinéma", "subcategoryId": "SEANCE_CINE", "prices": [7], "isDuo": True},
+                "venue": {"name": "Cinéma de Lyon"},
+                "_geoloc": {"lat": 45.7640, "lng": 4.8357},  # Lyon
+            },
+            {
+                "objectID": 3,
+                "offer": {"name": "Le Hobbit", "subcategoryId": "LIVRE_PAPIER", "prices": [25]},
+                "venue": {"name": "Librairie de Versailles"},
+                "_geoloc": {"lat": 48.8049, "lng": 2.1204},  # Versailles
+            },
+        ]
+    )
+    return index
+
+
+def get_ids(response):
+    return [hit["objectID"] for hit in response["hits"]]
+
+
+def test_search_text(index):
+    assert get_ids(index.search("seigneur")) == [1]
+    assert get_ids(index.search("cinema")) == [2]  # accents are ignored
+    assert get_ids(index.search("librairie hob")) == [3]  # last word is a prefix
+    assert get_ids(index.search("librairie lyon")) == []
+    assert get_ids(index.search("")) == [1, 2, 3]
+
+
+def test_search_with_facet_filters(index):
+    assert get_ids(index.search(facet_filters={"offer.subcategoryId": "LIVRE_PAPIER"})) == [1, 3]
+    assert get_ids(index.search(facet_filters={"offer.subcategoryId": ["SEANCE_CINE", "LIVRE_PAPIER"]})) == [1, 2, 3]
+    assert get_ids(index.search(facet_filters={"offer.isDuo": True})) == [2]
+
+
+def test_search_with_numeric_filters(index):
+    assert get_ids(index.search(numeric_filters={"offer.prices": (0, 10)})) == [1, 2]
+    assert get_ids(index.search(numeric_filters={"offer.prices": (20, None)})) == [3]
+
+
+def test_search_on_unknown_facet(index):
+    with pytest.raises(ValueError):
+        index.search(facet_filters={"offer.name": "Le Hobbit"})
+
+
+def test_search_with_ranking(index):
+    index.save_objects(
+        [{"objectID": 4, "offer": {"name": "Bilbo le Hobbit", "rankingWeight": 10}, "_geoloc": {"lat": 0, "lng": 0}}]
+    )
+    assert get_ids(index.search("hobbit")) == [4, 3]
+
+
+def test_search_around(index):
+    response = index.search(around_lat_lng=(48.8566, 2.3522), around_radius=30_000)
+    assert get_ids(response) == [1, 3]
+    assert response["hits"][0]["_rankingInfo"]["geoDistance"] == 0
+    assert 15_000 < response["hits"][1]["_rankingInfo"]["geoDistance"] < 20_000
+
+
+def test_search_facets_and_pagination(index):
+    response = index.search(facets=["offer.subcategoryId", "offer.prices"], hits_per_page=2, page=1)
+    assert get_ids(response) == [3]
+    assert response["nbHits"] == 3
+    assert response["nbPages"] == 2
+    assert response["facets"] == {
+        "offer.subcategoryId": {"LIVRE_PAPIER": 2, "SEANCE_CINE": 1},
+        "offer.prices": {"12": 1, "8": 1, "7": 1, "25": 1},
+    }
+
+
+def test_save_and_delete_objects(index):
+    index.save_objects([{"objectID": 1, "offer": {"name": "Bilbo"}, "_geoloc": {"lat": 0, "lng": 0}}])
+    assert get_ids(index.search("seigneur")) == []
+    assert get_ids(index.search("bilbo")) == [1]
+
+    index.delete_objects([1, 2])
+    assert get_ids(index.search("")) == [3]
+
+    index.clear_objects()
+    assert index.search("")["nbHits"] == 0
+
+
+def test_objects_are_shared_by_indices_with_the_same_name(index):
+    assert get_ids(local.LocalIndex("test", local.OFFER_SEARCHABLE_ATTRIBUTES).search("hobbit")) == [3]
+    assert local.LocalIndex("other", local.OFFER_SEARCHABLE_ATTRIBUTES).search("")["nbHits"] == 0
+
+
+def test_objects_are_shared_by_processes(tmp_path, index):
+    with override_settings(LOCAL_SEARCH_DATABASE=str(tmp_path / "search.sqlite")):
+        index.save_objects([{"objectID": 1, "offer": {"name": "Bilbo"}}])
+        # Simulate another process, that has its own connection.
+        with mock.patch.dict(local._connections, clear=True):
+            assert get_ids(index.search("bilbo")) == [1]
+    assert get_ids(index.search("bilbo")) == []
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_and_search_offers(app):
+    backend = local.LocalBackend()
+    offer = offers_factories.StockFactory(offer__name="Un livre de cuisine", price=15).offer
+
+    backend.index_offers([offer])
+
+    assert backend.check_offer_is_indexed(offer)
+    response = backend.search_offers("cuisine", facet_filters={"offer.subcategoryId": offer.subcategoryId})
+    assert get_ids(response) == [offer.id]
+
+    backend.unindex_offer_ids([offer.id])
+    assert not backend.check_offer_is_indexed(offer)
+    assert backend.search_offers("cuisine")["nbHits"] == 0
+
+
+@pytest.mark.usefixtures("db_session")
+def test_skip_unchanged_offers(app):
+    backend = local.LocalBackend()
+    offer = offers_factories.StockFactory(price=15).offer
+    backend.index_offers([offer])
+
+    with mock.patch.object(local.offers_index, "save_objects") as save_objects:
+        backend.index_offers([offer])
+    save_objects.assert_not_called()
+
+    offer.name = "Un autre nom"
+    with mock.patch.object(local.offers_index, "save_objects") as save_objects:
+        backend.index_offers([offer])
+    save_objects.assert_called_once()
+
+
+@pytest.mark.usefixtures("db_session")
+@override_settings(SEARCH_BACKEND="pcapi.core.search.backends.local.LocalBackend")
+def test_search_offers_command(app):
+    offer = offers_factories.StockFactory(offer__name="Un livre de cuisine", price=15).offer
+    local.LocalBackend().index_offers([offer])
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["search_offers", "cuisine", "--max-price", "20"])
+    assert get_ids(json.loads(result.output)) == [offer.id]
+
+    result = runner.invoke(args=["search_offers", "cuisine", "--min-price", "20"])
+    assert json.loads(result.output)["nbHits"] == 0
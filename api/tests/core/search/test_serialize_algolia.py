@@ -8,6 +8,7 @@ import pytest
 from pcapi.core.categories import subcategories
 import pcapi.core.offerers.factories as offerers_factories
 import pcapi.core.offerers.models as offerers_models
+import pcapi.core.offers.factories as offers_factories
 from pcapi.core.search.backends.algolia import AlgoliaBackend
 from pcapi.model_creators.generic_creators import create_criterion
 from pcapi.model_creators.generic_creators import create_offerer
@@ -15,6 +16,7 @@ from pcapi.model_creators.generic_creators import create_stock
 from pcapi.model_creators.generic_creators import create_venue
 from pcapi.model_creators.specific_creators import create_offer_with_event_product
 from pcapi.model_creators.specific_creators import create_offer_with_thing_product
+from pcapi.repository import offer_queries
 from pcapi.repository import repository
 from pcapi.utils.human_ids import humanize
 
@@ -337,7 +339,7 @@ class BuildObjectTest:
         # Then
         eighteen_thirty_in_seconds = 66600
         twenty_one_thirty_in_seconds = 77418
-        assert sorted(result["offer"]["times"]) == sorted([eighteen_thirty_in_seconds, twenty_one_thirty_in_seconds])
+        assert result["offer"]["times"] == [eighteen_thirty_in_seconds, twenty_one_thirty_in_seconds]
 
     @pytest.mark.usefixtures("db_session")
     def test_should_default_coordinates_when_offer_is_numeric(self, app):
@@ -477,7 +479,6 @@ class BuildObjectTest:
         result = AlgoliaBackend.serialize_offer(offer)
 
         # Then
-        result["offer"]["tags"] = set(result["offer"]["tags"])
         assert result == {
             "distinct": "3",
             "objectID": 3,
@@ -500,7 +501,7 @@ class BuildObjectTest:
                 "students": [],
                 "subcategoryId": subcategories.EVENEMENT_MUSIQUE.id,
                 "thumbUrl": f"/storage/thumbs/products/{humanized_product_id}",
-                "tags": {"Mon tag associé", "Iron Man mon super héros"},
+                "tags": ["Iron Man mon super héros", "Mon tag associé"],
                 "times": [32400],
             },
             "offerer": {
@@ -555,3 +556,42 @@ def test_serialize_venue():
         "banner_url": venue.bannerUrl,
         "_geoloc": {"lng": float(venue.longitude), "lat": float(venue.latitude)},
     }
+
+
+@pytest.mark.usefixtures("db_session")
+def test_serialize_offer_row_is_identical_to_serialize_offer():
+    event_offer = offers_factories.EventOfferFactory(
+        extraData={"performer": "Mirek", "visa": "123"}, rankingWeight=2, product__thumbCount=1
+    )
+    offers_factories.EventStockFactory(offer=event_offer, price=0)
+    offers_factories.EventStockFactory(
+        offer=event_offer,
+        price=12.5,
+        beginningDatetime=datetime.utcnow() + timedelta(days=2, hours=3),
+    )
+    offers_factories.EventStockFactory(offer=event_offer, isSoftDeleted=True)
+    offers_factories.OfferCriterionFactory(offer=event_offer, criterion__name="Tag 1")
+    offers_factories.OfferCriterionFactory(offer=event_offer, criterion__name="Tag 2")
+
+    thing_offer = offers_factories.ThingOfferFactory(extraData={"isbn": "9782123456803", "author": "Tolkien"})
+    offers_factories.ThingStockFactory(offer=thing_offer, price=5)
+    offers_factories.ThingStockFactory(offer=thing_offer, price=3, quantity=1, dnBookedQuantity=1)
+    offers_factories.MediationFactory(offer=thing_offer, thumbCount=1, dateCreated=datetime.utcnow())
+    offers_factories.MediationFactory(
+        offer=thing_offer, thumbCount=1, dateCreated=datetime.utcnow() - timedelta(days=1)
+    )
+
+    digital_offer = offers_factories.DigitalOfferFactory(venue__latitude=None, venue__longitude=None)
+    offers_factories.StockFactory(offer=digital_offer, price=0)
+
+    not_bookable_offer = offers_factories.OfferFactory()
+    offers_factories.StockFactory(offer=not_bookable_offer, quantity=0)
+    not_released_offer = offers_factories.OfferFactory(isActive=False)
+    offers_factories.StockFactory(offer=not_released_offer)
+
+    offers = [event_offer, thing_offer, digital_offer, not_bookable_offer, not_released_offer]
+    rows = offer_queries.get_offer_rows_for_search_indexation([offer.id for offer in offers])
+
+    assert [row.id for row in rows] == [event_offer.id, thing_offer.id, digital_offer.id]
+    for row, offer in zip(rows, [event_offer, thing_offer, digital_offer]):
+        assert AlgoliaBackend.serialize_offer_row(row) == AlgoliaBackend.serialize_offer(offer)
@@ -1,16 +1,20 @@
 from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
 
 from freezegun import freeze_time
 import pytest
+import pytz
 
 import pcapi.core.bookings.factories as bookings_factories
 from pcapi.core.bookings.models import Booking
 from pcapi.core.categories import subcategories
 import pcapi.core.offers.factories as offers_factories
+import pcapi.core.payments.api as payments_api
 import pcapi.core.payments.factories as payments_factories
 import pcapi.core.payments.models as payments_models
+from pcapi.core.testing import assert_num_queries
 import pcapi.core.users.factories as users_factories
 from pcapi.domain import reimbursement
 from pcapi.repository import repository
@@ -702,6 +706,96 @@ class CustomRuleFinderTest:
         assert finder.get_rule(booking3) is None  # outside `rule.timespan`
         assert finder.get_rule(booking4) is None  # no rule for this offerer
 
+    def test_successive_rules(self):
+        now = datetime.now()
+        booking1 = bookings_factories.UsedBookingFactory(dateUsed=now - timedelta(days=15))
+        offer = booking1.stock.offer
+        booking2 = bookings_factories.UsedBookingFactory(stock=booking1.stock, dateUsed=now - timedelta(days=5))
+        booking3 = bookings_factories.UsedBookingFactory(stock=booking1.stock, dateUsed=now - timedelta(days=1))
+        booking4 = bookings_factories.UsedBookingFactory(stock=booking1.stock, dateUsed=now - timedelta(days=25))
+        rule1 = payments_factories.CustomReimbursementRuleFactory(
+            offer=offer, timespan=(now - timedelta(days=20), now - timedelta(days=10))
+        )
+        # gap between `rule1` and `rule2`
+        rule2 = payments_factories.CustomReimbursementRuleFactory(offer=offer, timespan=(now - timedelta(days=3), None))
+
+        finder = reimbursement.CustomRuleFinder()
+        assert finder.get_rule(booking1) == rule1
+        assert finder.get_rule(booking2) is None  # between rules
+        assert finder.get_rule(booking3) == rule2
+        assert finder.get_rule(booking4) is None  # before first rule
+
+    def test_offerer_rules_with_and_without_categories(self):
+        yesterday = datetime.now() - timedelta(days=1)
+        booking1 = bookings_factories.UsedBookingFactory(stock__offer__subcategoryId=subcategories.FESTIVAL_CINE.id)
+        offerer = booking1.offerer
+        booking2 = bookings_factories.UsedBookingFactory(
+            stock__offer__subcategoryId=subcategories.LIVRE_PAPIER.id, stock__offer__venue__managingOfferer=offerer
+        )
+        cinema_rule = payments_factories.CustomReimbursementRuleFactory(
+            offerer=offerer,
+            subcategories=[subcategories.FESTIVAL_CINE.id, subcategories.SEANCE_CINE.id],
+            timespan=(yesterday, None),
+        )
+        book_rule = payments_factories.CustomReimbursementRuleFactory(
+            offerer=offerer, subcategories=[subcategories.LIVRE_PAPIER.id], timespan=(yesterday, None)
+        )
+
+        finder = reimbursement.CustomRuleFinder()
+        assert finder.get_rule(booking1) == cinema_rule
+        assert finder.get_rule(booking2) == book_rule
+
+
+@pytest.mark.usefixtures("db_session")
+class GetCustomRuleFinderTest:
+    def test_finder_is_cached(self):
+        booking = bookings_factories.UsedBookingFactory()
+        payments_factories.CustomReimbursementRuleFactory(
+            offer=booking.stock.offer, timespan=(datetime.now() - timedelta(days=1), None)
+        )
+
+        finder = reimbursement.get_custom_rule_finder()
+        with assert_num_queries(0):
+            assert reimbursement.get_custom_rule_finder() is finder
+            assert finder.get_rule(booking).offerId == booking.stock.offerId
+
+    def test_invalidate_on_rule_creation(self):
+        booking = bookings_factories.UsedBookingFactory()
+        finder = reimbursement.get_custom_rule_finder()
+        assert finder.get_rule(booking) is None
+
+        start = (datetime.today() + timedelta(days=1)).astimezone(pytz.utc)
+        rule = payments_api.create_offer_reimbursement_rule(booking.stock.offerId, amount=2, start_date=start)
+        booking.dateUsed = start.replace(tzinfo=None) + timedelta(days=1)
+
+        finder = reimbursement.get_custom_rule_finder()
+        assert finder.get_rule(booking).id == rule.id
+
+    def test_invalidate_on_rule_edition(self):
+        now = datetime.now()
+        booking = bookings_factories.UsedBookingFactory(dateUsed=now + timedelta(days=5))
+        rule = payments_factories.CustomReimbursementRuleFactory(
+            offer=booking.stock.offer, timespan=(now - timedelta(days=1), None)
+        )
+        finder = reimbursement.get_custom_rule_finder()
+        assert finder.get_rule(booking).id == rule.id
+
+        rule = payments_models.CustomReimbursementRule.query.get(rule.id)
+        payments_api.edit_reimbursement_rule(rule, end_date=pytz.utc.localize(now + timedelta(days=2)))
+
+        finder = reimbursement.get_custom_rule_finder()
+        assert finder.get_rule(booking) is None
+
+    def test_invalidate_from_another_process(self, app):
+        finder = reimbursement.get_custom_rule_finder()
+        app.redis_client.delete(reimbursement.REDIS_CUSTOM_RULE_FINDER_VERSION)
+        assert reimbursement.get_custom_rule_finder() is not finder
+
+    def test_expiration(self):
+        finder = reimbursement.get_custom_rule_finder()
+        with mock.patch("pcapi.domain.reimbursement.CUSTOM_RULE_FINDER_TTL", -1):
+            assert reimbursement.get_custom_rule_finder() is not finder
+
 
 def assert_total_reimbursement(booking_reimbursement, rule, booking):
     assert booking_reimbursement.booking == booking
@@ -16,6 +16,7 @@ from pcapi.core.offers.models import Stock
 from pcapi.core.providers.factories import AllocineVenueProviderFactory
 from pcapi.core.providers.factories import AllocineVenueProviderPriceRuleFactory
 from pcapi.local_providers import AllocineStocks
+from pcapi.models.api_errors import ApiErrors
 from pcapi.models.product import Product
 from pcapi.repository import repository
 import pcapi.sandboxes
@@ -1490,6 +1491,140 @@ class UpdateObjectsTest:
             assert stock.quantity == 50
 
 
+def build_movie_showtimes(movie_info, *starts_at):
+    showtimes = [
+        {"startsAt": start, "diffusionVersion": "LOCAL", "projection": ["DIGITAL"], "experience": None}
+        for start in starts_at
+    ]
+    return {"node": {"movie": movie_info, "showtimes": showtimes}}
+
+
+class FingerprintsTest:
+    @patch("pcapi.local_providers.allocine.allocine_stocks.get_movies_showtimes")
+    @patch("pcapi.local_providers.allocine.allocine_stocks.get_movie_poster")
+    @patch("pcapi.settings.ALLOCINE_API_KEY", "token")
+    @pytest.mark.usefixtures("db_session")
+    def test_skip_unchanged_movies(self, mock_poster_get_allocine, mock_call_allocine_api, app):
+        # Given
+        file_path = Path(pcapi.sandboxes.__path__[0]) / "providers" / "titelive_mocks" / "provider_thumb.jpeg"
+        mock_poster_get_allocine.return_value = file_path.read_bytes()
+        other_movie_info = dict(MOVIE_INFO, id="TW92aWU6OTk5OTk=", internalId=99999, title="Un autre film")
+        mock_call_allocine_api.side_effect = [
+            iter(
+                [
+                    build_movie_showtimes(MOVIE_INFO, "2019-12-03T10:00:00"),
+                    build_movie_showtimes(other_movie_info, "2019-12-03T10:00:00"),
+                ]
+            ),
+            iter(
+                [
+                    build_movie_showtimes(MOVIE_INFO, "2019-12-03T10:00:00"),
+                    build_movie_showtimes(other_movie_info, "2019-12-03T10:00:00"),
+                ]
+            ),
+            iter(
+                [
+                    build_movie_showtimes(MOVIE_INFO, "2019-12-03T10:00:00"),
+                    build_movie_showtimes(other_movie_info, "2019-12-03T10:00:00", "2019-12-03T18:00:00"),
+                ]
+            ),
+        ]
+        venue = VenueFactory(siret="77567146400110", bookingEmail="toto@example.com")
+        allocine_venue_provider = AllocineVenueProviderFactory(venue=venue)
+        AllocineVenueProviderPriceRuleFactory(allocineVenueProvider=allocine_venue_provider, price=10)
+        AllocineStocks(allocine_venue_provider).updateObjects()
+        assert Stock.query.count() == 2
+        assert mock_poster_get_allocine.call_count == 2
+
+        # When the showtimes have not changed
+        allocine_stocks_provider = AllocineStocks(allocine_venue_provider)
+        allocine_stocks_provider.updateObjects()
+
+        # Then
+        assert allocine_stocks_provider.skippedMovies == 2
+        assert allocine_stocks_provider.createdObjects == 0
+        assert allocine_stocks_provider.updatedObjects == 0
+
+        # When the showtimes of a movie have changed
+        allocine_stocks_provider = AllocineStocks(allocine_venue_provider)
+        allocine_stocks_provider.updateObjects()
+
+        # Then
+        assert allocine_stocks_provider.skippedMovies == 1
+        assert allocine_stocks_provider.createdObjects == 1
+        assert Stock.query.count() == 3
+        # The poster has not changed: it is not downloaded again.
+        assert mock_poster_get_allocine.call_count == 2
+        assert all(product.thumbCount == 1 for product in Product.query.all())
+
+    @patch("pcapi.local_providers.allocine.allocine_stocks.get_movies_showtimes")
+    @patch("pcapi.local_providers.allocine.allocine_stocks.get_movie_poster")
+    @patch("pcapi.settings.ALLOCINE_API_KEY", "token")
+    @pytest.mark.usefixtures("db_session")
+    def test_synchronize_movies_with_errors_again(self, mock_poster_get_allocine, mock_call_allocine_api, app):
+        # Given
+        mock_poster_get_allocine.return_value = bytes()
+        other_movie_info = dict(MOVIE_INFO, id="TW92aWU6OTk5OTk=", internalId=99999, title="Un autre film")
+        mock_call_allocine_api.side_effect = [
+            iter(
+                [
+                    build_movie_showtimes(MOVIE_INFO, "2019-12-03T10:00:00"),
+                    build_movie_showtimes(other_movie_info, "2019-12-03T10:00:00"),
+                ]
+            )
+            for _ in range(2)
+        ]
+        venue = VenueFactory(siret="77567146400110", bookingEmail="toto@example.com")
+        allocine_venue_provider = AllocineVenueProviderFactory(venue=venue)
+        AllocineVenueProviderPriceRuleFactory(allocineVenueProvider=allocine_venue_provider, price=10)
+
+        def validate(pc_object):
+            errors = ApiErrors()
+            if isinstance(pc_object, Stock) and pc_object.idAtProviders.startswith(other_movie_info["id"]):
+                errors.add_error("price", "Erreur de validation")
+            return errors
+
+        with patch("pcapi.local_providers.local_provider.entity_validator.validate", validate):
+            AllocineStocks(allocine_venue_provider).updateObjects()
+        assert Stock.query.count() == 1
+
+        # When
+        allocine_stocks_provider = AllocineStocks(allocine_venue_provider)
+        allocine_stocks_provider.updateObjects()
+
+        # Then
+        assert allocine_stocks_provider.skippedMovies == 1
+        assert Stock.query.count() == 2
+
+    @patch("pcapi.local_providers.allocine.allocine_stocks.get_movies_showtimes")
+    @patch("pcapi.local_providers.allocine.allocine_stocks.get_movie_poster")
+    @patch("pcapi.settings.ALLOCINE_API_KEY", "token")
+    @pytest.mark.usefixtures("db_session")
+    def test_synchronize_all_movies_when_settings_have_changed(
+        self, mock_poster_get_allocine, mock_call_allocine_api, app
+    ):
+        # Given
+        mock_poster_get_allocine.return_value = bytes()
+        mock_call_allocine_api.side_effect = [
+            iter([build_movie_showtimes(MOVIE_INFO, "2019-12-03T10:00:00")]),
+            iter([build_movie_showtimes(MOVIE_INFO, "2019-12-03T10:00:00")]),
+        ]
+        venue = VenueFactory(siret="77567146400110", bookingEmail="toto@example.com")
+        allocine_venue_provider = AllocineVenueProviderFactory(venue=venue)
+        price_rule = AllocineVenueProviderPriceRuleFactory(allocineVenueProvider=allocine_venue_provider, price=10)
+        AllocineStocks(allocine_venue_provider).updateObjects()
+
+        # When
+        price_rule.price = 12
+        repository.save(price_rule)
+        allocine_stocks_provider = AllocineStocks(allocine_venue_provider)
+        allocine_stocks_provider.updateObjects()
+
+        # Then
+        assert allocine_stocks_provider.skippedMovies == 0
+        assert Stock.query.one().price == 12
+
+
 class GetObjectThumbTest:
     @patch("pcapi.local_providers.allocine.allocine_stocks.get_movies_showtimes")
     @patch("pcapi.local_providers.allocine.allocine_stocks.get_movie_poster")
@@ -6,6 +6,8 @@ import pytest
 from pcapi.core.categories import subcategories
 import pcapi.core.offers.factories as offers_factories
 import pcapi.core.providers.factories as providers_factories
+from pcapi.core.testing import assert_num_queries
+from pcapi.local_providers.local_provider import _reindex_offers
 from pcapi.local_providers.local_provider import _save_same_thumb_from_thumb_count_to_index
 from pcapi.local_providers.providable_info import ProvidableInfo
 from pcapi.models.api_errors import ApiErrors
@@ -169,6 +171,45 @@ class UpdateObjectsTest:
         assert new_product.name == "New Product"
         assert new_product.subcategoryId == subcategories.LIVRE_PAPIER.id
 
+    @patch("pcapi.local_providers.chunk_manager.get_existing_object")
+    def test_reads_ahead_and_fetches_existing_objects_in_bulk(self, get_existing_object):
+        # Given
+        provider = providers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithReadAhead")
+        offers_factories.ThingProductFactory(
+            dateModifiedAtLastProvider=datetime(2000, 1, 1),
+            lastProvider=provider,
+            idAtProviders="2",
+            name="Old product name",
+        )
+        providable_infos_and_names = [
+            (ProvidableInfo(id_at_providers=str(i), date_modified_at_provider=datetime(2018, 1, 1)), f"Product {i}")
+            for i in range(1, 5)
+        ]
+        local_provider = provider_test_utils.TestLocalProviderWithReadAhead(providable_infos_and_names)
+
+        # When
+        local_provider.updateObjects()
+
+        # Then
+        get_existing_object.assert_not_called()
+        products = Product.query.order_by(Product.idAtProviders).all()
+        assert [product.name for product in products] == ["Product 1", "Product 2", "Product 3", "Product 4"]
+        assert local_provider.createdObjects == 3
+        assert local_provider.updatedObjects == 1
+
+    def test_reads_ahead_up_to_limit(self):
+        # Given
+        providers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithReadAhead")
+        providable_infos_and_names = [(ProvidableInfo(id_at_providers=str(i)), f"Product {i}") for i in range(1, 5)]
+        local_provider = provider_test_utils.TestLocalProviderWithReadAhead(providable_infos_and_names)
+
+        # When
+        local_provider.updateObjects(limit=2)
+
+        # Then
+        products = Product.query.order_by(Product.idAtProviders).all()
+        assert [product.name for product in products] == ["Product 1", "Product 2"]
+
 
 @pytest.mark.usefixtures("db_session")
 class CreateObjectTest:
@@ -335,3 +376,19 @@ class SaveThumbFromThumbCountToIndexTest:
 
         # Then
         assert product.thumbCount == 4
+
+
+@pytest.mark.usefixtures("db_session")
+class ReindexOffersTest:
+    @patch("pcapi.core.search.async_index_offer_ids")
+    def test_reindex_saved_offers_and_offers_of_saved_stocks(self, mocked_async_index_offer_ids):
+        offer = offers_factories.OfferFactory()
+        stock1 = offers_factories.StockFactory()
+        stock2 = offers_factories.StockFactory(offer=stock1.offer)
+        offers_factories.StockFactory()  # not saved, should not be reindexed
+        saved_ids = {"Offer": [offer.id], "Stock": [stock1.id, stock2.id], "Product": [1]}
+
+        with assert_num_queries(1):
+            _reindex_offers(saved_ids)
+
+        mocked_async_index_offer_ids.assert_called_once_with({offer.id, stock1.offerId}, low_priority=True)
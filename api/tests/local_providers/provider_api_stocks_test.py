@@ -1,10 +1,12 @@
 import datetime
+import threading
 from unittest.mock import call
 from unittest.mock import patch
 
 import pytest
 
 import pcapi.core.providers.factories as providers_factories
+from pcapi.local_providers.provider_api import provider_api_stocks
 from pcapi.local_providers.provider_api.provider_api_stocks import synchronize_stocks
 
 
@@ -36,3 +38,71 @@ class ProviderApiStocksTest:
         # Then
         assert mocked_synchronize_venue_provider.call_count == len(correct_venue_providers)
         mocked_synchronize_venue_provider.assert_has_calls(call(v) for v in reversed(correct_venue_providers))
+
+    @patch("pcapi.local_providers.provider_api.provider_api_stocks._synchronize_venue_provider_in_thread")
+    @pytest.mark.usefixtures("db_session")
+    def test_synchronize_venue_providers_concurrently(self, mocked_synchronize_in_thread, app):
+        api_provider_1 = providers_factories.APIProviderFactory()
+        api_provider_2 = providers_factories.APIProviderFactory()
+        venue_providers = [
+            providers_factories.VenueProviderFactory(provider=api_provider_1),
+            providers_factories.VenueProviderFactory(provider=api_provider_1),
+            providers_factories.VenueProviderFactory(provider=api_provider_2),
+        ]
+
+        synchronize_stocks(workers=2, workers_per_provider=1)
+
+        synchronized_ids = sorted(c.args[1] for c in mocked_synchronize_in_thread.call_args_list)
+        assert synchronized_ids == sorted(venue_provider.id for venue_provider in venue_providers)
+
+
+class RunByProviderTest:
+    def test_bounds_concurrency_per_provider(self):
+        lock = threading.Lock()
+        running = {"slow": 0, "fast": 0}
+        max_running = {"slow": 0, "fast": 0}
+        finished = []
+        # Tasks of the slow provider block until all tasks of the fast
+        # provider have finished, which would never happen if they
+        # delayed them. Tasks of the fast provider run by pairs.
+        fast_done = threading.Event()
+        fast_pair = threading.Barrier(2, timeout=5)
+
+        def task(item):
+            provider = item.split("-")[0]
+            with lock:
+                running[provider] += 1
+                max_running[provider] = max(max_running[provider], running[provider])
+            if provider == "slow":
+                assert fast_done.wait(timeout=5)
+            else:
+                fast_pair.wait()
+            with lock:
+                running[provider] -= 1
+                finished.append(item)
+                if sum(1 for finished_item in finished if finished_item.startswith("fast")) == 10:
+                    fast_done.set()
+
+        items = [("slow", f"slow-{i}") for i in range(4)] + [("fast", f"fast-{i}") for i in range(10)]
+        durations = provider_api_stocks.run_by_provider(items, task, workers=4, workers_per_provider=2)
+
+        assert set(durations) == {item for _provider, item in items}
+        assert max_running == {"slow": 2, "fast": 2}
+        assert all(item.startswith("fast") for item in finished[:10])
+
+    def test_starts_items_in_the_given_order(self):
+        started = []
+
+        items = [(1, "a"), (2, "b"), (1, "c"), (3, "d"), (2, "e")]
+        provider_api_stocks.run_by_provider(items, started.append, workers=1, workers_per_provider=1)
+
+        assert started == ["a", "b", "c", "d", "e"]
+
+    def test_continues_after_error(self):
+        def task(item):
+            if item == 1:
+                raise ValueError()
+
+        durations = provider_api_stocks.run_by_provider([(1, 1), (1, 2), (2, 3)], task, 2, 1)
+
+        assert set(durations) == {2, 3}
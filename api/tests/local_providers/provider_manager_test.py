@@ -11,6 +11,7 @@ import pcapi.core.offers.factories as offers_factories
 from pcapi.core.offers.models import Offer
 import pcapi.core.providers.factories as providers_factories
 from pcapi.local_providers.provider_manager import do_update
+from pcapi.local_providers.provider_manager import synchronize_allocine_venue_providers
 from pcapi.local_providers.provider_manager import synchronize_data_for_provider
 from pcapi.local_providers.provider_manager import synchronize_venue_provider
 from pcapi.local_providers.provider_manager import synchronize_venue_providers_for_provider
@@ -243,6 +244,36 @@ class SynchronizeVenueProvidersForProviderTest:
         mock_synchronize_venue_provider.assert_called_once()
 
 
+class SynchronizeAllocineVenueProvidersTest:
+    @patch("pcapi.local_providers.provider_manager.synchronize_venue_provider")
+    @patch("pcapi.local_providers.allocine.allocine_stocks.fetch_theater_showtimes")
+    @pytest.mark.usefixtures("db_session")
+    def test_synchronize_with_prefetched_showtimes(self, mock_fetch_theater_showtimes, mock_synchronize_venue_provider):
+        provider = providers_factories.AllocineProviderFactory()
+        venue_providers = providers_factories.AllocineVenueProviderFactory.create_batch(3, provider=provider)
+        theater_ids = [venue_provider.venueIdAtOfferProvider for venue_provider in venue_providers]
+
+        def fetch_theater_showtimes(api_key, theater_id, settings_fingerprint):
+            if theater_id == theater_ids[1]:
+                raise ValueError()
+            return [({"theater": theater_id}, None)]
+
+        mock_fetch_theater_showtimes.side_effect = fetch_theater_showtimes
+
+        synchronize_allocine_venue_providers(provider.id, workers=2)
+
+        assert mock_fetch_theater_showtimes.call_count == 3
+        calls = {
+            call.args[0].id: call.kwargs["theater_showtimes"] for call in mock_synchronize_venue_provider.call_args_list
+        }
+        assert calls == {
+            venue_providers[0].id: [({"theater": theater_ids[0]}, None)],
+            # Showtimes will be downloaded again by the provider.
+            venue_providers[1].id: None,
+            venue_providers[2].id: [({"theater": theater_ids[2]}, None)],
+        }
+
+
 class SynchronizeDataForProviderTest:
     @patch("pcapi.local_providers.provider_manager.do_update")
     @patch("pcapi.local_providers.provider_manager.get_local_provider_class_by_name")
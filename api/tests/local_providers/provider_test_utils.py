@@ -102,3 +102,22 @@ class TestLocalProviderWithThumbIndexAt4(LocalProvider):
 
     def __next__(self):
         pass
+
+
+class TestLocalProviderWithReadAhead(LocalProvider):
+    name = "LocalProvider Test With Read Ahead"
+    can_create = True
+    read_ahead_attributes = ("product_name",)
+
+    def __init__(self, providable_infos_and_names: list, venue_provider: VenueProvider = None):
+        super().__init__(venue_provider)
+        self.venue_provider = venue_provider
+        self.providable_infos_and_names = iter(providable_infos_and_names)
+
+    def fill_object_attributes(self, obj):
+        obj.name = self.product_name
+        obj.subcategoryId = subcategories.LIVRE_PAPIER.id
+
+    def __next__(self):
+        providable_info, self.product_name = next(self.providable_infos_and_names)
+        return [providable_info]
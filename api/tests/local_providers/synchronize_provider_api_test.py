@@ -170,8 +170,8 @@ class ProviderAPICronTest:
 
         # Test it adds offer in redis
         assert mocked_async_index_offer_ids.mock_calls == [
-            mock.call({offer.id, created_offer.id, stock.offer.id}),
-            mock.call({stock_with_booking.offer.id, second_created_offer.id}),
+            mock.call({offer.id, created_offer.id, stock.offer.id}, low_priority=True),
+            mock.call({stock_with_booking.offer.id, second_created_offer.id}, low_priority=True),
         ]
 
         # Ensure next synchronisation is done with modifiedSince parameter
@@ -263,3 +263,33 @@ class ProviderAPICronTest:
                     venue_reference="3010000108123@13",
                 )
             ]
+
+
+class PrefetchTest:
+    def test_yields_items_in_order(self):
+        assert list(synchronize_provider_api._prefetch(iter(range(10)), size=2)) == list(range(10))
+
+    def test_raises_error_of_iterable(self):
+        def pages():
+            yield 1
+            raise ValueError("provider is down")
+
+        prefetched = synchronize_provider_api._prefetch(pages(), size=2)
+        assert next(prefetched) == 1
+        with pytest.raises(ValueError, match="provider is down"):
+            next(prefetched)
+
+    def test_stops_producer_when_caller_stops(self):
+        consumed = []
+
+        def pages():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        prefetched = synchronize_provider_api._prefetch(pages(), size=2)
+        assert next(prefetched) == 0
+        prefetched.close()
+
+        # At most a few pages have been downloaded in advance.
+        assert len(consumed) <= 4
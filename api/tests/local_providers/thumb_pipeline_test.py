@@ -0,0 +1,96 @@
+import pathlib
+from unittest import mock
+
+import pytest
+
+import pcapi.core.offers.factories as offers_factories
+from pcapi.local_providers.thumb_pipeline import ThumbPipeline
+from pcapi.local_providers.thumb_pipeline import get_thumb_hash
+from pcapi.utils.image_conversion import STANDARD_VARIANT
+from pcapi.utils.image_conversion import THUMB_VARIANTS
+
+import tests
+
+
+IMAGES_DIR = pathlib.Path(tests.__path__[0]) / "files"
+
+
+@pytest.fixture(name="pipeline")
+def pipeline_fixture():
+    pipeline = ThumbPipeline(processes=0, upload_workers=2)
+    yield pipeline
+    pipeline.shutdown()
+
+
+@pytest.mark.usefixtures("db_session")
+class ThumbPipelineTest:
+    @mock.patch("pcapi.core.object_storage.store_public_object")
+    def test_add_new_thumbs(self, mocked_store_public_object, pipeline):
+        product = offers_factories.ThingProductFactory(thumbCount=0)
+        image = (IMAGES_DIR / "mouette_full_size.jpg").read_bytes()
+
+        assert pipeline.add(product, 2, image)
+        assert product.thumbCount == 2
+        assert product.thumbHashes == {"2": get_thumb_hash(image)}
+
+        processed = pipeline.wait()
+        assert [pending.error for pending in processed] == [None]
+        stored_ids = sorted(call.kwargs["object_id"] for call in mocked_store_public_object.call_args_list)
+        # All variants of the first thumb are stored.
+        assert stored_ids == sorted(
+            [product.get_thumb_storage_id(0, variant) for variant in THUMB_VARIANTS] + [product.get_thumb_storage_id(1)]
+        )
+        assert product.thumbCount == 2
+        assert product.hasThumbVariants
+
+    @mock.patch("pcapi.core.object_storage.store_public_object")
+    def test_skip_unchanged_thumb(self, mocked_store_public_object, pipeline):
+        image = (IMAGES_DIR / "mouette_full_size.jpg").read_bytes()
+        product = offers_factories.ThingProductFactory(thumbCount=1, thumbHashes={"1": get_thumb_hash(image)})
+
+        assert not pipeline.add(product, 1, image)
+        assert pipeline.wait() == []
+        assert pipeline.skipped_thumbs == 1
+        mocked_store_public_object.assert_not_called()
+
+        other_image = (IMAGES_DIR / "mouette_portrait.jpg").read_bytes()
+        assert pipeline.add(product, 1, other_image)
+        pipeline.wait()
+        assert product.thumbCount == 1
+        assert product.thumbHashes == {"1": get_thumb_hash(other_image)}
+        mocked_store_public_object.assert_called_once()
+        assert mocked_store_public_object.call_args.kwargs["object_id"] == product.get_thumb_storage_id(1)
+
+    @mock.patch("pcapi.core.object_storage.store_public_object", side_effect=ValueError)
+    def test_restore_object_on_error(self, mocked_store_public_object, pipeline):
+        product = offers_factories.ThingProductFactory(
+            thumbCount=1, thumbHashes={"1": "previous"}, hasThumbVariants=False
+        )
+        image = (IMAGES_DIR / "mouette_full_size.jpg").read_bytes()
+
+        pipeline.add(product, 1, image)
+        pipeline.add(product, 2, image)
+        processed = pipeline.wait()
+
+        assert [type(pending.error) for pending in processed] == [ValueError, ValueError]
+        assert product.thumbCount == 1
+        assert not product.hasThumbVariants
+        # The image will be processed again on the next synchronization.
+        assert product.thumbHashes == {}
+
+    @mock.patch("pcapi.core.object_storage.store_public_object")
+    def test_standardize_in_another_process(self, mocked_store_public_object):
+        product = offers_factories.ThingProductFactory(thumbCount=0)
+        image = (IMAGES_DIR / "mouette_full_size.jpg").read_bytes()
+        pipeline = ThumbPipeline(processes=1, upload_workers=1)
+        try:
+            pipeline.add(product, 1, image)
+            processed = pipeline.wait()
+        finally:
+            pipeline.shutdown()
+
+        assert [pending.error for pending in processed] == [None]
+        blobs = {call.kwargs["object_id"]: call.kwargs["blob"] for call in mocked_store_public_object.call_args_list}
+        blob = blobs[product.get_thumb_storage_id(0, STANDARD_VARIANT)]
+        assert blob.startswith(b"\xff\xd8")  # JPEG
+        assert blob != image
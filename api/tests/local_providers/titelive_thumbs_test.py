@@ -12,6 +12,7 @@ from pcapi.model_creators.specific_creators import create_product_with_thing_sub
 from pcapi.models.product import Product
 from pcapi.repository import repository
 import pcapi.sandboxes
+from pcapi.utils.image_conversion import THUMB_VARIANTS
 
 
 class TiteliveThingThumbsTest:
@@ -94,6 +95,41 @@ class TiteliveThingThumbsTest:
         assert new_product.name == "Test Book"
         assert new_product.thumbCount == 1
 
+    @pytest.mark.usefixtures("db_session")
+    @patch("pcapi.core.object_storage.store_public_object")
+    @patch("pcapi.local_providers.titelive_thing_thumbs.titelive_thing_thumbs.get_files_to_process_from_titelive_ftp")
+    @patch("pcapi.local_providers.titelive_thing_thumbs.titelive_thing_thumbs.get_zip_file_from_ftp")
+    def test_skip_unchanged_thumbs(
+        self, get_thumbs_zip_file_from_ftp, get_ordered_thumbs_zip_files, mocked_store_public_object, app
+    ):
+        # Given
+        product = create_product_with_thing_subcategory(id_at_providers="9780847858903", thumb_count=0)
+        repository.save(product)
+        zip_thumb_file = get_zip_with_1_usable_thumb_file()
+        get_ordered_thumbs_zip_files.return_value = [zip_thumb_file, zip_thumb_file]
+        get_thumbs_zip_file_from_ftp.side_effect = [
+            get_zip_file_from_sandbox(zip_thumb_file),
+            get_zip_file_from_sandbox(zip_thumb_file),
+        ]
+
+        provider_object = TiteLiveThingThumbs()
+        provider_object.provider.isActive = True
+        repository.save(provider_object.provider)
+
+        # When
+        provider_object.updateObjects()
+
+        # Then
+        product = Product.query.one()
+        assert product.thumbCount == 1
+        assert list(product.thumbHashes) == ["1"]
+        assert provider_object.checkedThumbs == 2
+        assert provider_object.createdThumbs == 1
+        assert provider_object.skippedThumbs == 1
+        assert provider_object.erroredThumbs == 0
+        # All variants of the first thumb have been stored once.
+        assert mocked_store_public_object.call_count == len(THUMB_VARIANTS)
+
 
 def get_zip_with_2_usable_thumb_files():
     return get_zip_thumbs_file_from_named_sandbox_file("test_livres_tl20190505.zip")
@@ -1,15 +1,20 @@
 import enum
+from unittest import mock
 from unittest.mock import patch
 
 import flask
 import pytest
 
 from pcapi.core.testing import assert_num_queries
+from pcapi.core.testing import override_settings
 from pcapi.models import db
 from pcapi.models.feature import FEATURES_DISABLED_BY_DEFAULT
 from pcapi.models.feature import Feature
 from pcapi.models.feature import FeatureToggle
+from pcapi.models.feature import _features_cache
+from pcapi.models.feature import get_states
 from pcapi.models.feature import install_feature_flags
+from pcapi.models.feature import notify_change
 from pcapi.repository import repository
 
 
@@ -57,7 +62,7 @@ class FeatureToggleTest:
         repository.save(feature)
         context = flask._request_ctx_stack.pop()
 
-        # we don't cache yet outside the scope of a request so it'll be 3 DB queries
+        # without the process-wide cache, nothing is cached outside the scope of a request so it'll be 3 DB queries
         try:
             with assert_num_queries(3):
                 FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
@@ -68,6 +73,79 @@ class FeatureToggleTest:
             flask._request_ctx_stack.push(context)
 
 
+@pytest.mark.usefixtures("db_session")
+@override_settings(FEATURE_FLAGS_CACHE_TTL=60)
+@patch("pcapi.models.feature._FeaturesCache._start_listener")
+class FeaturesCacheTest:
+    def test_cache_outside_request_context(self, _start_listener, app):
+        context = flask._request_ctx_stack.pop()
+        try:
+            with assert_num_queries(1):
+                FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+                FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+                FeatureToggle.SYNCHRONIZE_TITELIVE_PRODUCTS.is_active()
+        finally:
+            flask._request_ctx_stack.push(context)
+
+    def test_get_states(self, _start_listener):
+        with assert_num_queries(1):
+            states = get_states(FeatureToggle.SYNCHRONIZE_ALLOCINE, FeatureToggle.ENABLE_PRO_BOOKINGS_V2)
+
+        assert states == {FeatureToggle.SYNCHRONIZE_ALLOCINE: True, FeatureToggle.ENABLE_PRO_BOOKINGS_V2: False}
+        with assert_num_queries(0):
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+    def test_expire_states(self, _start_listener):
+        with mock.patch("pcapi.models.feature.time.monotonic", return_value=1000):
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+        Feature.query.filter_by(name=FeatureToggle.SYNCHRONIZE_ALLOCINE.name).update({"isActive": False})
+
+        with mock.patch("pcapi.models.feature.time.monotonic", return_value=1059):
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+        with mock.patch("pcapi.models.feature.time.monotonic", return_value=1060):
+            assert not FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+    def test_notify_change(self, _start_listener, app):
+        assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+        Feature.query.filter_by(name=FeatureToggle.SYNCHRONIZE_ALLOCINE.name).update({"isActive": False})
+        assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+        pubsub = app.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe("feature_flags:invalidate")
+        pubsub.get_message(timeout=1)  # subscription
+        notify_change()
+
+        assert not FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+        assert pubsub.get_message(timeout=1)["channel"] == "feature_flags:invalidate"
+
+    def test_clear_cache_on_published_change(self, _start_listener):
+        class StopListening(Exception):
+            pass
+
+        pubsub = mock.Mock()
+        pubsub.listen.side_effect = lambda: iter([{"type": "message", "data": ""}])
+        _features_cache.get_states()
+        with mock.patch("pcapi.models.feature.redis.from_url") as from_url:
+            from_url.return_value.pubsub.return_value = pubsub
+            with mock.patch("pcapi.models.feature.time.sleep", side_effect=StopListening):
+                with pytest.raises(StopListening):
+                    _features_cache._listen()
+
+        pubsub.subscribe.assert_called_once_with("feature_flags:invalidate")
+        assert _features_cache._states is None
+
+    def test_do_not_store_states_loaded_before_a_change(self, _start_listener):
+        def load_states_and_clear():
+            states = {"SYNCHRONIZE_ALLOCINE": True}
+            _features_cache.clear()  # a change is published while loading
+            return states
+
+        with mock.patch("pcapi.models.feature._load_states", side_effect=load_states_and_clear):
+            assert _features_cache.get_states() == {"SYNCHRONIZE_ALLOCINE": True}
+
+        assert _features_cache._states is None
+
+
 @pytest.mark.usefixtures("db_session")
 class FeatureTest:
     def test_features_installation(self):
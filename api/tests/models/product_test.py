@@ -22,6 +22,27 @@ def when_product_has_one_thumb(app):
     assert thumb_url == f"http://localhost/storage/thumbs/products/{product_id}"
 
 
+@pytest.mark.usefixtures("db_session")
+def test_thumb_variant_urls():
+    product = ProductFactory(thumbCount=1)
+    product_id = humanize(product.id)
+
+    assert product.thumbVariantUrls == {"750.jpeg": f"http://localhost/storage/thumbs/products/{product_id}"}
+
+    product.hasThumbVariants = True
+    assert product.thumbVariantUrls == {
+        "750.jpeg": f"http://localhost/storage/thumbs/products/{product_id}",
+        "750.webp": f"http://localhost/storage/thumbs/products/{product_id}.750.webp",
+        "375.jpeg": f"http://localhost/storage/thumbs/products/{product_id}.375.jpeg",
+        "375.webp": f"http://localhost/storage/thumbs/products/{product_id}.375.webp",
+        "150.jpeg": f"http://localhost/storage/thumbs/products/{product_id}.150.jpeg",
+        "150.webp": f"http://localhost/storage/thumbs/products/{product_id}.150.webp",
+    }
+
+    product.thumbCount = 0
+    assert product.thumbVariantUrls == {}
+
+
 @pytest.mark.usefixtures("db_session")
 def when_product_has_no_thumb(app):
     # Given
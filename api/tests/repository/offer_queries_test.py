@@ -1,15 +1,16 @@
 import pytest
 
+import pcapi.core.offers.factories as offers_factories
 from pcapi.model_creators.generic_creators import create_offerer
 from pcapi.model_creators.generic_creators import create_venue
 from pcapi.model_creators.specific_creators import create_offer_with_event_product
 from pcapi.model_creators.specific_creators import create_offer_with_thing_product
 from pcapi.model_creators.specific_creators import create_product_with_thing_subcategory
 from pcapi.repository import repository
+from pcapi.repository.offer_queries import get_offer_ids_by_venue_id_in_chunks
 from pcapi.repository.offer_queries import get_offers_by_ids
 from pcapi.repository.offer_queries import get_offers_by_venue_id
 from pcapi.repository.offer_queries import get_paginated_active_offer_ids
-from pcapi.repository.offer_queries import get_paginated_offer_ids_by_venue_id
 
 
 class FindOffersTest:
@@ -103,33 +104,21 @@ class GetPaginatedActiveOfferIdsTest:
         assert offer_ids == [offer4.id]
 
 
-class GetPaginatedOfferIdsByVenueIdTest:
+class GetOfferIdsByVenueIdInChunksTest:
     @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_in_two_offers_from_first_page_when_limit_is_one(self, app):
-        # Given
-        offerer = create_offerer()
-        venue = create_venue(offerer=offerer)
-        offer1 = create_offer_with_event_product(venue=venue)
-        offer2 = create_offer_with_event_product(venue=venue)
-        repository.save(offer1, offer2)
+    def test_yield_chunks_of_offer_ids_of_venue(self, app):
+        venue = offers_factories.VenueFactory()
+        offer1, offer2, offer3 = offers_factories.OfferFactory.create_batch(3, venue=venue)
+        offers_factories.OfferFactory()  # offer of another venue
 
-        # When
-        offer_ids = get_paginated_offer_ids_by_venue_id(venue_id=venue.id, limit=1, page=0)
+        chunks = get_offer_ids_by_venue_id_in_chunks(venue_id=venue.id, chunk_size=2)
 
-        # Then
-        assert offer_ids == [offer1.id]
+        assert list(chunks) == [[offer1.id, offer2.id], [offer3.id]]
 
     @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_in_two_offers_from_second_page_when_limit_is_one(self, app):
-        # Given
-        offerer = create_offerer()
-        venue = create_venue(offerer=offerer)
-        offer1 = create_offer_with_event_product(venue=venue)
-        offer2 = create_offer_with_event_product(venue=venue)
-        repository.save(offer1, offer2)
+    def test_yield_nothing_when_venue_has_no_offer(self, app):
+        venue = offers_factories.VenueFactory()
 
-        # When
-        offer_ids = get_paginated_offer_ids_by_venue_id(venue_id=venue.id, limit=1, page=1)
+        chunks = get_offer_ids_by_venue_id_in_chunks(venue_id=venue.id, chunk_size=2)
 
-        # Then
-        assert offer_ids == [offer2.id]
+        assert list(chunks) == []
@@ -1,6 +1,15 @@
 from datetime import datetime
 
+import pytest
+from sqlalchemy import Sequence
+
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
+from pcapi.models import db
+from pcapi.models.product import Product
+from pcapi.repository import providable_queries
+from pcapi.repository.providable_queries import get_existing_objects
 from pcapi.repository.providable_queries import get_last_update_for_provider
 
 
@@ -46,3 +55,86 @@ def test_get_last_update_for_provider_should_return_none_when_last_provider_id_m
 
     # Then
     assert date_modified_at_last_provider is None
+
+
+@pytest.mark.usefixtures("db_session")
+def test_get_existing_objects():
+    product1 = offers_factories.ThingProductFactory(idAtProviders="1")
+    product2 = offers_factories.ThingProductFactory(idAtProviders="2")
+    offers_factories.ThingProductFactory(idAtProviders="3")
+
+    existing = get_existing_objects(Product, ["1", "2", "4"])
+
+    assert existing == {"1": product1, "2": product2}
+
+
+@pytest.mark.usefixtures("db_session")
+def test_get_existing_objects_for_offers():
+    offer = offers_factories.OfferFactory(idAtProvider="1")
+    offers_factories.OfferFactory(idAtProvider="2")
+
+    existing = get_existing_objects(Offer, ["1", "4"])
+
+    assert existing == {"1": offer}
+
+
+@pytest.mark.usefixtures("db_session")
+class InsertChunkTest:
+    def test_insert_products(self):
+        product1 = Product(name="Livre 1", subcategoryId="LIVRE_PAPIER", idAtProviders="1", extraData={"isbn": "1"})
+        product2 = Product(name="Livre\t2", subcategoryId="LIVRE_PAPIER", idAtProviders="2", mediaUrls=['a"b'])
+
+        ids = providable_queries.insert_chunk({"1|Product": product1, "2|Product": product2})
+
+        assert ids == {"Product": [product1.id, product2.id]}
+        product = Product.query.get(product2.id)
+        assert product.name == "Livre\t2"
+        assert product.mediaUrls == ['a"b']
+        assert product.isGcuCompatible  # default value
+        assert Product.query.get(product1.id).extraData == {"isbn": "1"}
+
+    def test_insert_existing_product(self):
+        existing = offers_factories.ThingProductFactory(idAtProviders="1", name="Ancien nom")
+        product = Product(name="Nouveau nom", subcategoryId="LIVRE_PAPIER", idAtProviders="1")
+
+        ids = providable_queries.insert_chunk({"1|Product": product})
+
+        assert ids == {"Product": [existing.id]}
+        assert Product.query.one().name == "Nouveau nom"
+
+    def test_insert_offer_and_stock(self):
+        product = offers_factories.ThingProductFactory()
+        venue = offers_factories.VenueFactory()
+        offer = Offer(
+            name="Offre", subcategoryId=product.subcategoryId, productId=product.id, venueId=venue.id, idAtProvider="1"
+        )
+        offer.id = db.session.execute(Sequence("offer_id_seq"))
+        stock = Stock(offerId=offer.id, price=10, quantity=3, idAtProviders="1")
+
+        ids = providable_queries.insert_chunk({"1|Offer": offer, "1|Stock": stock})
+
+        assert ids == {"Offer": [offer.id], "Stock": [stock.id]}
+        assert Stock.query.one().offer == Offer.query.one()
+
+
+@pytest.mark.usefixtures("db_session")
+class UpdateChunkTest:
+    def test_update_offers_and_stocks(self):
+        stock = offers_factories.StockFactory(idAtProviders="1", quantity=1)
+        offer = stock.offer
+        offer.isDuo = True
+        stock.quantity = 5
+
+        ids = providable_queries.update_chunk({"1|Offer": offer, "1|Stock": stock})
+
+        assert ids == {"Offer": [offer.id], "Stock": [stock.id]}
+        assert Offer.query.one().isDuo
+        assert Stock.query.one().quantity == 5
+
+
+def test_to_copy_text():
+    assert providable_queries._to_copy_text(None) == "\\N"
+    assert providable_queries._to_copy_text(True) == "t"
+    assert providable_queries._to_copy_text("a\tb\\c") == "a\\tb\\\\c"
+    assert providable_queries._to_copy_text(["a", 'b"c', None]) == '{"a","b\\\\"c",NULL}'
+    assert providable_queries._to_copy_text(datetime(2022, 1, 1, 12)) == "2022-01-01T12:00:00"
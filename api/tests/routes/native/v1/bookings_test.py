@@ -208,7 +208,11 @@ class GetBookingsTest:
                     "subcategoryId": subcategories.SUPPORT_PHYSIQUE_FILM.id,
                     "extraData": None,
                     "id": used2.stock.offer.id,
-                    "image": {"credit": "street credit", "url": mediation.thumbUrl},
+                    "image": {
+                        "credit": "street credit",
+                        "url": mediation.thumbUrl,
+                        "variantUrls": {"750.jpeg": mediation.thumbUrl},
+                    },
                     "isDigital": True,
                     "isPermanent": False,
                     "name": used2.stock.offer.name,
@@ -123,6 +123,7 @@ class GetTest:
             assert favorites[4]["offer"]["image"]["url"] == "http://localhost/storage/thumbs/products/%s" % (
                 humanize(offer2.product.id)
             )
+            assert favorites[4]["offer"]["image"]["variantUrls"] == {"750.jpeg": favorites[4]["offer"]["image"]["url"]}
             assert favorites[4]["offer"]["expenseDomains"] == ["all"]
             assert favorites[4]["offer"]["subcategoryId"] == "SEANCE_CINE"
 
@@ -57,7 +57,7 @@ class OffersTest:
             externalTicketOfficeUrl="https://url.com",
             venue__name="il est venu le temps des names",
         )
-        MediationFactory(id=111, offer=offer, thumbCount=1, credit="street credit")
+        MediationFactory(id=111, offer=offer, thumbCount=1, hasThumbVariants=True, credit="street credit")
 
         bookableStock = EventStockFactory(offer=offer, price=12.34, quantity=2)
         expiredStock = EventStockFactory(
@@ -143,6 +143,14 @@ class OffersTest:
         assert response.json["image"] == {
             "url": "http://localhost/storage/thumbs/mediations/N4",
             "credit": "street credit",
+            "variantUrls": {
+                "750.jpeg": "http://localhost/storage/thumbs/mediations/N4",
+                "750.webp": "http://localhost/storage/thumbs/mediations/N4.750.webp",
+                "375.jpeg": "http://localhost/storage/thumbs/mediations/N4.375.jpeg",
+                "375.webp": "http://localhost/storage/thumbs/mediations/N4.375.webp",
+                "150.jpeg": "http://localhost/storage/thumbs/mediations/N4.150.jpeg",
+                "150.webp": "http://localhost/storage/thumbs/mediations/N4.150.webp",
+            },
         }
         assert response.json["isExpired"] == False
         assert response.json["isForbiddenToUnderage"] == False
@@ -333,8 +333,13 @@ def test_public_api(client, app):
                     "properties": {
                         "credit": {"nullable": True, "title": "Credit", "type": "string"},
                         "url": {"title": "Url", "type": "string"},
+                        "variantUrls": {
+                            "additionalProperties": {"type": "string"},
+                            "title": "Varianturls",
+                            "type": "object",
+                        },
                     },
-                    "required": ["url"],
+                    "required": ["url", "variantUrls"],
                     "title": "OfferImageResponse",
                     "type": "object",
                 },
@@ -869,8 +874,13 @@ def test_public_api(client, app):
                     "properties": {
                         "credit": {"nullable": True, "title": "Credit", "type": "string"},
                         "url": {"title": "Url", "type": "string"},
+                        "variantUrls": {
+                            "additionalProperties": {"type": "string"},
+                            "title": "Varianturls",
+                            "type": "object",
+                        },
                     },
-                    "required": ["url"],
+                    "required": ["url", "variantUrls"],
                     "title": "FavoriteMediationResponse",
                     "type": "object",
                 },
@@ -29,6 +29,7 @@ class GetAllBookingsTest:
     @pytest.mark.usefixtures("db_session")
     @patch("pcapi.core.bookings.repository.find_by_pro_user")
     def test_call_repository_with_user_and_page(self, find_by_pro_user, app):
+        find_by_pro_user.return_value.next_page_cursor = None
         pro = users_factories.ProFactory()
         response = (
             TestClient(app.test_client())
@@ -45,6 +46,7 @@ class GetAllBookingsTest:
             venue_id=None,
             offer_type=None,
             page=3,
+            cursor=None,
         )
 
     @pytest.mark.usefixtures("db_session")
@@ -62,6 +64,7 @@ class GetAllBookingsTest:
             venue_id=None,
             offer_type=None,
             page=1,
+            cursor=None,
         )
 
     @pytest.mark.usefixtures("db_session")
@@ -85,6 +88,7 @@ class GetAllBookingsTest:
             venue_id=venue.id,
             offer_type=None,
             page=1,
+            cursor=None,
         )
 
 
@@ -305,3 +309,12 @@ class Returns400Test:
         assert response.status_code == 400
         assert response.json["bookingPeriodBeginningDate"] == ["Ce champ est obligatoire"]
         assert response.json["bookingPeriodEndingDate"] == ["Ce champ est obligatoire"]
+
+    def when_cursor_is_invalid(self, app):
+        pro = users_factories.ProFactory()
+
+        client = TestClient(app.test_client()).with_session_auth(pro.email)
+        response = client.get(f"/bookings/pro?{BOOKING_PERIOD_PARAMS}&bookingStatusFilter=booked&cursor=invalid")
+
+        assert response.status_code == 400
+        assert response.json["cursor"] == ["Le curseur de pagination est invalide"]
@@ -0,0 +1,61 @@
+import codecs
+from datetime import datetime
+import io
+import zipfile
+
+import pytest
+
+import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.offers.factories as offers_factories
+
+from tests.conftest import TestClient
+
+
+BOOKING_PERIOD_PARAMS = "bookingPeriodBeginningDate=2020-08-10&bookingPeriodEndingDate=2020-08-12"
+
+
+@pytest.mark.usefixtures("db_session")
+class Returns200Test:
+    def test_get_csv(self, app):
+        booking = bookings_factories.BookingFactory(dateCreated=datetime(2020, 8, 11), token="ABCDEF")
+        pro = offers_factories.UserOffererFactory(offerer=booking.offerer).user
+
+        client = TestClient(app.test_client()).with_session_auth(pro.email)
+        response = client.get(f"/bookings/csv?{BOOKING_PERIOD_PARAMS}&bookingStatusFilter=booked")
+
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.headers["Content-Type"] == "text/csv; charset=utf-8;"
+        assert response.headers["Content-Disposition"] == "attachment; filename=reservations_pass_culture.csv"
+        content = response.data
+        assert content.startswith(codecs.BOM_UTF8)
+        lines = content.decode("utf-8-sig").splitlines()
+        assert len(lines) == 2
+        assert lines[0].startswith('"Lieu";')
+        assert '"ABCDEF"' in lines[1]
+
+    def test_get_excel(self, app):
+        booking = bookings_factories.BookingFactory(dateCreated=datetime(2020, 8, 11), token="ABCDEF")
+        pro = offers_factories.UserOffererFactory(offerer=booking.offerer).user
+
+        client = TestClient(app.test_client()).with_session_auth(pro.email)
+        response = client.get(f"/bookings/excel?{BOOKING_PERIOD_PARAMS}&bookingStatusFilter=booked")
+
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.headers["Content-Disposition"] == "attachment; filename=reservations_pass_culture.xlsx"
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        assert sheet.count("<row>") == 2
+        assert "ABCDEF" in sheet
+
+
+@pytest.mark.usefixtures("db_session")
+class Returns400Test:
+    def test_missing_booking_period(self, app):
+        pro = offers_factories.UserOffererFactory().user
+
+        client = TestClient(app.test_client()).with_session_auth(pro.email)
+        response = client.get("/bookings/csv?bookingStatusFilter=booked")
+
+        assert response.status_code == 400
@@ -0,0 +1,40 @@
+from unittest import mock
+
+from pcapi.utils.cache import LRUCache
+
+
+class LRUCacheTest:
+    def test_get_and_set(self):
+        cache = LRUCache(max_size=10, ttl=60)
+        cache.set_many({"a": 1, "b": None})
+
+        found, missing = cache.get_many(["a", "b", "c"])
+
+        assert found == {"a": 1, "b": None}
+        assert missing == ["c"]
+
+    def test_evict_least_recently_used(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set_many({"a": 1, "b": 2})
+        cache.get_many(["a"])
+
+        cache.set_many({"c": 3})
+
+        assert cache.get_many(["a", "b", "c"]) == ({"a": 1, "c": 3}, ["b"])
+        assert len(cache) == 2
+
+    def test_expire_entries(self):
+        cache = LRUCache(max_size=10, ttl=60)
+        with mock.patch("pcapi.utils.cache.time.monotonic", return_value=1000):
+            cache.set_many({"a": 1})
+        with mock.patch("pcapi.utils.cache.time.monotonic", return_value=1059):
+            assert cache.get_many(["a"]) == ({"a": 1}, [])
+        with mock.patch("pcapi.utils.cache.time.monotonic", return_value=1060):
+            assert cache.get_many(["a"]) == ({}, ["a"])
+        assert len(cache) == 0
+
+    def test_disabled_cache(self):
+        cache = LRUCache(max_size=0, ttl=60)
+        cache.set_many({"a": 1})
+
+        assert cache.get_many(["a"]) == ({}, ["a"])
@@ -6,10 +6,14 @@ import pytest
 
 from pcapi.utils.image_conversion import IMAGE_RATIO_LANDSCAPE_DEFAULT
 from pcapi.utils.image_conversion import IMAGE_RATIO_PORTRAIT_DEFAULT
+from pcapi.utils.image_conversion import ImageVariant
+from pcapi.utils.image_conversion import STANDARD_VARIANT
+from pcapi.utils.image_conversion import THUMB_VARIANTS
 from pcapi.utils.image_conversion import _crop_image
 from pcapi.utils.image_conversion import _resize_image
 from pcapi.utils.image_conversion import _transpose_image
 from pcapi.utils.image_conversion import standardize_image
+from pcapi.utils.image_conversion import standardize_image_variants
 
 import tests
 
@@ -82,3 +86,55 @@ class ImageConversionTest:
 
         result_image = PIL.Image.open(io.BytesIO(standardized_image)).convert("RGB")
         assert (result_image.width / result_image.height) == pytest.approx(IMAGE_RATIO_LANDSCAPE_DEFAULT, 0.01)
+
+    def test_image_variants(self):
+        image_as_bytes = (IMAGES_DIR / "mouette_full_size.jpg").read_bytes()
+
+        variants = standardize_image_variants(image_as_bytes, ratio=IMAGE_RATIO_PORTRAIT_DEFAULT)
+
+        assert set(variants) == set(THUMB_VARIANTS)
+        for variant, variant_as_bytes in variants.items():
+            result_image = PIL.Image.open(io.BytesIO(variant_as_bytes))
+            assert result_image.format == variant.format
+            assert result_image.width == variant.width
+            assert (result_image.width / result_image.height) == pytest.approx(IMAGE_RATIO_PORTRAIT_DEFAULT, 0.01)
+        assert variants[STANDARD_VARIANT] == standardize_image(image_as_bytes, ratio=IMAGE_RATIO_PORTRAIT_DEFAULT)
+
+    def test_image_variants_are_not_enlarged(self):
+        image_as_bytes = (IMAGES_DIR / "mouette_portrait.jpg").read_bytes()
+
+        variants = standardize_image_variants(
+            image_as_bytes,
+            ratio=IMAGE_RATIO_PORTRAIT_DEFAULT,
+            variants=(STANDARD_VARIANT, ImageVariant(150, "WEBP")),
+        )
+
+        assert PIL.Image.open(io.BytesIO(variants[STANDARD_VARIANT])).width == 398
+        assert PIL.Image.open(io.BytesIO(variants[ImageVariant(150, "WEBP")])).width == 150
+
+    def test_draft_large_jpeg_with_exif_orientation(self):
+        # 4032x3024 image that is rotated by 90 degrees: it is decoded
+        # at a quarter of its size, which is still wider than 750px
+        # once rotated.
+        image_as_bytes = (IMAGES_DIR / "image_with_exif_orientation.jpeg").read_bytes()
+
+        variants = standardize_image_variants(
+            image_as_bytes, ratio=IMAGE_RATIO_LANDSCAPE_DEFAULT, variants=(STANDARD_VARIANT,)
+        )
+
+        result_image = PIL.Image.open(io.BytesIO(variants[STANDARD_VARIANT]))
+        assert result_image.width == 750
+        assert (result_image.width / result_image.height) == pytest.approx(IMAGE_RATIO_LANDSCAPE_DEFAULT, 0.01)
+
+    def test_do_not_draft_when_cropped_image_would_be_too_small(self):
+        image_as_bytes = (IMAGES_DIR / "mouette_full_size.jpg").read_bytes()
+
+        variants = standardize_image_variants(
+            image_as_bytes,
+            ratio=IMAGE_RATIO_PORTRAIT_DEFAULT,
+            crop_params=(0.1, 0.1, 0.5),
+            variants=(STANDARD_VARIANT,),
+        )
+
+        # The cropped image is 595px wide: it is not resized.
+        assert PIL.Image.open(io.BytesIO(variants[STANDARD_VARIANT])).width == 595
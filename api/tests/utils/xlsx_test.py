@@ -0,0 +1,78 @@
+from decimal import Decimal
+import io
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zipfile
+
+from pcapi.utils import xlsx
+
+
+NAMESPACE = {"main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def read_sheet(content: bytes) -> list[list[str]]:
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        assert archive.testzip() is None
+        assert "xl/workbook.xml" in archive.namelist()
+        sheet = ET.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    return [
+        [
+            cell.findtext(".//main:t", namespaces=NAMESPACE) or cell.findtext("main:v", namespaces=NAMESPACE)
+            for cell in row
+        ]
+        for row in sheet.iterfind(".//main:row", NAMESPACE)
+    ]
+
+
+def measure_peak_memory(row_count: int) -> int:
+    rows = (("Cinéma", f"Film {i}", i, Decimal("12.50")) for i in range(row_count))
+    tracemalloc.start()
+    try:
+        for _chunk in xlsx.stream_xlsx(rows, chunk_size=1000):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class StreamXlsxTest:
+    def test_write_rows(self):
+        rows = [
+            ("Lieu", "Prix", "Date"),
+            ("Librairie <Tintin> & co", Decimal("12.50"), None),
+            ("Ligne\x00invalide", 3, "2022-03-01 10:00:00+01:00"),
+        ]
+
+        content = b"".join(xlsx.stream_xlsx(rows))
+
+        assert read_sheet(content) == [
+            ["Lieu", "Prix", "Date"],
+            ["Librairie <Tintin> & co", "12.50", None],
+            ["Ligneinvalide", "3", "2022-03-01 10:00:00+01:00"],
+        ]
+
+    def test_yield_chunks_while_reading_rows(self):
+        read_rows = []
+
+        def rows():
+            for i in range(5):
+                read_rows.append(i)
+                yield (i,)
+
+        stream = xlsx.stream_xlsx(rows(), chunk_size=2)
+        chunks = [next(stream)]  # workbook metadata
+        assert read_rows == []
+        chunks.append(next(stream))
+        assert read_rows == [0, 1]
+
+        chunks.extend(stream)
+        assert read_rows == [0, 1, 2, 3, 4]
+        assert read_sheet(b"".join(chunks)) == [["0"], ["1"], ["2"], ["3"], ["4"]]
+
+    def test_memory_does_not_grow_with_row_count(self):
+        # Rough benchmark: exporting 10 times more rows must not use
+        # (much) more memory.
+        small = measure_peak_memory(5_000)
+        large = measure_peak_memory(50_000)
+
+        assert large < small * 1.5